@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Benchmark: instrumentation overhead of the coverage backends
+
+Runs a pytest suite for examples/calculator.py with no coverage, with
+coverage.py and with the sys.monitoring collector (Python 3.12+), each
+run in a fresh interpreter, the same way the sandbox workers do it.
+
+Workloads:
+    calculator  A typical generated suite: every function called a few times
+    heavy       Hot loops: primes below 200k, Fibonacci and factorials
+
+Usage:
+    python benchmarks/bench_coverage.py                      # all backends, 5 runs each
+    python benchmarks/bench_coverage.py --runs 3 --workloads heavy
+"""
+
+import argparse
+import json
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT / "src"))
+
+EXAMPLE = ROOT / "examples" / "calculator.py"
+
+CALCULATOR_TESTS = '''
+import pytest
+from calculator import Calculator, factorial, fibonacci, is_prime
+
+
+@pytest.fixture
+def calc():
+    return Calculator()
+
+
+def test_arithmetic(calc):
+    assert calc.add(2, 3) == 5
+    assert calc.subtract(2, 3) == -1
+    assert calc.multiply(2, 3) == 6
+    assert calc.divide(6, 3) == 2
+    assert calc.power(2, 10) == 1024
+    assert len(calc.get_history()) == 5
+    calc.clear_history()
+    assert calc.get_history() == []
+
+
+def test_errors(calc):
+    with pytest.raises(ZeroDivisionError):
+        calc.divide(1, 0)
+    with pytest.raises(ValueError):
+        calc.power(2, -1)
+    with pytest.raises(ValueError):
+        factorial(-1)
+    with pytest.raises(ValueError):
+        fibonacci(-1)
+
+
+@pytest.mark.parametrize("n,expected", [(0, 1), (1, 1), (5, 120), (10, 3628800)])
+def test_factorial(n, expected):
+    assert factorial(n) == expected
+
+
+@pytest.mark.parametrize("n,expected", [(0, 0), (1, 1), (10, 55), (20, 6765)])
+def test_fibonacci(n, expected):
+    assert fibonacci(n) == expected
+
+
+@pytest.mark.parametrize("n", [1, 2, 4, 9, 17, 97])
+def test_is_prime(n):
+    assert is_prime(n) == (n in (2, 17, 97))
+'''
+
+HEAVY_TESTS = '''
+from calculator import Calculator, factorial, fibonacci, is_prime
+
+
+def test_primes():
+    assert sum(1 for n in range(200_000) if is_prime(n)) == 17984
+
+
+def test_fibonacci():
+    for n in range(2_000):
+        fibonacci(n)
+
+
+def test_factorial_and_history():
+    calc = Calculator()
+    for n in range(1, 300):
+        calc.multiply(factorial(n % 50), n)
+    assert len(calc.get_history()) == 299
+'''
+
+WORKLOADS = {"calculator": CALCULATOR_TESTS, "heavy": HEAVY_TESTS}
+
+
+def measure(workload: str, backend: str) -> dict:
+    """Run the suite once in this process under one backend"""
+    from sandbox import _run_pytest, pytest_plugin_modules
+
+    work_dir = tempfile.mkdtemp(prefix="bench-coverage-")
+    try:
+        shutil.copy(EXAMPLE, Path(work_dir) / "calculator.py")
+        (Path(work_dir) / "test_calculator.py").write_text(WORKLOADS[workload])
+        sys.path.insert(0, work_dir)
+
+        import os
+        os.chdir(work_dir)
+        args = ["test_calculator.py", "-q", "-p", "no:cacheprovider"]
+        coverage_files = [] if backend == "none" else ["calculator.py"]
+
+        started = time.perf_counter()
+        exit_code, report, used = _run_pytest(args, coverage_files, pytest_plugin_modules(), backend)
+        elapsed = time.perf_counter() - started
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    data = report.get("calculator.py", {})
+    return {
+        "workload": workload,
+        "backend": used or "none",
+        "exit_code": exit_code,
+        "seconds": elapsed,
+        "missing": data.get("missing"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark coverage backends")
+    parser.add_argument("--workloads", nargs="+", default=list(WORKLOADS), choices=list(WORKLOADS))
+    parser.add_argument("--backends", nargs="+", default=["none", "coveragepy", "sysmon"])
+    parser.add_argument("--runs", type=int, default=5, help="Runs per combination (default: 5)")
+    parser.add_argument("--child", nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure(*args.child)))
+        return
+
+    print(f"Python {sys.version.split()[0]}")
+    print(f"\n{'workload':<11} {'backend':<11} {'median s':>9} {'min s':>8} {'overhead':>9}  missing")
+    for workload in args.workloads:
+        baseline = None
+        for backend in args.backends:
+            runs = []
+            for _ in range(args.runs):
+                # Свежий интерпретатор на каждый прогон: как одноразовый воркер
+                proc = subprocess.run(
+                    [sys.executable, __file__, "--child", workload, backend],
+                    capture_output=True, text=True
+                )
+                if proc.returncode != 0:
+                    print(f"❌ {workload}/{backend}: {proc.stderr.strip()[-300:]}")
+                    break
+                runs.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+            if not runs:
+                continue
+            if runs[0]["backend"] != backend and backend != "none":
+                print(f"{workload:<11} {backend:<11} {'n/a (falls back to ' + runs[0]['backend'] + ')':>28}")
+                continue
+
+            times = [r["seconds"] for r in runs]
+            median = statistics.median(times)
+            if backend == "none":
+                baseline = median
+            overhead = f"{median / baseline:.2f}x" if baseline else "-"
+            print(
+                f"{workload:<11} {backend:<11} {median:>9.3f} {min(times):>8.3f} "
+                f"{overhead:>9}  {runs[0]['missing']}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Benchmark: cost of each crew memory backend
+
+Runs TestingCrew on examples/calculator.py with every memory backend
+(off, buffer, sqlite, crewai), each in a fresh interpreter, and reports
+startup time, run latency, token usage and peak RSS.
+
+Requires an LLM API key (runs make real LLM calls).
+
+Usage:
+    python benchmarks/bench_memory.py                 # all backends, 2 runs each
+    python benchmarks/bench_memory.py --runs 3 --backends off buffer
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT / "src"))
+
+EXAMPLE = ROOT / "examples" / "calculator.py"
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process in MB"""
+    # ru_maxrss: КБ на Linux, байты на macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def measure(backend: str, runs: int) -> dict:
+    """Measure one backend in the current process"""
+    started = time.perf_counter()
+    from crew import TestingCrew
+    from memory import create_memory
+
+    work_dir = tempfile.mkdtemp(prefix="bench-memory-")
+    memory = create_memory(backend, path=os.path.join(work_dir, "memory.db"))
+    crew = TestingCrew(memory=memory)
+    startup = time.perf_counter() - started
+    rss_before = peak_rss_mb()
+
+    latencies, tokens = [], []
+    for _ in range(runs):
+        run_started = time.perf_counter()
+        result = crew.run(str(EXAMPLE))
+        latencies.append(time.perf_counter() - run_started)
+        tokens.append((result.get("token_usage") or {}).get("total_tokens", 0))
+
+    return {
+        "backend": backend,
+        "startup_s": round(startup, 2),
+        "latency_s": [round(x, 1) for x in latencies],
+        "tokens": tokens,
+        "rss_startup_mb": round(rss_before, 1),
+        "rss_peak_mb": round(peak_rss_mb(), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark crew memory backends")
+    parser.add_argument("--backends", nargs="+", default=["off", "buffer", "sqlite", "crewai"])
+    parser.add_argument("--runs", type=int, default=2, help="Runs per backend (default: 2)")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure(args.child, args.runs)))
+        return
+
+    if not any(os.getenv(k) for k in ("OPENROUTER_API_KEY", "GROQ_API_KEY", "OPENAI_API_KEY")):
+        print("❌ Set an LLM API key: the benchmark makes real LLM calls")
+        sys.exit(1)
+
+    results = []
+    for backend in args.backends:
+        # Отдельный процесс на бэкенд — RSS не смешивается
+        proc = subprocess.run(
+            [sys.executable, __file__, "--child", backend, "--runs", str(args.runs)],
+            capture_output=True, text=True
+        )
+        if proc.returncode != 0:
+            print(f"❌ {backend}: {proc.stderr.strip()[-300:]}")
+            continue
+        results.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+
+    print(f"\n{'backend':<8} {'startup s':>9} {'latency s':>16} {'tokens':>16} {'RSS MB':>14}")
+    for r in results:
+        print(
+            f"{r['backend']:<8} {r['startup_s']:>9} "
+            f"{'/'.join(map(str, r['latency_s'])):>16} "
+            f"{'/'.join(map(str, r['tokens'])):>16} "
+            f"{r['rss_startup_mb']:>6}->{r['rss_peak_mb']:<6}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Benchmark: job latency with FIFO slots vs the fair SJF scheduler
+
+Replays a bot workload with simulated crew runs. A run sleeps for its
+estimated cost times --scale seconds; no LLM calls are made. The
+workload is a stream of small snippets from several users with a few
+large uploads arriving while the slots are busy. The old semaphore
+(arrival order) is compared with JobScheduler, and latency from submit
+to result is reported per job size.
+
+Usage:
+    python benchmarks/bench_scheduler.py
+    python benchmarks/bench_scheduler.py --slots 2 --small 40 --scale 0.0002
+"""
+
+import argparse
+import asyncio
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT / "src"))
+
+from scheduler import JobScheduler, estimate_cost  # noqa: E402
+
+SMALL_CODE = "def add(a, b):\n    return a + b\n\n\ndef sub(a, b):\n    return a - b\n"
+LARGE_CODE = "\n".join(
+    f"def func_{i}(x, y):\n    if x > y:\n        return x - y\n    return y * {i}\n"
+    for i in range(750)
+)  # ~3,000 строк
+
+
+def workload(small: int, large: int, users: int, seed: int) -> list[tuple[float, str, str]]:
+    """(arrival offset, user, code): small snippets with large uploads mixed in"""
+    rng = random.Random(seed)
+    jobs = []
+    arrival = 0.0
+    for _ in range(small):
+        arrival += rng.expovariate(80)
+        jobs.append((arrival, f"user{rng.randrange(users)}", SMALL_CODE))
+    # Загрузки приходят, пока слоты уже заняты сниппетами
+    for i in range(large):
+        jobs.append((arrival * (i + 1) / (large + 2), f"uploader{i}", LARGE_CODE))
+    return jobs
+
+
+async def run_fifo(jobs, slots: int, scale: float) -> list[tuple[str, float]]:
+    """The previous behaviour: a semaphore, served in arrival order"""
+    semaphore = asyncio.Semaphore(slots)
+
+    async def job(offset, user, code):
+        await asyncio.sleep(offset)
+        submitted = time.perf_counter()
+        async with semaphore:
+            await asyncio.sleep(estimate_cost(code) * scale)
+        return code, time.perf_counter() - submitted
+
+    return await asyncio.gather(*(job(*j) for j in jobs))
+
+
+async def run_fair(jobs, slots: int, scale: float) -> list[tuple[str, float]]:
+    # То же соотношение старения к длительности, что и у значений по умолчанию
+    scheduler = JobScheduler(slots, aging=20 * 0.2 / scale)
+
+    async def job(offset, user, code):
+        await asyncio.sleep(offset)
+        submitted = time.perf_counter()
+        ticket = scheduler.submit(user, code)
+        await scheduler.acquire(ticket)
+        try:
+            await asyncio.sleep(ticket.cost * scale)
+        finally:
+            scheduler.release(ticket)
+        return code, time.perf_counter() - submitted
+
+    return await asyncio.gather(*(job(*j) for j in jobs))
+
+
+def summarize(results, code: str) -> tuple[float, float]:
+    latencies = sorted(latency for job_code, latency in results if job_code == code)
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    return statistics.median(latencies), p95
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark job scheduling policies")
+    parser.add_argument("--slots", type=int, default=2, help="Concurrent jobs (default: 2)")
+    parser.add_argument("--small", type=int, default=30, help="Small snippets (default: 30)")
+    parser.add_argument("--large", type=int, default=2, help="Large uploads (default: 2)")
+    parser.add_argument("--users", type=int, default=5, help="Users sending snippets (default: 5)")
+    parser.add_argument("--scale", type=float, default=0.0001, help="Seconds per work unit (default: 0.0001)")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    jobs = workload(args.small, args.large, args.users, args.seed)
+    print(f"Workload: {args.large} uploads of {estimate_cost(LARGE_CODE):.0f} units, "
+          f"{args.small} snippets of {estimate_cost(SMALL_CODE):.0f} units, {args.slots} slots")
+    print(f"\n{'policy':<8} {'small p50':>10} {'small p95':>10} {'large p50':>10} {'large p95':>10}")
+
+    for name, policy in (("fifo", run_fifo), ("fair", run_fair)):
+        results = asyncio.run(policy(jobs, args.slots, args.scale))
+        small_p50, small_p95 = summarize(results, SMALL_CODE)
+        large_p50, large_p95 = summarize(results, LARGE_CODE)
+        print(f"{name:<8} {small_p50:>9.2f}s {small_p95:>9.2f}s {large_p50:>9.2f}s {large_p95:>9.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Benchmark: latency, tokens and test quality per model tier mix
+
+Runs TestingCrew on a fixed corpus with several assignments of model
+tiers to agents and reports, per mix: run latency, prompt/completion
+tokens per agent, whether the generated tests pass in the sandbox and
+their line coverage. With --prices the token counts are priced per model.
+
+Mixes:
+    fast     every agent on the fast tier
+    tiered   config/agents.yaml as shipped (fast analysis/validation)
+    strong   every agent on the strong tier
+
+Requires an LLM API key (runs make real LLM calls).
+
+Usage:
+    python benchmarks/bench_tiers.py
+    python benchmarks/bench_tiers.py --mixes tiered strong --runs 2
+    python benchmarks/bench_tiers.py --prices prices.json   # {"model": [usd_in_1m, usd_out_1m]}
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Iterator
+
+import yaml
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT / "src"))
+
+CORPUS = [
+    ROOT / "examples" / "calculator.py",
+    ROOT / "src" / "fingerprint.py",
+    ROOT / "src" / "ratelimit.py",
+]
+
+AGENTS = ("code_analyzer_agent", "qa_test_agent", "test_validator_agent")
+MODEL_KEYS = ("model", "temperature", "max_tokens", "fallback")
+
+
+def mix_config(mix: str, work_dir: str) -> str:
+    """agents.yaml for a mix: tiers copied from the shipped agents"""
+    with open(ROOT / "config" / "agents.yaml", encoding="utf-8") as f:
+        agents = yaml.safe_load(f)
+    tiers = {
+        "fast": {k: agents["code_analyzer_agent"].get(k) for k in MODEL_KEYS},
+        "strong": {k: agents["qa_test_agent"].get(k) for k in MODEL_KEYS},
+    }
+    if mix != "tiered":
+        for name in AGENTS:
+            for key in MODEL_KEYS:
+                agents[name].pop(key, None)
+            agents[name].update({k: v for k, v in tiers[mix].items() if v is not None})
+
+    path = os.path.join(work_dir, f"agents_{mix}.yaml")
+    with open(path, "w", encoding="utf-8") as f:
+        yaml.safe_dump(agents, f, sort_keys=False, allow_unicode=True)
+    return path
+
+
+def agent_usage(llm) -> Iterator[tuple[str, dict]]:
+    """(model, usage) for an agent's LLM and, for a fallback chain, each model"""
+    for llm_ in getattr(llm, "chain", None) or [llm]:
+        yield llm_.model, llm_.get_token_usage_summary().model_dump()
+
+
+def measure(mix: str, runs: int, work_dir: str) -> list[dict]:
+    from crew import TestingCrew, extract_tests
+    from sandbox import get_pool
+
+    class MixCrew(TestingCrew):
+        agents_config = mix_config(mix, work_dir)
+
+    rows = []
+    for path in CORPUS:
+        for _ in range(runs):
+            crew = MixCrew()  # Без кэша: каждый прогон идёт в LLM
+            started = time.perf_counter()
+            result = crew.run(str(path))
+            latency = time.perf_counter() - started
+
+            usage = {}
+            for name in AGENTS:
+                for model, data in agent_usage(getattr(crew, name)().llm):
+                    if data.get("total_tokens"):
+                        usage.setdefault(name, []).append({
+                            "model": model,
+                            "prompt_tokens": data.get("prompt_tokens", 0),
+                            "completion_tokens": data.get("completion_tokens", 0),
+                        })
+
+            tests = extract_tests(result)
+            check = get_pool().run_pytest(
+                {path.name: path.read_text(encoding="utf-8"), f"test_{path.name}": tests},
+                f"test_{path.name}", coverage_files=[path.name]
+            )
+            cov = check.coverage.get(path.name)
+            coverage = (
+                1 - len(cov["missing"]) / len(cov["statements"])
+                if cov and cov["statements"] else 0.0
+            )
+            rows.append({
+                "mix": mix,
+                "file": path.name,
+                "latency_s": round(latency, 1),
+                "usage": usage,
+                "tests_pass": check.passed,
+                "coverage": round(coverage, 3),
+            })
+    return rows
+
+
+def tokens(rows: list[dict], agent: str) -> int:
+    return sum(
+        e["prompt_tokens"] + e["completion_tokens"]
+        for r in rows for e in r["usage"].get(agent, [])
+    ) // max(len(rows), 1)
+
+
+def cost(rows: list[dict], prices: dict) -> float:
+    total = 0.0
+    for row in rows:
+        for entries in row["usage"].values():
+            for e in entries:
+                price_in, price_out = prices.get(e["model"], (0, 0))
+                total += e["prompt_tokens"] * price_in / 1e6 + e["completion_tokens"] * price_out / 1e6
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark model tier mixes")
+    parser.add_argument("--mixes", nargs="+", default=["fast", "tiered", "strong"])
+    parser.add_argument("--runs", type=int, default=1, help="Runs per file (default: 1)")
+    parser.add_argument("--prices", help="JSON file: model -> [USD per 1M input, per 1M output]")
+    parser.add_argument("--json", help="Also write raw rows to this file")
+    args = parser.parse_args()
+
+    if not any(os.getenv(k) for k in ("OPENROUTER_API_KEY", "GROQ_API_KEY", "OPENAI_API_KEY")):
+        print("❌ Set an LLM API key: the benchmark makes real LLM calls")
+        sys.exit(1)
+
+    prices = {}
+    if args.prices:
+        with open(args.prices, encoding="utf-8") as f:
+            prices = json.load(f)
+
+    work_dir = tempfile.mkdtemp(prefix="bench-tiers-")
+    all_rows = []
+    print(f"\n{'mix':<7} {'latency s':>10} {'analyze tok':>12} {'write tok':>10} "
+          f"{'validate tok':>13} {'pass':>5} {'coverage':>9} {'cost $':>8}")
+    for mix in args.mixes:
+        rows = measure(mix, args.runs, work_dir)
+        all_rows.extend(rows)
+
+        print(
+            f"{mix:<7} {statistics.median(r['latency_s'] for r in rows):>10.1f} "
+            f"{tokens(rows, 'code_analyzer_agent'):>12} {tokens(rows, 'qa_test_agent'):>10} "
+            f"{tokens(rows, 'test_validator_agent'):>13} "
+            f"{sum(r['tests_pass'] for r in rows)}/{len(rows):<3} "
+            f"{statistics.mean(r['coverage'] for r in rows):>8.0%} "
+            f"{(f'{cost(rows, prices):.4f}' if prices else '-'):>8}"
+        )
+
+    print("\nTokens are per file (mean); latency is the median crew run; pass/coverage")
+    print("come from running the generated tests in the sandbox.")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(all_rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
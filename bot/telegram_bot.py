@@ -8,29 +8,47 @@ Usage:
     Send Python code to the bot and receive comprehensive tests.
 """
 
+import asyncio
+import atexit
+import functools
+import logging
 import os
+import shutil
 import sys
-import asyncio
 import tempfile
-import logging
-from pathlib import Path
+import time
 from datetime import datetime
+from pathlib import Path
 from typing import Optional
 
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
 from telegram.ext import (
     Application,
-    CommandHandler,
-    MessageHandler,
     CallbackQueryHandler,
+    CommandHandler,
     ContextTypes,
+    MessageHandler,
     filters,
 )
 
 # Add parent directory to path for imports
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from src.crew import TestingCrew
+from src.admission import Admission, AdmissionLimits, RunHistory, admit
+from src.cache import TestCache
+from src.cancellation import CancelToken, DeadlineExceeded, JobCancelled
+from src.checkpoints import CheckpointStore
+from src.crew import TestingCrew, extract_tests
+from src.forkserver import add_preload
+from src.memory import create_memory
+from src.mutation import run_mutation_gate
+from src.profiling import Profile, SamplingProfiler
+from src.reports import ValidationReport
+from src.sandbox import preload_modules
+from src.scheduler import JobScheduler, Ticket
+from src.singleflight import JobStore, SingleFlight, job_key
+from src.tracing import get_tracer
+from src.workers import WorkerLimits, WorkerPool
 
 # Configure logging
 logging.basicConfig(
@@ -51,6 +69,90 @@ RATE_LIMIT = {}
 RATE_LIMIT_SECONDS = 60
 MAX_REQUESTS_PER_MINUTE = 5
 
+# Job execution: concurrent crew runs and per-job deadline
+MAX_CONCURRENT_JOBS = int(os.getenv("MAX_CONCURRENT_JOBS", "2"))
+JOB_TIMEOUT_SECONDS = float(os.getenv("JOB_TIMEOUT_SECONDS", "600"))
+
+# Free slots go to the cheapest job of the user with the fairest share
+# (SCHEDULER_* env); queued jobs see their position and ETA
+JOB_SCHEDULER = JobScheduler(MAX_CONCURRENT_JOBS)
+QUEUE_STATUS_INTERVAL = 5.0
+
+# Crew runs go to worker processes that retire after WORKER_MAX_JOBS jobs
+# or past WORKER_MAX_RSS_MB (JOB_WORKERS=thread: run in the bot process)
+JOB_WORKERS = os.getenv("JOB_WORKERS", "process")
+WORKER_POOL: Optional[WorkerPool] = None
+# CrewAI is imported once in the forkserver: a replacement worker is a fork
+WORKER_PRELOAD = ("crewai", "src.crew")
+
+# Submitted code is saved under this name: the test cache key and the
+# generated tests' imports use the module name, so it must not vary per job
+SNIPPET_FILE = "snippet.py"
+
+# Cancel tokens of running/queued jobs per user
+ACTIVE_JOBS: dict[int, list[CancelToken]] = {}
+
+# Cache of generated tests keyed by normalized-AST fingerprint (TEST_CACHE_* env)
+TEST_CACHE = TestCache.from_env()
+
+# Finished stages of every run (CHECKPOINT_* env): a retried job resumes
+# where it failed, /revalidate and /moretests reuse the analysis
+CHECKPOINTS = CheckpointStore.from_env()
+
+# Last code each user got tests for (/revalidate, /moretests)
+LAST_CODE: dict[int, str] = {}
+
+# Crew memory shared by all jobs (CREW_MEMORY: off, buffer, sqlite, crewai)
+CREW_MEMORY = create_memory()
+
+# Identical jobs submitted at the same time share one run; JOB_STORE_PATH
+# extends this to several bot processes
+SINGLE_FLIGHT = SingleFlight(JobStore.from_env())
+
+# Pre-flight checks before a job is queued (ADMISSION_* env); predictions
+# are fitted on the token usage and duration of recent runs
+ADMISSION_LIMITS = AdmissionLimits.from_env()
+RUN_HISTORY = RunHistory()
+
+# Mutation testing of every generated suite (score goes into the test file header);
+# off by default because it executes mutants of the user's code in the sandbox
+MUTATION_GATE = os.getenv("MUTATION_GATE", "0") == "1"
+
+# Spans from update to LLM call (TRACING_EXPORTER: off, jsonl, otlp)
+TRACER = get_tracer()
+
+# Telegram user ids allowed to use admin commands (comma-separated)
+ADMIN_USER_IDS = {int(i) for i in os.getenv("ADMIN_USER_IDS", "").split(",") if i.strip()}
+
+# Admins whose next job runs under the sampling profiler (/profile)
+PROFILE_NEXT_JOB: set[int] = set()
+
+
+def get_worker_pool() -> WorkerPool:
+    """Start the crew worker processes on first use (one per job slot)."""
+    global WORKER_POOL
+    if WORKER_POOL is None:
+        WORKER_POOL = WorkerPool(MAX_CONCURRENT_JOBS, WorkerLimits.from_env(), preload=WORKER_PRELOAD)
+        atexit.register(WORKER_POOL.shutdown)
+    return WORKER_POOL
+
+
+def traced_handler(name: str):
+    """Run an update handler inside a root span tagged with the user and update."""
+    def decorator(handler):
+        @functools.wraps(handler)
+        async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+            message = update.message
+            with TRACER.span(
+                name,
+                user_id=update.effective_user.id if update.effective_user else None,
+                update_id=update.update_id,
+                text_bytes=len((message.text or "").encode("utf-8")) if message else None
+            ):
+                return await handler(update, context)
+        return wrapper
+    return decorator
+
 
 def get_welcome_message() -> str:
     """Return welcome message in bot's character."""
@@ -66,6 +168,9 @@ I'm Andry, your testing assistant. Send me Python code and I'll generate compreh
 /help - Detailed help and examples
 /status - Check bot and API status
 /test - Start test generation mode
+/cancel - Stop your running generation
+/revalidate - Validate your last tests again
+/moretests - Improve your last tests (e.g. `/moretests more edge cases`)
 
 *Quick Start:*
 Just send me any Python code and I'll analyze it and generate tests!
@@ -108,6 +213,9 @@ Send a .py file and I'll generate tests for it.
 *Rate Limits:*
 - 5 requests per minute
 - Complex code may take 1-2 minutes
+- Sent the wrong code? Use /cancel to stop the run
+- Want better tests? `/moretests <what to add>` rewrites your last tests
+  without analyzing the code again
 
 Need help? Contact @TimmyZinin
 """
@@ -175,6 +283,33 @@ async def status_command(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     else:
         status_parts.append("LLM Provider: Not configured")
 
+    # Job queue
+    queue = JOB_SCHEDULER.stats()
+    status_parts.append(
+        f"Jobs: {queue['running']}/{queue['slots']} running, {queue['queued']} queued"
+    )
+
+    # Test cache efficiency
+    if TEST_CACHE is not None:
+        stats = TEST_CACHE.stats()
+        lookups = stats["hits"] + stats["misses"]
+        status_parts.append(
+            f"Test cache: {stats['hits']}/{lookups} hits "
+            f"({stats['hit_rate']:.0%}), ~{stats['tokens_saved']} tokens saved"
+        )
+
+    if WORKER_POOL is not None:
+        workers = WORKER_POOL.stats()
+        rss = ", ".join(f"{mb:g}" for mb in workers["rss_mb"].values()) or "-"
+        status_parts.append(
+            f"Workers: {workers['workers']}, {workers['jobs']} jobs, "
+            f"{workers['recycled']} recycled, RSS MB: {rss}"
+        )
+
+    flights = SINGLE_FLIGHT.stats()
+    if flights["shared"]:
+        status_parts.append(f"Duplicate jobs served by a shared run: {flights['shared']}")
+
     # Bot status
     status_parts.append(f"\nBot: Online")
     status_parts.append(f"Name: {BOT_NAME}")
@@ -184,6 +319,8 @@ async def status_command(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     if user_id in RATE_LIMIT:
         requests_used = len(RATE_LIMIT[user_id]["requests"])
         status_parts.append(f"\nYour requests this minute: {requests_used}/{MAX_REQUESTS_PER_MINUTE}")
+    for ticket in JOB_SCHEDULER.tickets(user_id):
+        status_parts.append(format_queue_status(*JOB_SCHEDULER.position(ticket)))
 
     await update.message.reply_text(
         "\n".join(status_parts),
@@ -229,6 +366,156 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         await query.edit_message_text("Cancelled. Send /test when you're ready!")
 
 
+async def cancel_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Handle /cancel command - stop the user's running jobs."""
+    user_id = update.effective_user.id
+    tokens = ACTIVE_JOBS.get(user_id, [])
+
+    if not tokens:
+        await update.message.reply_text("You have no running test generation.")
+        return
+
+    for token in tokens:
+        token.cancel("cancelled by user")
+
+    await update.message.reply_text(
+        "Cancelling... The run will stop after the current step."
+    )
+
+
+async def profile_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Handle /profile command - profile the admin's next generation."""
+    user_id = update.effective_user.id
+    if user_id not in ADMIN_USER_IDS:
+        await update.message.reply_text("This command is only available to bot admins.")
+        return
+
+    PROFILE_NEXT_JOB.add(user_id)
+    await update.message.reply_text(
+        "Your next generation will be profiled: you'll get per-stage CPU vs "
+        "wall-clock times, the top functions and a flame graph file."
+    )
+
+
+async def send_profile(status_message, profile: Profile) -> None:
+    """Send a profile summary and its folded stacks next to the job's status message."""
+    message = getattr(status_message, "message", status_message)
+    try:
+        await message.reply_text(f"```\n{profile.summary(top_n=15)[:3900]}\n```", parse_mode="Markdown")
+        await message.reply_document(
+            document=profile.folded().encode("utf-8"),
+            filename="profile.folded",
+            caption="Folded stacks: flamegraph.pl, inferno or speedscope.app"
+        )
+    except Exception as e:
+        logger.error(f"Error sending profile: {e}")
+
+
+def start_job(user_id: int) -> CancelToken:
+    """Register a new job for the user and return its cancel token."""
+    token = CancelToken(timeout=JOB_TIMEOUT_SECONDS)
+    ACTIVE_JOBS.setdefault(user_id, []).append(token)
+    return token
+
+
+def finish_job(user_id: int, token: CancelToken) -> None:
+    """Forget a finished job."""
+    tokens = ACTIVE_JOBS.get(user_id, [])
+    if token in tokens:
+        tokens.remove(token)
+    if not tokens:
+        ACTIVE_JOBS.pop(user_id, None)
+
+
+def describe_cancellation(error: JobCancelled) -> str:
+    """Return a user-facing message for a cancelled job."""
+    if isinstance(error, DeadlineExceeded):
+        return (
+            f"Generation stopped: it exceeded the {int(JOB_TIMEOUT_SECONDS)}s limit. "
+            "Try sending a smaller piece of code."
+        )
+    return "Generation cancelled."
+
+
+def format_queue_status(position: int, eta: float) -> str:
+    """Return a user-facing line with a job's queue position and ETA."""
+    minutes = max(1, round(eta / 60))
+    if position == 0:
+        return f"Your job is running, about {minutes} min left."
+    return f"Your job is #{position} in the queue, ready in about {minutes} min."
+
+
+async def wait_for_slot(ticket: Ticket, status_message, cancel_token: Optional[CancelToken]) -> None:
+    """
+    Wait until the scheduler starts the job, keeping the status message
+    updated with its queue position and ETA.
+
+    Raises:
+        JobCancelled: If the job was cancelled while queued
+    """
+    shown = None
+    while ticket.started is None:
+        position, eta = JOB_SCHEDULER.position(ticket)
+        text = f"Queued.\n\n{format_queue_status(position, eta)}"
+        if position and text != shown:
+            await status_message.edit_text(text)
+            shown = text
+        try:
+            await asyncio.wait_for(JOB_SCHEDULER.acquire(ticket), timeout=QUEUE_STATUS_INTERVAL)
+            return
+        except asyncio.TimeoutError:
+            if cancel_token is not None:
+                cancel_token.check()
+
+
+def preflight(code: str) -> Admission:
+    """Run the admission stages; the test cache is checked by key, without building a crew."""
+    is_cached = None
+    if TEST_CACHE is not None:
+        def is_cached(code: str) -> bool:
+            return TEST_CACHE.contains(TestingCrew.cache_key(TEST_CACHE, code, SNIPPET_FILE))
+    return admit(code, ADMISSION_LIMITS, RUN_HISTORY, is_cached)
+
+
+async def admit_request(update: Update, code: str) -> Optional[Admission]:
+    """
+    Admit a request before any LLM call, replying with the reason if it
+    is rejected.
+
+    Returns:
+        Admission to run with, or None if rejected
+    """
+    # Разбор и подсчёт токенов большого файла — не в цикле событий
+    with TRACER.span("bot.admission", code_bytes=len(code.encode("utf-8"))) as span:
+        admission = await asyncio.to_thread(preflight, code)
+        span.set_attributes(
+            verdict=admission.verdict,
+            tokens=admission.tokens,
+            predicted_tokens=admission.predicted_tokens,
+            cached=admission.cached
+        )
+
+    if not admission.admitted:
+        await update.message.reply_text(f"{admission.reason}\nPlease send Python code with a function or class.")
+        return None
+    return admission
+
+
+def format_admission(admission: Admission) -> str:
+    """Return the estimate (and downgrade notice) for the status message."""
+    if admission.cached:
+        return "_Seen this code before: serving saved tests._"
+    lines = [
+        f"_Estimated: ~{admission.predicted_tokens} tokens, "
+        f"~{max(1, round(admission.predicted_seconds / 60))} min._"
+    ]
+    if admission.dropped:
+        skipped = ", ".join(f"`{name}`" for name in admission.dropped[:10])
+        more = f" and {len(admission.dropped) - 10} more" if len(admission.dropped) > 10 else ""
+        lines.append(f"\n{admission.reason}\nSkipped (send separately): {skipped}{more}")
+    return "\n".join(lines)
+
+
 def extract_code_from_message(text: str) -> str:
     """Extract Python code from message, handling markdown blocks."""
     import re
@@ -249,79 +536,224 @@ def extract_code_from_message(text: str) -> str:
     return text.strip()
 
 
-async def generate_tests(code: str, status_message) -> Optional[str]:
+async def add_mutation_score(code: str, tests: str, module_name: str, status_message) -> str:
+    """
+    Run the mutation gate and prepend its score to the tests.
+
+    Args:
+        code: Code under test
+        tests: Generated tests
+        module_name: File name the tests import the code as
+        status_message: Telegram message to update with progress
+
+    Returns:
+        Tests with a '# Mutation score: ...' header (unchanged on error)
+    """
+    await status_message.edit_text("Measuring test quality (mutation testing)...")
+    try:
+        with TRACER.span("bot.mutation_gate") as span:
+            report = await asyncio.to_thread(run_mutation_gate, code, tests, module_name)
+            span.set_attributes(score=report.score, mutants=report.evaluated)
+    except Exception as e:
+        logger.error(f"Mutation gate failed: {e}")
+        return tests
+
+    logger.info(f"{report.summary()} in {report.duration:.1f}s")
+    return f"# {report.summary()}\n{tests}"
+
+
+async def generate_tests(
+    code: str,
+    status_message,
+    cancel_token: Optional[CancelToken] = None,
+    memory_key: Optional[str] = None,
+    user_id: Optional[int] = None,
+    admission: Optional[Admission] = None,
+    rerun: Optional[str] = None,
+    feedback: Optional[str] = None
+) -> Optional[str]:
     """
     Generate tests for the given code using CrewAI.
 
+    The crew runs in a worker thread; at most MAX_CONCURRENT_JOBS
+    run at once. The rest are queued by JOB_SCHEDULER: small jobs first,
+    fair across users, with the queue position shown in status_message.
+
     Args:
         code: Python source code
         status_message: Telegram message to update with progress
+        cancel_token: Token to abort the run (/cancel or deadline)
+        memory_key: Key for crew memory notes (the code's job_key())
+        user_id: Owner of the job for fair scheduling
+        admission: Pre-flight result; cache hits skip the queue and
+            finished runs feed its predictions
+        rerun: Regenerate this stage (tests, validate) and the later ones,
+            reusing the checkpointed earlier stages
+        feedback: What to improve in the previous tests (implies rerun="tests")
 
     Returns:
-        Generated test code or None on error
+        Generated test code (with a mutation score header if MUTATION_GATE,
+        a validation header for rerun="validate") or None on error
+
+    Raises:
+        JobCancelled: If the job was cancelled or hit its deadline
     """
+    temp_file = None
+    ticket = None
+    profiler = None
     try:
-        # Create temporary file for the code
-        with tempfile.NamedTemporaryFile(
-            mode='w',
-            suffix='.py',
-            delete=False,
-            encoding='utf-8'
-        ) as f:
+        # Save the code as <tmpdir>/snippet.py
+        temp_file = os.path.join(tempfile.mkdtemp(prefix="testing_agent_"), SNIPPET_FILE)
+        with open(temp_file, 'w', encoding='utf-8') as f:
             f.write(code)
-            temp_file = f.name
 
-        await status_message.edit_text(
-            "Analyzing code structure..."
-        )
+        # A cached result costs nothing: it does not wait for a worker slot
+        if admission is None or not admission.cached:
+            ticket = JOB_SCHEDULER.submit(user_id, code, cancel_token=cancel_token)
+            with TRACER.span("bot.queue_wait", max_concurrent_jobs=MAX_CONCURRENT_JOBS,
+                             job_cost=round(ticket.cost)) as span:
+                await wait_for_slot(ticket, status_message, cancel_token)
+                span.set_attributes(waited_s=round(ticket.waited, 2))
+        result = None
+        try:
+            # Job may have been cancelled while waiting for a slot
+            if cancel_token is not None:
+                cancel_token.check()
+
+            await status_message.edit_text(
+                "Analyzing code structure..."
+            )
 
-        # Run TestingCrew
-        crew = TestingCrew()
-        result = crew.run(
-            file_path=temp_file,
-            test_type="unit",
-            test_framework="pytest",
-            language="python"
-        )
+            run_kwargs = {
+                "file_path": temp_file,
+                "test_type": "unit",
+                "test_framework": "pytest",
+                "language": "python",
+                "cancel_token": cancel_token,
+                "memory_key": memory_key,
+                "rerun": rerun,
+                "feedback": feedback
+            }
+            started = time.monotonic()
+            profile = user_id in PROFILE_NEXT_JOB
+            cached = admission is not None and admission.cached
+            if JOB_WORKERS == "process" and not profile and not cached:
+                # Recycled worker process: the bot's RSS stays flat
+                with TRACER.span("bot.worker_job") as span:
+                    result, metrics = await asyncio.to_thread(get_worker_pool().run, **run_kwargs)
+                    span.set_attributes(**{f"worker.{k}": v for k, v in metrics.to_dict().items()})
+                logger.info(f"Worker job: {metrics.to_dict()}")
+                if TEST_CACHE is not None:
+                    # Lookups happened in the worker's cache: count them for /status
+                    TEST_CACHE.add_stats(metrics.cache_hits, metrics.cache_misses, metrics.tokens_saved)
+            else:
+                # Run TestingCrew off the event loop so /cancel stays responsive;
+                # to_thread copies the context, so crew spans nest under this job
+                crew = TestingCrew(test_cache=TEST_CACHE, memory=CREW_MEMORY, checkpoints=CHECKPOINTS)
+                run = crew.run
+                if profile:
+                    # The sampler sees threads of this process only
+                    PROFILE_NEXT_JOB.discard(user_id)
+                    profiler = SamplingProfiler().start()
+                    run = functools.partial(profiler.call, crew.run, stage="startup")
+                result = await asyncio.to_thread(run, **run_kwargs)
+        finally:
+            if ticket is not None:
+                JOB_SCHEDULER.release(ticket, learn=result is not None and not result.get("cached"))
+                ticket = None
+            if profiler is not None:
+                await send_profile(status_message, profiler.stop())
+                profiler = None
+
+        if result.get("resumed"):
+            logger.info(f"Resumed from checkpoints: {', '.join(result['resumed'])}")
+        if result.get("cached"):
+            logger.info(f"Served from test cache, stats: {TEST_CACHE.stats()}")
+        else:
+            # Кэш промптов провайдера по стадиям: доля cached_prompt_tokens
+            for stage in result.get("stages") or []:
+                logger.info(
+                    f"Stage {stage['task']}: {stage['seconds']}s, {stage['prompt_tokens']} prompt tokens, "
+                    f"{stage['cached_prompt_tokens']} cached ({stage['cache_hit_rate']:.0%})"
+                )
+            if admission is not None:
+                total_tokens = (result.get("token_usage") or {}).get("total_tokens") or 0
+                RUN_HISTORY.record(admission.tokens, total_tokens, time.monotonic() - started)
 
-        # Clean up temp file
-        os.unlink(temp_file)
+        # Extract tests from result (code block of write_tests_task output)
+        tests_content = extract_tests(result)
 
-        # Extract tests from result
-        tests_content = None
+        if tests_content and rerun == "validate":
+            # Тесты те же — мутационный прогон не нужен, только новый вердикт
+            note = ValidationReport.model_validate(result.get("validation") or {}).note()
+            return f"# Validation: {note or 'no report'}\n{tests_content}"
 
-        if result.get("tasks_output") and len(result["tasks_output"]) >= 2:
-            tests_content = result["tasks_output"][1]
-        else:
-            tests_content = result.get("raw", "")
-
-        # Extract code from markdown if present
-        if tests_content:
-            import re
-            if "```python" in tests_content:
-                code_blocks = re.findall(
-                    r'```python\n(.*?)```',
-                    tests_content,
-                    re.DOTALL
-                )
-                if code_blocks:
-                    tests_content = max(code_blocks, key=len)
-            elif "```" in tests_content:
-                code_blocks = re.findall(
-                    r'```\n(.*?)```',
-                    tests_content,
-                    re.DOTALL
-                )
-                if code_blocks:
-                    tests_content = max(code_blocks, key=len)
+        if tests_content and MUTATION_GATE:
+            tests_content = await add_mutation_score(code, tests_content, Path(temp_file).name, status_message)
 
-        return tests_content.strip() if tests_content else None
+        return tests_content or None
 
+    except JobCancelled as e:
+        logger.info(f"Job cancelled ({e.reason}), partial token usage: {e.token_usage}")
+        raise
     except Exception as e:
         logger.error(f"Error generating tests: {e}")
         return None
+    finally:
+        if ticket is not None:
+            # Cancelled while queued: drop it from the queue
+            JOB_SCHEDULER.release(ticket)
+        if temp_file:
+            shutil.rmtree(os.path.dirname(temp_file), ignore_errors=True)
+
+
+class JobStatusMessage:
+    """Status message of one job; edits stop once that job is cancelled."""
+
+    def __init__(self, message, cancel_token: Optional[CancelToken]):
+        self.message = message
+        self.cancel_token = cancel_token
+
+    async def edit_text(self, text: str, **kwargs):
+        # Общий запуск продолжается для других — не затираем "Generation cancelled."
+        if self.cancel_token is not None and self.cancel_token.cancelled:
+            return None
+        return await self.message.edit_text(text, **kwargs)
+
+
+async def generate_tests_shared(
+    code: str,
+    status_message,
+    cancel_token: CancelToken,
+    user_id: int,
+    admission: Admission
+) -> Optional[str]:
+    """
+    generate_tests() coalesced with identical jobs already in flight.
 
+    Each submitter has already been charged its own rate limit; only the
+    first one runs the crew and takes a scheduler slot. The others attach
+    and receive the same tests. The shared run stops only when every
+    attached job is cancelled.
+    """
+    async def pipeline(shared_token: CancelToken) -> Optional[str]:
+        # Memory notes belong to the code, not to whoever sent it
+        return await generate_tests(
+            code, JobStatusMessage(status_message, cancel_token), shared_token,
+            job_key(code), user_id, admission
+        )
 
+    async def on_attach() -> None:
+        await status_message.edit_text(
+            "The same code is already being processed: you'll get the same tests."
+        )
+
+    key = job_key(code, test_type="unit", test_framework="pytest")
+    with TRACER.span("bot.singleflight", shared=SINGLE_FLIGHT.in_flight(key)):
+        return await SINGLE_FLIGHT.run(key, pipeline, cancel_token, on_attach)
+
+
+@traced_handler("bot.handle_code_message")
 async def handle_code_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle incoming code messages."""
     user_id = update.effective_user.id
@@ -344,26 +776,26 @@ async def handle_code_message(update: Update, context: ContextTypes.DEFAULT_TYPE
         )
         return
 
-    # Check if it looks like Python code
-    if not any(keyword in code for keyword in ['def ', 'class ', 'import ', '=', 'return']):
-        await update.message.reply_text(
-            "This doesn't look like Python code. Please send valid Python code."
-        )
+    # Pre-flight: invalid or oversized code never reaches the crew
+    admission = await admit_request(update, code)
+    if admission is None:
         return
 
     # Send processing message
     status_msg = await update.message.reply_text(
-        f"Processing your code...\n\n_This may take 1-2 minutes for complex code._",
+        f"Processing your code...\n\n{format_admission(admission)}",
         parse_mode="Markdown"
     )
 
+    cancel_token = start_job(user_id)
     try:
         # Generate tests
-        tests = await generate_tests(code, status_msg)
+        tests = await generate_tests_shared(admission.code, status_msg, cancel_token, user_id, admission)
 
         if tests:
             # Clear user state
             USER_STATES.pop(user_id, None)
+            LAST_CODE[user_id] = admission.code
 
             # Send tests
             await status_msg.edit_text(
@@ -382,29 +814,36 @@ async def handle_code_message(update: Update, context: ContextTypes.DEFAULT_TYPE
                     f.write(tests)
                     temp_file = f.name
 
-                await update.message.reply_document(
-                    document=open(temp_file, 'rb'),
-                    filename="generated_tests.py",
-                    caption="Here are your generated tests!"
-                )
+                with TRACER.span("telegram.send_document", bytes=os.path.getsize(temp_file)):
+                    await update.message.reply_document(
+                        document=open(temp_file, 'rb'),
+                        filename="generated_tests.py",
+                        caption="Here are your generated tests!"
+                    )
                 os.unlink(temp_file)
             else:
-                await update.message.reply_text(
-                    f"```python\n{tests}\n```",
-                    parse_mode="Markdown"
-                )
+                with TRACER.span("telegram.send_message", bytes=len(tests.encode("utf-8"))):
+                    await update.message.reply_text(
+                        f"```python\n{tests}\n```",
+                        parse_mode="Markdown"
+                    )
         else:
             await status_msg.edit_text(
                 "Sorry, I couldn't generate tests. Please check your code and try again."
             )
 
+    except JobCancelled as e:
+        await status_msg.edit_text(describe_cancellation(e))
     except Exception as e:
         logger.error(f"Error in handle_code_message: {e}")
         await status_msg.edit_text(
             f"An error occurred: {str(e)[:200]}"
         )
+    finally:
+        finish_job(user_id, cancel_token)
 
 
+@traced_handler("bot.handle_document")
 async def handle_document(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle uploaded Python files."""
     user_id = update.effective_user.id
@@ -425,34 +864,56 @@ async def handle_document(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         )
         return
 
+    # Oversized uploads are rejected before downloading
+    if document.file_size and document.file_size > ADMISSION_LIMITS.max_bytes:
+        await update.message.reply_text(
+            f"The file is too large ({document.file_size // 1000} KB, "
+            f"limit {ADMISSION_LIMITS.max_bytes // 1000} KB)."
+        )
+        return
+
     # Download file
-    file = await context.bot.get_file(document.file_id)
+    with TRACER.span("telegram.download_file", bytes=document.file_size):
+        file = await context.bot.get_file(document.file_id)
 
-    with tempfile.NamedTemporaryFile(
-        mode='wb',
-        suffix='.py',
-        delete=False
-    ) as f:
-        await file.download_to_drive(f.name)
-        temp_path = f.name
+        with tempfile.NamedTemporaryFile(
+            mode='wb',
+            suffix='.py',
+            delete=False
+        ) as f:
+            await file.download_to_drive(f.name)
+            temp_path = f.name
 
     # Read code
-    with open(temp_path, 'r', encoding='utf-8') as f:
-        code = f.read()
-
-    os.unlink(temp_path)
+    try:
+        with open(temp_path, 'r', encoding='utf-8') as f:
+            code = f.read()
+    except UnicodeDecodeError:
+        code = None
+    finally:
+        os.unlink(temp_path)
+
+    if code is None:
+        await update.message.reply_text("The file is not UTF-8 text.")
+        return
 
     # Process like code message
+    admission = await admit_request(update, code)
+    if admission is None:
+        return
+
     status_msg = await update.message.reply_text(
-        f"Processing {document.file_name}...\n\n_This may take 1-2 minutes for complex code._",
+        f"Processing {document.file_name}...\n\n{format_admission(admission)}",
         parse_mode="Markdown"
     )
 
+    cancel_token = start_job(user_id)
     try:
-        tests = await generate_tests(code, status_msg)
+        tests = await generate_tests_shared(admission.code, status_msg, cancel_token, user_id, admission)
 
         if tests:
             USER_STATES.pop(user_id, None)
+            LAST_CODE[user_id] = admission.code
 
             await status_msg.edit_text("Tests generated successfully!")
 
@@ -467,22 +928,82 @@ async def handle_document(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
                 f.write(tests)
                 temp_file = f.name
 
-            await update.message.reply_document(
-                document=open(temp_file, 'rb'),
-                filename=test_filename,
-                caption=f"Tests for {document.file_name}"
-            )
+            with TRACER.span("telegram.send_document", bytes=os.path.getsize(temp_file)):
+                await update.message.reply_document(
+                    document=open(temp_file, 'rb'),
+                    filename=test_filename,
+                    caption=f"Tests for {document.file_name}"
+                )
             os.unlink(temp_file)
         else:
             await status_msg.edit_text(
                 "Sorry, I couldn't generate tests. Please check your code and try again."
             )
 
+    except JobCancelled as e:
+        await status_msg.edit_text(describe_cancellation(e))
     except Exception as e:
         logger.error(f"Error in handle_document: {e}")
         await status_msg.edit_text(
             f"An error occurred: {str(e)[:200]}"
         )
+    finally:
+        finish_job(user_id, cancel_token)
+
+
+async def rerun_stage(update: Update, rerun: str, feedback: Optional[str] = None) -> None:
+    """Regenerate one stage for the user's last code, reusing the checkpointed analysis."""
+    user_id = update.effective_user.id
+    code = LAST_CODE.get(user_id)
+    if code is None:
+        await update.message.reply_text("Send me some code first - then I can redo a stage for it.")
+        return
+
+    allowed, wait_time = check_rate_limit(user_id)
+    if not allowed:
+        await update.message.reply_text(f"Rate limit reached. Please wait {wait_time} seconds.")
+        return
+
+    action = "Validating your last tests again" if rerun == "validate" else f"Improving your last tests: {feedback}"
+    status_msg = await update.message.reply_text(f"{action}...")
+
+    cancel_token = start_job(user_id)
+    try:
+        tests = await generate_tests(
+            code, status_msg, cancel_token, job_key(code), user_id,
+            rerun=rerun, feedback=feedback
+        )
+        if not tests:
+            await status_msg.edit_text("Sorry, I couldn't redo this step. Please try again.")
+            return
+
+        await status_msg.edit_text("Done!")
+        with TRACER.span("telegram.send_document", bytes=len(tests.encode("utf-8"))):
+            await update.message.reply_document(
+                document=tests.encode("utf-8"),
+                filename="generated_tests.py",
+                caption="Validated tests" if rerun == "validate" else "Improved tests"
+            )
+    except JobCancelled as e:
+        await status_msg.edit_text(describe_cancellation(e))
+    except Exception as e:
+        logger.error(f"Error in rerun_stage: {e}")
+        await status_msg.edit_text(f"An error occurred: {str(e)[:200]}")
+    finally:
+        finish_job(user_id, cancel_token)
+
+
+@traced_handler("bot.revalidate_command")
+async def revalidate_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Handle /revalidate command - run only the validator on the last tests."""
+    await rerun_stage(update, "validate")
+
+
+@traced_handler("bot.moretests_command")
+async def moretests_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Handle /moretests [request] command - rewrite the last tests, skipping the analysis."""
+    feedback = " ".join(context.args or []) or "Add more edge cases and error-handling tests"
+    await rerun_stage(update, "tests", feedback)
 
 
 def main() -> None:
@@ -504,14 +1025,23 @@ def main() -> None:
         print("Warning: No LLM API key found")
         print("Set one of: OPENROUTER_API_KEY, GROQ_API_KEY, OPENAI_API_KEY")
 
+    # The crew workers and the sandbox (mutation gate) fork from one forkserver:
+    # both preload lists are added before either pool starts it
+    add_preload([*WORKER_PRELOAD, *preload_modules()])
+
     # Create application
-    application = Application.builder().token(token).build()
+    # concurrent_updates: /cancel must be handled while a job is running
+    application = Application.builder().token(token).concurrent_updates(True).build()
 
     # Add handlers
     application.add_handler(CommandHandler("start", start_command))
     application.add_handler(CommandHandler("help", help_command))
     application.add_handler(CommandHandler("status", status_command))
     application.add_handler(CommandHandler("test", test_command))
+    application.add_handler(CommandHandler("cancel", cancel_command))
+    application.add_handler(CommandHandler("profile", profile_command))
+    application.add_handler(CommandHandler("revalidate", revalidate_command))
+    application.add_handler(CommandHandler("moretests", moretests_command))
     application.add_handler(CallbackQueryHandler(button_callback))
     application.add_handler(
         MessageHandler(filters.Document.ALL, handle_document)
@@ -0,0 +1,300 @@
+"""
+Pre-flight admission of generation requests
+
+Runs before any LLM call and before a job takes a worker slot. Each
+stage is cheaper than the next, and the first failure rejects:
+
+1. size: bytes over the hard limit are rejected without parsing
+2. syntax: the code must parse with ast (line and message on failure)
+3. content: there must be a function or class to test
+4. tokens/complexity: over ADMISSION_MAX_TOKENS or ADMISSION_MAX_NODES the
+   request is downgraded to the top-level functions/classes that fit
+   (their dependencies included), or rejected if nothing fits
+5. cache: a cached result is marked so it is served without a slot
+
+Admitted requests carry a token and latency prediction fitted on recent
+runs (RunHistory).
+
+Tokens are counted with tiktoken when its encoding is available locally,
+otherwise with a tokenizer-based estimate (no network either way).
+
+Configuration (environment):
+    ADMISSION_MAX_BYTES   Hard size limit (default 200000)
+    ADMISSION_MAX_TOKENS  Prompt token budget for the code (default 12000)
+    ADMISSION_MAX_NODES   AST node budget (default 15000)
+    ADMISSION_DOWNGRADE   0 = reject instead of trimming to a subset (default 1)
+"""
+
+import ast
+import io
+import logging
+import math
+import os
+import threading
+import tokenize
+from collections import deque
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Callable, Optional
+
+try:
+    from .units import module_subset, split_units
+except ImportError:
+    from units import module_subset, split_units
+
+logger = logging.getLogger(__name__)
+
+ACCEPT = "accept"
+DOWNGRADE = "downgrade"
+REJECT = "reject"
+
+
+# ==================== TOKENS ====================
+
+@lru_cache(maxsize=1)
+def _encoding():
+    """tiktoken encoding, or None if tiktoken or its BPE file is unavailable"""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(os.getenv("TOKENIZER_ENCODING", "cl100k_base"))
+    except Exception as e:  # Нет пакета или файла словаря (офлайн)
+        logger.info(f"tiktoken unavailable, estimating tokens: {e}")
+        return None
+
+
+def _estimate_tokens(code: str) -> int:
+    """Approximate BPE tokens from Python's own tokenizer"""
+    try:
+        count = 0
+        for tok in tokenize.generate_tokens(io.StringIO(code).readline):
+            if tok.type in (tokenize.ENDMARKER, tokenize.DEDENT):
+                continue
+            # Длинные имена и строки BPE режет примерно по 4 символа
+            count += max(1, math.ceil(len(tok.string) / 4))
+        return count
+    except (tokenize.TokenError, SyntaxError, IndentationError):
+        return math.ceil(len(code) / 4)
+
+
+def count_tokens(text: str) -> int:
+    """Prompt tokens of text (tiktoken if available, else an estimate)"""
+    encoding = _encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return _estimate_tokens(text)
+
+
+# ==================== HISTORY ====================
+
+class RunHistory:
+    """
+    Recent runs, used to predict a request's total tokens and latency.
+
+    Both are fitted as a + b * input_tokens (least squares over the last
+    window runs); until there is enough spread in the data the priors
+    are used, shifted to match the observed mean.
+
+    Args:
+        window: Runs kept for the fit
+        prior_tokens: (a, b) for total tokens before any history
+        prior_seconds: (a, b) for run seconds before any history
+    """
+
+    MIN_RUNS = 5
+
+    def __init__(
+        self,
+        window: int = 200,
+        prior_tokens: tuple = (6000.0, 4.0),
+        prior_seconds: tuple = (40.0, 0.02)
+    ):
+        self._runs: deque = deque(maxlen=window)
+        self.prior_tokens = prior_tokens
+        self.prior_seconds = prior_seconds
+        self._lock = threading.Lock()
+
+    def record(self, input_tokens: int, total_tokens: int, seconds: float) -> None:
+        """Add a finished (non-cached) run"""
+        with self._lock:
+            self._runs.append((input_tokens, total_tokens, seconds))
+
+    def __len__(self) -> int:
+        return len(self._runs)
+
+    @staticmethod
+    def _fit(xs: list, ys: list, prior: tuple) -> tuple:
+        a, b = prior
+        if not xs:
+            return a, b
+        mean_x, mean_y = sum(xs) / len(xs), sum(ys) / len(ys)
+        var_x = sum((x - mean_x) ** 2 for x in xs)
+        if len(xs) >= RunHistory.MIN_RUNS and var_x > 0:
+            slope = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys, strict=True)) / var_x
+            if slope >= 0:
+                return mean_y - slope * mean_x, slope
+        # Мало данных — наклон из приора, уровень по наблюдениям
+        return max(mean_y - b * mean_x, 0.0), b
+
+    def predict(self, input_tokens: int) -> tuple[int, float]:
+        """
+        Expected (total tokens, seconds) of a run on input_tokens of code.
+        """
+        with self._lock:
+            runs = list(self._runs)
+        xs = [r[0] for r in runs]
+        a, b = self._fit(xs, [r[1] for r in runs], self.prior_tokens)
+        sa, sb = self._fit(xs, [r[2] for r in runs], self.prior_seconds)
+        return round(a + b * input_tokens), round(sa + sb * input_tokens, 1)
+
+
+# ==================== ADMISSION ====================
+
+@dataclass
+class AdmissionLimits:
+    """Thresholds of the admission stages"""
+
+    max_bytes: int = 200_000
+    max_tokens: int = 12_000
+    max_nodes: int = 15_000
+    downgrade: bool = True
+
+    @classmethod
+    def from_env(cls) -> "AdmissionLimits":
+        """Limits from ADMISSION_* variables"""
+        return cls(
+            max_bytes=int(os.getenv("ADMISSION_MAX_BYTES", "200000")),
+            max_tokens=int(os.getenv("ADMISSION_MAX_TOKENS", "12000")),
+            max_nodes=int(os.getenv("ADMISSION_MAX_NODES", "15000")),
+            downgrade=os.getenv("ADMISSION_DOWNGRADE", "1") == "1"
+        )
+
+
+@dataclass
+class Admission:
+    """Outcome of admit()"""
+
+    verdict: str  # ACCEPT | DOWNGRADE | REJECT
+    reason: str = ""
+    code: str = ""  # Код для запуска (при DOWNGRADE — подмножество)
+    tokens: int = 0
+    nodes: int = 0
+    units: list[str] = field(default_factory=list)    # Юниты, которые будут протестированы
+    dropped: list[str] = field(default_factory=list)  # Отброшенные при DOWNGRADE
+    predicted_tokens: int = 0
+    predicted_seconds: float = 0.0
+    cached: bool = False
+
+    @property
+    def admitted(self) -> bool:
+        return self.verdict != REJECT
+
+
+def _node_count(node: ast.AST) -> int:
+    return sum(1 for _ in ast.walk(node))
+
+
+def _fit_units(code: str, units: list, limits: AdmissionLimits) -> tuple[str, list[str]]:
+    """
+    Largest prefix-greedy set of units (in source order) whose subset
+    module stays within the token and node budgets.
+    """
+    base = module_subset(code, set())
+    used_tokens, used_nodes = count_tokens(base), _node_count(ast.parse(base))
+    by_name = {u.name: u for u in units}
+    sizes = {u.name: (count_tokens(u.source), _node_count(ast.parse(u.source))) for u in units}
+
+    kept: set[str] = set()
+    for unit in units:
+        # Юнит тянет за собой зависимости-определения, которых ещё нет
+        needed = {unit.name} | {d for d in unit.dependencies if d in by_name}
+        extra = needed - kept
+        tokens = sum(sizes[n][0] for n in extra)
+        nodes = sum(sizes[n][1] for n in extra)
+        if used_tokens + tokens <= limits.max_tokens and used_nodes + nodes <= limits.max_nodes:
+            kept |= extra
+            used_tokens += tokens
+            used_nodes += nodes
+
+    names = [u.name for u in units if u.name in kept]
+    return (module_subset(code, kept) if kept else ""), names
+
+
+def admit(
+    code: str,
+    limits: Optional[AdmissionLimits] = None,
+    history: Optional[RunHistory] = None,
+    is_cached: Optional[Callable[[str], bool]] = None
+) -> Admission:
+    """
+    Decide whether (and on which code) a generation run should happen.
+
+    Args:
+        code: Submitted Python source
+        limits: Stage thresholds (default: from env)
+        history: Past runs for the prediction (default: priors only)
+        is_cached: Returns True if a result for the code is cached
+
+    Returns:
+        Admission; verdict REJECT carries a user-facing reason
+    """
+    limits = limits or AdmissionLimits.from_env()
+    history = history or RunHistory()
+
+    if not code.strip():
+        return Admission(REJECT, "The message contains no code.")
+
+    size = len(code.encode("utf-8"))
+    if size > limits.max_bytes:
+        return Admission(
+            REJECT, f"The code is too large ({size // 1000} KB, limit {limits.max_bytes // 1000} KB)."
+        )
+
+    try:
+        tree = ast.parse(code)
+    except SyntaxError as e:
+        return Admission(REJECT, f"This is not valid Python: {e.msg} (line {e.lineno}).")
+
+    units = split_units(code)
+    if not units:
+        return Admission(REJECT, "There is no function or class to test.")
+
+    nodes = _node_count(tree)
+    tokens = count_tokens(code)
+    verdict, reason, dropped = ACCEPT, "", []
+    names = [u.name for u in units]
+
+    if tokens > limits.max_tokens or nodes > limits.max_nodes:
+        over = f"{tokens} tokens / {nodes} AST nodes, limit {limits.max_tokens} / {limits.max_nodes}"
+        if not limits.downgrade:
+            return Admission(REJECT, f"The code is too large to test in one run ({over}).",
+                             tokens=tokens, nodes=nodes)
+        subset, kept = _fit_units(code, units, limits)
+        if not kept:
+            return Admission(REJECT, f"Even a single function does not fit the budget ({over}).",
+                             tokens=tokens, nodes=nodes)
+        dropped = [name for name in names if name not in kept]
+        code, names = subset, kept
+        verdict = DOWNGRADE
+        reason = f"The code is large ({over}): testing {len(kept)} of {len(units)} functions/classes."
+        tokens, nodes = count_tokens(code), _node_count(ast.parse(code))
+
+    predicted_tokens, predicted_seconds = history.predict(tokens)
+    cached = bool(is_cached and is_cached(code))
+    return Admission(
+        verdict, reason, code=code, tokens=tokens, nodes=nodes, units=names, dropped=dropped,
+        predicted_tokens=0 if cached else predicted_tokens,
+        predicted_seconds=0.0 if cached else predicted_seconds,
+        cached=cached
+    )
+
+
+__all__ = [
+    "ACCEPT",
+    "DOWNGRADE",
+    "REJECT",
+    "Admission",
+    "AdmissionLimits",
+    "RunHistory",
+    "admit",
+    "count_tokens",
+]
@@ -0,0 +1,246 @@
+"""
+Local cache of generated tests
+
+Entries are keyed by the source fingerprint plus everything else that
+shapes the output (test type, framework, prompt config version), so a
+near-duplicate submission is served without a crew run.
+
+UnitTestCache stores tests per function/class instead, keyed by the
+unit's source and its direct dependencies.
+
+Configuration (environment, UNIT_CACHE_* for the per-unit cache):
+    TEST_CACHE_DIR                Cache directory; caching is off if unset
+    TEST_CACHE_MAX_ENTRIES        Max entries before LRU eviction (default 1000)
+    TEST_CACHE_TTL_SECONDS        Entry lifetime, 0 = forever (default 0)
+    TEST_CACHE_IGNORE_DOCSTRINGS  1 = docstring edits do not miss the cache
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+try:
+    from .fingerprint import fingerprint
+    from .units import CodeUnit, unit_fingerprint
+except ImportError:
+    from fingerprint import fingerprint
+    from units import CodeUnit, unit_fingerprint
+
+
+def _total_tokens(token_usage) -> int:
+    """Extract total_tokens from a usage dict/object (0 if unknown)"""
+    if token_usage is None:
+        return 0
+    if isinstance(token_usage, dict):
+        return int(token_usage.get("total_tokens") or 0)
+    return int(getattr(token_usage, "total_tokens", 0) or 0)
+
+
+class TestCache:
+    """
+    File-backed cache of crew results keyed by source fingerprint.
+
+    Each entry is a JSON file; lookups refresh the entry's mtime, and the
+    least recently used entries are evicted above max_entries.
+    Hit/miss counters and the tokens saved by hits are kept per instance.
+    """
+
+    # Не тестовый класс, несмотря на имя
+    __test__ = False
+
+    # Префикс переменных окружения для from_env()
+    env_prefix = "TEST_CACHE"
+
+    def __init__(
+        self,
+        cache_dir: str,
+        max_entries: int = 1000,
+        ttl_seconds: float = 0,
+        strip_docstrings: bool = False
+    ):
+        self.cache_dir = Path(cache_dir)
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.strip_docstrings = strip_docstrings
+
+        self.hits = 0
+        self.misses = 0
+        self.tokens_saved = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> Optional["TestCache"]:
+        """Build the cache from <env_prefix>_* variables (None if disabled)"""
+        prefix = cls.env_prefix
+        cache_dir = os.getenv(f"{prefix}_DIR")
+        if not cache_dir:
+            return None
+        return cls(
+            cache_dir=cache_dir,
+            max_entries=int(os.getenv(f"{prefix}_MAX_ENTRIES", "1000")),
+            ttl_seconds=float(os.getenv(f"{prefix}_TTL_SECONDS", "0")),
+            strip_docstrings=os.getenv(f"{prefix}_IGNORE_DOCSTRINGS", "0") == "1"
+        )
+
+    # ==================== KEYS ====================
+
+    def key_for(self, code_content: str, language: str = "python", **options) -> str:
+        """
+        Build the cache key for a submission.
+
+        Args:
+            code_content: Source code
+            language: Programming language
+            **options: Other run parameters that change the output
+                (test_type, test_framework, config_version, ...)
+
+        Returns:
+            Hex cache key
+        """
+        parts = [fingerprint(code_content, language, self.strip_docstrings), language]
+        parts += [f"{name}={options[name]}" for name in sorted(options)]
+        return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    # ==================== LOOKUP ====================
+
+    def _load(self, path: Path) -> Optional[dict]:
+        """Read an entry file (None if missing, corrupt or expired)"""
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if self.ttl_seconds and time.time() - entry.get("created_at", 0) > self.ttl_seconds:
+            return None
+        return entry
+
+    def contains(self, key: str) -> bool:
+        """True if get(key) would hit; counters and LRU order are not touched"""
+        return self._load(self._path(key)) is not None
+
+    def get(self, key: str) -> Optional[dict]:
+        """Return the cached result for key, or None on a miss"""
+        path = self._path(key)
+        entry = self._load(path)
+
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.tokens_saved += _total_tokens(entry["result"].get("token_usage"))
+
+        try:
+            os.utime(path)  # LRU: отмечаем использование
+        except OSError:
+            pass
+        return entry["result"]
+
+    def put(self, key: str, result: dict) -> None:
+        """Store a crew result (must be JSON-serializable)"""
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        entry = {"created_at": time.time(), "result": result}
+
+        # Атомарная запись: читатели не видят полузаписанный файл
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+        self._evict()
+
+    def _evict(self) -> None:
+        """Drop least recently used entries above max_entries"""
+        if not self.max_entries:
+            return
+        entries = list(self.cache_dir.glob("*/*.json"))
+        if len(entries) <= self.max_entries:
+            return
+
+        def mtime(path: Path) -> float:
+            try:
+                return path.stat().st_mtime
+            except OSError:
+                return 0.0
+
+        entries.sort(key=mtime)
+        for path in entries[:len(entries) - self.max_entries]:
+            try:
+                path.unlink()
+            except OSError:
+                pass
+
+    # ==================== STATS ====================
+
+    @property
+    def hit_rate(self) -> float:
+        """Share of lookups served from the cache (0.0 - 1.0)"""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def add_stats(self, hits: int = 0, misses: int = 0, tokens_saved: int = 0) -> None:
+        """Count lookups made by another instance on the same directory (a worker process)"""
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+            self.tokens_saved += tokens_saved
+
+    def stats(self) -> dict:
+        """Counters for reporting: hits, misses, hit_rate, tokens_saved"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hit_rate, 4),
+                "tokens_saved": self.tokens_saved
+            }
+
+
+class UnitTestCache(TestCache):
+    """
+    Cache of generated tests per function/class.
+
+    Entries hold the test blocks and imports for one unit; the key covers
+    the unit's normalized source, its direct dependencies and the run
+    options (prompt config version and module name included: the stored
+    imports name the module).
+    """
+
+    __test__ = False
+
+    env_prefix = "UNIT_CACHE"
+
+    def unit_key(self, unit: CodeUnit, deps: dict[str, str], **options) -> str:
+        """
+        Build the cache key for a unit.
+
+        Args:
+            unit: Code unit
+            deps: Name → source of the module's top-level statements
+            **options: Run parameters that change the output (module, ...)
+
+        Returns:
+            Hex cache key
+        """
+        parts = [unit.kind, unit.name, unit_fingerprint(unit, deps)]
+        parts += [f"{name}={options[name]}" for name in sorted(options)]
+        return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()
+
+
+__all__ = ["TestCache", "UnitTestCache"]
@@ -0,0 +1,151 @@
+"""
+Cooperative cancellation and deadlines for crew runs
+
+A CancelToken is checked between crew steps, between tasks and before
+every LLM call. Once cancelled (explicitly or by its deadline) the run
+aborts with JobCancelled at the next checkpoint.
+"""
+
+import contextvars
+import threading
+import time
+from typing import Any, Optional
+
+
+class JobCancelled(Exception):
+    """Raised when a run is cancelled before it completes"""
+
+    def __init__(self, reason: str = "cancelled", token_usage: Optional[dict] = None):
+        super().__init__(reason)
+        self.reason = reason
+        # Частичное использование токенов на момент отмены
+        self.token_usage = token_usage
+
+
+class DeadlineExceeded(JobCancelled):
+    """Raised when a run exceeds its deadline"""
+
+
+class CancelToken:
+    """
+    Cancellation flag with an optional deadline.
+
+    Args:
+        timeout: Seconds from now until the deadline (None = no deadline)
+        event: Event-like object used as the flag (threading.Event by default)
+    """
+
+    def __init__(self, timeout: Optional[float] = None, event: Any = None):
+        self._event = event if event is not None else threading.Event()
+        self._reason = "cancelled"
+        self.deadline = time.monotonic() + timeout if timeout is not None else None
+
+    def cancel(self, reason: str = "cancelled") -> None:
+        """Request cancellation; the run stops at its next checkpoint"""
+        self._reason = reason
+        self._event.set()
+
+    @property
+    def expired(self) -> bool:
+        """True if the deadline has passed"""
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    @property
+    def cancelled(self) -> bool:
+        """True if cancel() was called or the deadline has passed"""
+        return self._event.is_set() or self.expired
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left until the deadline, or None if there is no deadline"""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def check(self) -> None:
+        """
+        Raise if the run should stop.
+
+        Raises:
+            JobCancelled: If cancel() was called
+            DeadlineExceeded: If the deadline has passed
+        """
+        if self._event.is_set():
+            raise JobCancelled(self._reason)
+        if self.expired:
+            raise DeadlineExceeded("deadline exceeded")
+
+
+# Токен текущего запуска (для хуков, которые не получают его явно)
+_current_token: contextvars.ContextVar[Optional[CancelToken]] = contextvars.ContextVar(
+    "testing_agent_cancel_token", default=None
+)
+
+
+def current_token() -> Optional[CancelToken]:
+    """Return the token of the run executing in this context, if any"""
+    return _current_token.get()
+
+
+def set_current_token(token: Optional[CancelToken]) -> contextvars.Token:
+    """Bind a token to the current context; returns a handle for reset_current_token()"""
+    return _current_token.set(token)
+
+
+def reset_current_token(handle: contextvars.Token) -> None:
+    """Restore the token bound before set_current_token()"""
+    _current_token.reset(handle)
+
+
+def check_current_token(*_args: Any) -> None:
+    """Step/task callback: raise if the run executing in this context is cancelled"""
+    token = current_token()
+    if token is not None:
+        token.check()
+
+
+_llm_hook_installed = False
+_llm_hook_lock = threading.Lock()
+
+
+def _block_cancelled_llm_call(context: Any) -> Optional[bool]:
+    """before_llm_call hook: block the call if the current run is cancelled"""
+    token = current_token()
+    if token is not None and token.cancelled:
+        return False
+    return None
+
+
+def install_llm_call_guard() -> bool:
+    """
+    Register a global before-LLM-call hook that blocks calls of cancelled runs.
+
+    LLM call hooks exist only in newer CrewAI releases; on older ones this is
+    a no-op and cancellation relies on step/task callbacks alone.
+
+    Returns:
+        True if the hook is installed
+    """
+    global _llm_hook_installed
+
+    with _llm_hook_lock:
+        if _llm_hook_installed:
+            return True
+        try:
+            from crewai.hooks import register_before_llm_call_hook
+        except ImportError:
+            return False
+        register_before_llm_call_hook(_block_cancelled_llm_call)
+        _llm_hook_installed = True
+        return True
+
+
+__all__ = [
+    "CancelToken",
+    "JobCancelled",
+    "DeadlineExceeded",
+    "current_token",
+    "set_current_token",
+    "reset_current_token",
+    "check_current_token",
+    "install_llm_call_guard",
+]
@@ -0,0 +1,111 @@
+"""
+Stage checkpoints for crew runs
+
+A crew run is three stages: analyze, write tests, validate. When the
+validator times out or the provider fails after the first two are done,
+a plain retry pays for all three again. Every finished stage is
+therefore saved here as soon as it completes, keyed by the run's content
+key: the same key as the test cache (code fingerprint, test type,
+framework, prompt config version, dependency context). A retried or
+resumed run restores the completed stages and only runs the rest.
+
+The checkpoints stay after a successful run, marked complete, so a
+single stage can be regenerated later against the same analysis:
+"re-validate" reruns only the validator on the checkpointed tests, "more
+edge cases" reruns the test writer (and then the validator) with the
+previous tests and the request in the prompt. A plain repeat of a
+completed run is not resumed: it runs every stage again.
+
+Configuration (environment):
+    CHECKPOINT_DIR          Checkpoint directory, "off" disables
+                            (default .testing_agent/checkpoints)
+    CHECKPOINT_MAX_ENTRIES  Max runs kept before LRU eviction (default 500)
+    CHECKPOINT_TTL_SECONDS  Checkpoint lifetime, 0 = forever (default 86400)
+"""
+
+import os
+import threading
+from typing import Optional
+
+try:
+    from .cache import TestCache
+except ImportError:
+    from cache import TestCache
+
+DEFAULT_CHECKPOINT_DIR = ".testing_agent/checkpoints"
+
+
+class CheckpointStore(TestCache):
+    """
+    File-backed store of finished stages, one entry per run key.
+
+    An entry holds the stages (task name → {"raw", "json_dict"} of that
+    task's output) and whether the run completed. Keys are built by
+    key_for() exactly like TestCache keys.
+    """
+
+    __test__ = False
+
+    env_prefix = "CHECKPOINT"
+
+    def __init__(
+        self,
+        cache_dir: str = DEFAULT_CHECKPOINT_DIR,
+        max_entries: int = 500,
+        ttl_seconds: float = 86400,
+        strip_docstrings: bool = False
+    ):
+        super().__init__(cache_dir, max_entries, ttl_seconds, strip_docstrings)
+        # Запись стадии — чтение-изменение-запись файла записи
+        self._write_lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> Optional["CheckpointStore"]:
+        """Build the store from CHECKPOINT_* variables (None if "off")"""
+        cache_dir = os.getenv("CHECKPOINT_DIR", DEFAULT_CHECKPOINT_DIR)
+        if not cache_dir or cache_dir == "off":
+            return None
+        return cls(
+            cache_dir=cache_dir,
+            max_entries=int(os.getenv("CHECKPOINT_MAX_ENTRIES", "500")),
+            ttl_seconds=float(os.getenv("CHECKPOINT_TTL_SECONDS", "86400"))
+        )
+
+    def load(self, key: str) -> dict[str, dict]:
+        """Finished stages of the run (task name → output dict; {} if none)"""
+        entry = self._load(self._path(key))
+        return dict(entry["result"].get("stages", {})) if entry else {}
+
+    def save_stage(self, key: str, task_name: str, raw: str, json_dict: Optional[dict] = None) -> None:
+        """Store a finished stage; later stages of an earlier run are dropped"""
+        with self._write_lock:
+            stages = self.load(key)
+            # Новая версия стадии делает недействительными стадии после неё
+            if task_name in stages:
+                names = list(stages)
+                for name in names[names.index(task_name):]:
+                    stages.pop(name)
+            stages[task_name] = {"raw": raw, "json_dict": json_dict}
+            self.put(key, {"stages": stages})
+
+    def mark_complete(self, key: str) -> None:
+        """Mark the run finished; saving a stage again reopens it"""
+        with self._write_lock:
+            stages = self.load(key)
+            if stages:
+                self.put(key, {"stages": stages, "complete": True})
+
+    def is_complete(self, key: str) -> bool:
+        """True if the run's stages are from a finished run"""
+        entry = self._load(self._path(key))
+        return bool(entry and entry["result"].get("complete"))
+
+    def clear(self, key: str) -> None:
+        """Forget all stages of the run"""
+        try:
+            self._path(key).unlink()
+        except OSError:
+            pass
+
+
+__all__ = ["CheckpointStore", "DEFAULT_CHECKPOINT_DIR"]
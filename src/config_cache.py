@@ -0,0 +1,363 @@
+"""
+Compiled, hot-reloadable agent and task configuration
+
+agents.yaml and tasks.yaml are parsed once per file version into frozen
+objects whose prompt fields are precompiled templates (literal parts and
+{placeholder} names split up front). Every lookup stats the files and
+reparses only when mtime or size changed, so long-running bot workers
+pick up prompt edits without a restart and without per-request parsing.
+
+A broken edit (invalid YAML, missing fields) keeps the last good version
+in use and is logged; there is no fallback on the very first load.
+
+Prompts are expected to keep provider prefix caching possible: agent
+fields (the system prompt) have no placeholders, and task descriptions
+put their placeholders after the static instructions. Fields that break
+this are logged at load (CrewConfig.prefix_warnings).
+"""
+
+import copy
+import hashlib
+import logging
+import os
+import re
+import threading
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Mapping, Optional
+
+logger = logging.getLogger(__name__)
+
+# Как в CrewAI: {имя}, остальные фигурные скобки (JSON в промптах) — текст
+PLACEHOLDER = re.compile(r"\{([A-Za-z_][A-Za-z0-9_]*)\}")
+
+AGENT_FIELDS = ("role", "goal", "backstory")
+TASK_FIELDS = ("description", "expected_output")
+
+# Статический текст после первого плейсхолдера (метки полей вроде "Language:"),
+# который ещё не считается инструкцией, выпавшей из кэшируемого префикса
+PREFIX_TAIL_CHARS = 300
+
+
+class ConfigError(ValueError):
+    """Invalid config file or inputs that do not satisfy its placeholders"""
+
+
+@dataclass(frozen=True)
+class PromptTemplate:
+    """A prompt field split into literal text and placeholder names"""
+
+    text: str
+    parts: tuple  # Чётные индексы — текст, нечётные — имена плейсхолдеров
+    placeholders: frozenset
+
+    @classmethod
+    def compile(cls, text: str) -> "PromptTemplate":
+        parts = tuple(PLACEHOLDER.split(text))
+        return cls(text=text, parts=parts, placeholders=frozenset(parts[1::2]))
+
+    @property
+    def static_prefix(self) -> str:
+        """Text before the first placeholder (identical on every request)"""
+        return self.parts[0]
+
+    @property
+    def static_tail(self) -> int:
+        """Characters of literal text after the first placeholder"""
+        return sum(len(part.strip()) for part in self.parts[2::2])
+
+    def missing(self, inputs: Mapping) -> set[str]:
+        """Placeholders with no value in inputs"""
+        return {name for name in self.placeholders if name not in inputs}
+
+    def render(self, inputs: Mapping) -> str:
+        """
+        Substitute inputs in a single pass (values are not re-scanned).
+
+        Raises:
+            ConfigError: A placeholder has no value
+        """
+        missing = self.missing(inputs)
+        if missing:
+            raise ConfigError(f"Missing template inputs: {', '.join(sorted(missing))}")
+        return "".join(
+            part if i % 2 == 0 else str(inputs[part]) for i, part in enumerate(self.parts)
+        )
+
+
+@dataclass(frozen=True)
+class ModelSpec:
+    """Model settings of one agent (resolved by llm_config.create_llm)"""
+
+    model: Optional[str] = None
+    temperature: Optional[float] = None
+    max_tokens: Optional[int] = None
+    fallback: tuple = ()
+
+    @classmethod
+    def from_config(cls, entry: Mapping) -> "ModelSpec":
+        """
+        Read model, temperature, max_tokens and fallback of an agents.yaml entry.
+
+        Raises:
+            ValueError: A value has the wrong type
+        """
+        model = entry.get("model")
+        temperature = entry.get("temperature")
+        max_tokens = entry.get("max_tokens")
+        fallback = entry.get("fallback") or ()
+        if isinstance(fallback, str):
+            fallback = (fallback,)
+
+        if model is not None and not isinstance(model, str):
+            raise ValueError("model must be a model name")
+        if not all(isinstance(m, str) for m in fallback):
+            raise ValueError("fallback must be a list of model names")
+        if fallback and model is None:
+            raise ValueError("fallback needs a primary model")
+        if temperature is not None and (isinstance(temperature, bool) or not isinstance(temperature, (int, float))):
+            raise ValueError("temperature must be a number")
+        if max_tokens is not None and (isinstance(max_tokens, bool) or not isinstance(max_tokens, int)):
+            raise ValueError("max_tokens must be an integer")
+        return cls(model=model, temperature=temperature, max_tokens=max_tokens, fallback=tuple(fallback))
+
+
+@dataclass(frozen=True)
+class AgentConfig:
+    """One entry of agents.yaml"""
+
+    name: str
+    role: PromptTemplate
+    goal: PromptTemplate
+    backstory: PromptTemplate
+    options: Mapping  # Прочие ключи (только чтение)
+    llm: ModelSpec = ModelSpec()
+
+
+@dataclass(frozen=True)
+class TaskConfig:
+    """One entry of tasks.yaml"""
+
+    name: str
+    description: PromptTemplate
+    expected_output: PromptTemplate
+    options: Mapping
+
+
+@dataclass(frozen=True)
+class CrewConfig:
+    """Both config files of a crew, compiled"""
+
+    agents: Mapping  # имя → AgentConfig
+    tasks: Mapping   # имя → TaskConfig
+    version: str     # sha256 текстов обоих файлов, 16 символов
+
+    @property
+    def placeholders(self) -> frozenset:
+        names = set()
+        for item in (*self.agents.values(), *self.tasks.values()):
+            for template in _templates(item):
+                names |= template.placeholders
+        return frozenset(names)
+
+    def prefix_warnings(self) -> list[str]:
+        """Prompt fields that keep the rendered prompt from having a stable prefix"""
+        warnings = []
+        for agent in self.agents.values():
+            for field_name in AGENT_FIELDS:
+                template = getattr(agent, field_name)
+                if template.placeholders:
+                    warnings.append(f"{agent.name}.{field_name}: system prompt varies per request "
+                                    f"({', '.join(sorted(template.placeholders))})")
+        for task in self.tasks.values():
+            if task.expected_output.placeholders:
+                warnings.append(f"{task.name}.expected_output: placeholders follow the inputs")
+            if task.description.static_tail > PREFIX_TAIL_CHARS:
+                warnings.append(f"{task.name}.description: {task.description.static_tail} characters "
+                                "of instructions after the first placeholder")
+        return warnings
+
+    def check_inputs(self, inputs: Mapping) -> None:
+        """
+        Fail before a run if any prompt uses a placeholder the inputs lack.
+
+        Raises:
+            ConfigError: Lists every unresolved placeholder and where it is used
+        """
+        problems = []
+        for item in (*self.agents.values(), *self.tasks.values()):
+            for field_name, template in zip(_field_names(item), _templates(item), strict=True):
+                for name in sorted(template.missing(inputs)):
+                    problems.append(f"{item.name}.{field_name}: {{{name}}}")
+        if problems:
+            raise ConfigError("Unresolved placeholders: " + "; ".join(problems))
+
+
+def _field_names(item) -> tuple:
+    return AGENT_FIELDS if isinstance(item, AgentConfig) else TASK_FIELDS
+
+
+def _templates(item) -> list[PromptTemplate]:
+    return [getattr(item, name) for name in _field_names(item)]
+
+
+def _freeze(value):
+    """Read-only view of nested YAML data"""
+    if isinstance(value, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def _compile_entries(data: dict, path: str, fields: tuple, factory) -> Mapping:
+    if not isinstance(data, dict):
+        raise ConfigError(f"{path}: expected a mapping of names to entries")
+    compiled = {}
+    for name, entry in data.items():
+        if not isinstance(entry, dict):
+            raise ConfigError(f"{path}: '{name}' must be a mapping")
+        missing = [f for f in fields if not isinstance(entry.get(f), str)]
+        if missing:
+            raise ConfigError(f"{path}: '{name}' is missing {', '.join(missing)}")
+        options = {k: v for k, v in entry.items() if k not in fields}
+        extra = {}
+        if factory is AgentConfig:
+            try:
+                extra["llm"] = ModelSpec.from_config(options)
+            except ValueError as e:
+                raise ConfigError(f"{path}: '{name}': {e}") from e
+        compiled[name] = factory(
+            name=name,
+            options=_freeze(options),
+            **{f: PromptTemplate.compile(entry[f]) for f in fields},
+            **extra
+        )
+    return MappingProxyType(compiled)
+
+
+@dataclass(frozen=True)
+class _FileVersion:
+    mtime_ns: int
+    size: int
+    text: str
+    data: object
+
+
+class ConfigCache:
+    """
+    Parsed config files, reloaded when they change on disk.
+
+    Thread-safe; one instance is shared per process (see load_crew_config).
+    """
+
+    def __init__(self):
+        self._files: dict[str, _FileVersion] = {}
+        self._crews: dict[tuple, tuple] = {}  # пути → (версии файлов, CrewConfig)
+        self._lock = threading.Lock()
+        self.loads = 0  # Сколько раз файлы реально парсились
+
+    def _file(self, path: str) -> _FileVersion:
+        import yaml
+
+        stat = os.stat(path)
+        current = self._files.get(path)
+        if current and (current.mtime_ns, current.size) == (stat.st_mtime_ns, stat.st_size):
+            return current
+
+        with open(path, "r", encoding="utf-8") as f:
+            text = f.read()
+        try:
+            data = yaml.safe_load(text)
+        except yaml.YAMLError as e:
+            if current is None:
+                raise ConfigError(f"{path}: {e}") from e
+            logger.warning(f"Config reload failed, keeping the previous version: {path}: {e}")
+            return current
+        version = _FileVersion(stat.st_mtime_ns, stat.st_size, text, data if data is not None else {})
+        self._files[path] = version
+        self.loads += 1
+        return version
+
+    def yaml(self, path: str) -> dict:
+        """A private (mutable) copy of a parsed YAML file"""
+        path = os.path.abspath(path)
+        with self._lock:
+            return copy.deepcopy(self._file(path).data)
+
+    def crew_config(self, agents_path: str, tasks_path: str) -> CrewConfig:
+        """
+        Compiled configs of both files, current as of this call.
+
+        Raises:
+            ConfigError: First load is invalid (later broken edits keep
+                serving the last good version)
+        """
+        agents_path, tasks_path = os.path.abspath(agents_path), os.path.abspath(tasks_path)
+        key = (agents_path, tasks_path)
+
+        with self._lock:
+            previous = self._crews.get(key)
+            try:
+                agents = self._file(agents_path)
+                tasks = self._file(tasks_path)
+                versions = (agents.mtime_ns, agents.size, tasks.mtime_ns, tasks.size)
+                if previous is not None and previous[0] == versions:
+                    return previous[1]
+
+                digest = hashlib.sha256()
+                digest.update(agents.text.encode("utf-8"))
+                digest.update(tasks.text.encode("utf-8"))
+                config = CrewConfig(
+                    agents=_compile_entries(agents.data, agents_path, AGENT_FIELDS, AgentConfig),
+                    tasks=_compile_entries(tasks.data, tasks_path, TASK_FIELDS, TaskConfig),
+                    version=digest.hexdigest()[:16]
+                )
+            except (ConfigError, OSError) as e:
+                if previous is None:
+                    raise
+                logger.warning(f"Config reload failed, keeping the previous version: {e}")
+                return previous[1]
+
+            for warning in config.prefix_warnings():
+                logger.warning(f"Prompt prefix not cacheable: {warning}")
+            self._crews[key] = (versions, config)
+            return config
+
+
+_cache: Optional[ConfigCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_config_cache() -> ConfigCache:
+    """Process-wide config cache"""
+    global _cache
+
+    with _cache_lock:
+        if _cache is None:
+            _cache = ConfigCache()
+        return _cache
+
+
+def load_crew_config(agents_path: str, tasks_path: str) -> CrewConfig:
+    """Compiled agents/tasks config from the process-wide cache"""
+    return get_config_cache().crew_config(agents_path, tasks_path)
+
+
+def load_yaml(path) -> dict:
+    """Drop-in for CrewBase.load_yaml served from the process-wide cache"""
+    return get_config_cache().yaml(path)
+
+
+__all__ = [
+    "AgentConfig",
+    "ConfigCache",
+    "ConfigError",
+    "CrewConfig",
+    "ModelSpec",
+    "PromptTemplate",
+    "TaskConfig",
+    "get_config_cache",
+    "load_crew_config",
+    "load_yaml",
+]
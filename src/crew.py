@@ -8,31 +8,171 @@ Usage:
     result = crew.run(file_path="src/calculator.py")
 """
 
-import os
+import asyncio
+import hashlib
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextvars import ContextVar
+from dataclasses import dataclass
 from pathlib import Path
-from crewai import Agent, Task, Crew, Process, LLM
-from crewai.project import CrewBase, agent, task, crew
-from crewai_tools import FileReadTool
+from typing import AsyncIterator, Iterable, Iterator, Optional
+
+from crewai import Agent, Crew, Process, Task
+from crewai.project import CrewBase, agent, crew, task
+from crewai.tasks.task_output import TaskOutput
+
+try:
+    from .cache import TestCache, UnitTestCache
+    from .cancellation import (
+        CancelToken,
+        JobCancelled,
+        check_current_token,
+        install_llm_call_guard,
+        reset_current_token,
+        set_current_token,
+    )
+    from .checkpoints import CheckpointStore
+    from .config_cache import load_crew_config, load_yaml
+    from .gap_filling import GapFillLimits, GapFillReport, fill_coverage_gaps
+    from .llm_config import create_llm
+    from .memory import NoMemory, create_memory
+    from .postprocess import PostProcessor, PostProcessReport
+    from .profiling import mark_stage
+    from .ratelimit import RateLimiter, install_llm_rate_limit_hook, use_rate_limiter
+    from .reports import TASK_REPORTS, AnalysisReport, ValidationReport, structured_output
+    from .symbol_index import SymbolIndex
+    from .tools.coverage_tool import RunTestsTool
+    from .tools.snapshot_tool import (
+        SnapshotReadTool,
+        SnapshotStore,
+        current_store,
+        use_snapshot_store,
+    )
+    from .tracing import get_tracer
+    from .units import assemble_tests, dependency_sources, module_subset, split_tests, split_units
+except ImportError:
+    from cache import TestCache, UnitTestCache
+    from cancellation import (
+        CancelToken,
+        JobCancelled,
+        check_current_token,
+        install_llm_call_guard,
+        reset_current_token,
+        set_current_token,
+    )
+    from checkpoints import CheckpointStore
+    from config_cache import load_crew_config, load_yaml
+    from gap_filling import GapFillLimits, GapFillReport, fill_coverage_gaps
+    from llm_config import create_llm
+    from memory import NoMemory, create_memory
+    from postprocess import PostProcessor, PostProcessReport
+    from profiling import mark_stage
+    from ratelimit import RateLimiter, install_llm_rate_limit_hook, use_rate_limiter
+    from reports import TASK_REPORTS, AnalysisReport, ValidationReport, structured_output
+    from symbol_index import SymbolIndex
+    from tools.coverage_tool import RunTestsTool
+    from tools.snapshot_tool import (
+        SnapshotReadTool,
+        SnapshotStore,
+        current_store,
+        use_snapshot_store,
+    )
+    from tracing import get_tracer
+    from units import assemble_tests, dependency_sources, module_subset, split_tests, split_units
 
 # Настройка LLM провайдера (приоритет: OpenRouter > GROQ > OpenAI)
 def get_llm():
-    """Получить LLM на основе доступных API ключей"""
-    if os.getenv("OPENROUTER_API_KEY"):
-        return LLM(
-            model="openrouter/google/gemini-2.0-flash-001",
-            api_key=os.getenv("OPENROUTER_API_KEY")
-        )
-    elif os.getenv("GROQ_API_KEY"):
-        return LLM(
-            model="groq/llama-3.3-70b-versatile",
-            api_key=os.getenv("GROQ_API_KEY")
-        )
-    elif os.getenv("OPENAI_API_KEY"):
-        return LLM(model="gpt-4o-mini")
+    """Получить LLM по умолчанию: первая модель с API ключом, остальные — запасные"""
+    return create_llm()
+
+
+def _key_options(config_version: str, dependency_context: str) -> dict:
+    """Параметры ключа кэша: версия промптов и контекст зависимостей"""
+    options = {"config_version": config_version}
+    if dependency_context:
+        # Правка сигнатур в импортируемых модулях инвалидирует кэш
+        options["dependencies"] = hashlib.sha256(dependency_context.encode("utf-8")).hexdigest()[:16]
+    return options
+
+
+def extract_tests(result: dict) -> str:
+    """
+    Извлечь код тестов из результата run().
+
+    Берётся вывод write_tests_task (или raw), из markdown-блоков —
+    самый большой блок кода.
+    """
+    import re
+
+    # tasks_output: [0] = analyze, [1] = write_tests, [2] = validate
+    if result.get("tasks_output") and len(result["tasks_output"]) >= 2:
+        tests_content = result["tasks_output"][1]
     else:
-        raise ValueError(
-            "No API key found. Set one of: OPENROUTER_API_KEY, GROQ_API_KEY, OPENAI_API_KEY"
-        )
+        # Fallback на raw если tasks_output недоступен
+        tests_content = result.get("raw", "")
+
+    # Извлекаем Python код из markdown blocks
+    if tests_content and "```python" in tests_content:
+        code_blocks = re.findall(r'```python\n(.*?)```', tests_content, re.DOTALL)
+        if code_blocks:
+            # Берём самый большой блок (обычно это полные тесты)
+            tests_content = max(code_blocks, key=len)
+    elif tests_content and "```" in tests_content:
+        # Попробуем без указания языка
+        code_blocks = re.findall(r'```\n(.*?)```', tests_content, re.DOTALL)
+        if code_blocks:
+            tests_content = max(code_blocks, key=len)
+
+    return tests_content.strip() if tests_content else ""
+
+
+# Моменты завершения задач текущего запуска (длительность стадий)
+_stage_marks: ContextVar[Optional[list]] = ContextVar("stage_marks", default=None)
+# Имена задач текущего запуска: стадии профилировщика (--profile)
+_stage_names: ContextVar[tuple] = ContextVar("stage_names", default=())
+# Чекпойнты текущего запуска: (CheckpointStore, ключ запуска)
+_checkpoint: ContextVar[Optional[tuple]] = ContextVar("checkpoint", default=None)
+
+# Стадии пайплайна по порядку: короткое имя (--rerun, бот) → задача
+STAGES = {
+    "analyze": "analyze_code_task",
+    "tests": "write_tests_task",
+    "validate": "validate_tests_task",
+}
+
+
+def on_task_done(output) -> None:
+    """task_callback: чекпойнт, точка отмены и граница задачи для снимка файлов"""
+    checkpoint = _checkpoint.get()
+    if checkpoint is not None:
+        # До проверки отмены: задача уже завершена, её результат не теряем
+        store, key = checkpoint
+        store.save_stage(key, output.name, output.raw, output.json_dict)
+    check_current_token(output)
+    marks = _stage_marks.get()
+    if marks is not None:
+        marks.append(time.perf_counter())
+        names = _stage_names.get()
+        mark_stage(names[len(marks) - 1] if len(marks) - 1 < len(names) else "finish")
+    store = current_store()
+    if store is not None:
+        store.next_task()
+
+
+@dataclass
+class BatchResult:
+    """Результат одного файла в run_many() / arun_many()"""
+
+    file_path: str
+    result: Optional[dict] = None
+    error: Optional[Exception] = None
+    duration: float = 0.0
+    output_path: Optional[str] = None  # Заполняется в save_many()
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
 
 # Путь к конфигам относительно этого файла
 CONFIG_DIR = Path(__file__).parent.parent / "config"
@@ -55,19 +195,49 @@ class TestingCrew:
     agents_config = str(CONFIG_DIR / "agents.yaml")
     tasks_config = str(CONFIG_DIR / "tasks.yaml")
 
-    def __init__(self):
-        """Инициализация crew с загрузкой конфигов"""
+    def __init__(
+        self,
+        test_cache: TestCache = None,
+        unit_cache: UnitTestCache = None,
+        memory=None,
+        symbol_index: SymbolIndex = None,
+        postprocessor: PostProcessor = None,
+        checkpoints: CheckpointStore = None
+    ):
+        """
+        Инициализация crew с загрузкой конфигов
+
+        Args:
+            test_cache: Кэш сгенерированных тестов (None — без кэша)
+            unit_cache: Кэш тестов по функциям/классам для run_incremental()
+            memory: Бэкенд памяти — имя (off, buffer, sqlite, crewai) или
+                экземпляр; по умолчанию из CREW_MEMORY (off)
+            symbol_index: Индекс символов проекта — сигнатуры импортируемого
+                кода попадают в промпт (None — без контекста зависимостей)
+            postprocessor: Форматирование и безопасные исправления тестов
+                перед сохранением; по умолчанию из POSTPROCESS_TESTS (выкл.)
+            checkpoints: Чекпойнты стадий — повтор прерванного запуска продолжает
+                с первой незавершённой стадии (None — без чекпойнтов)
+        """
+        self.test_cache = test_cache
+        self.checkpoints = checkpoints
+        self.unit_cache = unit_cache
+        self.symbol_index = symbol_index
+        self.memory = memory if isinstance(memory, NoMemory) else create_memory(memory)
+        self.postprocessor = postprocessor or PostProcessor.from_env()
+        self.last_postprocess: Optional[PostProcessReport] = None
+        self.last_result: Optional[dict] = None  # run() последнего run_and_save()
+        self.last_gap_fill: Optional[GapFillReport] = None  # fill_gaps в run_and_save()
         self._load_configs()
 
     def _load_configs(self):
-        """Загрузка YAML конфигураций"""
-        import yaml
+        """Скомпилированные конфиги из кэша процесса (перечитываются при правке файлов)"""
+        self._config = load_crew_config(self.agents_config, self.tasks_config)
+        self._agents_config = self._config.agents
+        self._tasks_config = self._config.tasks
 
-        with open(self.agents_config, 'r', encoding='utf-8') as f:
-            self._agents_config = yaml.safe_load(f)
-
-        with open(self.tasks_config, 'r', encoding='utf-8') as f:
-            self._tasks_config = yaml.safe_load(f)
+        # Версия промптов: правка конфигов инвалидирует кэш
+        self.config_version = self._config.version
 
     # ==================== AGENTS ====================
 
@@ -76,11 +246,11 @@ class TestingCrew:
         """Агент для анализа кода"""
         config = self._agents_config["code_analyzer_agent"]
         return Agent(
-            role=config["role"],
-            goal=config["goal"],
-            backstory=config["backstory"],
-            llm=get_llm(),
-            tools=[FileReadTool()],
+            role=config.role.text,
+            goal=config.goal.text,
+            backstory=config.backstory.text,
+            llm=create_llm(config.llm),
+            tools=[SnapshotReadTool()],
             verbose=True,
             allow_delegation=False,
             max_iter=10,
@@ -93,14 +263,15 @@ class TestingCrew:
         """Главный агент для написания тестов"""
         config = self._agents_config["qa_test_agent"]
         return Agent(
-            role=config["role"],
-            goal=config["goal"],
-            backstory=config["backstory"],
-            llm=get_llm(),
-            tools=[FileReadTool()],
+            role=config.role.text,
+            goal=config.goal.text,
+            backstory=config.backstory.text,
+            llm=create_llm(config.llm),
+            # Тесты запускаются в песочнице (forkserver + rlimits), без Docker
+            tools=[SnapshotReadTool(), RunTestsTool()],
             verbose=True,
             allow_delegation=False,
-            allow_code_execution=False,  # Отключено (требует Docker)
+            allow_code_execution=False,  # Встроенное исполнение CrewAI требует Docker
             max_iter=15,
             max_execution_time=300,  # 5 минут максимум
             respect_context_window=True,
@@ -112,10 +283,10 @@ class TestingCrew:
         """Агент для валидации тестов"""
         config = self._agents_config["test_validator_agent"]
         return Agent(
-            role=config["role"],
-            goal=config["goal"],
-            backstory=config["backstory"],
-            llm=get_llm(),
+            role=config.role.text,
+            goal=config.goal.text,
+            backstory=config.backstory.text,
+            llm=create_llm(config.llm),
             tools=[],  # Валидатору не нужны внешние инструменты
             verbose=True,
             allow_delegation=False,
@@ -131,9 +302,11 @@ class TestingCrew:
         """Задача анализа кода"""
         config = self._tasks_config["analyze_code_task"]
         return Task(
-            description=config["description"],
-            expected_output=config["expected_output"],
-            agent=self.code_analyzer_agent()
+            description=config.description.text,
+            expected_output=config.expected_output.text,
+            agent=self.code_analyzer_agent(),
+            # JSON ответа → AnalysisReport (с локальным исправлением, без повтора LLM)
+            callback=structured_output(AnalysisReport)
         )
 
     @task
@@ -141,8 +314,8 @@ class TestingCrew:
         """Задача написания тестов"""
         config = self._tasks_config["write_tests_task"]
         return Task(
-            description=config["description"],
-            expected_output=config["expected_output"],
+            description=config.description.text,
+            expected_output=config.expected_output.text,
             agent=self.qa_test_agent(),
             context=[self.analyze_code_task()]  # Зависит от анализа
         )
@@ -152,10 +325,21 @@ class TestingCrew:
         """Задача валидации тестов"""
         config = self._tasks_config["validate_tests_task"]
         return Task(
-            description=config["description"],
-            expected_output=config["expected_output"],
+            description=config.description.text,
+            expected_output=config.expected_output.text,
             agent=self.test_validator_agent(),
-            context=[self.write_tests_task()]  # Зависит от написанных тестов
+            context=[self.write_tests_task()],  # Зависит от написанных тестов
+            callback=structured_output(ValidationReport)
+        )
+
+    @task
+    def fill_coverage_gaps_task(self) -> Task:
+        """Задача дописывания тестов для непокрытого кода (вне пайплайна)"""
+        config = self._tasks_config["fill_coverage_gaps_task"]
+        return Task(
+            description=config.description.text,
+            expected_output=config.expected_output.text,
+            agent=self.qa_test_agent()
         )
 
     # ==================== CREW ====================
@@ -176,9 +360,14 @@ class TestingCrew:
             ],
             process=Process.sequential,  # Pipeline
             verbose=True,
-            memory=True,  # Сохранять контекст между задачами
+            # Контекст между задачами идёт через context=; встроенная
+            # embedding-память CrewAI — только для бэкенда "crewai"
+            memory=self.memory.crewai_memory,
             max_rpm=10,   # Rate limiting
-            planning=False  # Отключено — вызывает ошибки парсинга
+            planning=False,  # Отключено — вызывает ошибки парсинга
+            # Точки кооперативной отмены: после каждого шага и каждой задачи
+            step_callback=check_current_token,
+            task_callback=on_task_done
         )
 
     # ==================== RUN METHODS ====================
@@ -188,7 +377,14 @@ class TestingCrew:
         file_path: str,
         test_type: str = "unit",
         test_framework: str = "pytest",
-        language: str = "python"
+        language: str = "python",
+        cancel_token: CancelToken = None,
+        timeout: float = None,
+        code_content: str = None,
+        rate_limiter: RateLimiter = None,
+        memory_key: str = None,
+        rerun: str = None,
+        feedback: str = None
     ) -> dict:
         """
         Запуск тестирования для файла.
@@ -198,36 +394,724 @@ class TestingCrew:
             test_type: Тип тестов (unit, integration, e2e)
             test_framework: Фреймворк (pytest, unittest, jest)
             language: Язык программирования
+            cancel_token: Токен для отмены запуска извне
+            timeout: Дедлайн всего запуска в секундах
+            code_content: Код для промпта (по умолчанию — содержимое file_path)
+            rate_limiter: Общий лимит запросов к LLM для параллельных запусков
+            memory_key: Ключ памяти (по умолчанию — абсолютный путь файла)
+            rerun: Стадия из STAGES (analyze, tests, validate), которую
+                перезапустить вместе со следующими; более ранние берутся из
+                чекпойнтов, готовый результат из test_cache не используется
+            feedback: Что улучшить в тестах ("more edge cases"): прежние
+                тесты и пожелание идут в промпт; по умолчанию rerun="tests"
 
         Returns:
-            dict с результатами: analysis, tests, validation
+            dict с результатами: raw, tasks_output (analysis, tests, validation),
+            token_usage (dict), cached (результат взят из кэша),
+            file_reads (статистика инструмента чтения, если crew запускался),
+            stages (по задачам: секунды, токены, в т.ч. cached_prompt_tokens
+            из кэша промптов провайдера; если crew запускался),
+            analysis / validation (AnalysisReport / ValidationReport как dict,
+            None если в ответе не нашлось JSON),
+            resumed (задачи, взятые из чекпойнтов)
+
+        Raises:
+            JobCancelled: Запуск отменён (DeadlineExceeded — истёк дедлайн);
+                в token_usage — частичное использование токенов
+            ValueError: Неизвестная стадия rerun
         """
-        # Читаем код
-        with open(file_path, 'r', encoding='utf-8') as f:
-            code_content = f.read()
+        if feedback and rerun is None:
+            rerun = "tests"
+        if rerun is not None and rerun not in STAGES:
+            raise ValueError(f"Unknown stage: {rerun} (expected one of: {', '.join(STAGES)})")
+
+        with get_tracer().span(
+            "testing_crew.run",
+            file_path=file_path,
+            test_type=test_type,
+            test_framework=test_framework,
+            language=language
+        ) as span:
+            if cancel_token is None and timeout is not None:
+                cancel_token = CancelToken(timeout=timeout)
+            mark_stage("prepare")
+
+            # Читаем код
+            if code_content is None:
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    code_content = f.read()
+            span.set_attribute("code_bytes", len(code_content.encode("utf-8")))
+
+            # Входные данные для crew
+            inputs = {
+                "file_path": file_path,
+                "code_content": code_content,
+                "test_type": test_type,
+                "test_framework": test_framework,
+                "language": language,
+                "coverage_gaps": ""  # Только для fill_coverage_gaps_task
+            }
+
+            # Заметки прошлых запусков (пусто, если память выключена)
+            if memory_key is None:
+                memory_key = str(Path(file_path).resolve())
+            inputs["memory_context"] = self.memory.context_for(memory_key)
+
+            # Сигнатуры импортируемого кода проекта вместо чтения файлов агентами
+            inputs["dependency_context"] = self._dependency_context(code_content, file_path, language)
+            span.set_attribute("dependency_context_bytes", len(inputs["dependency_context"]))
+
+            # Кэш: почти одинаковый код (форматирование, комментарии) — без запуска crew
+            cache_key = None
+            if self.test_cache is not None:
+                cache_key = self._cache_key(
+                    code_content, file_path, inputs["dependency_context"], language, test_type, test_framework
+                )
+                # Перезапуск стадии — новый результат вместо готового
+                cached = self.test_cache.get(cache_key) if rerun is None else None
+                span.set_attribute("cached", cached is not None)
+                if cached is not None:
+                    return {**cached, "cached": True}
+
+            # Завершённые стадии прошлых попыток с тем же ключом
+            checkpoint_key, done = None, {}
+            if self.checkpoints is not None:
+                checkpoint_key = self._cache_key(
+                    code_content, file_path, inputs["dependency_context"], language, test_type, test_framework,
+                    cache=self.checkpoints
+                )
+                done = self.checkpoints.load(checkpoint_key)
+                # Завершённый запуск продолжается только перезапуском стадии:
+                # простой повтор выполняет все стадии заново
+                if rerun is None and self.checkpoints.is_complete(checkpoint_key):
+                    done = {}
+            previous_tests = (done.get(STAGES["tests"]) or {}).get("raw", "")
+            if rerun is not None:
+                for name in list(STAGES.values())[list(STAGES).index(rerun):]:
+                    done.pop(name, None)
+            inputs["revision_notes"] = self._revision_notes(feedback, previous_tests)
+
+            # Плейсхолдеры промптов проверяются до первого вызова LLM
+            self._config.check_inputs(inputs)
+
+            # Запуск
+            crew = self.crew()
+            resumed = self._resume(crew, done)
+            span.set_attribute("resumed_stages", len(resumed))
+            if not crew.tasks:
+                # Все стадии уже завершены (например, упал шаг после crew)
+                output = self._output(resumed, token_usage=None)
+                if cache_key is not None:
+                    self.test_cache.put(cache_key, output)
+                self.checkpoints.mark_complete(checkpoint_key)
+                return {**output, "cached": False, "resumed": [t.name for t in resumed]}
+            if cancel_token is not None:
+                cancel_token.check()
+                install_llm_call_guard()
+            if rate_limiter is not None:
+                install_llm_rate_limit_hook()
+
+            # Снимок кода на момент запуска: инструмент чтения отдаёт его,
+            # даже если файл на диске меняется во время работы агентов
+            snapshots = SnapshotStore()
+            snapshots.add(file_path, code_content)
+
+            # Агенты (и их LLM) живут дольше запуска — стадии считаем по разнице
+            usage_before = self._llm_usage(crew)
+            marks = [time.perf_counter()]
+            marks_handle = _stage_marks.set(marks)
+            names_handle = _stage_names.set(tuple(task.name for task in crew.tasks))
+            mark_stage(crew.tasks[0].name)
+            handle = set_current_token(cancel_token)
+            checkpoint_handle = _checkpoint.set(
+                (self.checkpoints, checkpoint_key) if checkpoint_key is not None else None
+            )
+            try:
+                with use_rate_limiter(rate_limiter), use_snapshot_store(snapshots):
+                    result = crew.kickoff(inputs=inputs)
+                if cancel_token is not None:
+                    cancel_token.check()
+            except Exception as e:
+                if cancel_token is None or not cancel_token.cancelled:
+                    raise
+                usage = self._usage_snapshot(crew)
+                if isinstance(e, JobCancelled):
+                    e.token_usage = usage
+                    raise
+                # Заблокированный вызов LLM мог всплыть как другая ошибка CrewAI
+                try:
+                    cancel_token.check()
+                except JobCancelled as cancelled:
+                    cancelled.token_usage = usage
+                    raise cancelled from e
+            finally:
+                reset_current_token(handle)
+                _checkpoint.reset(checkpoint_handle)
+                _stage_marks.reset(marks_handle)
+                _stage_names.reset(names_handle)
+            mark_stage("finish")
+
+            token_usage = result.token_usage if hasattr(result, 'token_usage') else None
+            if hasattr(token_usage, "model_dump"):
+                token_usage = token_usage.model_dump()
+
+            output = self._output(resumed + list(getattr(result, "tasks_output", None) or []), token_usage)
+
+            if cache_key is not None:
+                self.test_cache.put(cache_key, output)
+            if checkpoint_key is not None:
+                self.checkpoints.mark_complete(checkpoint_key)
+
+            self.memory.remember_run(memory_key, output["tasks_output"], reports=output)
+
+            file_reads = snapshots.stats()
+            stages = self._stages(crew, usage_before, marks)
+            usage = token_usage if isinstance(token_usage, dict) else {}
+            span.set_attributes(
+                tool_reads=file_reads["reads"],
+                tool_repeat_reads=file_reads["repeat_reads"],
+                prompt_tokens=usage.get("prompt_tokens"),
+                cached_prompt_tokens=usage.get("cached_prompt_tokens"),
+                completion_tokens=usage.get("completion_tokens"),
+                total_tokens=usage.get("total_tokens"),
+                output_bytes=len((output["raw"] or "").encode("utf-8"))
+            )
+            return {
+                **output,
+                "cached": False,
+                "file_reads": file_reads,
+                "stages": stages,
+                "resumed": [task.name for task in resumed]
+            }
+
+    def _dependency_context(self, code_content: str, file_path: str, language: str) -> str:
+        """Сигнатуры из индекса символов, которые импортирует код ('' если нет)"""
+        if self.symbol_index is None or language != "python":
+            return ""
+        return self.symbol_index.context_for(code_content, file_path)
+
+    def _cache_key(
+        self,
+        code_content: str,
+        file_path: str,
+        dependency_context: str,
+        language: str,
+        test_type: str,
+        test_framework: str,
+        cache: TestCache = None
+    ) -> str:
+        """
+        Ключ test_cache (или cache) для запуска с такими параметрами.
+
+        Промпты и импорты в тестах используют имя модуля, поэтому оно
+        входит в ключ: тот же код под другим именем — другой результат.
+        """
+        return self.cache_key(
+            cache or self.test_cache, code_content, file_path, language, test_type, test_framework,
+            dependency_context, config_version=self.config_version
+        )
+
+    @classmethod
+    def cache_key(
+        cls,
+        cache: TestCache,
+        code_content: str,
+        file_path: str,
+        language: str = "python",
+        test_type: str = "unit",
+        test_framework: str = "pytest",
+        dependency_context: str = "",
+        config_version: str = None
+    ) -> str:
+        """
+        Ключ кэша запуска без создания crew (агентов и LLM).
+
+        Args:
+            cache: Кэш, чей key_for() строит ключ
+            code_content: Код, который будет передан в run()
+            file_path: Путь файла, как в run() (в ключе — имя модуля)
+            language: Язык программирования
+            test_type: Тип тестов
+            test_framework: Фреймворк
+            dependency_context: Контекст зависимостей из индекса символов
+            config_version: Версия промптов (по умолчанию — текущих agents/tasks.yaml)
+
+        Returns:
+            Hex ключ
+        """
+        if config_version is None:
+            config_version = load_crew_config(cls.agents_config, cls.tasks_config).version
+        return cache.key_for(
+            code_content,
+            language,
+            test_type=test_type,
+            test_framework=test_framework,
+            module=Path(file_path).stem,
+            **_key_options(config_version, dependency_context)
+        )
+
+    def is_cached(
+        self,
+        code_content: str,
+        file_path: str,
+        test_type: str = "unit",
+        test_framework: str = "pytest",
+        language: str = "python"
+    ) -> bool:
+        """
+        Есть ли готовый результат в test_cache (без запуска и без счётчиков кэша).
+
+        Args:
+            code_content: Код, который будет передан в run()
+            file_path: Путь файла, как в run() (имя модуля и контекст зависимостей)
+            test_type: Тип тестов
+            test_framework: Фреймворк
+            language: Язык программирования
+
+        Returns:
+            True, если run() с этими параметрами вернёт результат из кэша
+        """
+        if self.test_cache is None:
+            return False
+        key = self._cache_key(
+            code_content,
+            file_path,
+            self._dependency_context(code_content, file_path, language),
+            language, test_type, test_framework
+        )
+        return self.test_cache.contains(key)
+
+    def _context_options(self, dependency_context: str) -> dict:
+        """Параметры ключа кэша: версия промптов и контекст зависимостей"""
+        return _key_options(self.config_version, dependency_context)
+
+    @staticmethod
+    def _resume(crew: Crew, done: dict) -> list[TaskOutput]:
+        """
+        Убрать из crew задачи, завершённые в прошлых попытках.
+
+        Их результаты восстанавливаются в task.output: context= следующих
+        задач читает именно его. Пропускается только начало пайплайна.
+
+        Returns:
+            Восстановленные результаты по порядку задач
+        """
+        resumed = []
+        for crew_task in crew.tasks:
+            stage = done.get(crew_task.name)
+            if stage is None:
+                break
+            model = TASK_REPORTS.get(crew_task.name)
+            json_dict = stage.get("json_dict")
+            crew_task.output = TaskOutput(
+                name=crew_task.name,
+                description=crew_task.description,
+                expected_output=crew_task.expected_output,
+                raw=stage.get("raw") or "",
+                json_dict=json_dict,
+                pydantic=model.model_validate(json_dict) if model and json_dict else None,
+                agent=crew_task.agent.role if crew_task.agent is not None else ""
+            )
+            resumed.append(crew_task.output)
+        if resumed:
+            crew.tasks = crew.tasks[len(resumed):]
+        return resumed
+
+    @classmethod
+    def _output(cls, tasks_output: list[TaskOutput], token_usage) -> dict:
+        """Результат run() по выводам всех задач (восстановленных и выполненных)"""
+        return {
+            "raw": tasks_output[-1].raw if tasks_output else "",
+            "tasks_output": [task.raw for task in tasks_output],
+            "token_usage": token_usage,
+            **cls._reports(tasks_output)
+        }
 
-        # Входные данные для crew
+    @staticmethod
+    def _reports(tasks_output: list[TaskOutput]) -> dict:
+        """Отчёты анализатора и валидатора (json_dict от structured_output)"""
+        by_name = {task.name: task.json_dict for task in tasks_output}
+        return {
+            "analysis": by_name.get(STAGES["analyze"]),
+            "validation": by_name.get(STAGES["validate"])
+        }
+
+    @staticmethod
+    def _revision_notes(feedback: Optional[str], previous_tests: str) -> str:
+        """Секция промпта с прежними тестами и пожеланием ('' без feedback)"""
+        if not feedback:
+            return ""
+        notes = f"REVISION REQUEST: {feedback}"
+        if previous_tests:
+            notes += (
+                "\nImprove the previous version of the tests below. Keep the tests "
+                "that are correct and return the complete updated test file.\n\n"
+                f"Previous tests:\n{previous_tests}"
+            )
+        return notes
+
+    @staticmethod
+    def _llm_usage(crew: Crew) -> dict:
+        """Накопленное использование токенов LLM каждой задачи (имя задачи → dict)"""
+        usage = {}
+        for crew_task in crew.tasks:
+            try:
+                usage[crew_task.name] = crew_task.agent.llm.get_token_usage_summary().model_dump()
+            except Exception:
+                usage[crew_task.name] = {}
+        return usage
+
+    @classmethod
+    def _stages(cls, crew: Crew, before: dict, marks: list) -> list[dict]:
+        """
+        Время и токены каждой задачи запуска.
+
+        cached_prompt_tokens — часть prompt_tokens, которую провайдер взял
+        из кэша префиксов (дешевле и быстрее); cache_hit_rate — их доля.
+        """
+        after = cls._llm_usage(crew)
+        stages = []
+        for i, crew_task in enumerate(crew.tasks):
+            delta = {
+                key: after[crew_task.name].get(key, 0) - before.get(crew_task.name, {}).get(key, 0)
+                for key in ("prompt_tokens", "cached_prompt_tokens", "completion_tokens",
+                            "successful_requests")
+            }
+            prompt = delta["prompt_tokens"]
+            stages.append({
+                "task": crew_task.name,
+                "seconds": round(marks[i + 1] - marks[i], 2) if i + 1 < len(marks) else None,
+                "requests": delta.pop("successful_requests"),
+                **delta,
+                "cache_hit_rate": round(delta["cached_prompt_tokens"] / prompt, 3) if prompt else 0.0
+            })
+        return stages
+
+    @staticmethod
+    def _usage_snapshot(crew: Crew) -> dict:
+        """Текущее использование токенов (в т.ч. для прерванного запуска)"""
+        try:
+            usage = crew.calculate_usage_metrics()
+        except Exception:
+            return None
+        return usage.model_dump() if hasattr(usage, "model_dump") else dict(usage)
+
+    # ==================== COVERAGE GAPS ====================
+
+    def fill_coverage_gaps(
+        self,
+        file_path: str,
+        tests_content: str,
+        test_framework: str = "pytest",
+        cancel_token: CancelToken = None,
+        limits: GapFillLimits = None,
+        code_content: str = None
+    ) -> GapFillReport:
+        """
+        Дописать тесты для непокрытого кода (только python + pytest).
+
+        Набор запускается в песочнице с coverage, непокрытые строки
+        сопоставляются с функциями, и qa_test_agent получает только их
+        тела. Новые тесты добавляются в конец набора; раунды повторяются
+        до цели покрытия или исчерпания бюджета (GAP_FILL_*).
+
+        Args:
+            file_path: Тестируемый файл (тесты импортируют его по имени модуля)
+            tests_content: Сгенерированные тесты
+            test_framework: Фреймворк (для промпта)
+            cancel_token: Токен для отмены извне
+            limits: Цель и бюджеты (по умолчанию из окружения)
+            code_content: Код (по умолчанию — содержимое file_path)
+
+        Returns:
+            GapFillReport; в report.tests — дополненный набор
+
+        Raises:
+            JobCancelled: Отменено между раундами или во время вызова LLM
+        """
+        if code_content is None:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                code_content = f.read()
         inputs = {
             "file_path": file_path,
             "code_content": code_content,
-            "test_type": test_type,
+            "test_type": "unit",
             "test_framework": test_framework,
-            "language": language
+            "language": "python",
+            "memory_context": "",
+            "dependency_context": "",
+            "revision_notes": "",
+            "coverage_gaps": ""
         }
+        self._config.check_inputs(inputs)
+        if cancel_token is not None:
+            install_llm_call_guard()
+        snapshots = SnapshotStore()
+        snapshots.add(file_path, code_content)
+
+        def write_tests(coverage_gaps: str) -> tuple[str, int]:
+            """Один раунд: промпт с непокрытыми функциями → (новые тесты, токены)"""
+            if cancel_token is not None:
+                cancel_token.check()
+            mark_stage("coverage")
+            crew = Crew(
+                agents=[self.qa_test_agent()],
+                tasks=[self.fill_coverage_gaps_task()],
+                process=Process.sequential,
+                verbose=True,
+                max_rpm=10,
+                step_callback=check_current_token,
+                task_callback=on_task_done
+            )
+            before = self._llm_usage(crew)
+            handle = set_current_token(cancel_token)
+            try:
+                with use_snapshot_store(snapshots):
+                    result = crew.kickoff(inputs={**inputs, "coverage_gaps": coverage_gaps})
+            finally:
+                reset_current_token(handle)
+            after = self._llm_usage(crew)
+            tokens = sum(
+                after[name].get(key, 0) - before[name].get(key, 0)
+                for name in after for key in ("prompt_tokens", "completion_tokens")
+            )
+            return extract_tests({"raw": result.raw}), tokens
 
-        # Запуск
-        result = self.crew().kickoff(inputs=inputs)
+        with get_tracer().span("testing_crew.fill_coverage_gaps", file_path=file_path) as span:
+            report = fill_coverage_gaps(
+                code_content, tests_content, Path(file_path).name, write_tests, limits=limits
+            )
+            span.set_attributes(
+                initial_coverage=report.initial_coverage,
+                final_coverage=report.final_coverage,
+                gap_fill_rounds=len(report.rounds),
+                gap_fill_tokens=report.tokens,
+                tests_added=len(report.added)
+            )
+        return report
+
+    # ==================== BATCH / ASYNC ====================
+
+    def _spawn(self) -> "TestingCrew":
+        """Новый экземпляр с теми же кэшами (crew() не потокобезопасен)"""
+        return type(self)(
+            test_cache=self.test_cache,
+            unit_cache=self.unit_cache,
+            memory=self.memory,
+            symbol_index=self.symbol_index,
+            postprocessor=self.postprocessor,
+            checkpoints=self.checkpoints
+        )
+
+    def run_many(
+        self,
+        files: Iterable[str],
+        concurrency: int = 4,
+        max_rpm: int = 10,
+        **kwargs
+    ) -> Iterator[BatchResult]:
+        """
+        Запуск для нескольких файлов в пуле потоков.
+
+        Результаты отдаются по мере готовности (не в порядке files);
+        ошибка одного файла не прерывает остальные.
+
+        Args:
+            files: Пути к файлам
+            concurrency: Сколько файлов обрабатывать одновременно
+            max_rpm: Общий лимит запросов к LLM в минуту (None — без общего лимита)
+            **kwargs: Параметры для run() (test_type, timeout, ...)
+
+        Yields:
+            BatchResult для каждого файла
+        """
+        limiter = RateLimiter(max_rpm) if max_rpm else None
+
+        def work(file_path: str) -> BatchResult:
+            started = time.perf_counter()
+            try:
+                result = self._spawn().run(file_path, rate_limiter=limiter, **kwargs)
+                return BatchResult(file_path, result=result, duration=time.perf_counter() - started)
+            except Exception as e:
+                return BatchResult(file_path, error=e, duration=time.perf_counter() - started)
+
+        pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="testing-crew")
+        try:
+            futures = [pool.submit(work, file_path) for file_path in files]
+            for future in as_completed(futures):
+                yield future.result()
+        finally:
+            # Потребитель прервал итерацию — не запускаем оставшиеся файлы
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    async def arun(self, file_path: str, **kwargs) -> dict:
+        """Асинхронный run(): crew выполняется в рабочем потоке"""
+        return await asyncio.to_thread(self.run, file_path, **kwargs)
+
+    async def arun_many(
+        self,
+        files: Iterable[str],
+        concurrency: int = 4,
+        max_rpm: int = 10,
+        **kwargs
+    ) -> AsyncIterator[BatchResult]:
+        """
+        Асинхронный run_many(): результаты отдаются по мере готовности.
+
+        Args:
+            files: Пути к файлам
+            concurrency: Сколько файлов обрабатывать одновременно
+            max_rpm: Общий лимит запросов к LLM в минуту (None — без общего лимита)
+            **kwargs: Параметры для run()
+
+        Yields:
+            BatchResult для каждого файла
+        """
+        limiter = RateLimiter(max_rpm) if max_rpm else None
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def work(file_path: str) -> BatchResult:
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    result = await self._spawn().arun(file_path, rate_limiter=limiter, **kwargs)
+                    return BatchResult(file_path, result=result, duration=time.perf_counter() - started)
+                except Exception as e:
+                    return BatchResult(file_path, error=e, duration=time.perf_counter() - started)
+
+        tasks = [asyncio.ensure_future(work(file_path)) for file_path in files]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # Ещё не начатые файлы отменяются; уже запущенные потоки отменяет cancel_token
+            for task in tasks:
+                task.cancel()
+
+    def run_incremental(
+        self,
+        file_path: str,
+        test_type: str = "unit",
+        test_framework: str = "pytest",
+        language: str = "python",
+        **kwargs
+    ) -> dict:
+        """
+        Генерация тестов с кэшем по функциям/классам.
+
+        Тесты неизменившихся юнитов (ключ: исходник юнита, его прямые
+        зависимости, имя модуля, параметры и версия промптов) берутся из unit_cache;
+        в crew уходят только новые/изменённые юниты. Результат собирается
+        в один тестовый модуль.
+
+        Args:
+            file_path: Путь к Python файлу
+            test_type: Тип тестов
+            test_framework: Фреймворк
+            language: Язык (поддерживается только python)
+            **kwargs: Дополнительные параметры для run()
+
+        Returns:
+            dict: tests (собранный модуль), units_cached, units_generated,
+            token_usage (None если crew не запускался)
+        """
+        with open(file_path, 'r', encoding='utf-8') as f:
+            code_content = f.read()
+
+        units = split_units(code_content)
+        if self.unit_cache is None or language != "python" or not units:
+            result = self.run(
+                file_path, test_type, test_framework, language,
+                code_content=code_content, **kwargs
+            )
+            return {
+                "tests": extract_tests(result),
+                "units_cached": [],
+                "units_generated": [u.name for u in units],
+                "token_usage": result.get("token_usage")
+            }
+
+        deps = dependency_sources(code_content)
+        options = self._context_options(
+            self._dependency_context(code_content, file_path, language)
+        )
+        # Тесты импортируют модуль по имени файла: он входит в ключ
+        keys = {
+            unit.name: self.unit_cache.unit_key(
+                unit, deps,
+                test_type=test_type,
+                test_framework=test_framework,
+                module=Path(file_path).stem,
+                **options
+            )
+            for unit in units
+        }
+        artifacts = {}
+        for unit in units:
+            cached = self.unit_cache.get(keys[unit.name])
+            if cached is not None:
+                artifacts[unit.name] = cached
+
+        stale = [u.name for u in units if u.name not in artifacts]
+        token_usage = None
+
+        if stale:
+            # Промпт содержит только изменившиеся юниты и их зависимости
+            partial = module_subset(code_content, set(stale))
+            result = self.run(
+                file_path, test_type, test_framework, language,
+                code_content=partial, **kwargs
+            )
+            token_usage = result.get("token_usage")
+
+            generated = extract_tests(result)
+            try:
+                imports, blocks = split_tests(generated, stale)
+            except SyntaxError:
+                # Невалидный Python не кэшируем — отдаём как есть
+                ordered = [artifacts[u.name] for u in units if u.name in artifacts]
+                cached_part = assemble_tests(
+                    [line for a in ordered for line in a["imports"]],
+                    [block for a in ordered for block in a["blocks"]]
+                ) if ordered else ""
+                return {
+                    "tests": "\n\n".join(p for p in [cached_part.strip(), generated] if p),
+                    "units_cached": [u.name for u in units if u.name in artifacts],
+                    "units_generated": stale,
+                    "token_usage": token_usage
+                }
+
+            total_tokens = (token_usage or {}).get("total_tokens") or 0
+            for name in stale:
+                if not blocks[name]:
+                    continue  # Нет тестов — в следующий раз сгенерируем снова
+                artifacts[name] = {
+                    "unit": name,
+                    "imports": imports,
+                    "blocks": blocks[name],
+                    # Доля токенов запуска — для статистики сэкономленного
+                    "token_usage": {"total_tokens": total_tokens // len(stale)}
+                }
+                self.unit_cache.put(keys[name], artifacts[name])
+
+        ordered = [artifacts[u.name] for u in units if u.name in artifacts]
+        tests = assemble_tests(
+            [line for a in ordered for line in a["imports"]],
+            [block for a in ordered for block in a["blocks"]]
+        )
 
         return {
-            "raw": result.raw,
-            "tasks_output": [task.raw for task in result.tasks_output] if hasattr(result, 'tasks_output') else [],
-            "token_usage": result.token_usage if hasattr(result, 'token_usage') else None
+            "tests": tests if ordered else "",
+            "units_cached": [u.name for u in units if u.name not in stale],
+            "units_generated": [name for name in stale if name in artifacts],
+            "token_usage": token_usage
         }
 
     def run_and_save(
         self,
         file_path: str,
         output_path: str = None,
+        fill_gaps: bool = False,
         **kwargs
     ) -> str:
         """
@@ -236,54 +1120,120 @@ class TestingCrew:
         Args:
             file_path: Путь к файлу для тестирования
             output_path: Путь для сохранения тестов (auto если None)
+            fill_gaps: Дописать тесты для непокрытого кода до цели
+                GAP_FILL_TARGET (python + pytest; отчёт в last_gap_fill)
             **kwargs: Дополнительные параметры для run()
 
         Returns:
             Путь к сохранённому файлу с тестами
         """
-        import re
+        if fill_gaps and kwargs.get("cancel_token") is None and kwargs.get("timeout") is not None:
+            # Дедлайн на генерацию вместе с раундами дописывания
+            kwargs["cancel_token"] = CancelToken(timeout=kwargs["timeout"])
 
-        result = self.run(file_path, **kwargs)
+        # Покомпонентный кэш: LLM получает только изменившиеся функции/классы
+        # Перезапуск стадии идёт по чекпойнтам всего файла, не по юнитам
+        if (self.unit_cache is not None and kwargs.get("language", "python") == "python"
+                and not kwargs.get("rerun") and not kwargs.get("feedback")):
+            tests_content = self.run_incremental(file_path, **kwargs)["tests"]
+        else:
+            self.last_result = self.run(file_path, **kwargs)
+            tests_content = extract_tests(self.last_result)
+        mark_stage("save")
 
         # Автоматический путь: src/calc.py → tests/test_calc.py
         if output_path is None:
             base_name = Path(file_path).stem
             output_path = f"tests/test_{base_name}.py"
 
-        # Создаём директорию если нужно
-        Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+        if not tests_content or not tests_content.strip():
+            raise ValueError("No tests generated - check crew output")
 
-        # Извлекаем тесты из второй задачи (write_tests_task)
-        # tasks_output: [0] = analyze, [1] = write_tests, [2] = validate
-        tests_content = None
+        self.last_gap_fill = None
+        if (fill_gaps and kwargs.get("language", "python") == "python"
+                and kwargs.get("test_framework", "pytest") == "pytest"):
+            self.last_gap_fill = self.fill_coverage_gaps(
+                file_path, tests_content, cancel_token=kwargs.get("cancel_token")
+            )
+            tests_content = self.last_gap_fill.tests
+            print(f"⏱ {self.last_gap_fill.summary()}")
+            mark_stage("save")
 
-        if result.get("tasks_output") and len(result["tasks_output"]) >= 2:
-            # Берём вывод write_tests_task (индекс 1)
-            tests_content = result["tasks_output"][1]
-        else:
-            # Fallback на raw если tasks_output недоступен
-            tests_content = result["raw"]
-
-        # Извлекаем Python код из markdown blocks
-        if tests_content and "```python" in tests_content:
-            code_blocks = re.findall(r'```python\n(.*?)```', tests_content, re.DOTALL)
-            if code_blocks:
-                # Берём самый большой блок (обычно это полные тесты)
-                tests_content = max(code_blocks, key=len)
-        elif tests_content and "```" in tests_content:
-            # Попробуем без указания языка
-            code_blocks = re.findall(r'```\n(.*?)```', tests_content, re.DOTALL)
-            if code_blocks:
-                tests_content = max(code_blocks, key=len)
+        if kwargs.get("language", "python") == "python":
+            tests_content = self._postprocess({file_path: tests_content})[file_path]
+        self._write_tests(output_path, tests_content)
+        return output_path
 
-        if not tests_content or not tests_content.strip():
-            raise ValueError("No tests generated - check crew output")
+    def save_many(
+        self,
+        files: Iterable[str],
+        output_dir: str = "tests",
+        concurrency: int = 4,
+        max_rpm: int = 10,
+        **kwargs
+    ) -> list[BatchResult]:
+        """
+        run_many() с сохранением: тесты всех файлов проходят
+        post-processing одним пакетом (один запуск ruff на все файлы).
+
+        Args:
+            files: Пути к файлам
+            output_dir: Каталог для test_<имя>.py
+            concurrency: Сколько файлов обрабатывать одновременно
+            max_rpm: Общий лимит запросов к LLM в минуту
+            **kwargs: Параметры для run()
+
+        Returns:
+            BatchResult для каждого файла (output_path у сохранённых)
+        """
+        started = time.perf_counter()
+        results = list(self.run_many(files, concurrency=concurrency, max_rpm=max_rpm, **kwargs))
+        generated = {}
+        for item in results:
+            if not item.ok:
+                continue
+            tests_content = extract_tests(item.result)
+            if tests_content and tests_content.strip():
+                generated[item.file_path] = tests_content
+            else:
+                item.error = ValueError("No tests generated - check crew output")
+        generate_seconds = time.perf_counter() - started
+
+        processed = generated
+        if kwargs.get("language", "python") == "python":
+            processed = self._postprocess(generated)
+        for item in results:
+            if item.file_path in processed:
+                item.output_path = str(Path(output_dir) / f"test_{Path(item.file_path).stem}.py")
+                self._write_tests(item.output_path, processed[item.file_path])
+
+        print(f"⏱ generate: {generate_seconds:.1f} s for {len(results)} files")
+        return results
+
+    def _postprocess(self, tests: dict[str, str]) -> dict[str, str]:
+        """Форматирование и исправления (путь исходника → тесты), если включены"""
+        if self.postprocessor is None or not tests:
+            return tests
+        mark_stage("postprocess")
+        # Модули под тестом сортируются как first-party импорты
+        first_party = {Path(file_path).stem for file_path in tests}
+        processed, self.last_postprocess = self.postprocessor.process(tests, first_party)
+        print(f"⏱ {self.last_postprocess.summary()}")
+        return processed
+
+    @staticmethod
+    def _write_tests(output_path: str, tests_content: str) -> None:
+        # Создаём директорию если нужно
+        Path(output_path).parent.mkdir(parents=True, exist_ok=True)
 
         with open(output_path, 'w', encoding='utf-8') as f:
-            f.write(tests_content.strip())
+            f.write(tests_content.strip() + "\n")
 
         print(f"✅ Tests saved to: {output_path}")
-        return output_path
+
+
+# CrewBase парсит те же YAML для каждого экземпляра — отдаём копию из кэша
+TestingCrew.load_yaml = staticmethod(load_yaml)
 
 
 # Для использования без CrewBase декоратора
@@ -0,0 +1,80 @@
+"""
+Source fingerprinting for near-duplicate detection
+
+The fingerprint is a hash of the normalized AST, so whitespace, comments,
+trailing newlines and (optionally) docstrings do not change it. Code that
+does not parse falls back to a hash of whitespace-normalized text.
+"""
+
+import ast
+import hashlib
+import re
+import sys
+
+# Меняется при изменении нормализации — старые отпечатки перестают совпадать
+FINGERPRINT_VERSION = "1"
+
+
+def _strip_docstrings(tree: ast.AST) -> ast.AST:
+    """Remove docstrings from the module and every class/function body"""
+    for node in ast.walk(tree):
+        if not isinstance(node, (ast.Module, ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)):
+            continue
+        body = node.body
+        if (
+            body
+            and isinstance(body[0], ast.Expr)
+            and isinstance(body[0].value, ast.Constant)
+            and isinstance(body[0].value.value, str)
+        ):
+            # Пустое тело недопустимо — заменяем на pass
+            node.body = body[1:] or [ast.Pass()]
+    return tree
+
+
+def normalize_source(source: str, language: str = "python", strip_docstrings: bool = False) -> str:
+    """
+    Return the canonical form of source code used for fingerprinting.
+
+    Args:
+        source: Source code
+        language: Programming language (only Python is parsed)
+        strip_docstrings: Ignore docstrings as well as comments/formatting
+
+    Returns:
+        AST dump for Python code, whitespace-normalized text otherwise
+    """
+    if language == "python":
+        try:
+            tree = ast.parse(source)
+        except (SyntaxError, ValueError):
+            pass
+        else:
+            if strip_docstrings:
+                tree = _strip_docstrings(tree)
+            # Без include_attributes: номера строк и отступы не влияют
+            return ast.dump(tree, annotate_fields=False)
+
+    lines = [re.sub(r"\s+", " ", line).strip() for line in source.splitlines()]
+    return "\n".join(line for line in lines if line)
+
+
+def fingerprint(source: str, language: str = "python", strip_docstrings: bool = False) -> str:
+    """
+    Compute the fingerprint of source code.
+
+    Args:
+        source: Source code
+        language: Programming language
+        strip_docstrings: Ignore docstrings
+
+    Returns:
+        Hex SHA-256 digest
+    """
+    normalized = normalize_source(source, language, strip_docstrings)
+    # AST dump зависит от версии Python
+    salt = f"v{FINGERPRINT_VERSION}:py{sys.version_info[0]}.{sys.version_info[1]}:{language}"
+    return hashlib.sha256(f"{salt}\n{normalized}".encode("utf-8")).hexdigest()
+
+
+__all__ = ["FINGERPRINT_VERSION", "normalize_source", "fingerprint"]
@@ -0,0 +1,57 @@
+"""
+One forkserver for every worker pool of the process
+
+multiprocessing runs a single forkserver per process, and its preload
+list is fixed when the server starts. The sandbox pool (pytest, coverage)
+and the crew worker pool (CrewAI) both fork from it, so neither pool sets
+the list on its own: each adds its modules here, and the server preloads
+every module added before it started, whichever pool starts it. Modules
+added later are not preloaded (a warning is logged), so a process that
+uses both pools adds both lists before starting either (as the bot does).
+"""
+
+import logging
+import multiprocessing
+import multiprocessing.forkserver
+import threading
+from multiprocessing.context import BaseContext
+from typing import Iterable
+
+logger = logging.getLogger(__name__)
+
+_preload: list[str] = []
+_lock = threading.Lock()
+
+
+def _started() -> bool:
+    # Внутреннее состояние multiprocessing: pid появляется при запуске сервера
+    return getattr(multiprocessing.forkserver._forkserver, "_forkserver_pid", None) is not None
+
+
+def add_preload(modules: Iterable[str]) -> None:
+    """Add modules for the forkserver to import once (kept in order, without duplicates)"""
+    with _lock:
+        new = [m for m in modules if m not in _preload]
+        if not new:
+            return
+        if _started():
+            logger.warning(f"Forkserver already running, not preloaded: {', '.join(new)}")
+        _preload.extend(new)
+        multiprocessing.get_context("forkserver").set_forkserver_preload(list(_preload))
+
+
+def preloaded() -> list[str]:
+    """Modules added so far"""
+    with _lock:
+        return list(_preload)
+
+
+def get_context(preload: Iterable[str] = ()) -> BaseContext:
+    """The forkserver context with preload added (spawn, without preloading, on Windows)"""
+    if "forkserver" not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("spawn")
+    add_preload(preload)
+    return multiprocessing.get_context("forkserver")
+
+
+__all__ = ["add_preload", "get_context", "preloaded"]
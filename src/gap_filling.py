@@ -0,0 +1,389 @@
+"""
+Coverage-guided gap filling for generated test suites
+
+The generated suite is run in the sandbox with coverage (the same report
+CoverageTool returns). Uncovered lines, and on the sys.monitoring
+backend the conditions taken only one way, are mapped back to the
+functions and methods that contain them. The writer then gets a small
+prompt with only those function bodies, the uncovered lines marked, and
+the names of the tests that already exist. It is asked for new tests for
+these gaps only.
+
+New tests are appended to the suite (units.append_tests); the existing
+text is never regenerated. A new test that fails on the original code is
+dropped, and a round that adds no coverage is discarded. Rounds repeat
+until the coverage target is met, there are no gaps left inside
+functions, or the round or token budget is spent.
+
+Configuration (environment):
+    GAP_FILL_TARGET         Coverage percent to reach (default 80)
+    GAP_FILL_MAX_ROUNDS     Writer calls per suite (default 3)
+    GAP_FILL_TOKEN_BUDGET   LLM tokens for all rounds, 0 = unlimited (default 30000)
+    GAP_FILL_MAX_FUNCTIONS  Functions per prompt, largest gaps first (default 5)
+"""
+
+import ast
+import os
+import re
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Optional
+
+try:
+    from .sandbox import SandboxPool, get_pool
+    from .tools.coverage_tool import coverage_report
+    from .units import append_tests
+except ImportError:
+    from sandbox import SandboxPool, get_pool
+    from tools.coverage_tool import coverage_report
+    from units import append_tests
+
+# "FAILED test_x.py::test_name - ..." / "ERROR test_x.py::TestClass::test_m"
+_FAILED = re.compile(r"^(?:FAILED|ERROR) [^\s:]+::([A-Za-z_]\w*)", re.MULTILINE)
+
+# Коды выхода pytest, при которых тесты не выполнялись (ошибка сбора и т.п.)
+_BROKEN_EXIT_CODES = (2, 3, 4)
+
+
+@dataclass
+class GapFillLimits:
+    """When gap filling stops"""
+
+    target: float = 80.0
+    max_rounds: int = 3
+    token_budget: int = 30000
+    max_functions: int = 5
+
+    @classmethod
+    def from_env(cls) -> "GapFillLimits":
+        return cls(
+            target=float(os.getenv("GAP_FILL_TARGET", "80")),
+            max_rounds=int(os.getenv("GAP_FILL_MAX_ROUNDS", "3")),
+            token_budget=int(os.getenv("GAP_FILL_TOKEN_BUDGET", "30000")),
+            max_functions=int(os.getenv("GAP_FILL_MAX_FUNCTIONS", "5"))
+        )
+
+
+@dataclass
+class Gap:
+    """Uncovered code of one function or method"""
+
+    function: str  # "factorial", "Calculator.divide"
+    start: int
+    end: int
+    missing: list[int] = field(default_factory=list)
+    partial: list[int] = field(default_factory=list)
+
+    @property
+    def size(self) -> int:
+        return len(self.missing) + len(self.partial)
+
+    def render(self, lines: list[str]) -> str:
+        """Function source with line numbers, uncovered lines marked"""
+        missing, partial = set(self.missing), set(self.partial)
+        body = []
+        for number in range(self.start, self.end + 1):
+            mark = ""
+            if number in missing:
+                mark = "  # <- NOT COVERED"
+            elif number in partial:
+                mark = "  # <- ONLY ONE OUTCOME TESTED"
+            body.append(f"{number:>4} | {lines[number - 1]}{mark}")
+        return "\n".join(body)
+
+
+@dataclass
+class GapRound:
+    """One writer call"""
+
+    round: int
+    functions: list[str]
+    coverage_before: float
+    coverage_after: Optional[float] = None
+    tokens: int = 0
+    added: list[str] = field(default_factory=list)
+    rejected: list[str] = field(default_factory=list)  # Новые тесты, упавшие на исходном коде
+    error: Optional[str] = None  # Почему раунд отброшен
+
+
+@dataclass
+class GapFillReport:
+    """Outcome of gap filling"""
+
+    target: float
+    initial_coverage: float
+    final_coverage: float
+    tests: str
+    rounds: list[GapRound] = field(default_factory=list)
+    stop_reason: str = ""
+    tokens: int = 0
+    duration: float = 0.0
+
+    @property
+    def added(self) -> list[str]:
+        return [name for r in self.rounds for name in r.added]
+
+    def summary(self) -> str:
+        return (
+            f"Coverage {self.initial_coverage:g}% → {self.final_coverage:g}% "
+            f"(target {self.target:g}%): {len(self.added)} tests added in "
+            f"{len(self.rounds)} rounds, {self.tokens} tokens, {self.stop_reason}"
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            "target": self.target,
+            "initial_coverage": self.initial_coverage,
+            "final_coverage": self.final_coverage,
+            "added": self.added,
+            "rounds": len(self.rounds),
+            "tokens": self.tokens,
+            "stop_reason": self.stop_reason,
+            "duration": round(self.duration, 2)
+        }
+
+
+# ==================== GAPS ====================
+
+def _functions(tree: ast.Module) -> list[tuple[int, int, str]]:
+    """(first line, last line, qualified name) of every function and method"""
+    found = []
+
+    def visit(node: ast.AST, prefix: str) -> None:
+        for child in ast.iter_child_nodes(node):
+            if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                start = min([child.lineno] + [d.lineno for d in child.decorator_list])
+                found.append((start, child.end_lineno, prefix + child.name))
+                visit(child, f"{prefix}{child.name}.")
+            elif isinstance(child, ast.ClassDef):
+                visit(child, f"{prefix}{child.name}.")
+            else:
+                visit(child, prefix)
+
+    visit(tree, "")
+    return found
+
+
+def find_gaps(source: str, missing: list[int], partial: Optional[list[int]] = None) -> list[Gap]:
+    """
+    Map uncovered lines to the functions that contain them.
+
+    A line belongs to the innermost function around it. Lines outside
+    any function (module level, class attributes) are left out: importing
+    the module runs them, tests cannot cover them any better.
+
+    Args:
+        source: Module under test
+        missing: Lines never executed
+        partial: Lines with a condition that went only one way
+
+    Returns:
+        Gaps, largest first
+    """
+    functions = _functions(ast.parse(source))
+    gaps: dict[str, Gap] = {}
+
+    def owner(line: int) -> Optional[Gap]:
+        around = [f for f in functions if f[0] <= line <= f[1]]
+        if not around:
+            return None
+        start, end, name = max(around, key=lambda f: f[0])
+        return gaps.setdefault(name, Gap(name, start, end))
+
+    for line in sorted(set(missing)):
+        gap = owner(line)
+        if gap is not None:
+            gap.missing.append(line)
+    for line in sorted(set(partial or ()) - set(missing)):
+        gap = owner(line)
+        if gap is not None:
+            gap.partial.append(line)
+    return sorted(gaps.values(), key=lambda g: (-g.size, g.start))
+
+
+def _test_names(tests: str) -> list[str]:
+    try:
+        tree = ast.parse(tests)
+    except SyntaxError:
+        return []
+    return [
+        node.name for node in tree.body
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef))
+        and node.name.lower().startswith("test")
+    ]
+
+
+def gap_context(gaps: list[Gap], source: str, tests: str, coverage: float, target: float) -> str:
+    """
+    Prompt section for the writer: only the functions with gaps.
+
+    Args:
+        gaps: Gaps to cover in this round
+        source: Module under test
+        tests: Current test suite (its imports and test names are listed)
+        coverage: Current coverage percent
+        target: Coverage percent to reach
+
+    Returns:
+        Text for the {coverage_gaps} placeholder
+    """
+    lines = source.splitlines()
+    try:
+        imports = [
+            ast.unparse(node) for node in ast.parse(tests).body
+            if isinstance(node, (ast.Import, ast.ImportFrom))
+        ]
+    except SyntaxError:
+        imports = []
+
+    parts = [
+        f"Current coverage: {coverage:g}% (target {target:g}%)",
+        "",
+        "Imports of the existing test module (reuse them):",
+        "\n".join(imports) or "(none)",
+        "",
+        "Existing tests (do not repeat or rename them):",
+        ", ".join(_test_names(tests)) or "(none)",
+        "",
+        "Uncovered code:",
+    ]
+    for gap in gaps:
+        parts += [
+            "",
+            f"### {gap.function} (lines {gap.start}-{gap.end})",
+            "```",
+            gap.render(lines),
+            "```",
+        ]
+    return "\n".join(parts)
+
+
+# ==================== LOOP ====================
+
+@dataclass
+class _Measurement:
+    coverage: float
+    missing: list[int]
+    partial: list[int]
+    failed: set[str]
+    broken: bool
+
+
+def _measure(pool: SandboxPool, source: str, tests: str, module_name: str, test_name: str) -> _Measurement:
+    """Run the suite with coverage; failing top-level tests by name"""
+    result = pool.run_pytest(
+        {module_name: source, test_name: tests}, test_name,
+        coverage_files=[module_name], extra_args=["--tb=no", "-rfE"]
+    )
+    report = coverage_report(result, module_name)
+    return _Measurement(
+        coverage=report["coverage_percent"],
+        missing=report["missing_lines"],
+        partial=report.get("partial_branch_lines", []),
+        failed=set(_FAILED.findall(result.output)),
+        broken=result.timed_out or result.exit_code in _BROKEN_EXIT_CODES or result.exit_code is None
+    )
+
+
+def fill_coverage_gaps(
+    source: str,
+    tests: str,
+    module_name: str,
+    write_tests: Callable[[str], tuple[str, int]],
+    limits: Optional[GapFillLimits] = None,
+    pool: Optional[SandboxPool] = None
+) -> GapFillReport:
+    """
+    Add tests for uncovered code until the target or the budget is reached.
+
+    Args:
+        source: Module under test
+        tests: Generated test module (imports module_name)
+        module_name: File name the tests import the module as (e.g. calculator.py)
+        write_tests: Writer: gap_context() text → (new test code, tokens used)
+        limits: Target and budgets (default: GAP_FILL_* env)
+        pool: Sandbox pool (default: shared pool)
+
+    Returns:
+        GapFillReport; report.tests is the extended suite
+    """
+    started = time.perf_counter()
+    limits = limits or GapFillLimits.from_env()
+    pool = pool or get_pool()
+    test_name = f"test_{Path(module_name).stem}_gaps.py"
+
+    current = _measure(pool, source, tests, module_name, test_name)
+    report = GapFillReport(limits.target, current.coverage, current.coverage, tests)
+    if current.broken:
+        report.stop_reason = "the suite does not run"
+        report.duration = time.perf_counter() - started
+        return report
+    # Упавшие до нас тесты — не повод отбрасывать новые
+    baseline_failed = current.failed
+
+    for number in range(1, limits.max_rounds + 1):
+        if current.coverage >= limits.target:
+            break
+        if limits.token_budget and report.tokens >= limits.token_budget:
+            report.stop_reason = "token budget spent"
+            break
+        gaps = find_gaps(source, current.missing, current.partial)[:limits.max_functions]
+        if not gaps:
+            report.stop_reason = "no uncovered code inside functions"
+            break
+
+        code, tokens = write_tests(gap_context(gaps, source, report.tests, current.coverage, limits.target))
+        report.tokens += tokens
+        step = GapRound(number, [g.function for g in gaps], current.coverage, tokens=tokens)
+        report.rounds.append(step)
+
+        try:
+            candidate, added = append_tests(report.tests, code)
+        except SyntaxError:
+            step.error = "generated code does not parse"
+            continue
+        if not added:
+            step.error = "no new tests"
+            continue
+
+        measured = _measure(pool, source, candidate, module_name, test_name)
+        rejected = (measured.failed - baseline_failed) & set(added)
+        if rejected and not measured.broken:
+            candidate, added = append_tests(report.tests, code, exclude=rejected)
+            step.rejected = sorted(rejected)
+            if not added:
+                step.error = "all new tests fail"
+                continue
+            measured = _measure(pool, source, candidate, module_name, test_name)
+        if measured.broken:
+            step.error = "the extended suite does not run"
+            continue
+        step.coverage_after = measured.coverage
+        if measured.coverage <= current.coverage:
+            step.error = "no coverage gain"
+            continue
+
+        step.added = added
+        report.tests = candidate
+        current = measured
+    else:
+        if current.coverage < limits.target:
+            report.stop_reason = "round limit reached"
+
+    if current.coverage >= limits.target:
+        report.stop_reason = "target reached"
+    report.final_coverage = current.coverage
+    report.duration = time.perf_counter() - started
+    return report
+
+
+__all__ = [
+    "Gap",
+    "GapFillLimits",
+    "GapFillReport",
+    "GapRound",
+    "find_gaps",
+    "gap_context",
+    "fill_coverage_gaps",
+]
@@ -0,0 +1,311 @@
+"""
+Per-agent model selection with fallback chains
+
+Each agent in agents.yaml may set its model (parsed into a ModelSpec by
+config_cache):
+
+    code_analyzer_agent:
+      model: openrouter/google/gemini-2.0-flash-lite-001
+      temperature: 0.1
+      max_tokens: 2048
+      fallback:
+        - groq/llama-3.1-8b-instant
+        - gpt-4o-mini
+
+Candidates whose provider has no API key in the environment are skipped;
+the first remaining one is the primary model. At run time a failing
+model (outage, quota, unknown model) hands the call to the next one and
+is skipped for a cooldown by every agent and job of the process. Agents without a block use the default chain
+(OpenRouter > Groq > OpenAI, the order get_llm() always had).
+
+Models named local/<model> go to a local OpenAI-compatible server
+(LOCAL_LLM_BASE_URL, see local_llm) and are skipped while none is set.
+
+Configuration (environment):
+    LLM_FALLBACK_COOLDOWN  Seconds a failed model is skipped (default 60)
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from typing import Any, Optional
+
+from crewai import LLM
+from crewai.events.types.llm_events import LLMCallType
+from crewai.llms.base_llm import BaseLLM, LLMCallBlockedError, call_stop_override, llm_call_context
+from pydantic import Field
+
+try:
+    from .cancellation import JobCancelled
+    from .config_cache import ModelSpec
+    from .local_llm import get_server
+except ImportError:
+    from cancellation import JobCancelled
+    from config_cache import ModelSpec
+    from local_llm import get_server
+
+logger = logging.getLogger(__name__)
+
+# Провайдер (префикс модели) → переменная с ключом; None — ключ не нужен
+PROVIDER_KEYS = {
+    "openrouter": "OPENROUTER_API_KEY",
+    "groq": "GROQ_API_KEY",
+    "openai": "OPENAI_API_KEY",
+    "anthropic": "ANTHROPIC_API_KEY",
+    "gemini": "GEMINI_API_KEY",
+    "ollama": None,
+    "local": "LOCAL_LLM_BASE_URL",  # Для локального сервера нужен не ключ, а адрес
+}
+
+# Порядок прежнего get_llm(): OpenRouter > GROQ > OpenAI
+DEFAULT_CHAIN = (
+    "openrouter/google/gemini-2.0-flash-001",
+    "groq/llama-3.3-70b-versatile",
+    "gpt-4o-mini",
+)
+
+
+def model_chain(spec: ModelSpec) -> tuple:
+    """Primary model and its fallbacks (the default chain if no model is set)"""
+    if spec.model is None:
+        return DEFAULT_CHAIN
+    return (spec.model, *spec.fallback)
+
+
+def provider_of(model: str) -> str:
+    """Provider prefix of a model name (openai if none)"""
+    prefix = model.split("/", 1)[0] if "/" in model else "openai"
+    return prefix if prefix in PROVIDER_KEYS else "openai"
+
+
+def api_key_for(model: str) -> Optional[str]:
+    env = PROVIDER_KEYS.get(provider_of(model))
+    return os.getenv(env) if env else None
+
+
+def is_available(model: str) -> bool:
+    """True if the model's provider needs no key or has one set"""
+    env = PROVIDER_KEYS.get(provider_of(model))
+    return env is None or bool(os.getenv(env))
+
+
+def available_chain(spec: ModelSpec) -> list[str]:
+    """Models of the spec's chain that can be called with the current env"""
+    return [model for model in model_chain(spec) if is_available(model)]
+
+
+def _build_one(model: str, spec: ModelSpec):
+    if provider_of(model) == "local":
+        return LocalLLM(
+            model=model.split("/", 1)[1],
+            temperature=spec.temperature,
+            max_tokens=spec.max_tokens,
+            server=get_server()
+        )
+    kwargs: dict[str, Any] = {"model": model}
+    if provider_of(model) != "openai":
+        kwargs["api_key"] = api_key_for(model)
+    if spec.temperature is not None:
+        kwargs["temperature"] = spec.temperature
+    if spec.max_tokens is not None:
+        kwargs["max_tokens"] = spec.max_tokens
+    return LLM(**kwargs)
+
+
+def create_llm(spec: Optional[ModelSpec] = None):
+    """
+    LLM for an agent: one model, or a FallbackLLM over the usable chain.
+
+    Args:
+        spec: Agent's model settings (default: the default chain)
+
+    Returns:
+        crewai LLM / FallbackLLM
+
+    Raises:
+        ValueError: No model of the chain has an API key
+    """
+    spec = spec or ModelSpec()
+    models = available_chain(spec)
+    if not models:
+        raise ValueError(
+            "No API key found for any of: " + ", ".join(model_chain(spec))
+            + ". Set one of: OPENROUTER_API_KEY, GROQ_API_KEY, OPENAI_API_KEY"
+        )
+
+    llms = []
+    for model in models:
+        try:
+            llms.append(_build_one(model, spec))
+        except Exception as e:  # Нет SDK провайдера (например, litellm)
+            logger.warning(f"Skipping model {model}: {e}")
+    if not llms:
+        raise ValueError(f"None of the models could be created: {', '.join(models)}")
+    if len(llms) == 1:
+        return llms[0]
+    return FallbackLLM(model=llms[0].model, chain=llms)
+
+
+# ==================== LOCAL SERVER ====================
+
+class LocalLLM(BaseLLM):
+    """
+    Model on a local OpenAI-compatible server (see local_llm).
+
+    Calls share the server's concurrency limit; with LOCAL_LLM_BATCH=1
+    small prompts are batched with other jobs' prompts. Tools are used
+    through the ReAct text format (no native function calling).
+    """
+
+    llm_type: str = "local"
+    server: Any = Field(exclude=True)
+
+    def _params(self) -> dict:
+        params: dict[str, Any] = {}
+        if self.temperature is not None:
+            params["temperature"] = self.temperature
+        if self.max_tokens is not None:
+            params["max_tokens"] = int(self.max_tokens)
+        if self.stop_sequences:
+            params["stop"] = list(self.stop_sequences)
+        return params
+
+    def call(self, messages, tools=None, callbacks=None, available_functions=None,
+             from_task=None, from_agent=None, response_model=None):
+        with llm_call_context():
+            try:
+                self._emit_call_started_event(
+                    messages=messages, tools=tools, callbacks=callbacks,
+                    available_functions=available_functions, from_task=from_task, from_agent=from_agent
+                )
+                formatted = self._format_messages(messages)
+                self._invoke_before_llm_call_hooks(formatted, from_agent)
+
+                text, usage, finish_reason = self.server.complete(self.model, formatted, self._params())
+                self._track_token_usage_internal(usage)
+                text = self._apply_stop_words(text)
+                text = self._invoke_after_llm_call_hooks(formatted, text, from_agent)
+                self._emit_call_completed_event(
+                    response=text, call_type=LLMCallType.LLM_CALL, from_task=from_task,
+                    from_agent=from_agent, messages=formatted, usage=usage, finish_reason=finish_reason
+                )
+                return self._validate_structured_output(text, response_model)
+            except _NEVER_FALL_BACK:
+                raise
+            except Exception as e:
+                self._emit_call_failed_event(error=f"Local LLM call failed: {e}",
+                                             from_task=from_task, from_agent=from_agent)
+                raise
+
+    async def acall(self, messages, *args, **kwargs):
+        return await asyncio.to_thread(self.call, messages, *args, **kwargs)
+
+    def supports_function_calling(self) -> bool:
+        return False
+
+    def supports_stop_words(self) -> bool:
+        return True
+
+    def get_context_window_size(self) -> int:
+        return int(os.getenv("LOCAL_LLM_CONTEXT_WINDOW", "8192"))
+
+
+# ==================== FALLBACK ====================
+
+# Отмена и заблокированный хуком вызов — не сбой модели
+_NEVER_FALL_BACK = (JobCancelled, LLMCallBlockedError, KeyboardInterrupt)
+
+# Имя модели → когда закончится пауза после сбоя. Общее для процесса:
+# crew (и его LLM) создаётся заново на каждое задание
+_failed_until: dict[str, float] = {}
+_failed_lock = threading.Lock()
+
+
+def reset_cooldowns() -> None:
+    """Forget every model failure (all models are tried in chain order again)"""
+    with _failed_lock:
+        _failed_until.clear()
+
+
+class FallbackLLM(BaseLLM):
+    """
+    Calls the first healthy model of a chain, moving on when one fails.
+
+    A model that raised is skipped for LLM_FALLBACK_COOLDOWN seconds by
+    every FallbackLLM of the process (failures are kept by model name, so
+    they outlive the crew of one job); if every model is cooling down the
+    chain is tried in order anyway.
+    Token usage is the sum over the chain.
+    """
+
+    llm_type: str = "fallback"
+    chain: list[Any] = Field(default_factory=list)
+    cooldown: float = Field(default_factory=lambda: float(os.getenv("LLM_FALLBACK_COOLDOWN", "60")))
+
+    def _order(self) -> list:
+        now = time.monotonic()
+        with _failed_lock:
+            healthy = [llm for llm in self.chain if _failed_until.get(llm.model, 0) <= now]
+        return healthy or list(self.chain)
+
+    def _mark_failed(self, llm, error: Exception) -> None:
+        logger.warning(f"Model {llm.model} failed, falling back: {type(error).__name__}: {error}")
+        with _failed_lock:
+            _failed_until[llm.model] = time.monotonic() + self.cooldown
+
+    def call(self, messages, *args, **kwargs):
+        last_error = None
+        for llm in self._order():
+            try:
+                with call_stop_override(llm, self.stop_sequences or None):
+                    return llm.call(messages, *args, **kwargs)
+            except _NEVER_FALL_BACK:
+                raise
+            except Exception as e:
+                self._mark_failed(llm, e)
+                last_error = e
+        raise last_error
+
+    async def acall(self, messages, *args, **kwargs):
+        last_error = None
+        for llm in self._order():
+            try:
+                with call_stop_override(llm, self.stop_sequences or None):
+                    return await llm.acall(messages, *args, **kwargs)
+            except _NEVER_FALL_BACK:
+                raise
+            except Exception as e:
+                self._mark_failed(llm, e)
+                last_error = e
+        raise last_error
+
+    def supports_function_calling(self) -> bool:
+        return all(getattr(llm, "supports_function_calling", lambda: False)() for llm in self.chain)
+
+    def supports_stop_words(self) -> bool:
+        return self.chain[0].supports_stop_words()
+
+    def get_context_window_size(self) -> int:
+        # Промпт должен поместиться в любую модель цепочки
+        return min(llm.get_context_window_size() for llm in self.chain)
+
+    def get_token_usage_summary(self):
+        total = self.chain[0].get_token_usage_summary()
+        for llm in self.chain[1:]:
+            total.add_usage_metrics(llm.get_token_usage_summary())
+        return total
+
+
+__all__ = [
+    "DEFAULT_CHAIN",
+    "FallbackLLM",
+    "LocalLLM",
+    "available_chain",
+    "create_llm",
+    "is_available",
+    "model_chain",
+    "provider_of",
+    "reset_cooldowns",
+]
@@ -0,0 +1,283 @@
+"""
+Client for a local OpenAI-compatible inference server
+
+Used by models named local/<model> in agents.yaml (see llm_config.LocalLLM),
+for example a vLLM, llama.cpp or TGI server running next to the bot. The
+server has its own concurrency limit, shared by every agent and job in the
+process, and none of the hosted providers' rate limits. When several
+processes use the server (crew worker processes), share_concurrency()
+splits the limit between them.
+
+Requests go to /chat/completions. With LOCAL_LLM_BATCH=1, small prompts
+that arrive at about the same time with the same sampling parameters are
+grouped into one /completions request with a list of prompts, which
+batching servers (vLLM, llama.cpp) run together. Those prompts are
+rendered with LOCAL_LLM_CHAT_TEMPLATE, which must match the served model.
+
+Configuration (environment):
+    LOCAL_LLM_BASE_URL         Server URL including /v1 (provider is off if unset)
+    LOCAL_LLM_API_KEY          Bearer token, if the server wants one
+    LOCAL_LLM_CONCURRENCY      Requests in flight to the server, across worker processes (default 4)
+    LOCAL_LLM_TIMEOUT          Seconds per request (default 300)
+    LOCAL_LLM_BATCH            1 = group small prompts into batches (default 0)
+    LOCAL_LLM_BATCH_SIZE       Prompts per batch (default 8)
+    LOCAL_LLM_BATCH_WINDOW_MS  How long the first prompt waits for others (default 20)
+    LOCAL_LLM_BATCH_MAX_CHARS  Longer prompts are sent alone (default 8000)
+    LOCAL_LLM_CHAT_TEMPLATE    chatml | llama3 | plain (default chatml)
+    LOCAL_LLM_CONTEXT_WINDOW   Context size of the served model in tokens (default 8192)
+"""
+
+import dataclasses
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Optional
+
+# Шаблоны для /completions: (сообщение, начало ответа ассистента, стоп)
+CHAT_TEMPLATES = {
+    "chatml": ("<|im_start|>{role}\n{content}<|im_end|>\n", "<|im_start|>assistant\n", "<|im_end|>"),
+    "llama3": (
+        "<|start_header_id|>{role}<|end_header_id|>\n\n{content}<|eot_id|>",
+        "<|start_header_id|>assistant<|end_header_id|>\n\n",
+        "<|eot_id|>",
+    ),
+    "plain": ("{role}: {content}\n\n", "assistant: ", None),
+}
+
+
+class LocalLLMError(RuntimeError):
+    """The local server failed or returned an unexpected response"""
+
+
+@dataclass(frozen=True)
+class LocalServerConfig:
+    """Connection and batching settings of one local server"""
+
+    base_url: str
+    api_key: Optional[str] = None
+    concurrency: int = 4
+    timeout: float = 300.0
+    batch: bool = False
+    batch_size: int = 8
+    batch_window: float = 0.02
+    batch_max_chars: int = 8000
+    chat_template: str = "chatml"
+
+    @classmethod
+    def from_env(cls) -> Optional["LocalServerConfig"]:
+        """Settings from LOCAL_LLM_* variables (None if no server is configured)"""
+        base_url = os.getenv("LOCAL_LLM_BASE_URL")
+        if not base_url:
+            return None
+        template = os.getenv("LOCAL_LLM_CHAT_TEMPLATE", "chatml")
+        if template not in CHAT_TEMPLATES:
+            raise ValueError(f"LOCAL_LLM_CHAT_TEMPLATE must be one of: {', '.join(CHAT_TEMPLATES)}")
+        return cls(
+            base_url=base_url.rstrip("/"),
+            api_key=os.getenv("LOCAL_LLM_API_KEY") or None,
+            concurrency=int(os.getenv("LOCAL_LLM_CONCURRENCY", "4")),
+            timeout=float(os.getenv("LOCAL_LLM_TIMEOUT", "300")),
+            batch=os.getenv("LOCAL_LLM_BATCH", "0") == "1",
+            batch_size=int(os.getenv("LOCAL_LLM_BATCH_SIZE", "8")),
+            batch_window=float(os.getenv("LOCAL_LLM_BATCH_WINDOW_MS", "20")) / 1000,
+            batch_max_chars=int(os.getenv("LOCAL_LLM_BATCH_MAX_CHARS", "8000")),
+            chat_template=template,
+        )
+
+
+def render_prompt(messages: list, template: str = "chatml") -> str:
+    """Chat messages as one completion prompt ending where the answer starts"""
+    message_format, assistant_start, _ = CHAT_TEMPLATES[template]
+    parts = [message_format.format(role=m["role"], content=m["content"]) for m in messages]
+    return "".join(parts) + assistant_start
+
+
+@dataclass
+class _Batch:
+    params: dict
+    items: list = field(default_factory=list)  # (prompt, Future)
+    closed: bool = False
+
+
+class LocalServer:
+    """
+    Requests to one server: a concurrency limit, optional batching, and
+    request counters.
+
+    Thread-safe: crew runs call it from worker threads.
+    """
+
+    def __init__(self, config: LocalServerConfig):
+        self.config = config
+        self._slots = threading.BoundedSemaphore(config.concurrency)
+        self._lock = threading.Lock()
+        self._open: dict[str, _Batch] = {}
+        self.requests = 0  # HTTP-запросы к серверу
+        self.prompts = 0   # Промпты, отправленные в пакетах
+        self.batches = 0
+
+    def _post(self, path: str, payload: dict) -> dict:
+        headers = {"Content-Type": "application/json"}
+        if self.config.api_key:
+            headers["Authorization"] = f"Bearer {self.config.api_key}"
+        request = urllib.request.Request(
+            self.config.base_url + path, data=json.dumps(payload).encode("utf-8"), headers=headers
+        )
+        with self._slots:
+            with self._lock:
+                self.requests += 1
+            try:
+                with urllib.request.urlopen(request, timeout=self.config.timeout) as response:
+                    return json.loads(response.read())
+            except urllib.error.HTTPError as e:
+                body = e.read().decode("utf-8", "replace")[:500]
+                raise LocalLLMError(f"{path}: HTTP {e.code}: {body}") from e
+            except (urllib.error.URLError, OSError, ValueError) as e:
+                raise LocalLLMError(f"{path}: {e}") from e
+
+    def chat(self, model: str, messages: list, params: dict) -> tuple[str, dict, Optional[str]]:
+        """
+        One chat completion.
+
+        Returns:
+            (text, usage, finish_reason)
+        """
+        data = self._post("/chat/completions", {"model": model, "messages": messages, **params})
+        try:
+            choice = data["choices"][0]
+            return choice["message"]["content"] or "", data.get("usage") or {}, choice.get("finish_reason")
+        except (KeyError, IndexError, TypeError) as e:
+            raise LocalLLMError(f"/chat/completions: unexpected response: {str(data)[:200]}") from e
+
+    def complete(self, model: str, messages: list, params: dict) -> tuple[str, dict, Optional[str]]:
+        """
+        Chat completion that may be batched with other concurrent prompts.
+
+        Falls back to chat() when batching is off or the prompt is large.
+
+        Returns:
+            (text, usage, finish_reason); usage is this prompt's share of the batch
+        """
+        prompt = render_prompt(messages, self.config.chat_template)
+        if not self.config.batch or len(prompt) > self.config.batch_max_chars:
+            return self.chat(model, messages, params)
+
+        stop = CHAT_TEMPLATES[self.config.chat_template][2]
+        params = {"model": model, **params}
+        if stop:
+            params["stop"] = [*params.get("stop", []), stop]
+        key = json.dumps(params, sort_keys=True)
+        future: Future = Future()
+
+        with self._lock:
+            batch = self._open.get(key)
+            leader = batch is None
+            if leader:
+                batch = self._open[key] = _Batch(params)
+            batch.items.append((prompt, future))
+            full = len(batch.items) >= self.config.batch_size
+            if full:
+                self._close(key, batch)
+
+        if full:
+            self._send(batch)
+        elif leader:
+            # Первый промпт ждёт остальных, затем отправляет что набралось
+            time.sleep(self.config.batch_window)
+            with self._lock:
+                send = not batch.closed
+                if send:
+                    self._close(key, batch)
+            if send:
+                self._send(batch)
+        return future.result()
+
+    def _close(self, key: str, batch: _Batch) -> None:
+        """Under self._lock: no more prompts join this batch"""
+        batch.closed = True
+        if self._open.get(key) is batch:
+            del self._open[key]
+
+    def _send(self, batch: _Batch) -> None:
+        prompts = [prompt for prompt, _ in batch.items]
+        try:
+            data = self._post("/completions", {**batch.params, "prompt": prompts})
+            choices = {choice["index"]: choice for choice in data["choices"]}
+            texts = [choices[i]["text"] for i in range(len(prompts))]
+        except Exception as e:
+            error = e if isinstance(e, LocalLLMError) else LocalLLMError(f"/completions: bad batch response: {e}")
+            for _, future in batch.items:
+                future.set_exception(error)
+            return
+
+        with self._lock:
+            self.batches += 1
+            self.prompts += len(prompts)
+        usage = data.get("usage") or {}
+        prompt_chars = sum(len(p) for p in prompts) or 1
+        text_chars = sum(len(t) for t in texts) or 1
+        for i, (prompt, future) in enumerate(batch.items):
+            # Сервер отдаёт usage на весь пакет — делим пропорционально длине
+            share = {
+                "prompt_tokens": round(usage.get("prompt_tokens", 0) * len(prompt) / prompt_chars),
+                "completion_tokens": round(usage.get("completion_tokens", 0) * len(texts[i]) / text_chars),
+            }
+            share["total_tokens"] = share["prompt_tokens"] + share["completion_tokens"]
+            future.set_result((texts[i], share, choices[i].get("finish_reason")))
+
+    def stats(self) -> dict:
+        """HTTP requests made, and prompts sent in batches"""
+        with self._lock:
+            return {"requests": self.requests, "batches": self.batches, "batched_prompts": self.prompts}
+
+
+_servers: dict[LocalServerConfig, LocalServer] = {}
+_servers_lock = threading.Lock()
+_processes = 1  # Процессы, между которыми делится concurrency
+
+
+def share_concurrency(processes: int) -> None:
+    """
+    Split each server's concurrency limit between processes, so that
+    processes that all call the server (crew workers) stay within it
+    together. Each process gets at least one request in flight.
+
+    Call before the first get_server() of the process.
+    """
+    global _processes
+    _processes = max(1, processes)
+
+
+def get_server(config: Optional[LocalServerConfig] = None) -> LocalServer:
+    """
+    Shared LocalServer for config (default: from env), so all agents of
+    the process respect one concurrency limit (this process's share of
+    it, see share_concurrency()).
+
+    Raises:
+        ValueError: No server is configured
+    """
+    config = config or LocalServerConfig.from_env()
+    if config is None:
+        raise ValueError("LOCAL_LLM_BASE_URL is not set")
+    with _servers_lock:
+        if config not in _servers:
+            share = max(1, config.concurrency // _processes)
+            _servers[config] = LocalServer(dataclasses.replace(config, concurrency=share))
+        return _servers[config]
+
+
+__all__ = [
+    "CHAT_TEMPLATES",
+    "LocalLLMError",
+    "LocalServer",
+    "LocalServerConfig",
+    "get_server",
+    "render_prompt",
+    "share_concurrency",
+]
@@ -6,6 +6,9 @@ Testing Agent - Entry Point
     python main.py <file_path>                    # Тестировать файл
     python main.py <file_path> --output tests/    # С указанием выхода
     python main.py --example                      # Запустить на примере
+    python main.py --watch src/                   # Перегенерировать тесты при сохранении
+    python main.py <file_path> --rerun validate   # Только стадия валидации (по чекпойнтам)
+    python main.py <file_path> --fill-gaps        # Дописать тесты до цели покрытия
 
 Примеры:
     python main.py src/calculator.py
@@ -30,7 +33,15 @@ Examples:
   %(prog)s src/calculator.py
   %(prog)s src/utils.py --output tests/test_utils.py
   %(prog)s src/api.py --type integration --framework pytest
+  %(prog)s src/big_module.py --timeout 600
+  %(prog)s src/calculator.py --mutation
+  %(prog)s src/calculator.py --format
+  %(prog)s src/calculator.py --profile
+  %(prog)s src/calculator.py --rerun validate
+  %(prog)s src/calculator.py --feedback "more edge cases"
+  %(prog)s src/calculator.py --fill-gaps
   %(prog)s --example
+  %(prog)s --watch src/
         """
     )
 
@@ -42,7 +53,8 @@ Examples:
 
     parser.add_argument(
         "--output", "-o",
-        help="Output path for generated tests (default: tests/test_<filename>.py)"
+        help="Output path for generated tests (default: tests/test_<filename>.py; "
+             "with --watch: output directory)"
     )
 
     parser.add_argument(
@@ -66,6 +78,73 @@ Examples:
         help="Programming language (default: python)"
     )
 
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=None,
+        metavar="SECONDS",
+        help="Abort the whole run after this many seconds (default: no limit)"
+    )
+
+    parser.add_argument(
+        "--memory",
+        choices=["off", "buffer", "sqlite", "crewai"],
+        default=None,
+        help="Crew memory backend (default: $CREW_MEMORY or off)"
+    )
+
+    parser.add_argument(
+        "--mutation",
+        action="store_true",
+        help="Measure the generated tests with mutation testing (python + pytest only)"
+    )
+
+    parser.add_argument(
+        "--format",
+        action="store_true",
+        help="Format the tests and fix unused/unsorted imports before saving "
+             "(python only; default: $POSTPROCESS_TESTS)"
+    )
+
+    parser.add_argument(
+        "--watch",
+        metavar="PATH",
+        help="Watch a source tree and regenerate tests for modules whose code "
+             "changes on save (Linux; see $WATCH_DEBOUNCE, $WATCH_CONCURRENCY)"
+    )
+
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const="profile.folded",
+        metavar="FILE",
+        help="Sample the run: per-stage CPU/wall-clock times and top functions, "
+             "folded stacks for flame graphs in FILE (default: profile.folded)"
+    )
+
+    parser.add_argument(
+        "--rerun",
+        choices=["analyze", "tests", "validate"],
+        default=None,
+        help="Regenerate this stage and the ones after it, reusing checkpointed "
+             "earlier stages (see $CHECKPOINT_DIR)"
+    )
+
+    parser.add_argument(
+        "--feedback",
+        metavar="TEXT",
+        help='Rewrite the previous tests with this request, e.g. "more edge cases" '
+             "(implies --rerun tests)"
+    )
+
+    parser.add_argument(
+        "--fill-gaps",
+        action="store_true",
+        help="Run the generated tests with coverage and ask for tests of the "
+             "uncovered functions only, appending them until $GAP_FILL_TARGET "
+             "or the budget is reached (python + pytest)"
+    )
+
     parser.add_argument(
         "--example",
         action="store_true",
@@ -226,10 +305,65 @@ def is_prime(n: int) -> bool:
     return str(example_path)
 
 
+def watch(args) -> None:
+    """Режим --watch: один набор тёплых TestingCrew на все сохранения"""
+    if not Path(args.watch).is_dir():
+        print(f"❌ Error: Directory not found: {args.watch}")
+        sys.exit(1)
+
+    from cache import TestCache, UnitTestCache
+    from crew import TestingCrew
+    from postprocess import PostProcessor
+    from symbol_index import SymbolIndex
+    from watch import Watcher
+
+    test_cache = TestCache.from_env()
+    unit_cache = UnitTestCache.from_env()
+    symbol_index = SymbolIndex.for_file(str(Path(args.watch) / "_"))
+
+    def crew_factory():
+        return TestingCrew(
+            test_cache=test_cache,
+            unit_cache=unit_cache,
+            memory=args.memory,
+            symbol_index=symbol_index,
+            postprocessor=PostProcessor() if args.format else None
+        )
+
+    watcher = Watcher(
+        args.watch,
+        crew_factory,
+        language=args.language,
+        output_dir=args.output or "tests",
+        test_type=args.type,
+        test_framework=args.framework,
+        timeout=args.timeout
+    )
+    try:
+        directories = watcher.start()
+    except RuntimeError as e:
+        print(f"❌ Error: {e}")
+        sys.exit(1)
+
+    print(f"👀 Watching {args.watch} ({directories} directories, "
+          f"concurrency {watcher.concurrency}) - Ctrl+C to stop")
+    try:
+        watcher.serve_forever()
+    except KeyboardInterrupt:
+        print("\n🛑 Stopped")
+    finally:
+        watcher.close()
+        print(f"📊 {watcher.stats}")
+
+
 def main():
     """Main entry point"""
     args = parse_args()
 
+    if args.watch:
+        watch(args)
+        return
+
     # Если запрос примера
     if args.example:
         file_path = create_example_file()
@@ -245,6 +379,25 @@ def main():
         print(f"❌ Error: File not found: {file_path}")
         sys.exit(1)
 
+    if not args.profile:
+        generate(args, file_path)
+        return
+
+    # Сэмплирующий профилировщик: импорты и разбор YAML попадают в стадию startup
+    from profiling import SamplingProfiler
+
+    profiler = SamplingProfiler().start()
+    try:
+        profiler.call(generate, args, file_path, stage="startup")
+    finally:
+        profile = profiler.stop()
+        profile.write_folded(args.profile)
+        print("\n" + profile.summary(top_n=15))
+        print(f"\n🔥 Folded stacks saved to: {args.profile} (flamegraph.pl, speedscope)")
+
+
+def generate(args, file_path: str) -> None:
+    """Генерация тестов для одного файла"""
     print("=" * 60)
     print("🧪 Testing Agent - AI-Powered Test Generation")
     print("=" * 60)
@@ -252,12 +405,29 @@ def main():
     print(f"🔧 Type: {args.type}")
     print(f"📦 Framework: {args.framework}")
     print(f"💻 Language: {args.language}")
+    if args.rerun or args.feedback:
+        print(f"🔁 Rerun: {args.rerun or 'tests'}" + (f" ({args.feedback})" if args.feedback else ""))
+    if args.timeout:
+        print(f"⏱️  Timeout: {args.timeout:g}s")
     print("=" * 60)
 
+    from cancellation import DeadlineExceeded, JobCancelled
+
     try:
+        from cache import TestCache, UnitTestCache
+        from checkpoints import CheckpointStore
         from crew import TestingCrew
-
-        crew = TestingCrew()
+        from postprocess import PostProcessor
+        from symbol_index import SymbolIndex
+
+        crew = TestingCrew(
+            test_cache=TestCache.from_env(),
+            unit_cache=UnitTestCache.from_env(),
+            memory=args.memory,
+            symbol_index=SymbolIndex.for_file(file_path),
+            postprocessor=PostProcessor() if args.format else None,
+            checkpoints=CheckpointStore.from_env()
+        )
 
         print("\n🚀 Starting test generation...\n")
 
@@ -266,7 +436,11 @@ def main():
             output_path=args.output,
             test_type=args.type,
             test_framework=args.framework,
-            language=args.language
+            language=args.language,
+            timeout=args.timeout,
+            rerun=args.rerun,
+            feedback=args.feedback,
+            fill_gaps=args.fill_gaps
         )
 
         print("\n" + "=" * 60)
@@ -274,12 +448,51 @@ def main():
         print(f"📁 Tests saved to: {output_path}")
         print("=" * 60)
 
+        result = crew.last_result or {}
+        if result.get("resumed"):
+            print(f"♻️  Reused checkpointed stages: {', '.join(result['resumed'])}")
+        if result.get("validation"):
+            from reports import ValidationReport
+
+            note = ValidationReport.model_validate(result["validation"]).note()
+            if note:
+                print(f"🔎 Validation: {note}")
+        if crew.last_gap_fill is not None:
+            for step in crew.last_gap_fill.rounds:
+                status = step.error or f"+{len(step.added)} tests"
+                print(f"   round {step.round}: {', '.join(step.functions)} → {status}")
+
+        # Измеренное качество тестов вместо оценки LLM
+        if args.mutation and args.language == "python" and args.framework == "pytest":
+            from mutation import run_mutation_gate
+            from profiling import mark_stage
+
+            mark_stage("mutation")
+
+            print("\n🧬 Running mutation testing...")
+            report = run_mutation_gate(
+                source=Path(file_path).read_text(encoding="utf-8"),
+                tests=Path(output_path).read_text(encoding="utf-8"),
+                module_name=Path(file_path).name
+            )
+            print(f"🧬 {report.summary()} in {report.duration:.1f}s")
+            for survivor in report.survivors[:10]:
+                print(f"   survived: {survivor}")
+
         # Показываем команду для запуска тестов
         if args.framework == "pytest":
             print(f"\n💡 Run tests with: pytest {output_path} -v")
         elif args.framework == "unittest":
             print(f"\n💡 Run tests with: python -m unittest {output_path}")
 
+    except JobCancelled as e:
+        if isinstance(e, DeadlineExceeded):
+            print(f"\n⏱️  Timed out after {args.timeout:g}s - run aborted")
+        else:
+            print(f"\n🛑 Run cancelled: {e.reason}")
+        if e.token_usage:
+            print(f"📊 Partial token usage: {e.token_usage}")
+        sys.exit(2)
     except ImportError as e:
         print(f"❌ Import error: {e}")
         print("\n💡 Install dependencies:")
@@ -0,0 +1,211 @@
+"""
+Lightweight crew memory backends
+
+CrewAI's built-in memory (memory=True) embeds every task output and keeps
+a vector store on disk. The three tasks already pass results to each other
+via context=, so by default no memory is used. These backends keep a few
+notes from earlier runs on the same key (file or chat) and hand them to
+the next run as plain text - no embeddings, no extra LLM calls.
+
+Backends (CREW_MEMORY):
+    off     No memory (default)
+    buffer  In-process short-term buffer, lost on restart
+    sqlite  Persistent local store (CREW_MEMORY_PATH)
+    crewai  CrewAI's embedding-backed memory (memory=True)
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional
+
+try:
+    from .reports import AnalysisReport, ValidationReport
+except ImportError:
+    from reports import AnalysisReport, ValidationReport
+
+DEFAULT_MEMORY_PATH = ".testing_agent/memory.db"
+
+
+class NoMemory:
+    """Memory disabled: nothing is stored or recalled"""
+
+    name = "off"
+    # Включать ли встроенную память CrewAI (Crew(memory=...))
+    crewai_memory = False
+
+    def __init__(self, max_items: int = 5, max_chars: int = 2000):
+        self.max_items = max_items
+        self.max_chars = max_chars
+
+    def remember(self, key: str, text: str) -> None:
+        """Store a note for key"""
+
+    def recall(self, key: str) -> list[str]:
+        """Return recent notes for key, oldest first"""
+        return []
+
+    def reset(self) -> None:
+        """Forget everything"""
+
+    def remember_run(
+        self,
+        key: str,
+        tasks_output: list[str],
+        note_chars: int = 400,
+        reports: Optional[dict] = None
+    ) -> None:
+        """
+        Store short notes from a finished run (analysis and validation).
+
+        Parsed reports (run() result keys analysis/validation) give compact
+        notes; without them the start of the raw task output is kept.
+        """
+        labels = {0: ("analysis", AnalysisReport), 2: ("validation", ValidationReport)}
+        for index, (label, model) in labels.items():
+            report = (reports or {}).get(label)
+            if report:
+                note = model.model_validate(report).note()
+                if note:
+                    self.remember(key, f"{label}: {note[:note_chars]}")
+                    continue
+            if index < len(tasks_output) and tasks_output[index]:
+                text = " ".join(tasks_output[index].split())
+                self.remember(key, f"{label}: {text[:note_chars]}")
+
+    def context_for(self, key: str) -> str:
+        """Render recalled notes as a prompt section ('' if none)"""
+        notes = self.recall(key) if key else []
+        if not notes:
+            return ""
+
+        text = "\n".join(f"- {note}" for note in notes)
+        if len(text) > self.max_chars:
+            text = text[-self.max_chars:]
+        return f"Notes from previous runs on this code:\n{text}"
+
+
+class BufferMemory(NoMemory):
+    """In-process short-term buffer: last max_items notes per key"""
+
+    name = "buffer"
+
+    def __init__(self, max_items: int = 5, max_chars: int = 2000):
+        super().__init__(max_items, max_chars)
+        self._notes: dict[str, deque] = {}
+        self._lock = threading.Lock()
+
+    def remember(self, key: str, text: str) -> None:
+        with self._lock:
+            self._notes.setdefault(key, deque(maxlen=self.max_items)).append(text)
+
+    def recall(self, key: str) -> list[str]:
+        with self._lock:
+            return list(self._notes.get(key, ()))
+
+    def reset(self) -> None:
+        with self._lock:
+            self._notes.clear()
+
+
+class SqliteMemory(NoMemory):
+    """Persistent local store (one SQLite file, no embeddings)"""
+
+    name = "sqlite"
+
+    def __init__(self, path: str = DEFAULT_MEMORY_PATH, max_items: int = 5, max_chars: int = 2000):
+        super().__init__(max_items, max_chars)
+        self.path = path
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS notes ("
+                "key TEXT NOT NULL, created_at REAL NOT NULL, text TEXT NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS notes_key ON notes (key, created_at)")
+
+    @contextmanager
+    def _connect(self):
+        """Connection in a transaction, closed afterwards"""
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def remember(self, key: str, text: str) -> None:
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT INTO notes (key, created_at, text) VALUES (?, ?, ?)",
+                (key, time.time(), text)
+            )
+            # Храним только последние max_items заметок на ключ
+            conn.execute(
+                "DELETE FROM notes WHERE key = ? AND rowid NOT IN ("
+                "SELECT rowid FROM notes WHERE key = ? ORDER BY created_at DESC LIMIT ?)",
+                (key, key, self.max_items)
+            )
+
+    def recall(self, key: str) -> list[str]:
+        with self._lock, self._connect() as conn:
+            rows = conn.execute(
+                "SELECT text FROM notes WHERE key = ? ORDER BY created_at DESC LIMIT ?",
+                (key, self.max_items)
+            ).fetchall()
+        return [row[0] for row in reversed(rows)]
+
+    def reset(self) -> None:
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM notes")
+
+
+class CrewAIMemory(NoMemory):
+    """CrewAI's own embedding-backed memory (the previous default)"""
+
+    name = "crewai"
+    crewai_memory = True
+
+
+MEMORY_BACKENDS = {
+    "off": NoMemory,
+    "buffer": BufferMemory,
+    "sqlite": SqliteMemory,
+    "crewai": CrewAIMemory,
+}
+
+
+def create_memory(backend: Optional[str] = None, path: Optional[str] = None) -> NoMemory:
+    """
+    Create a memory backend.
+
+    Args:
+        backend: off | buffer | sqlite | crewai (default: CREW_MEMORY or off)
+        path: SQLite file for the sqlite backend (default: CREW_MEMORY_PATH)
+
+    Returns:
+        Memory backend instance
+    """
+    backend = backend or os.getenv("CREW_MEMORY", "off")
+    if backend not in MEMORY_BACKENDS:
+        raise ValueError(
+            f"Unknown memory backend: {backend}. Use one of: {', '.join(MEMORY_BACKENDS)}"
+        )
+    if backend == "sqlite":
+        return SqliteMemory(path or os.getenv("CREW_MEMORY_PATH", DEFAULT_MEMORY_PATH))
+    return MEMORY_BACKENDS[backend]()
+
+
+__all__ = [
+    "NoMemory",
+    "BufferMemory",
+    "SqliteMemory",
+    "CrewAIMemory",
+    "MEMORY_BACKENDS",
+    "create_memory",
+]
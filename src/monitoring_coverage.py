@@ -0,0 +1,257 @@
+"""
+Low-overhead line and branch coverage on sys.monitoring (PEP 669)
+
+On Python 3.12+ the interpreter calls a tool back on LINE and BRANCH
+events, and a callback returning sys.monitoring.DISABLE switches that
+event off for that instruction. Every line is therefore recorded once and
+then runs at full speed, instead of paying a trace function call on each
+executed line as the classic sys.settrace tracer of coverage.py does.
+
+Only code objects of the measured files are instrumented: a PY_START
+hook turns on local LINE/BRANCH events when such a code object first
+runs and disables itself everywhere else.
+
+Statements are computed from the AST so that reports match coverage.py:
+first lines of statements, except-clauses, decorators and case patterns,
+without docstrings and global/nonlocal declarations.
+"""
+
+import ast
+import os
+import sys
+from typing import Iterable, Optional
+
+monitoring = getattr(sys, "monitoring", None)
+
+# Python 3.14 разделяет BRANCH на две стороны: каждую можно отключить отдельно
+_SPLIT_BRANCHES = monitoring is not None and hasattr(monitoring.events, "BRANCH_LEFT")
+
+
+def available() -> bool:
+    """True if sys.monitoring exists and the coverage tool slot is free"""
+    return monitoring is not None and monitoring.get_tool(monitoring.COVERAGE_ID) is None
+
+
+# ==================== STATIC ANALYSIS ====================
+
+def _docstring_nodes(tree: ast.Module) -> list[ast.stmt]:
+    found = []
+    for node in ast.walk(tree):
+        if not isinstance(node, (ast.Module, ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)):
+            continue
+        first = node.body[0] if node.body else None
+        if isinstance(first, ast.Expr) and isinstance(first.value, ast.Constant) \
+                and isinstance(first.value.value, str):
+            found.append(first)
+    return found
+
+
+def analyze_source(source: str) -> tuple[set[int], dict[int, int]]:
+    """
+    Statements of a module and the statement each source line belongs to.
+
+    Args:
+        source: Module source code
+
+    Returns:
+        (statement lines, line → statement line); a continuation line of a
+        multi-line statement maps to its first line
+    """
+    tree = ast.parse(source)
+    docstrings = {id(node) for node in _docstring_nodes(tree)}
+
+    statements: set[int] = set()
+    spans: list[tuple[int, int, int]] = []  # (first, last, statement line)
+    for node in ast.walk(tree):
+        if isinstance(node, ast.stmt):
+            if id(node) in docstrings:
+                spans.append((node.lineno, node.end_lineno, 0))
+                continue
+            if isinstance(node, (ast.Global, ast.Nonlocal)):
+                continue
+            statements.add(node.lineno)
+            spans.append((node.lineno, node.end_lineno, node.lineno))
+            for decorator in getattr(node, "decorator_list", ()):
+                statements.add(decorator.lineno)
+                spans.append((decorator.lineno, decorator.end_lineno, decorator.lineno))
+        elif isinstance(node, ast.ExceptHandler):
+            statements.add(node.lineno)
+            spans.append((node.lineno, node.end_lineno, node.lineno))
+        elif isinstance(node, ast.match_case):
+            line = node.pattern.lineno
+            statements.add(line)
+            spans.append((line, node.body[-1].end_lineno, line))
+
+    # Внешние узлы первыми: строку забирает самый вложенный оператор
+    line_map: dict[int, int] = {}
+    for first, last, line in sorted(spans, key=lambda s: s[0] - s[1]):
+        for number in range(first, last + 1):
+            line_map[number] = line
+    return statements, {k: v for k, v in line_map.items() if v}
+
+
+def _offset_lines(code) -> dict[int, int]:
+    """Bytecode offset → source line for one code object"""
+    lines = {}
+    for start, end, line in code.co_lines():
+        if line is not None:
+            for offset in range(start, end, 2):
+                lines[offset] = line
+    return lines
+
+
+# ==================== COLLECTOR ====================
+
+class MonitoringCoverage:
+    """
+    Line and branch coverage of selected files via sys.monitoring.
+
+    Args:
+        paths: Source files to measure (other code is never instrumented)
+
+    Example:
+        collector = MonitoringCoverage(["calculator.py"])
+        collector.start()
+        ...  # run the tests
+        collector.stop()
+        statements, missing = collector.analysis("calculator.py")
+    """
+
+    TOOL_ID = monitoring.COVERAGE_ID if monitoring else 1
+
+    def __init__(self, paths: Iterable[str]):
+        if monitoring is None:
+            raise RuntimeError("sys.monitoring requires Python 3.12+")
+        self.paths = {os.path.realpath(p) for p in paths}
+        self._measured: dict[str, bool] = {}  # co_filename → измеряется ли
+        self._instrumented: list = []
+        # Файл → выполненные строки; (код, смещение) → смещения переходов
+        self._lines: dict[str, set[int]] = {p: set() for p in self.paths}
+        self._branches: dict[tuple, set[int]] = {}
+        self._running = False
+
+    # ---------- callbacks ----------
+
+    def _is_measured(self, filename: str) -> bool:
+        measured = self._measured.get(filename)
+        if measured is None:
+            measured = self._measured[filename] = os.path.realpath(filename) in self.paths
+        return measured
+
+    def _on_start(self, code, instruction_offset):
+        if self._is_measured(code.co_filename):
+            events = monitoring.events
+            branch = (events.BRANCH_LEFT | events.BRANCH_RIGHT) if _SPLIT_BRANCHES else events.BRANCH
+            monitoring.set_local_events(self.TOOL_ID, code, events.LINE | branch)
+            self._instrumented.append(code)
+        return monitoring.DISABLE
+
+    def _on_line(self, code, line_number):
+        self._lines[os.path.realpath(code.co_filename)].add(line_number)
+        return monitoring.DISABLE
+
+    def _on_branch(self, code, instruction_offset, destination_offset):
+        targets = self._branches.setdefault((code, instruction_offset), set())
+        targets.add(destination_offset)
+        # До 3.14 событие одно на обе стороны: отключаем, когда видели обе
+        if _SPLIT_BRANCHES or len(targets) > 1:
+            return monitoring.DISABLE
+        return None
+
+    # ---------- control ----------
+
+    def start(self) -> None:
+        """Register the tool and begin collecting"""
+        events = monitoring.events
+        monitoring.use_tool_id(self.TOOL_ID, "testing-agent-coverage")
+        monitoring.register_callback(self.TOOL_ID, events.PY_START, self._on_start)
+        monitoring.register_callback(self.TOOL_ID, events.LINE, self._on_line)
+        if _SPLIT_BRANCHES:
+            monitoring.register_callback(self.TOOL_ID, events.BRANCH_LEFT, self._on_branch)
+            monitoring.register_callback(self.TOOL_ID, events.BRANCH_RIGHT, self._on_branch)
+        else:
+            monitoring.register_callback(self.TOOL_ID, events.BRANCH, self._on_branch)
+        # Отключённые прошлым сбором места снова активны
+        monitoring.restart_events()
+        monitoring.set_events(self.TOOL_ID, events.PY_START)
+        self._running = True
+
+    def stop(self) -> None:
+        """Stop collecting and release the tool slot"""
+        if not self._running:
+            return
+        monitoring.set_events(self.TOOL_ID, 0)
+        for code in self._instrumented:
+            monitoring.set_local_events(self.TOOL_ID, code, 0)
+        for event in vars(monitoring.events).values():
+            if isinstance(event, int) and event and not event & (event - 1):
+                monitoring.register_callback(self.TOOL_ID, event, None)
+        monitoring.free_tool_id(self.TOOL_ID)
+        self._running = False
+
+    def __enter__(self) -> "MonitoringCoverage":
+        self.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    # ---------- results ----------
+
+    def executed_lines(self, path: str) -> set[int]:
+        """Raw line numbers that ran in a measured file"""
+        return set(self._lines.get(os.path.realpath(path), ()))
+
+    def analysis(self, path: str, source: Optional[str] = None) -> tuple[list[int], list[int]]:
+        """
+        Statements and missing statements of a measured file.
+
+        Args:
+            path: Measured source file
+            source: Its source (default: read from path)
+
+        Returns:
+            (statements, missing), both sorted, as coverage.py analysis2()
+        """
+        if source is None:
+            with open(path, encoding="utf-8") as f:
+                source = f.read()
+        statements, line_map = analyze_source(source)
+        executed = {line_map[n] for n in self.executed_lines(path) if n in line_map}
+        return sorted(statements), sorted(statements - executed)
+
+    def partial_branches(self, path: str, source: Optional[str] = None) -> list[int]:
+        """
+        Statements with a branch that was only ever taken one way.
+
+        Args:
+            path: Measured source file
+            source: Its source (default: read from path)
+
+        Returns:
+            Sorted statement lines (e.g. an if whose condition was always true)
+        """
+        if source is None:
+            with open(path, encoding="utf-8") as f:
+                source = f.read()
+        _, line_map = analyze_source(source)
+        real = os.path.realpath(path)
+
+        offset_lines: dict = {}
+        partial = set()
+        for (code, offset), targets in self._branches.items():
+            if len(targets) > 1 or os.path.realpath(code.co_filename) != real:
+                continue
+            if code not in offset_lines:
+                offset_lines[code] = _offset_lines(code)
+            line = offset_lines[code].get(offset)
+            if line in line_map:
+                partial.add(line_map[line])
+        return sorted(partial)
+
+
+__all__ = [
+    "MonitoringCoverage",
+    "analyze_source",
+    "available",
+]
@@ -0,0 +1,356 @@
+"""
+Mutation testing quality gate for generated test suites
+
+Small AST mutations (operator swaps, boundary flips, negated conditions,
+changed constants) are applied to the functions of the module under
+test. A mutant is killed when the generated tests fail on it. Mutants on
+lines the tests never execute are skipped up front (they cannot be
+killed), and the rest run in parallel sandbox workers with pytest -x, so
+each mutant stops at its first failing test.
+
+Configuration (environment):
+    MUTATION_WORKERS      Parallel sandbox workers (default: CPU count)
+    MUTATION_MAX_MUTANTS  Upper bound on mutants per run (default 200)
+    MUTATION_TIME_BUDGET  Seconds for the whole gate (default 60)
+"""
+
+import ast
+import copy
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+try:
+    from .sandbox import SandboxJob, SandboxPool
+except ImportError:
+    from sandbox import SandboxJob, SandboxPool
+
+BINOP_SWAPS = {
+    ast.Add: ast.Sub,
+    ast.Sub: ast.Add,
+    ast.Mult: ast.Div,
+    ast.Div: ast.Mult,
+    ast.FloorDiv: ast.Mult,
+    ast.Mod: ast.FloorDiv,
+    ast.Pow: ast.Mult,
+}
+
+COMPARE_SWAPS = {
+    ast.Lt: ast.LtE,
+    ast.LtE: ast.Lt,
+    ast.Gt: ast.GtE,
+    ast.GtE: ast.Gt,
+    ast.Eq: ast.NotEq,
+    ast.NotEq: ast.Eq,
+    ast.In: ast.NotIn,
+    ast.NotIn: ast.In,
+    ast.Is: ast.IsNot,
+    ast.IsNot: ast.Is,
+}
+
+BOOLOP_SWAPS = {ast.And: ast.Or, ast.Or: ast.And}
+
+OPERATOR_SYMBOLS = {
+    ast.Add: "+", ast.Sub: "-", ast.Mult: "*", ast.Div: "/", ast.FloorDiv: "//",
+    ast.Mod: "%", ast.Pow: "**", ast.Lt: "<", ast.LtE: "<=", ast.Gt: ">",
+    ast.GtE: ">=", ast.Eq: "==", ast.NotEq: "!=", ast.In: "in", ast.NotIn: "not in",
+    ast.Is: "is", ast.IsNot: "is not", ast.And: "and", ast.Or: "or",
+}
+
+
+@dataclass
+class Mutant:
+    """One mutation of the module"""
+
+    id: int
+    line: int
+    kind: str  # "operator" | "boundary" | "condition" | "constant" | "boolean"
+    description: str
+    source: str
+
+
+@dataclass
+class MutationReport:
+    """Outcome of the mutation gate"""
+
+    killed: int = 0
+    survived: int = 0
+    timed_out: int = 0
+    skipped_uncovered: int = 0
+    not_run: int = 0  # Не уложились в бюджет времени
+    duration: float = 0.0
+    baseline_passed: bool = True
+    survivors: list[str] = field(default_factory=list)
+    error: Optional[str] = None
+
+    @property
+    def evaluated(self) -> int:
+        return self.killed + self.survived + self.timed_out
+
+    @property
+    def score(self) -> Optional[float]:
+        """Share of evaluated mutants killed (timeouts count as killed)"""
+        if not self.evaluated:
+            return None
+        return (self.killed + self.timed_out) / self.evaluated
+
+    def summary(self) -> str:
+        if self.error:
+            return f"Mutation score: n/a ({self.error})"
+        if self.score is None:
+            return "Mutation score: n/a (no mutants on covered lines)"
+        text = (
+            f"Mutation score: {self.score:.0%} "
+            f"({self.killed + self.timed_out}/{self.evaluated} mutants killed"
+        )
+        if self.skipped_uncovered:
+            text += f", {self.skipped_uncovered} on uncovered lines skipped"
+        if self.not_run:
+            text += f", {self.not_run} not run (time budget)"
+        return text + ")"
+
+    def to_dict(self) -> dict:
+        return {
+            "score": round(self.score, 4) if self.score is not None else None,
+            "killed": self.killed,
+            "survived": self.survived,
+            "timed_out": self.timed_out,
+            "skipped_uncovered": self.skipped_uncovered,
+            "not_run": self.not_run,
+            "duration": round(self.duration, 3),
+            "baseline_passed": self.baseline_passed,
+            "survivors": self.survivors,
+            "error": self.error,
+        }
+
+
+# ==================== MUTANT GENERATION ====================
+
+def _function_nodes(tree: ast.Module) -> list[ast.AST]:
+    """Nodes inside function bodies, in ast.walk order of the whole tree"""
+    inside = set()
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            for statement in node.body:
+                inside.update(id(n) for n in ast.walk(statement))
+    return [n for n in ast.walk(tree) if id(n) in inside]
+
+
+def _docstring_ids(tree: ast.Module) -> set[int]:
+    ids = set()
+    for node in ast.walk(tree):
+        body = getattr(node, "body", None)
+        if isinstance(body, list) and body and isinstance(body[0], ast.Expr) \
+                and isinstance(body[0].value, ast.Constant):
+            ids.add(id(body[0].value))
+    return ids
+
+
+def _mutations(node: ast.AST, docstrings: set[int]) -> list[tuple[str, str, Callable]]:
+    """(kind, description, apply) for every mutation of a node"""
+    found = []
+
+    if isinstance(node, (ast.BinOp, ast.AugAssign)) and type(node.op) in BINOP_SWAPS:
+        old, new = type(node.op), BINOP_SWAPS[type(node.op)]
+
+        def apply(n, new=new):
+            n.op = new()
+        found.append(("operator", f"{OPERATOR_SYMBOLS[old]} -> {OPERATOR_SYMBOLS[new]}", apply))
+
+    elif isinstance(node, ast.Compare):
+        for index, op in enumerate(node.ops):
+            if type(op) not in COMPARE_SWAPS:
+                continue
+            new = COMPARE_SWAPS[type(op)]
+            kind = "boundary" if type(op) in (ast.Lt, ast.LtE, ast.Gt, ast.GtE) else "operator"
+
+            def apply(n, index=index, new=new):
+                n.ops[index] = new()
+            found.append((kind, f"{OPERATOR_SYMBOLS[type(op)]} -> {OPERATOR_SYMBOLS[new]}", apply))
+
+    elif isinstance(node, ast.BoolOp):
+        old, new = type(node.op), BOOLOP_SWAPS[type(node.op)]
+
+        def apply(n, new=new):
+            n.op = new()
+        found.append(("boolean", f"{OPERATOR_SYMBOLS[old]} -> {OPERATOR_SYMBOLS[new]}", apply))
+
+    elif isinstance(node, (ast.If, ast.While, ast.IfExp)):
+        def apply(n):
+            n.test = ast.UnaryOp(op=ast.Not(), operand=n.test)
+        found.append(("condition", f"negate `{ast.unparse(node.test)[:40]}`", apply))
+
+    elif isinstance(node, ast.Constant) and id(node) not in docstrings:
+        value = node.value
+        if isinstance(value, bool):
+            def apply(n):
+                n.value = not n.value
+            found.append(("constant", f"{value} -> {not value}", apply))
+        elif isinstance(value, int):
+            def apply(n):
+                n.value = n.value + 1
+            found.append(("constant", f"{value} -> {value + 1}", apply))
+
+    return found
+
+
+def generate_mutants(source: str, max_mutants: Optional[int] = None) -> list[Mutant]:
+    """
+    Mutants of the functions of a module.
+
+    Args:
+        source: Module source code
+        max_mutants: Keep at most this many (evenly spread over the module)
+
+    Returns:
+        Mutants in source order (empty if the code does not parse)
+    """
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError):
+        return []
+
+    index_of = {id(n): i for i, n in enumerate(ast.walk(tree))}
+    docstrings = _docstring_ids(tree)
+
+    points = []
+    for node in _function_nodes(tree):
+        for kind, description, apply in _mutations(node, docstrings):
+            points.append((node.lineno, index_of[id(node)], kind, description, apply))
+    points.sort(key=lambda p: (p[0], p[1]))
+
+    if max_mutants and len(points) > max_mutants:
+        step = len(points) / max_mutants
+        points = [points[int(i * step)] for i in range(max_mutants)]
+
+    mutants = []
+    for line, node_index, kind, description, apply in points:
+        mutated = copy.deepcopy(tree)
+        target = next(n for i, n in enumerate(ast.walk(mutated)) if i == node_index)
+        apply(target)
+        try:
+            mutated_source = ast.unparse(ast.fix_missing_locations(mutated))
+        except Exception:
+            continue
+        mutants.append(Mutant(
+            id=len(mutants),
+            line=line,
+            kind=kind,
+            description=f"line {line}: {description}",
+            source=mutated_source
+        ))
+    return mutants
+
+
+# ==================== GATE ====================
+
+_mutation_pool: Optional[SandboxPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_mutation_pool() -> SandboxPool:
+    """Sandbox pool sized for mutation runs (MUTATION_WORKERS, default CPU count)"""
+    global _mutation_pool
+
+    with _pool_lock:
+        if _mutation_pool is None:
+            import atexit
+            workers = int(os.getenv("MUTATION_WORKERS", "0")) or os.cpu_count() or 2
+            _mutation_pool = SandboxPool(size=workers)
+            atexit.register(_mutation_pool.shutdown)
+        return _mutation_pool
+
+
+def run_mutation_gate(
+    source: str,
+    tests: str,
+    module_name: str,
+    pool: Optional[SandboxPool] = None,
+    max_mutants: Optional[int] = None,
+    time_budget: Optional[float] = None
+) -> MutationReport:
+    """
+    Measure how many mutants of a module the generated tests kill.
+
+    Args:
+        source: Module under test
+        tests: Generated test module (imports module_name)
+        module_name: File name the tests import the module as (e.g. calculator.py)
+        pool: Sandbox pool (default: shared mutation pool)
+        max_mutants: Upper bound on mutants (default: MUTATION_MAX_MUTANTS or 200)
+        time_budget: Seconds for the whole gate (default: MUTATION_TIME_BUDGET or 60)
+
+    Returns:
+        MutationReport
+    """
+    started = time.perf_counter()
+    pool = pool or get_mutation_pool()
+    max_mutants = max_mutants or int(os.getenv("MUTATION_MAX_MUTANTS", "200"))
+    time_budget = time_budget or float(os.getenv("MUTATION_TIME_BUDGET", "60"))
+    test_name = f"test_{module_name.rsplit('.', 1)[0]}_mutation.py"
+    report = MutationReport()
+
+    # Базовый прогон: тесты должны проходить, покрытие отсекает мутантов
+    baseline = pool.run_pytest(
+        {module_name: source, test_name: tests}, test_name, coverage_files=[module_name]
+    )
+    if not baseline.passed:
+        report.baseline_passed = False
+        report.error = "generated tests fail on the original code"
+        report.duration = time.perf_counter() - started
+        return report
+
+    coverage = baseline.coverage.get(module_name)
+    missing = set(coverage["missing"]) if coverage else set()
+
+    mutants = []
+    for mutant in generate_mutants(source, max_mutants):
+        if mutant.line in missing:
+            report.skipped_uncovered += 1
+        else:
+            mutants.append(mutant)
+
+    # Зависший мутант (бесконечный цикл) считается убитым по таймауту
+    mutant_timeout = max(2.0, baseline.duration * 5)
+    deadline = started + time_budget
+
+    def run_mutant(mutant: Mutant):
+        if time.perf_counter() > deadline:
+            return mutant, None
+        job = SandboxJob(
+            files={module_name: mutant.source, test_name: tests},
+            pytest_args=[test_name, "-x", "-q", "--tb=no", "-p", "no:cacheprovider",
+                         "-p", "no:unraisableexception"],
+            plugins=pool.plugins
+        )
+        return mutant, pool.run(job, timeout=mutant_timeout)
+
+    with ThreadPoolExecutor(max_workers=pool.size) as executor:
+        futures = [executor.submit(run_mutant, mutant) for mutant in mutants]
+        for future in as_completed(futures):
+            mutant, result = future.result()
+            if result is None:
+                report.not_run += 1
+            elif result.timed_out:
+                report.timed_out += 1
+            elif result.passed:
+                report.survived += 1
+                report.survivors.append(mutant.description)
+            else:
+                report.killed += 1
+
+    report.survivors.sort(key=lambda d: int(d.split(":")[0].split()[1]))
+    report.duration = time.perf_counter() - started
+    return report
+
+
+__all__ = [
+    "Mutant",
+    "MutationReport",
+    "generate_mutants",
+    "get_mutation_pool",
+    "run_mutation_gate",
+]
@@ -0,0 +1,284 @@
+"""
+In-process formatting and safe lint fixes for generated tests
+
+Generated test modules are cleaned up before they are written:
+
+1. fix: unused imports are removed and the leading import block is
+   sorted (future / stdlib / third-party / first-party, isort style).
+   A built-in fixer does this in process. For batches of several files
+   (save_many) the ruff executable is used when it is installed, started
+   once for all files; a single file never pays a process start.
+2. format: black's Python API (black.format_str), skipped if black is
+   not installed.
+
+A file that does not parse, or that a stage fails on, keeps the text it
+had before that stage. Every call returns the time spent per stage.
+
+Configuration (environment):
+    POSTPROCESS_TESTS        1 = TestingCrew post-processes saved tests (default 0)
+    POSTPROCESS_LINE_LENGTH  Line length for black and ruff (default 100)
+"""
+
+import ast
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+
+# Импорты из этих модулей не удаляются, даже если имена не используются
+_KEEP_MODULES = {"__future__"}
+
+
+@dataclass
+class PostProcessReport:
+    """Outcome of one PostProcessor.process() call"""
+
+    files: int = 0
+    changed: int = 0
+    stage_seconds: dict = field(default_factory=dict)  # стадия → секунды
+    tools: dict = field(default_factory=dict)          # стадия → инструмент (или skipped)
+    errors: dict = field(default_factory=dict)         # имя файла → ошибка
+
+    def summary(self) -> str:
+        stages = ", ".join(
+            f"{stage} {seconds * 1000:.0f} ms ({self.tools.get(stage, '?')})"
+            for stage, seconds in self.stage_seconds.items()
+        )
+        return f"Post-processed {self.files} files ({self.changed} changed): {stages}"
+
+
+# ==================== BUILT-IN FIXES ====================
+
+def _bound_name(alias: ast.alias, is_from: bool) -> str:
+    if alias.asname:
+        return alias.asname
+    return alias.name if is_from else alias.name.split(".")[0]
+
+
+def _used_names(nodes: list) -> set[str]:
+    """Names referenced by the given statements"""
+    used = set()
+    for statement in nodes:
+        for node in ast.walk(statement):
+            if isinstance(node, ast.Name):
+                used.add(node.id)
+            elif isinstance(node, ast.Constant) and isinstance(node.value, str):
+                # Строковые аннотации, __all__, patch("mod.name") — считаем использованием
+                used.update(re.findall(r"[A-Za-z_][A-Za-z0-9_]*", node.value))
+    return used
+
+
+def _section(module: str, level: int, first_party: set) -> int:
+    """0 future, 1 stdlib, 2 third-party, 3 first-party"""
+    top = module.split(".")[0]
+    if top == "__future__":
+        return 0
+    if level or top in first_party:
+        return 3
+    if top in getattr(sys, "stdlib_module_names", ()):
+        return 1
+    return 2
+
+
+def _render(node: ast.stmt, names: list) -> str:
+    def alias(a: ast.alias) -> str:
+        return f"{a.name} as {a.asname}" if a.asname else a.name
+
+    if isinstance(node, ast.Import):
+        return "\n".join(f"import {alias(a)}" for a in names)
+    module = "." * node.level + (node.module or "")
+    parts = sorted((alias(a) for a in names), key=lambda s: (s.lower(), s))
+    return f"from {module} import {', '.join(parts)}"
+
+
+def fix_imports(source: str, first_party: Optional[set] = None) -> str:
+    """
+    Drop unused imports and sort the leading import block.
+
+    Only the contiguous block of top-level imports at the start of the
+    module (after its docstring) is touched. If it contains comments or
+    other statements it is left as it is.
+
+    Args:
+        source: Python module
+        first_party: Top-level module names sorted as first-party (e.g.
+            the module under test)
+
+    Returns:
+        Fixed source (unchanged if it does not parse)
+    """
+    try:
+        tree = ast.parse(source)
+    except SyntaxError:
+        return source
+
+    body = list(tree.body)
+    start = 0
+    first = body[0] if body else None
+    if isinstance(first, ast.Expr) and isinstance(first.value, ast.Constant) and isinstance(first.value.value, str):
+        start = 1  # Докстринг модуля остаётся на месте
+    end = start
+    while end < len(body) and isinstance(body[end], (ast.Import, ast.ImportFrom)):
+        end += 1
+    block = body[start:end]
+    if not block:
+        return source
+
+    lines = source.splitlines(keepends=True)
+    first_line, last_line = block[0].lineno, block[-1].end_lineno
+    # Комментарии внутри блока потерялись бы при пересборке
+    if any("#" in line for line in lines[first_line - 1:last_line]):
+        return source
+    if any(isinstance(n, ast.ImportFrom) and any(a.name == "*" for a in n.names) for n in block):
+        return source
+
+    used = _used_names(body[end:])
+    first_party = set(first_party or ())
+
+    sections: dict[int, list] = {0: [], 1: [], 2: [], 3: []}
+    for node in block:
+        is_from = isinstance(node, ast.ImportFrom)
+        keep = [
+            a for a in node.names
+            if (is_from and node.module in _KEEP_MODULES) or _bound_name(a, is_from) in used
+        ]
+        if not keep:
+            continue
+        if is_from:
+            module = node.module or ""
+            sections[_section(module, node.level, first_party)].append(
+                ((1, module.lower(), node.level), _render(node, keep))
+            )
+        else:
+            for a in keep:
+                sections[_section(a.name, 0, first_party)].append(
+                    ((0, a.name.lower(), 0), _render(node, [a]))
+                )
+
+    groups = []
+    for index in sorted(sections):
+        seen, statements = set(), []
+        for _, text in sorted(sections[index], key=lambda item: item[0]):
+            if text not in seen:
+                seen.add(text)
+                statements.append(text)
+        if statements:
+            groups.append("\n".join(statements))
+    rebuilt = "\n\n".join(groups)
+
+    before = "".join(lines[:first_line - 1])
+    after = "".join(lines[last_line:])
+    if not rebuilt:
+        return before + after.lstrip("\n")
+    return before + rebuilt + "\n" + after
+
+
+# ==================== POST-PROCESSOR ====================
+
+class PostProcessor:
+    """
+    Formats generated test modules and applies safe fixes.
+
+    Args:
+        line_length: Line length for black and ruff
+        use_ruff: Use the ruff executable for batches of several files when
+            installed (False = always the built-in fixer)
+        use_black: Format with black when installed
+    """
+
+    def __init__(self, line_length: Optional[int] = None, use_ruff: bool = True, use_black: bool = True):
+        self.line_length = line_length or int(os.getenv("POSTPROCESS_LINE_LENGTH", "100"))
+        self.ruff = shutil.which("ruff") if use_ruff else None
+        self.black = None
+        if use_black:
+            try:
+                import black
+                self.black = black
+            except ImportError:
+                pass
+
+    @classmethod
+    def from_env(cls) -> Optional["PostProcessor"]:
+        """Post-processor if POSTPROCESS_TESTS=1, else None"""
+        if os.getenv("POSTPROCESS_TESTS", "0") != "1":
+            return None
+        return cls()
+
+    def process_one(self, source: str, first_party: Optional[set] = None) -> str:
+        """Post-process a single module"""
+        return self.process({"test_module.py": source}, first_party)[0]["test_module.py"]
+
+    def process(self, sources: dict[str, str], first_party: Optional[set] = None) -> tuple[dict, PostProcessReport]:
+        """
+        Post-process a batch of modules.
+
+        Args:
+            sources: File name → module source
+            first_party: Module names sorted as first-party imports
+
+        Returns:
+            (file name → processed source, report with time per stage)
+        """
+        report = PostProcessReport(files=len(sources))
+        result = dict(sources)
+
+        started = time.perf_counter()
+        # Одному файлу запуск процесса ruff стоит дороже самой правки
+        if self.ruff and len(result) > 1:
+            result = self._ruff_fix(result, first_party, report)
+            report.tools["fix"] = "ruff"
+        else:
+            result = {name: fix_imports(text, first_party) for name, text in result.items()}
+            report.tools["fix"] = "builtin"
+        report.stage_seconds["fix"] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        if self.black is not None:
+            mode = self.black.Mode(line_length=self.line_length)
+            for name, text in result.items():
+                try:
+                    result[name] = self.black.format_str(text, mode=mode)
+                except Exception as e:  # black.InvalidInput и внутренние ошибки
+                    report.errors[name] = f"black: {e}"
+            report.tools["format"] = "black"
+        else:
+            report.tools["format"] = "skipped"
+        report.stage_seconds["format"] = time.perf_counter() - started
+
+        report.changed = sum(1 for name in sources if result[name] != sources[name])
+        return result, report
+
+    def _ruff_fix(self, sources: dict, first_party: Optional[set], report: PostProcessReport) -> dict:
+        """One ruff process for the whole batch"""
+        with tempfile.TemporaryDirectory(prefix="postprocess-") as work_dir:
+            paths = {}
+            for index, (name, text) in enumerate(sources.items()):
+                # Уникальные имена: в пакетном режиме файлы могут совпадать по имени
+                path = Path(work_dir) / f"f{index}_{Path(name).name}"
+                path.write_text(text, encoding="utf-8")
+                paths[name] = path
+            command = [
+                self.ruff, "check", "--fix", "--isolated", "--no-cache", "--exit-zero", "--quiet",
+                "--select", "F401,I", f"--line-length={self.line_length}",
+            ]
+            if first_party:
+                command.append(f"--config=lint.isort.known-first-party={sorted(first_party)!r}")
+            try:
+                subprocess.run(command + [work_dir], capture_output=True, timeout=60, check=True)
+            except (OSError, subprocess.SubprocessError) as e:
+                report.errors["*"] = f"ruff: {e}"
+                return {name: fix_imports(text, first_party) for name, text in sources.items()}
+            return {name: path.read_text(encoding="utf-8") for name, path in paths.items()}
+
+
+__all__ = [
+    "PostProcessReport",
+    "PostProcessor",
+    "fix_imports",
+]
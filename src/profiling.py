@@ -0,0 +1,287 @@
+"""
+Sampling profiler for a single run: where the wall-clock time goes
+
+A background thread samples the Python stacks of the threads running
+the profiled job every PROFILE_INTERVAL_MS milliseconds. The job itself
+is not instrumented, so the overhead is the sampler's own time (reported
+in the summary; about 1% at the default interval).
+
+The code of the run marks its stages with mark_stage() (prepare, each
+crew task, extract, postprocess, ...). For each stage the profile has
+the wall-clock time and the CPU time of the thread, so
+wall - cpu is time spent waiting, mostly for the LLM. Outside a profiled
+job mark_stage() does nothing.
+
+Outputs:
+    folded stacks   "stage;frame;...;leaf count" lines for flamegraph.pl,
+                    inferno, speedscope
+    summary         stage table and top-N functions by self and total samples
+
+Configuration (environment):
+    PROFILE_INTERVAL_MS  Sampling interval in milliseconds (default 10)
+"""
+
+import contextvars
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+MAX_DEPTH = 200
+
+_active: contextvars.ContextVar[Optional["SamplingProfiler"]] = contextvars.ContextVar(
+    "active_profiler", default=None
+)
+
+
+def mark_stage(name: str) -> None:
+    """Start stage name in the current thread of the profiled job (no-op otherwise)"""
+    profiler = _active.get()
+    if profiler is not None:
+        profiler.mark(name)
+
+
+@dataclass
+class StageTime:
+    """Time of one stage summed over the job's threads"""
+
+    stage: str
+    wall: float = 0.0
+    cpu: float = 0.0
+    samples: int = 0
+
+    @property
+    def wait(self) -> float:
+        """Wall-clock time not spent on CPU (LLM and other I/O, lock waits)"""
+        return max(0.0, self.wall - self.cpu)
+
+
+@dataclass
+class Profile:
+    """Result of a profiled job"""
+
+    interval: float
+    duration: float
+    stages: list[StageTime] = field(default_factory=list)
+    stacks: Counter = field(default_factory=Counter)  # (stage, frames...) → samples
+    sampler_seconds: float = 0.0
+
+    @property
+    def samples(self) -> int:
+        return sum(self.stacks.values())
+
+    @property
+    def overhead(self) -> float:
+        """Sampler CPU time as a share of the job's wall-clock time"""
+        return self.sampler_seconds / self.duration if self.duration else 0.0
+
+    def folded(self) -> str:
+        """Collapsed stacks, one "stage;frame;...;leaf count" line per stack"""
+        return "".join(
+            f"{';'.join(stack)} {count}\n" for stack, count in sorted(self.stacks.items())
+        )
+
+    def write_folded(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.folded())
+
+    def top(self, n: int = 20) -> list[dict]:
+        """
+        Functions with the most samples.
+
+        Returns:
+            Dicts with function, self (samples where it is the leaf),
+            total (samples where it is on the stack), sorted by self
+        """
+        own, total = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            frames = stack[1:]
+            if not frames:
+                continue
+            own[frames[-1]] += count
+            for frame in set(frames):
+                total[frame] += count
+        ranked = sorted(total, key=lambda f: (own[f], total[f]), reverse=True)[:n]
+        return [{"function": f, "self": own[f], "total": total[f]} for f in ranked]
+
+    def summary(self, top_n: int = 20) -> str:
+        """Stage table and top-N functions as plain text"""
+        lines = [
+            f"Profile: {self.duration:.2f}s wall, {self.samples} samples every "
+            f"{self.interval * 1000:g}ms, sampler overhead {self.overhead:.1%}",
+            "",
+            f"{'stage':<24} {'wall s':>8} {'cpu s':>8} {'wait s':>8} {'cpu %':>6} {'samples':>8}",
+        ]
+        for stage in self.stages:
+            share = stage.cpu / stage.wall if stage.wall else 0.0
+            lines.append(
+                f"{stage.stage:<24} {stage.wall:>8.2f} {stage.cpu:>8.2f} {stage.wait:>8.2f} "
+                f"{share:>6.0%} {stage.samples:>8}"
+            )
+        samples = self.samples or 1
+        lines += ["", f"{'self %':>7} {'total %':>8}  function"]
+        for row in self.top(top_n):
+            lines.append(f"{row['self'] / samples:>7.1%} {row['total'] / samples:>8.1%}  {row['function']}")
+        return "\n".join(lines)
+
+
+class SamplingProfiler:
+    """
+    Samples the stacks of the threads that run a job.
+
+    Threads join the job through call() or activate(), or by calling
+    mark_stage() in a context copied from one (asyncio.to_thread). A
+    stage's times are added when its thread marks the next stage or
+    leaves the job.
+
+    Args:
+        interval: Seconds between samples (default: $PROFILE_INTERVAL_MS)
+    """
+
+    def __init__(self, interval: Optional[float] = None):
+        self.interval = interval or float(os.getenv("PROFILE_INTERVAL_MS", "10")) / 1000
+        self._lock = threading.Lock()
+        self._threads: dict[int, list] = {}  # ident → [стадия, wall, cpu] текущей стадии
+        self._stages: dict[str, StageTime] = {}
+        self._stacks: Counter = Counter()
+        self._labels: dict = {}  # id(code) → (code, "module.qualname")
+        self._sampler: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._sampler_seconds = 0.0
+        self._started = 0.0
+        self._duration = 0.0
+
+    # ---------- жизненный цикл ----------
+
+    def start(self) -> "SamplingProfiler":
+        self._stop.clear()
+        self._started = time.perf_counter()
+        self._sampler = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._sampler.start()
+        return self
+
+    def stop(self) -> Profile:
+        """Stop sampling and close the stages of the calling thread"""
+        self._close_thread(threading.get_ident())
+        self._stop.set()
+        if self._sampler is not None:
+            self._sampler.join()
+            self._sampler = None
+        self._duration = time.perf_counter() - self._started
+        return self.profile()
+
+    def profile(self) -> Profile:
+        with self._lock:
+            return Profile(
+                interval=self.interval,
+                duration=self._duration or time.perf_counter() - self._started,
+                stages=[StageTime(s.stage, round(s.wall, 3), round(s.cpu, 3), s.samples)
+                        for s in self._stages.values()],
+                stacks=Counter(self._stacks),
+                sampler_seconds=self._sampler_seconds
+            )
+
+    # ---------- потоки задания ----------
+
+    def activate(self, stage: str = "run"):
+        """Context manager: the current thread runs the job, starting in stage"""
+        return _Activation(self, stage)
+
+    def call(self, fn: Callable, *args, stage: str = "run", **kwargs):
+        """Run fn in the current thread as part of the job"""
+        with self.activate(stage):
+            return fn(*args, **kwargs)
+
+    def mark(self, stage: str) -> None:
+        """Close the current stage of this thread and start stage"""
+        ident = threading.get_ident()
+        now, cpu = time.perf_counter(), time.thread_time()
+        with self._lock:
+            self._account(ident, now, cpu)
+            self._threads[ident] = [stage, now, cpu]
+            self._stages.setdefault(stage, StageTime(stage))
+
+    def _close_thread(self, ident: int) -> None:
+        if ident != threading.get_ident():
+            return
+        now, cpu = time.perf_counter(), time.thread_time()
+        with self._lock:
+            self._account(ident, now, cpu)
+            self._threads.pop(ident, None)
+
+    def _account(self, ident: int, now: float, cpu: float) -> None:
+        current = self._threads.get(ident)
+        if current is not None:
+            stage, wall0, cpu0 = current
+            self._stages[stage].wall += now - wall0
+            self._stages[stage].cpu += cpu - cpu0
+
+    # ---------- сэмплирование ----------
+
+    def _label(self, frame) -> str:
+        code = frame.f_code
+        # hash() объекта кода не кэшируется и дорог — ключ по id (код хранится в значении)
+        cached = self._labels.get(id(code))
+        if cached is not None and cached[0] is code:
+            return cached[1]
+        module = frame.f_globals.get("__name__") or os.path.basename(code.co_filename)
+        qualname = getattr(code, "co_qualname", code.co_name)
+        # ";" и пробел — разделители формата folded
+        label = f"{module}.{qualname}".replace(";", ":").replace(" ", "_")
+        self._labels[id(code)] = (code, label)
+        return label
+
+    def _sample(self) -> None:
+        with self._lock:
+            threads = {ident: state[0] for ident, state in self._threads.items()}
+        if not threads:
+            return
+        frames = sys._current_frames()
+        for ident, stage in threads.items():
+            frame = frames.get(ident)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None and len(stack) < MAX_DEPTH:
+                stack.append(self._label(frame))
+                frame = frame.f_back
+            stack.append(f"stage:{stage}")
+            key = tuple(reversed(stack))
+            with self._lock:
+                self._stacks[key] += 1
+                if stage in self._stages:
+                    self._stages[stage].samples += 1
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            # CPU времени сэмплера: ожидание GIL не замедляет задание
+            started = time.thread_time()
+            self._sample()
+            self._sampler_seconds += time.thread_time() - started
+
+
+class _Activation:
+    def __init__(self, profiler: SamplingProfiler, stage: str):
+        self.profiler = profiler
+        self.stage = stage
+        self._token = None
+
+    def __enter__(self) -> SamplingProfiler:
+        self._token = _active.set(self.profiler)
+        self.profiler.mark(self.stage)
+        return self.profiler
+
+    def __exit__(self, *exc) -> None:
+        self.profiler._close_thread(threading.get_ident())
+        _active.reset(self._token)
+
+
+__all__ = [
+    "Profile",
+    "SamplingProfiler",
+    "StageTime",
+    "mark_stage",
+]
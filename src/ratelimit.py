@@ -0,0 +1,139 @@
+"""
+Shared LLM rate limiting for concurrent crew runs
+
+Each crew enforces its own max_rpm; when several crews run at once the
+provider sees their sum. A RateLimiter bound to a run (see
+use_rate_limiter) is acquired before every LLM call of that run, so all
+runs sharing one limiter stay under a single requests-per-minute budget.
+"""
+
+import contextvars
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Optional
+
+try:
+    from .cancellation import current_token
+except ImportError:
+    from cancellation import current_token
+
+
+class RateLimiter:
+    """
+    Sliding-window limiter: at most max_rpm acquisitions per period.
+
+    Args:
+        max_rpm: Requests allowed per period
+        period: Window length in seconds
+    """
+
+    def __init__(self, max_rpm: int, period: float = 60.0):
+        if max_rpm < 1:
+            raise ValueError("max_rpm must be >= 1")
+        self.max_rpm = max_rpm
+        self.period = period
+        self._calls: deque[float] = deque()
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> float:
+        """
+        Take a slot if one is free.
+
+        Returns:
+            0.0 if acquired, otherwise seconds until a slot frees up
+        """
+        with self._lock:
+            now = time.monotonic()
+            while self._calls and now - self._calls[0] >= self.period:
+                self._calls.popleft()
+            if len(self._calls) < self.max_rpm:
+                self._calls.append(now)
+                return 0.0
+            return self.period - (now - self._calls[0])
+
+    def acquire(self) -> None:
+        """
+        Block until a slot is free.
+
+        Waiting is interrupted if the run executing in this context is
+        cancelled (raises JobCancelled).
+        """
+        while True:
+            wait = self.try_acquire()
+            if wait <= 0:
+                return
+            token = current_token()
+            if token is not None:
+                token.check()
+            # Короткие интервалы: отмена срабатывает быстро
+            time.sleep(min(wait, 0.5))
+
+
+_current_limiter: contextvars.ContextVar[Optional[RateLimiter]] = contextvars.ContextVar(
+    "testing_agent_rate_limiter", default=None
+)
+
+
+def current_limiter() -> Optional[RateLimiter]:
+    """Return the limiter bound to the run executing in this context, if any"""
+    return _current_limiter.get()
+
+
+@contextmanager
+def use_rate_limiter(limiter: Optional[RateLimiter]):
+    """Bind a limiter to the current context for the duration of a run"""
+    handle = _current_limiter.set(limiter)
+    try:
+        yield limiter
+    finally:
+        _current_limiter.reset(handle)
+
+
+_hook_installed = False
+_hook_lock = threading.Lock()
+
+
+def _acquire_before_llm_call(context: Any) -> Optional[bool]:
+    """before_llm_call hook: wait for the shared limiter"""
+    limiter = current_limiter()
+    if limiter is not None:
+        try:
+            limiter.acquire()
+        except Exception:
+            # Отменённый запуск: блокируем вызов, остальное сделает CancelToken
+            return False
+    return None
+
+
+def install_llm_rate_limit_hook() -> bool:
+    """
+    Register the global before-LLM-call hook that applies shared limiters.
+
+    LLM call hooks exist only in newer CrewAI releases; on older ones this
+    returns False and only each crew's own max_rpm applies.
+
+    Returns:
+        True if the hook is installed
+    """
+    global _hook_installed
+
+    with _hook_lock:
+        if _hook_installed:
+            return True
+        try:
+            from crewai.hooks import register_before_llm_call_hook
+        except ImportError:
+            return False
+        register_before_llm_call_hook(_acquire_before_llm_call)
+        _hook_installed = True
+        return True
+
+
+__all__ = [
+    "RateLimiter",
+    "current_limiter",
+    "use_rate_limiter",
+    "install_llm_rate_limit_hook",
+]
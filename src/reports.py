@@ -0,0 +1,443 @@
+"""
+Structured analysis and validation reports
+
+The analyzer and the validator answer with JSON (the shape is spelled
+out in expected_output of tasks.yaml). Their outputs are parsed into the
+pydantic models below by a callback on each task, so TaskOutput.pydantic
+and the run result hold typed reports instead of free text.
+
+Parsing never goes back to the LLM. JsonRepair reads the answer one
+character at a time and keeps the longest prefix that is valid JSON
+once closed. It skips prose and code fences around the object. It
+drops trailing commas and keys that have no value, escapes raw
+newlines in strings, and accepts single quotes and Python literals. A
+truncated answer (max_tokens, a dropped stream) therefore still
+yields every field that arrived, instead of costing a retry.
+The models themselves accept the usual looseness ("85%", numbers as
+strings, params as objects).
+"""
+
+import json
+import logging
+import re
+from typing import Annotated, Any, Callable, Optional
+
+from pydantic import BaseModel, BeforeValidator, ConfigDict, ValidationError
+
+logger = logging.getLogger(__name__)
+
+_NUMBER = re.compile(r"-?\d+(\.\d+)?([eE][+-]?\d+)?")
+_FENCE = re.compile(r"```(?:json)?\s*\n(.*?)(?:```|$)", re.DOTALL)
+_LITERALS = {"true": "true", "false": "false", "null": "null",
+             "True": "true", "False": "false", "None": "null"}
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+# ==================== JSON REPAIR ====================
+
+class JsonRepair:
+    """
+    Incremental, tolerant JSON reader.
+
+    feed() accepts text in chunks (e.g. as it streams in); snapshot()
+    returns the longest valid JSON document that the text so far
+    supports, with open strings and containers closed.
+    """
+
+    def __init__(self):
+        self._out: list[str] = []
+        self._stack: list[str] = []
+        self._expect = "value"  # value | key | colon | comma
+        self._in_string = False
+        self._string_is_key = False
+        self._quote = '"'
+        self._escape = False
+        self._token: Optional[str] = None  # Число или литерал в процессе чтения
+        self._pending_comma = False
+        self._key_start = 0  # Длина вывода перед текущим ключом (с запятой)
+        self._safe = (0, "")  # (длина вывода, закрывающие скобки) — валидная точка обрыва
+        self.started = False
+        self.done = False
+
+    # ---------- вывод ----------
+
+    def _emit(self, text: str) -> None:
+        self._out.append(text)
+
+    def _closers(self) -> str:
+        return "".join(_CLOSERS[c] for c in reversed(self._stack))
+
+    def _mark_safe(self) -> None:
+        self._safe = (len(self._out), self._closers())
+
+    def _start_item(self) -> None:
+        if self._pending_comma:
+            self._emit(",")
+            self._pending_comma = False
+
+    def _value_done(self) -> None:
+        self._expect = "comma"
+        if not self._stack:
+            self.done = True
+        self._mark_safe()
+
+    # ---------- разбор ----------
+
+    def feed(self, text: str) -> "JsonRepair":
+        for ch in text:
+            if self.done:
+                break
+            self._step(ch)
+        return self
+
+    def _step(self, ch: str) -> None:
+        if not self.started:
+            # Пропускаем прозу и ``` до первого объекта/массива
+            if ch in "{[":
+                self.started = True
+                self._open(ch)
+            return
+
+        if self._in_string:
+            self._string_char(ch)
+            return
+
+        if self._token is not None:
+            if ch.isalnum() or ch in "+-._":
+                self._token += ch
+                return
+            self._finish_token()
+            if self.done:
+                return
+
+        if ch.isspace():
+            return
+        if ch in "\"'":
+            self._start_string(ch)
+        elif ch == ":":
+            if self._expect == "colon":
+                self._emit(":")
+                self._expect = "value"
+        elif ch == ",":
+            if self._expect == "comma":
+                self._pending_comma = True
+                self._expect = "key" if self._stack[-1] == "{" else "value"
+        elif ch in "}]":
+            self._close(ch)
+        elif ch in "{[":
+            if self._expect == "comma":  # Пропущенная запятая между значениями
+                self._pending_comma = self._stack[-1] == "["
+                self._expect = "value" if self._pending_comma else self._expect
+            if self._expect == "value":
+                self._start_item()
+                self._open(ch)
+        elif ch.isalnum() or ch == "-":
+            if self._expect == "comma" and self._stack[-1] == "[":
+                self._pending_comma = True
+                self._expect = "value"
+            if self._expect == "value":
+                self._start_item()
+                self._token = ch
+
+    def _open(self, ch: str) -> None:
+        self._emit(ch)
+        self._stack.append(ch)
+        self._expect = "key" if ch == "{" else "value"
+        self._mark_safe()
+
+    def _close(self, ch: str) -> None:
+        if not self._stack or _CLOSERS[self._stack[-1]] != ch:
+            return
+        if self._stack[-1] == "{" and self._expect in ("colon", "value"):
+            # Ключ без значения: отбрасываем его (и запятую перед ним)
+            del self._out[self._key_start:]
+        self._pending_comma = False  # Висячая запятая
+        self._emit(ch)
+        self._stack.pop()
+        self._value_done()
+
+    def _start_string(self, quote: str) -> None:
+        if self._expect == "comma":
+            # Пропущенная запятая: строка после значения
+            self._pending_comma = True
+            self._expect = "key" if self._stack[-1] == "{" else "value"
+        if self._expect not in ("key", "value"):
+            return
+        self._string_is_key = self._expect == "key"
+        if self._string_is_key:
+            self._key_start = len(self._out)
+        self._start_item()
+        self._in_string = True
+        self._quote = quote
+        self._emit('"')
+
+    def _string_char(self, ch: str) -> None:
+        if self._escape:
+            self._escape = False
+            if ch == "'":
+                self._out[-1] = "'"  # \' — не JSON-экранирование
+            elif ch not in '"\\/bfnrtu':
+                self._out[-1] = "\\\\"  # \d в регулярке из кода: обратный слэш как символ
+                self._emit(ch)
+            else:
+                self._emit(ch)
+        elif ch == "\\":
+            self._escape = True
+            self._emit(ch)
+        elif ch == self._quote:
+            self._emit('"')
+            self._in_string = False
+            if self._string_is_key:
+                self._expect = "colon"
+            else:
+                self._value_done()
+        elif ch == '"':
+            self._emit('\\"')  # Внутри строки в одинарных кавычках
+        elif ch in "\n\r\t":
+            self._emit({"\n": "\\n", "\r": "\\r", "\t": "\\t"}[ch])
+        else:
+            self._emit(ch)
+
+    @staticmethod
+    def _literal(token: str) -> Optional[str]:
+        if token in _LITERALS:
+            return _LITERALS[token]
+        if _NUMBER.fullmatch(token):
+            return token
+        return None
+
+    def _finish_token(self) -> None:
+        token, self._token = self._token, None
+        literal = self._literal(token)
+        # Слово без кавычек — строка
+        self._emit(literal if literal is not None else json.dumps(token))
+        self._value_done()
+
+    # ---------- результат ----------
+
+    def snapshot(self) -> Optional[str]:
+        """Valid JSON for the text fed so far (None before the first { or [)"""
+        if not self.started:
+            return None
+        text = "".join(self._out)
+        if self.done:
+            return text
+        if self._in_string and not self._string_is_key:
+            # Обрыв внутри строкового значения: сохраняем начало строки
+            if self._escape:
+                text = text[:-1]
+            return text + '"' + self._closers()
+        if self._token is not None:
+            literal = self._literal(self._token)
+            if literal is not None:
+                return text + literal + self._closers()
+        length, closers = self._safe
+        return "".join(self._out[:length]) + closers
+
+
+def _json_region(text: str) -> str:
+    """Contents of the first ```json block if there is one, else the text"""
+    match = _FENCE.search(text)
+    if match and match.group(1).lstrip()[:1] in ("{", "["):
+        return match.group(1)
+    return text
+
+
+def repair_json(text: str) -> Optional[str]:
+    """Valid JSON recovered from an LLM answer (None if it has no object or array)"""
+    return JsonRepair().feed(_json_region(text)).snapshot()
+
+
+def loads_lenient(text: str) -> tuple[Any, bool]:
+    """
+    Parse JSON from an LLM answer without asking the LLM again.
+
+    Returns:
+        (value or None, repaired) — repaired is True when the JSON had to be
+        fixed (truncated, trailing commas, ...)
+    """
+    region = _json_region(text).strip()
+    try:
+        return json.loads(region), False
+    except ValueError:
+        pass
+    repaired = repair_json(region)
+    if repaired is None:
+        return None, False
+    try:
+        return json.loads(repaired), True
+    except ValueError:
+        return None, False
+
+
+# ==================== MODELS ====================
+
+def _to_list(value: Any) -> Any:
+    if value is None:
+        return []
+    if isinstance(value, (str, dict)):
+        return [value]
+    return value
+
+
+def _to_str_list(value: Any) -> list:
+    """["a", {"name": "b"}, 3] → ["a", "b", "3"]"""
+    items = []
+    for item in _to_list(value):
+        if isinstance(item, dict):
+            item = item.get("name") or item.get("function") or json.dumps(item)
+        items.append(str(item))
+    return items
+
+
+def _to_number(value: Any) -> Any:
+    """"85%", "7/10", "8.5" → number; anything else unchanged"""
+    if isinstance(value, str):
+        match = re.search(r"-?\d+(\.\d+)?", value)
+        return float(match.group()) if match else None
+    return value
+
+
+def _to_bool(value: Any) -> Any:
+    if isinstance(value, str):
+        return value.strip().lower() in ("true", "yes", "y", "1", "valid", "ok")
+    return value
+
+
+StrList = Annotated[list[str], BeforeValidator(_to_str_list)]
+Number = Annotated[Optional[float], BeforeValidator(_to_number)]
+Flag = Annotated[Optional[bool], BeforeValidator(_to_bool)]
+
+
+class _Report(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+
+
+class FunctionAnalysis(_Report):
+    """One testable unit found by the analyzer"""
+
+    name: str = ""
+    line_number: Number = None
+    params: StrList = []
+    returns: Optional[str] = None
+    branches: Number = None
+    has_side_effects: Flag = None
+    dependencies: StrList = []
+    complexity: Number = None
+    testability: Optional[str] = None
+
+
+class AnalysisReport(_Report):
+    """Output of analyze_code_task"""
+
+    file_path: Optional[str] = None
+    language: Optional[str] = None
+    functions: Annotated[list[FunctionAnalysis], BeforeValidator(_to_list)] = []
+    total_complexity: Number = None
+    priority_targets: StrList = []
+    warnings: StrList = []
+
+    def note(self) -> str:
+        """Short memory note: priorities and warnings"""
+        parts = [f"{len(self.functions)} functions"]
+        if self.priority_targets:
+            parts.append("priority: " + ", ".join(self.priority_targets[:5]))
+        if self.warnings:
+            parts.append("warnings: " + "; ".join(self.warnings[:3]))
+        return ", ".join(parts)
+
+
+class ValidationIssue(_Report):
+    """One problem found by the validator"""
+
+    severity: Optional[str] = None
+    test: Optional[str] = None
+    issue: str = ""
+    fix: Optional[str] = None
+
+
+class ValidationReport(_Report):
+    """Output of validate_tests_task"""
+
+    syntax_valid: Flag = None
+    imports_valid: Flag = None
+    estimated_coverage: Number = None
+    functions_tested: StrList = []
+    functions_missing: StrList = []
+    issues: Annotated[list[ValidationIssue], BeforeValidator(_to_list)] = []
+    quality_score: Number = None
+    ready_for_execution: Flag = None
+    recommendations: StrList = []
+
+    def note(self) -> str:
+        """Short memory note: score, missing functions, top issues"""
+        parts = []
+        if self.quality_score is not None:
+            parts.append(f"quality {self.quality_score:g}")
+        if self.functions_missing:
+            parts.append("untested: " + ", ".join(self.functions_missing[:5]))
+        issues = [i.issue for i in self.issues if i.issue][:3]
+        if issues:
+            parts.append("issues: " + "; ".join(issues))
+        return ", ".join(parts)
+
+
+# Отчёты по задачам crew
+TASK_REPORTS = {
+    "analyze_code_task": AnalysisReport,
+    "validate_tests_task": ValidationReport,
+}
+
+
+def parse_report(text: str, model: type[BaseModel]) -> tuple[Optional[BaseModel], bool]:
+    """
+    Parse an LLM answer into a report model.
+
+    Returns:
+        (report or None if there is no usable JSON object, repaired)
+    """
+    if not text:
+        return None, False
+    data, repaired = loads_lenient(text)
+    if isinstance(data, list) and model is AnalysisReport:
+        data = {"functions": data}
+    if not isinstance(data, dict):
+        return None, False
+    try:
+        return model.model_validate(data), repaired
+    except ValidationError as e:
+        logger.warning(f"{model.__name__} does not validate: {e.error_count()} errors")
+        return None, repaired
+
+
+def structured_output(model: type[BaseModel]) -> Callable:
+    """
+    Task callback that attaches the parsed report to the TaskOutput.
+
+    output.pydantic gets the report and output.json_dict its dict; raw
+    stays as the model wrote it (the next task still gets it as context).
+    """
+    def attach(output) -> None:
+        report, repaired = parse_report(getattr(output, "raw", "") or "", model)
+        if report is None:
+            logger.warning(f"No {model.__name__} in task output; keeping raw text")
+            return
+        if repaired:
+            logger.info(f"{model.__name__}: repaired malformed JSON locally (no retry)")
+        output.pydantic = report
+        output.json_dict = report.model_dump()
+    return attach
+
+
+__all__ = [
+    "JsonRepair",
+    "repair_json",
+    "loads_lenient",
+    "FunctionAnalysis",
+    "AnalysisReport",
+    "ValidationIssue",
+    "ValidationReport",
+    "TASK_REPORTS",
+    "parse_report",
+    "structured_output",
+]
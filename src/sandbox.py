@@ -0,0 +1,668 @@
+"""
+Prewarmed sandbox for running generated tests
+
+Workers are forked from a multiprocessing forkserver that has pytest
+(and coverage) already imported, so starting one costs a fork instead of
+an interpreter launch plus imports. The forkserver is shared with the
+crew worker pool; forkserver.py merges the modules both preload. A few idle workers are kept ready;
+each runs exactly one job and is replaced in the background.
+
+Every job runs in a fresh temporary directory, under rlimits (CPU time,
+address space, open files), in a new network namespace with no
+interfaces and under a Landlock ruleset: the job directory is the only
+writable place, and only the interpreter and system directories are
+readable (not the project, its .env, the caches or /proc). The test code
+sees an allowlisted environment without the bot's secrets. A job is not
+run at all when the namespace or the ruleset cannot be set up, unless
+SANDBOX_REQUIRE_ISOLATION=0. No Docker is needed.
+
+Configuration (environment):
+    SANDBOX_WORKERS      Idle prewarmed workers (default 2)
+    SANDBOX_CPU_SECONDS  CPU time limit per job (default 30)
+    SANDBOX_MEMORY_MB    Address space limit per job (default 1024)
+    SANDBOX_OPEN_FILES   Open file limit per job (default 256)
+    SANDBOX_TIMEOUT      Wall-clock limit per job in seconds (default 60)
+    SANDBOX_REQUIRE_ISOLATION  Refuse jobs without network and filesystem
+                         isolation (default 1; 0 runs them anyway, e.g.
+                         inside a throwaway container; without Landlock the
+                         original environment stays readable in /proc)
+    COVERAGE_BACKEND     auto | sysmon | coveragepy (default auto: sys.monitoring
+                         on Python 3.12+, coverage.py elsewhere)
+"""
+
+import atexit
+import ctypes
+import ctypes.util
+import dataclasses
+import os
+import queue
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Iterable, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+try:
+    from . import monitoring_coverage
+    from .forkserver import get_context
+except ImportError:
+    import monitoring_coverage
+    from forkserver import get_context
+
+# Модули, импортируемые один раз в forkserver (наследуются воркерами)
+DEFAULT_PRELOAD = ("pytest", "coverage", "pdb")
+
+CLONE_NEWNET = 0x40000000
+CLONE_NEWUSER = 0x10000000
+
+MAX_OUTPUT_CHARS = 4000
+
+# Окружение кода тестов: только эти переменные (секреты бота — нет)
+ENV_ALLOWLIST = ("PATH", "LANG", "LANGUAGE", "TZ", "USER", "LOGNAME")
+ENV_PREFIX_ALLOWLIST = ("LC_", "PYTHON")
+
+# Landlock (Linux 5.13+): номера syscall общие для всех архитектур
+_SYS_LANDLOCK_CREATE_RULESET = 444
+_SYS_LANDLOCK_ADD_RULE = 445
+_SYS_LANDLOCK_RESTRICT_SELF = 446
+_LANDLOCK_CREATE_RULESET_VERSION = 1
+_LANDLOCK_RULE_PATH_BENEATH = 1
+_PR_SET_NO_NEW_PRIVS = 38
+
+_FS_EXECUTE = 1 << 0
+_FS_WRITE_FILE = 1 << 1
+_FS_READ_FILE = 1 << 2
+_FS_READ_DIR = 1 << 3
+_FS_ABI1 = (1 << 13) - 1  # execute ... make_sym
+_FS_REFER = 1 << 13  # ABI 2
+_FS_TRUNCATE = 1 << 14  # ABI 3
+_FS_FILE = _FS_EXECUTE | _FS_WRITE_FILE | _FS_READ_FILE | _FS_TRUNCATE
+_FS_READ = _FS_EXECUTE | _FS_READ_FILE | _FS_READ_DIR
+
+# Читаемые системные пути (кроме каталогов интерпретатора)
+SYSTEM_READ_PATHS = (
+    "/usr", "/lib", "/lib32", "/lib64", "/bin",
+    "/etc/ssl", "/etc/localtime", "/dev/urandom", "/dev/random", "/dev/zero",
+)
+
+
+@dataclass
+class SandboxLimits:
+    """Resource limits applied to each job"""
+
+    cpu_seconds: int = 30
+    memory_mb: int = 1024
+    open_files: int = 256
+    timeout: float = 60.0
+    isolate_network: bool = True
+    isolate_filesystem: bool = True
+    # Не запускать задачу, если изоляцию сети или файловой системы не удалось включить
+    require_isolation: bool = True
+
+    @classmethod
+    def from_env(cls) -> "SandboxLimits":
+        return cls(
+            cpu_seconds=int(os.getenv("SANDBOX_CPU_SECONDS", "30")),
+            memory_mb=int(os.getenv("SANDBOX_MEMORY_MB", "1024")),
+            open_files=int(os.getenv("SANDBOX_OPEN_FILES", "256")),
+            timeout=float(os.getenv("SANDBOX_TIMEOUT", "60")),
+            require_isolation=os.getenv("SANDBOX_REQUIRE_ISOLATION", "1") != "0"
+        )
+
+
+@dataclass
+class SandboxJob:
+    """Files to materialize and the pytest arguments to run them with"""
+
+    files: dict[str, str]
+    pytest_args: list[str]
+    coverage_files: list[str] = field(default_factory=list)
+    # Плагины pytest (модули); None — обычная автозагрузка по entry points
+    plugins: Optional[list[str]] = None
+    coverage_backend: str = "auto"
+    # Каталог задачи; SandboxPool.run() создаёт и удаляет его сам
+    work_dir: Optional[str] = None
+
+
+@dataclass
+class SandboxResult:
+    """Outcome of one sandboxed pytest run"""
+
+    exit_code: Optional[int]
+    output: str = ""
+    duration: float = 0.0
+    timed_out: bool = False
+    network_isolated: bool = False
+    filesystem_isolated: bool = False
+    # Имя файла → {"statements": [...], "missing": [...]}; бэкенд sysmon
+    # добавляет "partial_branches" — ветвления, пройденные в одну сторону
+    coverage: dict[str, dict] = field(default_factory=dict)
+    coverage_backend: Optional[str] = None
+    error: Optional[str] = None
+
+    @property
+    def passed(self) -> bool:
+        return self.exit_code == 0
+
+
+# ==================== WORKER SIDE ====================
+
+def _unshare(flags: int) -> bool:
+    if hasattr(os, "unshare"):  # Python 3.12+
+        try:
+            os.unshare(flags)
+            return True
+        except OSError:
+            return False
+    libc_name = ctypes.util.find_library("c")
+    if not libc_name:
+        return False
+    libc = ctypes.CDLL(libc_name, use_errno=True)
+    return libc.unshare(flags) == 0
+
+
+def isolate_network() -> bool:
+    """
+    Move the process into an empty network namespace.
+
+    Tries CLONE_NEWNET directly (root / CAP_SYS_ADMIN), then together with
+    a new user namespace (unprivileged). Best effort: False if neither is
+    permitted, e.g. inside a restricted container.
+    """
+    if not sys.platform.startswith("linux"):
+        return False
+    return _unshare(CLONE_NEWNET) or _unshare(CLONE_NEWUSER | CLONE_NEWNET)
+
+
+class _PathBeneathAttr(ctypes.Structure):
+    _pack_ = 1
+    _fields_ = [("allowed_access", ctypes.c_uint64), ("parent_fd", ctypes.c_int32)]
+
+
+def readable_paths() -> list[str]:
+    """Read-only paths for test code: the interpreter, site-packages, system dirs"""
+    import site
+
+    paths = [sys.prefix, sys.base_prefix, sys.exec_prefix, sys.base_exec_prefix]
+    paths += getattr(site, "getsitepackages", list)()
+    paths += SYSTEM_READ_PATHS
+    return list(dict.fromkeys(paths))
+
+
+def restrict_filesystem(work_dir: str, read_only: Optional[Iterable[str]] = None) -> bool:
+    """
+    Confine the current process with Landlock.
+
+    Everything under work_dir stays fully accessible; read_only paths
+    (default: readable_paths()) can be read and executed; os.devnull can
+    be written. Everything else, /proc included, is denied. The
+    restriction is permanent and inherited by child processes.
+
+    Returns:
+        False if Landlock is unavailable (old kernel, not Linux, seccomp)
+    """
+    if not sys.platform.startswith("linux"):
+        return False
+    libc = ctypes.CDLL(None, use_errno=True)
+    abi = libc.syscall(
+        ctypes.c_long(_SYS_LANDLOCK_CREATE_RULESET), None, ctypes.c_size_t(0),
+        ctypes.c_uint32(_LANDLOCK_CREATE_RULESET_VERSION)
+    )
+    if abi < 1:
+        return False
+    handled = _FS_ABI1 | (_FS_REFER if abi >= 2 else 0) | (_FS_TRUNCATE if abi >= 3 else 0)
+    attr = ctypes.c_uint64(handled)
+    ruleset = libc.syscall(
+        ctypes.c_long(_SYS_LANDLOCK_CREATE_RULESET), ctypes.byref(attr),
+        ctypes.c_size_t(ctypes.sizeof(attr)), ctypes.c_uint32(0)
+    )
+    if ruleset < 0:
+        return False
+
+    rules = [(work_dir, handled), (os.devnull, _FS_READ_FILE | _FS_WRITE_FILE)]
+    rules += [(path, _FS_READ) for path in (readable_paths() if read_only is None else read_only)]
+    try:
+        for path, access in rules:
+            try:
+                fd = os.open(path, os.O_PATH | os.O_CLOEXEC)
+            except OSError:
+                continue  # Нет такого пути — нечего разрешать
+            try:
+                if not os.path.isdir(path):
+                    access &= _FS_FILE  # Для файлов — только файловые права
+                rule = _PathBeneathAttr(access & handled, fd)
+                if libc.syscall(
+                    ctypes.c_long(_SYS_LANDLOCK_ADD_RULE), ctypes.c_int(ruleset),
+                    ctypes.c_int(_LANDLOCK_RULE_PATH_BENEATH), ctypes.byref(rule), ctypes.c_uint32(0)
+                ) != 0:
+                    return False
+            finally:
+                os.close(fd)
+        if libc.prctl(_PR_SET_NO_NEW_PRIVS, ctypes.c_ulong(1), ctypes.c_ulong(0),
+                      ctypes.c_ulong(0), ctypes.c_ulong(0)) != 0:
+            return False
+        return libc.syscall(
+            ctypes.c_long(_SYS_LANDLOCK_RESTRICT_SELF), ctypes.c_int(ruleset), ctypes.c_uint32(0)
+        ) == 0
+    finally:
+        os.close(ruleset)
+
+
+def sandbox_env(work_dir: str, environ: Optional[dict] = None) -> dict[str, str]:
+    """Environment for test code: allowlisted variables, HOME and TMPDIR in work_dir"""
+    environ = os.environ if environ is None else environ
+    env = {
+        key: value for key, value in environ.items()
+        if key in ENV_ALLOWLIST or key.startswith(ENV_PREFIX_ALLOWLIST)
+    }
+    env.update(HOME=work_dir, TMPDIR=work_dir)
+    return env
+
+
+def apply_limits(limits: SandboxLimits) -> None:
+    """Apply rlimits to the current process (never raises above the hard limit)"""
+    if resource is None:
+        return
+
+    def set_limit(kind: int, value: int) -> None:
+        _, hard = resource.getrlimit(kind)
+        if hard != resource.RLIM_INFINITY:
+            value = min(value, hard)
+        try:
+            resource.setrlimit(kind, (value, hard))
+        except (ValueError, OSError):
+            pass
+
+    set_limit(resource.RLIMIT_CPU, limits.cpu_seconds)
+    set_limit(resource.RLIMIT_AS, limits.memory_mb * 1024 * 1024)
+    set_limit(resource.RLIMIT_NOFILE, limits.open_files)
+
+
+def pytest_builtin_modules() -> list[str]:
+    """pytest's own plugin modules (imported lazily by every pytest.main())"""
+    try:
+        from _pytest.config import default_plugins
+    except ImportError:
+        return []
+    return [f"_pytest.{name}" for name in default_plugins]
+
+
+def preload_modules(preload: tuple = DEFAULT_PRELOAD, plugins: Optional[list[str]] = None) -> list[str]:
+    """Importable modules a SandboxPool preloads in the forkserver"""
+    if plugins is None:
+        plugins = pytest_plugin_modules()
+    modules = [*preload, *pytest_builtin_modules(), *plugins]
+    return [m for m in modules if _importable(m)]
+
+
+def pytest_plugin_modules() -> list[str]:
+    """Modules of installed pytest plugins (pytest11 entry points)"""
+    from importlib.metadata import entry_points
+    return sorted({ep.value.split(":")[0] for ep in entry_points(group="pytest11")})
+
+
+def resolve_coverage_backend(backend: str = "auto") -> str:
+    """
+    Pick the coverage backend for this interpreter.
+
+    Args:
+        backend: "auto", "sysmon" or "coveragepy"
+
+    Returns:
+        "sysmon" if requested (or auto) and sys.monitoring is usable,
+        otherwise "coveragepy"
+    """
+    if backend in ("auto", "sysmon") and monitoring_coverage.available():
+        return "sysmon"
+    return "coveragepy"
+
+
+def _run_pytest(
+    args: list[str],
+    coverage_files: list[str],
+    plugins: Optional[list[str]],
+    coverage_backend: str = "auto"
+) -> tuple[int, dict, Optional[str]]:
+    """pytest.main() in this process, optionally under a coverage collector"""
+    import importlib
+
+    import pytest
+
+    plugin_objects = None
+    if plugins is not None:
+        # Плагины уже импортированы в forkserver и передаются объектами:
+        # без сканирования всех установленных пакетов на каждый запуск
+        os.environ["PYTEST_DISABLE_PLUGIN_AUTOLOAD"] = "1"
+        plugin_objects = [importlib.import_module(name) for name in plugins]
+
+    if not coverage_files:
+        return int(pytest.main(args, plugins=plugin_objects)), {}, None
+
+    paths = [os.path.abspath(name) for name in coverage_files]
+    backend = resolve_coverage_backend(coverage_backend)
+
+    if backend == "sysmon":
+        collector = monitoring_coverage.MonitoringCoverage(paths)
+        collector.start()
+        try:
+            exit_code = int(pytest.main(args, plugins=plugin_objects))
+        finally:
+            collector.stop()
+
+        report = {}
+        for name, path in zip(coverage_files, paths, strict=True):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    source = f.read()
+                statements, missing = collector.analysis(path, source)
+            except (OSError, SyntaxError, ValueError):
+                continue
+            report[name] = {
+                "statements": statements,
+                "missing": missing,
+                "partial_branches": collector.partial_branches(path, source)
+            }
+        return exit_code, report, backend
+
+    import coverage
+
+    cov = coverage.Coverage(data_file=None, include=paths)
+    cov.start()
+    try:
+        exit_code = int(pytest.main(args, plugins=plugin_objects))
+    finally:
+        cov.stop()
+
+    report = {}
+    for name, path in zip(coverage_files, paths, strict=True):
+        try:
+            _, statements, _, missing, _ = cov.analysis2(path)
+        except coverage.CoverageException:
+            continue
+        report[name] = {"statements": list(statements), "missing": list(missing)}
+    return exit_code, report, backend
+
+
+def _execute(job: SandboxJob, limits: SandboxLimits) -> SandboxResult:
+    started = time.perf_counter()
+    # После Landlock воркер не может удалить свой каталог — это делает пул
+    own_dir = job.work_dir is None
+    work_dir = tempfile.mkdtemp(prefix="sandbox_") if own_dir else job.work_dir
+    try:
+        for name, content in job.files.items():
+            path = os.path.join(work_dir, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(content)
+        os.chdir(work_dir)
+        sys.path.insert(0, work_dir)
+
+        # Вывод pytest (и дочерних процессов тестов) — в файл, на уровне fd
+        log_path = os.path.join(work_dir, ".sandbox_output")
+        log_fd = os.open(log_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os.dup2(log_fd, 1)
+        os.dup2(log_fd, 2)
+
+        # Секреты процесса (токены, ключи API) коду тестов не видны
+        env = sandbox_env(work_dir)
+        os.environ.clear()
+        os.environ.update(env)
+        tempfile.tempdir = work_dir
+
+        network_isolated = isolate_network() if limits.isolate_network else False
+        filesystem_isolated = restrict_filesystem(work_dir) if limits.isolate_filesystem else False
+        missing = [
+            name for name, isolated in (("network", network_isolated), ("filesystem", filesystem_isolated))
+            if not isolated
+        ]
+        if limits.require_isolation and missing:
+            return SandboxResult(
+                exit_code=None,
+                duration=time.perf_counter() - started,
+                network_isolated=network_isolated,
+                filesystem_isolated=filesystem_isolated,
+                error=(f"sandbox isolation unavailable ({', '.join(missing)}); "
+                       "set SANDBOX_REQUIRE_ISOLATION=0 to run tests without it")
+            )
+        apply_limits(limits)
+
+        try:
+            exit_code, report, backend = _run_pytest(
+                job.pytest_args, job.coverage_files, job.plugins, job.coverage_backend
+            )
+            error = None
+        except BaseException as e:
+            exit_code, report, backend = None, {}, None
+            error = f"{type(e).__name__}: {e}"
+
+        sys.stdout.flush()
+        sys.stderr.flush()
+        with open(log_path, "r", encoding="utf-8", errors="replace") as f:
+            output = f.read()
+        return SandboxResult(
+            exit_code=exit_code,
+            output=output[-MAX_OUTPUT_CHARS:],
+            duration=time.perf_counter() - started,
+            network_isolated=network_isolated,
+            filesystem_isolated=filesystem_isolated,
+            coverage=report,
+            coverage_backend=backend,
+            error=error
+        )
+    finally:
+        if own_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def _worker_main(conn, limits: SandboxLimits) -> None:
+    """Worker: wait for one job, run it, send the result, exit"""
+    try:
+        job = conn.recv()
+    except EOFError:
+        return  # Пул закрыт до назначения задачи
+    try:
+        result = _execute(job, limits)
+    except BaseException as e:
+        result = SandboxResult(exit_code=None, error=f"{type(e).__name__}: {e}")
+    try:
+        conn.send(result)
+    finally:
+        conn.close()
+        # Без atexit-хуков и финализаторов pytest: процесс одноразовый
+        os._exit(0)
+
+
+# ==================== POOL ====================
+
+class SandboxPool:
+    """
+    Prewarmed single-use workers forked from a forkserver.
+
+    Args:
+        size: Idle workers kept ready (also the max concurrent jobs)
+        limits: Resource limits per job (default: from SANDBOX_* env)
+        preload: Modules imported once in the forkserver
+    """
+
+    def __init__(
+        self,
+        size: int = 2,
+        limits: Optional[SandboxLimits] = None,
+        preload: tuple = DEFAULT_PRELOAD
+    ):
+        self.size = size
+        self.limits = limits or SandboxLimits.from_env()
+
+        self.plugins = pytest_plugin_modules()
+        # Forkserver общий с воркерами crew: список модулей сливается в forkserver.py
+        self._ctx = get_context(preload_modules(preload, self.plugins))
+
+        self._idle: queue.Queue = queue.Queue()
+        self._closed = False
+        for _ in range(size):
+            self._idle.put(self._start_worker())
+
+    def _start_worker(self):
+        parent_conn, child_conn = self._ctx.Pipe()
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(child_conn, self.limits),
+            name="sandbox-worker",
+            daemon=True
+        )
+        process.start()
+        child_conn.close()
+        return process, parent_conn
+
+    def _replenish(self) -> None:
+        """Start a replacement worker off the caller's path"""
+        def start():
+            if not self._closed:
+                self._idle.put(self._start_worker())
+        threading.Thread(target=start, name="sandbox-replenish", daemon=True).start()
+
+    def run(self, job: SandboxJob, timeout: Optional[float] = None) -> SandboxResult:
+        """
+        Run a job in a prewarmed worker.
+
+        Args:
+            job: Files and pytest arguments
+            timeout: Wall-clock limit (default: limits.timeout)
+
+        Returns:
+            SandboxResult (timed_out=True if the worker was killed)
+        """
+        if self._closed:
+            raise RuntimeError("SandboxPool is shut down")
+        timeout = self.limits.timeout if timeout is None else timeout
+
+        process, conn = self._idle.get()
+        self._replenish()
+        started = time.perf_counter()
+        # Каталог удаляет пул: и после убитого по таймауту воркера
+        job = dataclasses.replace(job, work_dir=tempfile.mkdtemp(prefix="sandbox_"))
+        try:
+            try:
+                conn.send(job)
+            except (BrokenPipeError, EOFError, OSError) as e:
+                return SandboxResult(exit_code=None, error=f"worker unavailable: {e}")
+
+            if not conn.poll(timeout):
+                process.kill()
+                return SandboxResult(
+                    exit_code=None,
+                    duration=time.perf_counter() - started,
+                    timed_out=True,
+                    error=f"timed out after {timeout:g}s"
+                )
+            try:
+                return conn.recv()
+            except EOFError:
+                # Воркер убит ядром: RLIMIT_CPU (SIGXCPU) или нехватка памяти
+                process.join(1)
+                return SandboxResult(
+                    exit_code=None,
+                    duration=time.perf_counter() - started,
+                    error=f"worker died (exit code {process.exitcode})"
+                )
+        finally:
+            conn.close()
+            process.join(1)
+            if process.is_alive():
+                process.kill()
+            shutil.rmtree(job.work_dir, ignore_errors=True)
+
+    def run_pytest(
+        self,
+        files: dict[str, str],
+        test_file: str,
+        coverage_files: Optional[list[str]] = None,
+        extra_args: Optional[list[str]] = None,
+        timeout: Optional[float] = None
+    ) -> SandboxResult:
+        """
+        Run one test file against the given sources.
+
+        Args:
+            files: Relative path → content, written to the job directory
+            test_file: Test file among files
+            coverage_files: Sources to measure line coverage for
+            extra_args: Additional pytest arguments
+            timeout: Wall-clock limit
+
+        Returns:
+            SandboxResult
+        """
+        # cacheprovider: каталог одноразовый; unraisableexception: gc.collect()
+        # при завершении сессии, бесполезный в одноразовом процессе
+        args = [
+            test_file, "-q", "--tb=short",
+            "-p", "no:cacheprovider", "-p", "no:unraisableexception",
+            *(extra_args or [])
+        ]
+        job = SandboxJob(
+            files, args, list(coverage_files or []),
+            plugins=self.plugins,
+            coverage_backend=os.getenv("COVERAGE_BACKEND", "auto")
+        )
+        return self.run(job, timeout)
+
+    def shutdown(self) -> None:
+        """Stop idle workers"""
+        self._closed = True
+        while True:
+            try:
+                process, conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()  # Воркер получает EOF и завершается
+            process.join(1)
+            if process.is_alive():
+                process.kill()
+
+
+def _importable(module: str) -> bool:
+    import importlib.util
+    try:
+        return importlib.util.find_spec(module) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+_pool: Optional[SandboxPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> SandboxPool:
+    """Process-wide sandbox pool, created on first use (SANDBOX_* env)"""
+    global _pool
+
+    with _pool_lock:
+        if _pool is None:
+            _pool = SandboxPool(size=int(os.getenv("SANDBOX_WORKERS", "2")))
+            atexit.register(_pool.shutdown)
+        return _pool
+
+
+__all__ = [
+    "SandboxLimits",
+    "SandboxJob",
+    "SandboxResult",
+    "SandboxPool",
+    "get_pool",
+    "preload_modules",
+    "resolve_coverage_backend",
+    "isolate_network",
+    "restrict_filesystem",
+    "sandbox_env",
+    "apply_limits",
+]
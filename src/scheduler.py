@@ -0,0 +1,286 @@
+"""
+Fair, shortest-job-first scheduling of bot generation jobs
+
+Each job is given an estimated cost in work units. The cost is a fixed
+per-job overhead (the crew's three LLM calls) plus the AST node count
+plus the source size in bytes / 40, which stands in for prompt tokens.
+Free slots are handed out by weighted fair queuing across users: the
+job with the smallest virtual finish tag starts next. Each user offers
+their cheapest pending job, so a 3,000-line upload does not hold back
+other users' 10-line snippets, and one user cannot crowd out everyone
+else. Aging credits every waiting
+second against a job's cost, so large jobs are never starved.
+
+Seconds per work unit are learned from finished jobs (EWMA). This gives
+every queued job a position and an ETA.
+
+Configuration (environment):
+    SCHEDULER_AGING            Work units credited per second of waiting (default 20)
+    SCHEDULER_SECONDS_PER_UNIT Initial seconds per work unit (default 0.2)
+"""
+
+import ast
+import asyncio
+import heapq
+import itertools
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any, Hashable, Optional
+
+# Фиксированные затраты на задачу: три вызова LLM независимо от размера кода
+JOB_OVERHEAD_UNITS = 200
+BYTES_PER_UNIT = 40
+EWMA_ALPHA = 0.2
+
+
+def estimate_cost(code: str) -> float:
+    """
+    Expected work of generating tests for code, in work units.
+
+    Args:
+        code: Python source
+
+    Returns:
+        Overhead + AST node count + source bytes / BYTES_PER_UNIT
+    """
+    try:
+        nodes = sum(1 for _ in ast.walk(ast.parse(code)))
+    except (SyntaxError, ValueError):
+        # Не парсится — оцениваем только по размеру
+        nodes = len(code) // 8
+    return JOB_OVERHEAD_UNITS + nodes + len(code.encode("utf-8")) / BYTES_PER_UNIT
+
+
+@dataclass(eq=False)
+class Ticket:
+    """A job's place in the scheduler"""
+
+    user: Hashable
+    cost: float
+    cancel_token: Any = None
+    submitted: float = field(default_factory=time.monotonic)
+    started: Optional[float] = None
+    seq: int = 0
+    _future: Optional[asyncio.Future] = field(default=None, repr=False)
+
+    @property
+    def waited(self) -> float:
+        return (self.started or time.monotonic()) - self.submitted
+
+
+@dataclass
+class _UserQueue:
+    weight: float = 1.0
+    finish: float = 0.0  # Виртуальное время окончания последней выданной задачи
+    pending: list = field(default_factory=list)
+
+
+class JobScheduler:
+    """
+    Hands out a fixed number of slots to waiting jobs.
+
+    Used from a single event loop. submit() queues a job, acquire() waits
+    for its slot and release() returns it.
+
+    Args:
+        slots: Jobs allowed to run at once
+        aging: Work units credited per second of waiting
+        seconds_per_unit: Initial runtime estimate per work unit
+        weights: Optional per-user share (default 1.0)
+    """
+
+    def __init__(
+        self,
+        slots: int,
+        aging: Optional[float] = None,
+        seconds_per_unit: Optional[float] = None,
+        weights: Optional[dict] = None
+    ):
+        if slots < 1:
+            raise ValueError("slots must be >= 1")
+        self.slots = slots
+        self.aging = aging if aging is not None else float(os.getenv("SCHEDULER_AGING", "20"))
+        self.seconds_per_unit = (
+            seconds_per_unit if seconds_per_unit is not None
+            else float(os.getenv("SCHEDULER_SECONDS_PER_UNIT", "0.2"))
+        )
+        self.weights = dict(weights or {})
+        self.virtual_time = 0.0
+        self.running: list[Ticket] = []
+        self.completed = 0
+        self._users: dict[Hashable, _UserQueue] = {}
+        self._seq = itertools.count()
+
+    # ==================== QUEUE ====================
+
+    def submit(self, user: Hashable, code: Optional[str] = None, cost: Optional[float] = None,
+               cancel_token: Any = None) -> Ticket:
+        """
+        Queue a job; it runs as soon as the policy picks it.
+
+        Args:
+            user: Owner of the job (fair share unit)
+            code: Source to estimate the cost from
+            cost: Explicit cost in work units (instead of code)
+            cancel_token: CancelToken; cancelled jobs are dropped from the queue
+
+        Returns:
+            Ticket to pass to acquire() / release()
+        """
+        if cost is None:
+            cost = estimate_cost(code or "")
+        ticket = Ticket(user=user, cost=cost, cancel_token=cancel_token, seq=next(self._seq))
+        ticket._future = asyncio.get_running_loop().create_future()
+
+        queue = self._users.get(user)
+        if queue is None:
+            queue = self._users[user] = _UserQueue(weight=self.weights.get(user, 1.0))
+        queue.pending.append(ticket)
+        self._dispatch()
+        return ticket
+
+    async def acquire(self, ticket: Ticket) -> None:
+        """
+        Wait until the ticket is given a slot.
+
+        Raises:
+            JobCancelled: The job's cancel token fired while it was queued
+        """
+        granted = await asyncio.shield(ticket._future)
+        if not granted:
+            ticket.cancel_token.check()
+
+    def release(self, ticket: Ticket, learn: bool = True) -> None:
+        """
+        Return the slot of a started job (or drop a queued one).
+
+        Args:
+            ticket: Job to release
+            learn: Update the runtime estimate from this job (False for
+                cache hits and failed runs, which say nothing about cost)
+        """
+        if ticket in self.running:
+            self.running.remove(ticket)
+            if learn:
+                duration = time.monotonic() - ticket.started
+                self.seconds_per_unit += EWMA_ALPHA * (duration / ticket.cost - self.seconds_per_unit)
+            self.completed += 1
+        else:
+            self._remove(ticket)
+        self._dispatch()
+
+    def _remove(self, ticket: Ticket) -> None:
+        queue = self._users.get(ticket.user)
+        if queue and ticket in queue.pending:
+            queue.pending.remove(ticket)
+            if ticket._future and not ticket._future.done():
+                ticket._future.set_result(False)
+
+    # ==================== POLICY ====================
+
+    def _pick(self, pending: dict, virtual_time: float, finish: dict, now: float):
+        """
+        Next job to start: each user offers their cheapest job after aging,
+        and the user whose job has the smallest aged finish tag wins.
+
+        Returns:
+            (user, ticket, start tag, finish tag) or None if nothing is pending
+        """
+        best = None
+        for user, tickets in pending.items():
+            ticket = min(tickets, key=lambda t: (t.cost - self.aging * (now - t.submitted), t.seq))
+            start = max(virtual_time, finish[user])
+            tag = start + ticket.cost / self._users[user].weight
+            key = (tag - self.aging * (now - ticket.submitted), ticket.seq)
+            if best is None or key < best[0]:
+                best = (key, user, ticket, start, tag)
+        return best[1:] if best else None
+
+    def _order(self, now: float) -> list[Ticket]:
+        """Pending jobs in the order they would start (state is not changed)"""
+        virtual_time = self.virtual_time
+        finish = {user: q.finish for user, q in self._users.items()}
+        pending = {user: list(q.pending) for user, q in self._users.items() if q.pending}
+
+        order = []
+        while pending:
+            user, ticket, virtual_time, finish[user] = self._pick(pending, virtual_time, finish, now)
+            order.append(ticket)
+            pending[user].remove(ticket)
+            if not pending[user]:
+                del pending[user]
+        return order
+
+    def _dispatch(self) -> None:
+        now = time.monotonic()
+        for user, queue in list(self._users.items()):
+            for ticket in [t for t in queue.pending if t.cancel_token is not None and t.cancel_token.cancelled]:
+                self._remove(ticket)
+            if not queue.pending and queue.finish <= self.virtual_time:
+                del self._users[user]  # Пустая очередь без долга — забываем
+
+        while len(self.running) < self.slots:
+            pending = {user: q.pending for user, q in self._users.items() if q.pending}
+            picked = self._pick(pending, self.virtual_time, {u: self._users[u].finish for u in pending}, now)
+            if picked is None:
+                return
+
+            user, ticket, self.virtual_time, tag = picked
+            queue = self._users[user]
+            queue.pending.remove(ticket)
+            queue.finish = tag
+            ticket.started = now
+            self.running.append(ticket)
+            ticket._future.set_result(True)
+
+    # ==================== STATUS ====================
+
+    def expected_seconds(self, ticket: Ticket) -> float:
+        """Estimated runtime of a job"""
+        return ticket.cost * self.seconds_per_unit
+
+    def position(self, ticket: Ticket) -> tuple[int, float]:
+        """
+        Place in the queue and estimated seconds until the job finishes.
+
+        Returns:
+            (position, eta): position 0 means running; eta counts from now
+        """
+        now = time.monotonic()
+        if ticket in self.running:
+            return 0, max(self.expected_seconds(ticket) - (now - ticket.started), 0.0)
+
+        # Слоты освобождаются по мере окончания запущенных задач
+        free_at = [max(self.expected_seconds(t) - (now - t.started), 0.0) for t in self.running]
+        free_at += [0.0] * (self.slots - len(free_at))
+        heapq.heapify(free_at)
+        for index, queued in enumerate(self._order(now), start=1):
+            start = heapq.heappop(free_at)
+            end = start + self.expected_seconds(queued)
+            if queued is ticket:
+                return index, end
+            heapq.heappush(free_at, end)
+        return 0, 0.0
+
+    def tickets(self, user: Hashable) -> list[Ticket]:
+        """A user's running and queued jobs"""
+        queue = self._users.get(user)
+        return [t for t in self.running if t.user == user] + (list(queue.pending) if queue else [])
+
+    def stats(self) -> dict:
+        """Queue length, running jobs and the current runtime estimate"""
+        return {
+            "queued": sum(len(q.pending) for q in self._users.values()),
+            "running": len(self.running),
+            "slots": self.slots,
+            "completed": self.completed,
+            "seconds_per_unit": round(self.seconds_per_unit, 4),
+        }
+
+
+__all__ = [
+    "JobScheduler",
+    "Ticket",
+    "estimate_cost",
+]
@@ -0,0 +1,404 @@
+"""
+Coalescing of concurrent identical jobs (singleflight)
+
+Jobs with the same content key share one run. The first submission leads
+and runs the pipeline. Later ones attach to it and receive its result.
+The shared run is cancelled only when every attached job has been
+cancelled, so one user's /cancel does not cancel the run for the others.
+Its deadline is the latest deadline of the attached jobs; when it passes
+the run fails with DeadlineExceeded.
+
+Inside one process, flights are tracked in memory. Across worker
+processes, a JobStore (SQLite) records which process runs a key. Other
+processes poll the store for the result. If the owner stops sending
+heartbeats, a waiting process takes the key over.
+
+Configuration (environment):
+    JOB_STORE_PATH           SQLite file shared by worker processes (off if unset)
+    JOB_STORE_STALE_SECONDS  Heartbeat age after which a run is taken over (default 30)
+    JOB_STORE_RESULT_TTL     Seconds finished results stay readable (default 600)
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Optional
+
+try:
+    from .cancellation import CancelToken, DeadlineExceeded, JobCancelled
+    from .fingerprint import fingerprint
+except ImportError:
+    from cancellation import CancelToken, DeadlineExceeded, JobCancelled
+    from fingerprint import fingerprint
+
+POLL_SECONDS = 0.5
+
+
+def job_key(code: str, language: str = "python", **options) -> str:
+    """
+    Content key of a job: formatting and comments do not matter.
+
+    Args:
+        code: Source code
+        language: Programming language
+        **options: Run parameters that change the output (test_type, ...)
+
+    Returns:
+        Hex key
+    """
+    parts = [fingerprint(code, language), language]
+    parts += [f"{name}={options[name]}" for name in sorted(options)]
+    return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()
+
+
+# ==================== JOB STORE ====================
+
+@dataclass
+class JobRecord:
+    """Row of the job store"""
+
+    key: str
+    owner: str
+    state: str  # running | done
+    heartbeat: float
+    result: Any = None
+
+
+class JobStore:
+    """
+    SQLite record of which process runs a job key, and its result.
+
+    Args:
+        path: SQLite file shared by the processes
+        stale_seconds: A running job without a heartbeat for this long is
+            considered dead and can be claimed again
+        result_ttl: Seconds a finished result stays readable
+    """
+
+    def __init__(self, path: str, stale_seconds: float = 30, result_ttl: float = 600):
+        self.path = path
+        self.stale_seconds = stale_seconds
+        self.result_ttl = result_ttl
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "key TEXT PRIMARY KEY, owner TEXT NOT NULL, state TEXT NOT NULL, "
+                "heartbeat REAL NOT NULL, result TEXT)"
+            )
+
+    @classmethod
+    def from_env(cls) -> Optional["JobStore"]:
+        """Store from JOB_STORE_* variables (None if disabled)"""
+        path = os.getenv("JOB_STORE_PATH")
+        if not path:
+            return None
+        return cls(
+            path,
+            stale_seconds=float(os.getenv("JOB_STORE_STALE_SECONDS", "30")),
+            result_ttl=float(os.getenv("JOB_STORE_RESULT_TTL", "600"))
+        )
+
+    @contextmanager
+    def _connect(self):
+        """Connection in a transaction, closed afterwards"""
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def claim(self, key: str) -> bool:
+        """
+        Become the process that runs key.
+
+        Returns:
+            True if claimed: there was no row, the row's owner stopped
+            heartbeating, or the finished result has expired
+        """
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")  # Проверка и запись — одна транзакция
+            row = conn.execute("SELECT state, heartbeat FROM jobs WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                state, heartbeat = row
+                limit = self.stale_seconds if state == "running" else self.result_ttl
+                if now - heartbeat <= limit:
+                    return False
+            conn.execute(
+                "INSERT OR REPLACE INTO jobs (key, owner, state, heartbeat, result) "
+                "VALUES (?, ?, 'running', ?, NULL)",
+                (key, self.owner, now)
+            )
+            return True
+
+    def heartbeat(self, key: str) -> None:
+        """Mark this process's run of key as alive"""
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET heartbeat = ? WHERE key = ? AND owner = ? AND state = 'running'",
+                (time.time(), key, self.owner)
+            )
+
+    def complete(self, key: str, result: Any) -> None:
+        """Publish the result (must be JSON-serializable)"""
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET state = 'done', heartbeat = ?, result = ? WHERE key = ? AND owner = ?",
+                (time.time(), json.dumps(result), key, self.owner)
+            )
+            # Заодно чистим устаревшие результаты
+            conn.execute(
+                "DELETE FROM jobs WHERE state = 'done' AND heartbeat < ?",
+                (time.time() - self.result_ttl,)
+            )
+
+    def release(self, key: str) -> None:
+        """Give up a run without a result (cancelled or failed); others may claim it"""
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "DELETE FROM jobs WHERE key = ? AND owner = ? AND state = 'running'",
+                (key, self.owner)
+            )
+
+    def get(self, key: str) -> Optional[JobRecord]:
+        """Current record of key, or None"""
+        with self._lock, self._connect() as conn:
+            row = conn.execute(
+                "SELECT owner, state, heartbeat, result FROM jobs WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        owner, state, heartbeat, result = row
+        return JobRecord(key, owner, state, heartbeat, json.loads(result) if result is not None else None)
+
+
+# ==================== SINGLEFLIGHT ====================
+
+class _AllCancelled:
+    """Event-like flag of a shared run: set once every attached job is cancelled"""
+
+    def __init__(self):
+        self.tokens: list[CancelToken] = []
+        self._forced = threading.Event()
+
+    def is_set(self) -> bool:
+        if self._forced.is_set():
+            return True
+        tokens = list(self.tokens)
+        return bool(tokens) and all(token.cancelled for token in tokens)
+
+    def set(self) -> None:
+        self._forced.set()
+
+
+class _SharedToken(CancelToken):
+    """
+    Token of a shared run: cancelled once every attached job is, with the
+    latest deadline among theirs (none if a job without a deadline or
+    without a token is attached).
+    """
+
+    def __init__(self):
+        super().__init__(event=_AllCancelled())
+        self._unbounded = False
+
+    def attach(self, token: Optional[CancelToken]) -> None:
+        if token is None or token.deadline is None:
+            self._unbounded = True
+            self.deadline = None
+        if token is not None:
+            self._event.tokens.append(token)
+        if not self._unbounded:
+            self.deadline = max(t.deadline for t in self._event.tokens)
+
+    def check(self) -> None:
+        # Все сроки истекли: это дедлайн, а не отмена
+        if self.expired:
+            raise DeadlineExceeded("deadline exceeded")
+        super().check()
+
+
+@dataclass
+class _Flight:
+    future: asyncio.Future
+    token: _SharedToken = field(default_factory=_SharedToken)
+    followers: int = 0
+    task: Optional[asyncio.Task] = None
+
+
+class SingleFlight:
+    """
+    Runs at most one job per key at a time; identical jobs share it.
+
+    Used from a single event loop.
+
+    Args:
+        store: JobStore for coalescing across processes (None = this process only)
+    """
+
+    def __init__(self, store: Optional[JobStore] = None):
+        self.store = store
+        self._flights: dict[str, _Flight] = {}
+        self.runs = 0    # Запуски, выполненные этим процессом
+        self.shared = 0  # Задания, получившие чужой результат
+
+    def in_flight(self, key: str) -> bool:
+        """True if a job with key is running in this process"""
+        return key in self._flights
+
+    async def run(
+        self,
+        key: str,
+        fn: Callable[[CancelToken], Awaitable[Any]],
+        token: Optional[CancelToken] = None,
+        on_attach: Optional[Callable[[], Awaitable[None]]] = None
+    ) -> Any:
+        """
+        Run fn for key, or attach to the run already in progress.
+
+        Args:
+            key: Content key (see job_key)
+            fn: Coroutine function running the pipeline; it receives the
+                shared token (cancelled once every attached job is; its
+                deadline is the latest of theirs)
+            token: This job's cancel token
+            on_attach: Awaited when the job attaches to another run
+
+        Returns:
+            fn's result (JSON-serializable when a store is used; None
+            means failure and is not published to other processes)
+
+        Raises:
+            JobCancelled: This job was cancelled (the shared run goes on
+                while other jobs are attached)
+            DeadlineExceeded: This job's deadline passed, or the shared
+                run's (the latest of all attached jobs)
+        """
+        flight = self._flights.get(key)
+        if flight is not None:
+            self.shared += 1
+            flight.followers += 1
+            flight.token.attach(token)
+            if on_attach is not None:
+                await on_attach()
+            return await self._wait(flight.future, token)
+
+        flight = _Flight(future=asyncio.get_running_loop().create_future())
+        flight.token.attach(token)
+        self._flights[key] = flight
+        # Исключение видят все участники; без ожидающих его не логируем
+        flight.future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        flight.task = asyncio.create_task(self._lead(key, flight, fn, on_attach))
+        return await self._wait(flight.future, token)
+
+    async def _lead(self, key: str, flight: _Flight, fn, on_attach) -> None:
+        shared_token = flight.token
+        try:
+            while True:
+                if self.store is None or await asyncio.to_thread(self.store.claim, key):
+                    result = await self._run_claimed(key, fn, shared_token)
+                    break
+                # Ключ выполняет другой процесс: ждём его результат
+                if on_attach is not None:
+                    await on_attach()
+                    on_attach = None
+                found, result = await self._poll_store(key, shared_token)
+                if found:
+                    self.shared += 1
+                    break
+        except asyncio.CancelledError:
+            self._flights.pop(key, None)
+            flight.future.cancel()
+            raise
+        except Exception as e:
+            self._flights.pop(key, None)
+            flight.future.set_exception(e)
+            return
+        self._flights.pop(key, None)
+        flight.future.set_result(result)
+
+    async def _run_claimed(self, key: str, fn, shared_token: CancelToken) -> Any:
+        self.runs += 1
+        heartbeat = None
+        if self.store is not None:
+            heartbeat = asyncio.create_task(self._heartbeat(key))
+        try:
+            result = await fn(shared_token)
+        except BaseException:
+            if self.store is not None:
+                await asyncio.to_thread(self.store.release, key)
+            raise
+        finally:
+            if heartbeat is not None:
+                heartbeat.cancel()
+        if self.store is not None:
+            if result is None:
+                # None — неудачный запуск: не публикуем его на JOB_STORE_RESULT_TTL,
+                # ожидающие процессы выполнят задание сами
+                await asyncio.to_thread(self.store.release, key)
+            else:
+                await asyncio.to_thread(self.store.complete, key, result)
+        return result
+
+    async def _heartbeat(self, key: str) -> None:
+        while True:
+            await asyncio.sleep(self.store.stale_seconds / 3)
+            await asyncio.to_thread(self.store.heartbeat, key)
+
+    async def _poll_store(self, key: str, shared_token: CancelToken) -> tuple[bool, Any]:
+        """
+        Wait for another process's run of key.
+
+        Returns:
+            (True, result) when it finished, (False, None) if the run is
+            gone or stale and key should be claimed again
+        """
+        while True:
+            shared_token.check()
+            record = await asyncio.to_thread(self.store.get, key)
+            if record is None:
+                return False, None
+            if record.state == "done":
+                return True, record.result
+            if time.time() - record.heartbeat > self.store.stale_seconds:
+                return False, None
+            await asyncio.sleep(POLL_SECONDS)
+
+    @staticmethod
+    async def _wait(future: asyncio.Future, token: Optional[CancelToken]) -> Any:
+        """Wait for the shared result, leaving early if this job is cancelled"""
+        while True:
+            try:
+                return await asyncio.wait_for(asyncio.shield(future), timeout=POLL_SECONDS)
+            except asyncio.TimeoutError:
+                if token is not None:
+                    token.check()
+            except JobCancelled:
+                # Общий запуск отменён — все участники отменены; своя причина точнее
+                if token is not None:
+                    token.check()
+                raise
+
+    def stats(self) -> dict:
+        """Runs done by this process and jobs served by another run"""
+        return {"runs": self.runs, "shared": self.shared, "in_flight": len(self._flights)}
+
+
+__all__ = [
+    "JobRecord",
+    "JobStore",
+    "SingleFlight",
+    "job_key",
+]
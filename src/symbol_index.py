@@ -0,0 +1,367 @@
+"""
+Project-wide symbol index for dependency context
+
+Modules, classes, function signatures and first docstring lines of a
+project are extracted with ast and stored in one JSON file. Entries are
+keyed by file mtime/size and content hash, so an update re-parses only
+files that actually changed. For a module under test, context_for()
+renders just the signatures it imports from the project, so agents do
+not guess sibling APIs or spend tool iterations reading those files.
+
+Configuration (environment):
+    SYMBOL_INDEX       0 = disabled (default: enabled when a project root is found)
+    SYMBOL_INDEX_PATH  Index file (default: <root>/.testing_agent/symbols.json)
+"""
+
+import ast
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Optional
+
+INDEX_VERSION = 1
+
+# Признаки корня проекта
+ROOT_MARKERS = ("pyproject.toml", "setup.py", "setup.cfg", ".git")
+
+SKIP_DIRS = {
+    ".git", ".hg", ".venv", "venv", "env", "node_modules", "__pycache__",
+    "build", "dist", ".tox", ".nox", ".mypy_cache", ".pytest_cache", ".testing_agent",
+}
+
+DEFAULT_INDEX_DIR = ".testing_agent"
+
+
+def find_project_root(file_path: str) -> Optional[Path]:
+    """Nearest parent directory of file_path containing a root marker"""
+    path = Path(file_path).resolve().parent
+    for directory in (path, *path.parents):
+        if any((directory / marker).exists() for marker in ROOT_MARKERS):
+            return directory
+    return None
+
+
+def _first_doc_line(node: ast.AST) -> str:
+    doc = ast.get_docstring(node) or ""
+    return doc.strip().splitlines()[0] if doc.strip() else ""
+
+
+def _signature(node) -> str:
+    """def line of a function without the body"""
+    prefix = "async def" if isinstance(node, ast.AsyncFunctionDef) else "def"
+    returns = f" -> {ast.unparse(node.returns)}" if node.returns else ""
+    return f"{prefix} {node.name}({ast.unparse(node.args)}){returns}"
+
+
+def _decorators(node) -> list[str]:
+    return [ast.unparse(d) for d in node.decorator_list]
+
+
+def extract_symbols(source: str) -> dict[str, dict]:
+    """
+    Public top-level symbols of a module.
+
+    Args:
+        source: Module source code
+
+    Returns:
+        Name → {kind, signature, doc, decorators[, methods]} (empty if unparsable)
+    """
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError):
+        return {}
+
+    symbols = {}
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            symbols[node.name] = {
+                "kind": "function",
+                "signature": _signature(node),
+                "doc": _first_doc_line(node),
+                "decorators": _decorators(node),
+            }
+        elif isinstance(node, ast.ClassDef):
+            bases = ", ".join(ast.unparse(b) for b in node.bases + node.keywords)
+            methods = [
+                {
+                    "signature": _signature(item),
+                    "doc": _first_doc_line(item),
+                    "decorators": _decorators(item),
+                }
+                for item in node.body
+                if isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef))
+                and (not item.name.startswith("_") or item.name == "__init__")
+            ]
+            symbols[node.name] = {
+                "kind": "class",
+                "signature": f"class {node.name}({bases})" if bases else f"class {node.name}",
+                "doc": _first_doc_line(node),
+                "decorators": _decorators(node),
+                "methods": methods,
+            }
+        elif isinstance(node, (ast.Assign, ast.AnnAssign)):
+            targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+            for target in targets:
+                if isinstance(target, ast.Name) and target.id.isupper():
+                    symbols[target.id] = {
+                        "kind": "constant",
+                        "signature": ast.unparse(node).split("\n")[0][:120],
+                        "doc": "",
+                        "decorators": [],
+                    }
+    return symbols
+
+
+def imported_names(source: str, module: Optional[str] = None) -> dict[str, Optional[set[str]]]:
+    """
+    What a module imports.
+
+    Args:
+        source: Module source code
+        module: Dotted name of the module (resolves relative imports)
+
+    Returns:
+        Module → imported names (None = whole module, `import x`)
+    """
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError):
+        return {}
+
+    package = module.rsplit(".", 1)[0] if module and "." in module else ""
+    imports: dict[str, Optional[set[str]]] = {}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                imports[alias.name] = None
+        elif isinstance(node, ast.ImportFrom):
+            target = node.module or ""
+            if node.level:
+                base = package.split(".") if package else []
+                base = base[:len(base) - (node.level - 1)]
+                target = ".".join(part for part in [*base, target] if part)
+            if target in imports and imports[target] is None:
+                continue  # Модуль уже импортирован целиком
+            imports.setdefault(target, set()).update(alias.name for alias in node.names)
+    return imports
+
+
+class SymbolIndex:
+    """
+    Persistent, incrementally updated index of a project's symbols.
+
+    Args:
+        root: Project root directory
+        index_path: JSON file for the index (default: <root>/.testing_agent/symbols.json)
+        max_chars: Limit of the rendered dependency context
+    """
+
+    def __init__(self, root: str, index_path: Optional[str] = None, max_chars: int = 6000):
+        self.root = Path(root).resolve()
+        self.index_path = Path(index_path) if index_path else self.root / DEFAULT_INDEX_DIR / "symbols.json"
+        self.max_chars = max_chars
+        self._files: dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    @classmethod
+    def for_file(cls, file_path: str) -> Optional["SymbolIndex"]:
+        """Index of the project containing file_path (None if disabled or no root)"""
+        if os.getenv("SYMBOL_INDEX", "1") == "0":
+            return None
+        root = find_project_root(file_path)
+        if root is None:
+            return None
+        return cls(str(root), index_path=os.getenv("SYMBOL_INDEX_PATH") or None)
+
+    # ==================== STORAGE ====================
+
+    def _load(self) -> None:
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("version") == INDEX_VERSION and data.get("root") == str(self.root):
+            self._files = data.get("files", {})
+
+    def _save(self) -> None:
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        data = {"version": INDEX_VERSION, "root": str(self.root), "files": self._files}
+
+        # Атомарная запись, как в TestCache.put
+        fd, tmp_path = tempfile.mkstemp(dir=self.index_path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.index_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    # ==================== UPDATE ====================
+
+    def module_name(self, path: Path) -> str:
+        """Dotted module name of a file relative to the root"""
+        parts = list(path.resolve().relative_to(self.root).with_suffix("").parts)
+        if parts and parts[-1] == "__init__":
+            parts.pop()
+        return ".".join(parts)
+
+    def _python_files(self):
+        for directory, dirs, files in os.walk(self.root):
+            dirs[:] = [d for d in dirs if d not in SKIP_DIRS and not d.startswith(".")]
+            for name in files:
+                if name.endswith(".py"):
+                    yield Path(directory) / name
+
+    def update(self) -> dict:
+        """
+        Bring the index up to date with the files on disk.
+
+        Unchanged mtime and size skip the file; a changed mtime with the
+        same content hash only refreshes the stat; otherwise it is parsed.
+
+        Returns:
+            Counts: parsed, unchanged, removed
+        """
+        stats = {"parsed": 0, "unchanged": 0, "removed": 0}
+        with self._lock:
+            dirty = not self.index_path.exists()
+            seen = set()
+            for path in self._python_files():
+                rel = str(path.relative_to(self.root))
+                seen.add(rel)
+                try:
+                    stat = path.stat()
+                except OSError:
+                    continue
+
+                entry = self._files.get(rel)
+                if entry and entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+                    stats["unchanged"] += 1
+                    continue
+
+                try:
+                    data = path.read_bytes()
+                except OSError:
+                    continue
+                digest = hashlib.sha256(data).hexdigest()
+                dirty = True
+                if entry and entry["sha256"] == digest:
+                    # touch без правок: запоминаем новый mtime, не парсим
+                    entry.update(mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+                    stats["unchanged"] += 1
+                    continue
+
+                self._files[rel] = {
+                    "module": self.module_name(path),
+                    "mtime_ns": stat.st_mtime_ns,
+                    "size": stat.st_size,
+                    "sha256": digest,
+                    "symbols": extract_symbols(data.decode("utf-8", errors="replace")),
+                }
+                stats["parsed"] += 1
+
+            for rel in set(self._files) - seen:
+                del self._files[rel]
+                stats["removed"] += 1
+                dirty = True
+
+            if dirty:
+                self._save()
+        return stats
+
+    # ==================== LOOKUP ====================
+
+    def _modules(self) -> dict[str, dict]:
+        return {entry["module"]: entry["symbols"] for entry in self._files.values()}
+
+    def lookup(self, module: str) -> Optional[dict]:
+        """Symbols of a project module (None if not in the project)"""
+        with self._lock:
+            return self._modules().get(module)
+
+    def context_for(self, source: str, file_path: Optional[str] = None) -> str:
+        """
+        Render signatures the given module imports from the project.
+
+        Args:
+            source: Source of the module under test
+            file_path: Its path (resolves relative imports; excluded from context)
+
+        Returns:
+            Prompt section ('' if nothing is imported from the project)
+        """
+        self.update()
+
+        module = None
+        if file_path:
+            try:
+                module = self.module_name(Path(file_path))
+            except ValueError:
+                module = None
+
+        with self._lock:
+            modules = self._modules()
+
+        sections = []
+        for target, names in sorted(imported_names(source, module).items()):
+            if target == module:
+                continue
+            if names is not None:
+                # `from pkg import mod` — импорт подмодуля целиком
+                for name in sorted(names):
+                    if f"{target}.{name}" in modules:
+                        sections.append(self._render(f"{target}.{name}", modules[f"{target}.{name}"], None))
+                names = {n for n in names if f"{target}.{n}" not in modules}
+                if not names:
+                    continue
+            if target in modules:
+                sections.append(self._render(target, modules[target], names))
+
+        if not sections:
+            return ""
+        text = "\n\n".join(section for section in sections if section)
+        if len(text) > self.max_chars:
+            text = text[:self.max_chars] + "\n# ... (truncated)"
+        return f"Signatures of project code imported by this module:\n```python\n{text}\n```"
+
+    @staticmethod
+    def _render(module: str, symbols: dict, names: Optional[set[str]]) -> str:
+        if names is None or "*" in names:
+            selected = [n for n in symbols if not n.startswith("_")]
+        else:
+            selected = [n for n in symbols if n in names]
+        if not selected:
+            return ""
+
+        lines = [f"# {module}"]
+        for name in selected:
+            symbol = symbols[name]
+            if symbol["kind"] == "constant":
+                lines.append(symbol["signature"])
+                continue
+
+            methods = symbol.get("methods", [])
+            doc = f"  # {symbol['doc']}" if symbol["doc"] else ""
+            lines += [f"@{d}" for d in symbol["decorators"]]
+            lines.append(f"{symbol['signature']}:{doc}" if methods else f"{symbol['signature']}: ...{doc}")
+            for method in methods:
+                doc = f"  # {method['doc']}" if method["doc"] else ""
+                lines += [f"    @{d}" for d in method["decorators"]]
+                lines.append(f"    {method['signature']}: ...{doc}")
+        return "\n".join(lines)
+
+
+__all__ = [
+    "SymbolIndex",
+    "extract_symbols",
+    "imported_names",
+    "find_project_root",
+]
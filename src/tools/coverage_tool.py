@@ -3,9 +3,17 @@ Custom Coverage Tool for CrewAI
 Analyzes test coverage and suggests improvements
 """
 
-from typing import Any, Type
-from pydantic import BaseModel, Field
+from typing import Type
+
 from crewai.tools import BaseTool
+from pydantic import BaseModel, Field
+
+try:
+    from ..sandbox import get_pool
+    from .snapshot_tool import current_store
+except ImportError:
+    from sandbox import get_pool
+    from tools.snapshot_tool import current_store
 
 
 class CoverageInput(BaseModel):
@@ -38,6 +46,9 @@ class CoverageTool(BaseTool):
         """
         Run coverage analysis.
 
+        Tests run in a prewarmed sandbox worker (see sandbox.py) with
+        both files copied into a temporary directory.
+
         Args:
             source_file: Path to source file
             test_file: Path to test file
@@ -45,75 +56,28 @@ class CoverageTool(BaseTool):
         Returns:
             Coverage report as string
         """
-        try:
-            import coverage
-            import subprocess
-            import json
-            from pathlib import Path
-
-            # Создаём coverage объект
-            cov = coverage.Coverage(
-                source=[str(Path(source_file).parent)],
-                omit=["*test*", "*__pycache__*"]
-            )
-
-            # Запускаем тесты под coverage
-            cov.start()
-
-            result = subprocess.run(
-                ["python", "-m", "pytest", test_file, "-v", "--tb=short"],
-                capture_output=True,
-                text=True,
-                timeout=60
-            )
+        import json
+        from pathlib import Path
 
-            cov.stop()
-            cov.save()
-
-            # Получаем данные
-            analysis = cov.analysis(source_file)
-
-            # analysis = (filename, statements, excluded, missing, formatted_missing)
-            total_lines = len(analysis[1])
-            missing_lines = len(analysis[3])
-            covered_lines = total_lines - missing_lines
-
-            coverage_percent = (covered_lines / total_lines * 100) if total_lines > 0 else 0
-
-            report = {
-                "source_file": source_file,
-                "test_file": test_file,
-                "coverage_percent": round(coverage_percent, 2),
-                "total_lines": total_lines,
-                "covered_lines": covered_lines,
-                "missing_lines": list(analysis[3]),
-                "test_output": result.stdout[-500:] if result.stdout else "",
-                "test_errors": result.stderr[-500:] if result.stderr else "",
-                "test_passed": result.returncode == 0
+        try:
+            source_name = Path(source_file).name
+            test_name = Path(test_file).name
+            files = {
+                source_name: Path(source_file).read_text(encoding="utf-8"),
+                test_name: Path(test_file).read_text(encoding="utf-8")
             }
 
-            # Suggestions
-            if coverage_percent < 80:
-                report["suggestions"] = [
-                    f"Coverage is {coverage_percent}%, target is 80%",
-                    f"Add tests for lines: {', '.join(map(str, analysis[3][:10]))}",
-                    "Focus on error handling paths and edge cases"
-                ]
-            else:
-                report["suggestions"] = ["Coverage target met! Consider adding edge case tests."]
+            result = get_pool().run_pytest(files, test_name, coverage_files=[source_name])
+            if result.timed_out:
+                return json.dumps({
+                    "error": "Test execution timed out",
+                    "fix": "Check for infinite loops or long-running tests"
+                })
 
+            report = coverage_report(result, source_name)
+            report.update(source_file=source_file, test_file=test_file)
             return json.dumps(report, indent=2)
 
-        except ImportError:
-            return json.dumps({
-                "error": "coverage package not installed",
-                "fix": "pip install coverage pytest"
-            })
-        except subprocess.TimeoutExpired:
-            return json.dumps({
-                "error": "Test execution timed out",
-                "fix": "Check for infinite loops or long-running tests"
-            })
         except Exception as e:
             return json.dumps({
                 "error": str(e),
@@ -121,6 +85,108 @@ class CoverageTool(BaseTool):
             })
 
 
+def coverage_report(result, source_name: str) -> dict:
+    """
+    Build the coverage report dict from a sandbox result.
+
+    Args:
+        result: SandboxResult of a run with coverage_files=[source_name]
+        source_name: Source file name inside the sandbox
+
+    Returns:
+        Report with coverage_percent, missing_lines, test output and suggestions
+    """
+    data = result.coverage.get(source_name, {"statements": [], "missing": []})
+    total_lines = len(data["statements"])
+    missing = data["missing"]
+    covered_lines = total_lines - len(missing)
+    coverage_percent = (covered_lines / total_lines * 100) if total_lines > 0 else 0
+
+    report = {
+        "coverage_percent": round(coverage_percent, 2),
+        "total_lines": total_lines,
+        "covered_lines": covered_lines,
+        "missing_lines": missing,
+        "test_output": result.output[-500:],
+        "test_errors": result.error or "",
+        "test_passed": result.passed,
+        "duration_seconds": round(result.duration, 3)
+    }
+    # Branch data comes only from the sys.monitoring backend (Python 3.12+)
+    partial = data.get("partial_branches")
+    if partial is not None:
+        report["partial_branch_lines"] = partial
+
+    # Suggestions
+    if coverage_percent < 80:
+        report["suggestions"] = [
+            f"Coverage is {round(coverage_percent, 2)}%, target is 80%",
+            f"Add tests for lines: {', '.join(map(str, missing[:10]))}",
+            "Focus on error handling paths and edge cases"
+        ]
+        if partial:
+            report["suggestions"].append(
+                f"Cover the other outcome of conditions on lines: {', '.join(map(str, partial[:10]))}"
+            )
+    else:
+        report["suggestions"] = ["Coverage target met! Consider adding edge case tests."]
+    return report
+
+
+class RunTestsInput(BaseModel):
+    """Input schema for RunTestsTool"""
+    test_code: str = Field(
+        description="Complete pytest test module to run against the code under test"
+    )
+
+
+class RunTestsTool(BaseTool):
+    """
+    Tool for running generated tests against the code under test.
+
+    The module under test comes from the run's snapshot (the code in the
+    prompt); tests run with coverage in a prewarmed sandbox worker.
+    """
+
+    name: str = "run_tests"
+    description: str = (
+        "Runs a pytest test module against the code under test in an isolated sandbox. "
+        "Returns pass/fail, failing test output, coverage percent and uncovered lines. "
+        "Input: test_code (the full test file)."
+    )
+    args_schema: Type[BaseModel] = RunTestsInput
+
+    def _run(self, test_code: str) -> str:
+        """
+        Run the tests.
+
+        Args:
+            test_code: Test module source
+
+        Returns:
+            JSON report or an error message
+        """
+        import json
+        from pathlib import Path
+
+        store = current_store()
+        if store is None or store.primary is None:
+            return json.dumps({"error": "No code under test in this run"})
+
+        snapshot = store.snapshot(store.primary)
+        source_name = Path(store.primary).name
+        test_name = f"test_{Path(source_name).stem}_generated.py"
+        files = {
+            source_name: snapshot.read_lines(),
+            test_name: test_code
+        }
+
+        result = get_pool().run_pytest(files, test_name, coverage_files=[source_name])
+        if result.timed_out:
+            return json.dumps({"error": f"Tests timed out ({result.error})"})
+        return json.dumps(coverage_report(result, source_name), indent=2)
+
+
 class SyntaxCheckerInput(BaseModel):
     """Input schema for SyntaxCheckerTool"""
     code: str = Field(description="Python code to check for syntax errors")
@@ -176,4 +242,4 @@ class SyntaxCheckerTool(BaseTool):
 
 
 # Export tools
-__all__ = ["CoverageTool", "SyntaxCheckerTool"]
+__all__ = ["CoverageTool", "RunTestsTool", "SyntaxCheckerTool", "coverage_report"]
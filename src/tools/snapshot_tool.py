@@ -0,0 +1,325 @@
+"""
+Snapshot-backed file read tool for CrewAI
+Serves the code under test from an immutable snapshot taken at run() time
+"""
+
+import contextvars
+import mmap
+import os
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional, Type
+
+from crewai.tools import BaseTool
+from pydantic import BaseModel, Field
+
+# Файлы больше порога читаются через mmap, а не в память процесса
+MMAP_THRESHOLD_BYTES = 1024 * 1024
+
+# Ограничение на размер одного ответа инструмента
+MAX_LINES_PER_READ = 400
+
+
+class FileSnapshot:
+    """
+    Immutable copy of a file's content with line-range access.
+
+    Small files (and code already in memory) are kept as bytes. Large
+    files are copied once to a private temp file and memory-mapped, so
+    the snapshot neither changes when the original is edited nor loads
+    the whole file into the Python heap.
+    """
+
+    def __init__(self, path: str, data):
+        self.path = path
+        self._data = data  # bytes или mmap
+        self._line_starts: Optional[list[int]] = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_text(cls, path: str, text: str) -> "FileSnapshot":
+        return cls(path, text.encode("utf-8"))
+
+    @classmethod
+    def from_path(cls, path: str, mmap_threshold: int = MMAP_THRESHOLD_BYTES) -> "FileSnapshot":
+        """Snapshot a file from disk (mmap of a private copy above mmap_threshold)"""
+        size = os.path.getsize(path)
+        if size < mmap_threshold or size == 0:
+            with open(path, "rb") as f:
+                return cls(path, f.read())
+
+        # Копия нужна для неизменяемости: mmap оригинала видит его правки
+        fd, copy_path = tempfile.mkstemp(prefix="snapshot_", suffix=Path(path).suffix)
+        try:
+            with open(path, "rb") as src, os.fdopen(fd, "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            with open(copy_path, "rb") as f:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        finally:
+            os.unlink(copy_path)  # Отображение остаётся валидным
+        return cls(path, data)
+
+    @property
+    def size(self) -> int:
+        return len(self._data)
+
+    @property
+    def mapped(self) -> bool:
+        return isinstance(self._data, mmap.mmap)
+
+    def _starts(self) -> list[int]:
+        """Byte offsets of line starts (built once, lazily)"""
+        with self._lock:
+            if self._line_starts is None:
+                starts = [0]
+                find = self._data.find
+                pos = find(b"\n")
+                while pos != -1:
+                    starts.append(pos + 1)
+                    pos = find(b"\n", pos + 1)
+                if starts[-1] == len(self._data) and len(starts) > 1:
+                    starts.pop()
+                self._line_starts = starts
+            return self._line_starts
+
+    @property
+    def line_count(self) -> int:
+        return len(self._starts()) if self._data else 0
+
+    def read_lines(self, start_line: int = 1, end_line: Optional[int] = None) -> str:
+        """
+        Return lines start_line..end_line (1-based, inclusive).
+
+        Args:
+            start_line: First line
+            end_line: Last line (default: end of file)
+
+        Returns:
+            Decoded text of the range
+        """
+        starts = self._starts()
+        total = self.line_count
+        start_line = max(1, start_line)
+        end_line = total if end_line is None else min(end_line, total)
+        if start_line > end_line:
+            return ""
+        begin = starts[start_line - 1]
+        end = starts[end_line] if end_line < len(starts) else len(self._data)
+        return self._data[begin:end].decode("utf-8", errors="replace")
+
+    def close(self) -> None:
+        if self.mapped:
+            self._data.close()
+
+
+class SnapshotStore:
+    """
+    Per-run set of file snapshots plus memoized reads.
+
+    The file under test is snapshotted from the prompt's code_content;
+    any other file is snapshotted on first access and frozen for the
+    rest of the run.
+
+    Reads are memoized for the whole run. A read repeated within the
+    same task is answered with a short pointer to the earlier output
+    instead of the content again: the agent already has it, and echoing
+    it back tends to start a re-read loop that costs a model round-trip
+    per iteration.
+
+    Counters:
+        reads: Tool calls served
+        memo_hits: Calls answered from the per-run memo
+        repeat_reads: Repeated reads within a task, answered with a pointer
+        bytes_served: Bytes returned to agents
+    """
+
+    def __init__(self, root: Optional[str] = None, mmap_threshold: int = MMAP_THRESHOLD_BYTES):
+        self.root = Path(root).resolve() if root else None
+        self.mmap_threshold = mmap_threshold
+        self.primary: Optional[str] = None
+        self._snapshots: dict[str, FileSnapshot] = {}
+        self._memo: dict[tuple, str] = {}
+        self._seen_in_task: set[tuple] = set()
+        self._lock = threading.Lock()
+
+        self.reads = 0
+        self.memo_hits = 0
+        self.repeat_reads = 0
+        self.bytes_served = 0
+
+    @staticmethod
+    def _key(path: str) -> str:
+        return str(Path(path).resolve())
+
+    def add(self, path: str, content: str, primary: bool = True) -> FileSnapshot:
+        """Register in-memory content for path (the code already in the prompt)"""
+        snapshot = FileSnapshot.from_text(path, content)
+        with self._lock:
+            self._snapshots[self._key(path)] = snapshot
+            if primary:
+                self.primary = self._key(path)
+        return snapshot
+
+    def snapshot(self, path: str) -> FileSnapshot:
+        """Snapshot for path, taken on first access"""
+        key = self._key(path)
+        with self._lock:
+            snapshot = self._snapshots.get(key)
+        if snapshot is not None:
+            return snapshot
+
+        if self.root is not None and not Path(key).is_relative_to(self.root):
+            raise PermissionError(f"{path} is outside the project")
+        snapshot = FileSnapshot.from_path(key, self.mmap_threshold)
+        with self._lock:
+            # Параллельный вызов мог успеть раньше — оставляем первый снимок
+            existing = self._snapshots.setdefault(key, snapshot)
+        if existing is not snapshot:
+            snapshot.close()
+        return existing
+
+    def read(self, path: str, start_line: int = 1, end_line: Optional[int] = None) -> str:
+        """Memoized line-range read with the tool's response format"""
+        memo_key = (self._key(path), start_line, end_line)
+        with self._lock:
+            self.reads += 1
+            if memo_key in self._seen_in_task:
+                self.repeat_reads += 1
+                return (
+                    f"{path} lines {start_line}-{end_line or 'end'} were already returned "
+                    "above and have not changed; use that output instead of reading again."
+                )
+            self._seen_in_task.add(memo_key)
+            if memo_key in self._memo:
+                self.memo_hits += 1
+                result = self._memo[memo_key]
+                self.bytes_served += len(result.encode("utf-8"))
+                return result
+
+        snapshot = self.snapshot(path)
+        total = snapshot.line_count
+        if end_line is None or end_line - start_line + 1 > MAX_LINES_PER_READ:
+            last = min(total, start_line + MAX_LINES_PER_READ - 1)
+        else:
+            last = min(total, end_line)
+
+        text = snapshot.read_lines(start_line, last)
+        result = f"{path} (lines {start_line}-{last} of {total})\n{text}"
+        if last < total and (end_line is None or end_line > last):
+            result += f"\n[truncated: request start_line={last + 1} for more]"
+
+        with self._lock:
+            self._memo[memo_key] = result
+            self.bytes_served += len(result.encode("utf-8"))
+        return result
+
+    def next_task(self) -> None:
+        """Start a new task: its agent has not seen earlier reads"""
+        with self._lock:
+            self._seen_in_task.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "reads": self.reads,
+                "memo_hits": self.memo_hits,
+                "repeat_reads": self.repeat_reads,
+                "bytes_served": self.bytes_served,
+                "files": len(self._snapshots),
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            for snapshot in self._snapshots.values():
+                snapshot.close()
+            self._snapshots.clear()
+            self._memo.clear()
+
+
+_current_store: contextvars.ContextVar[Optional[SnapshotStore]] = contextvars.ContextVar(
+    "testing_agent_snapshot_store", default=None
+)
+
+
+def current_store() -> Optional[SnapshotStore]:
+    """Snapshot store of the run executing in this context, if any"""
+    return _current_store.get()
+
+
+@contextmanager
+def use_snapshot_store(store: SnapshotStore):
+    """Bind a snapshot store to the current context for the duration of a run"""
+    handle = _current_store.set(store)
+    try:
+        yield store
+    finally:
+        _current_store.reset(handle)
+        store.close()
+
+
+class SnapshotReadInput(BaseModel):
+    """Input schema for SnapshotReadTool"""
+    file_path: str = Field(
+        description="Path to the file to read"
+    )
+    start_line: int = Field(
+        default=1,
+        description="First line to read (1-based)"
+    )
+    end_line: Optional[int] = Field(
+        default=None,
+        description="Last line to read (inclusive); omit to read to the end"
+    )
+
+
+class SnapshotReadTool(BaseTool):
+    """
+    Tool for reading files from the run's snapshot.
+
+    Replaces FileReadTool: the code under test is served from the copy
+    taken when the run started (the one in the prompt), other files are
+    frozen on first read, and repeated reads are memoized per run.
+    """
+
+    name: str = "read_file"
+    description: str = (
+        "Reads a file as it was when this run started. "
+        "The code under test is already in the task description - read it only "
+        "to get exact line numbers. Input: file_path, optional start_line and end_line "
+        f"(at most {MAX_LINES_PER_READ} lines per call)."
+    )
+    args_schema: Type[BaseModel] = SnapshotReadInput
+
+    def _run(self, file_path: str, start_line: int = 1, end_line: Optional[int] = None) -> str:
+        """
+        Read a line range from the snapshot.
+
+        Args:
+            file_path: Path to the file
+            start_line: First line (1-based)
+            end_line: Last line, inclusive
+
+        Returns:
+            File content with a header, or an error message
+        """
+        try:
+            store = current_store()
+            if store is not None:
+                return store.read(file_path, start_line, end_line)
+            # Вне run(): одноразовое хранилище, поведение как у FileReadTool
+            with use_snapshot_store(SnapshotStore()) as store:
+                return store.read(file_path, start_line, end_line)
+        except OSError as e:
+            return f"Error reading {file_path}: {e}"
+
+
+__all__ = [
+    "FileSnapshot",
+    "SnapshotStore",
+    "SnapshotReadTool",
+    "current_store",
+    "use_snapshot_store",
+]
@@ -0,0 +1,562 @@
+"""
+End-to-end tracing: spans from the bot handler down to LLM and tool calls
+
+Spans nest through a context variable, so a span opened in the bot
+handler is the parent of the queue wait, the TestingCrew.run span and,
+through CrewAI's event bus, every task, LLM call and tool invocation
+of that run. Finished spans go to a JSONL file or to an OTLP/HTTP
+collector (OTLP JSON encoding, e.g. http://localhost:4318/v1/traces).
+
+Configuration (environment):
+    TRACING_EXPORTER       off (default) | jsonl | otlp
+    TRACING_JSONL_PATH     File for the jsonl exporter (default traces.jsonl)
+    TRACING_OTLP_ENDPOINT  Collector URL (default http://localhost:4318/v1/traces)
+    TRACING_SERVICE_NAME   service.name resource attribute (default testing-agent)
+"""
+
+import atexit
+import contextvars
+import json
+import logging
+import os
+import queue
+import secrets
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class Span:
+    """A timed operation with attributes"""
+
+    __slots__ = (
+        "name", "trace_id", "span_id", "parent_id",
+        "start_ns", "end_ns", "attributes", "status", "error"
+    )
+
+    def __init__(
+        self,
+        name: str,
+        parent: Optional["Span"] = None,
+        start_ns: Optional[int] = None,
+        attributes: Optional[dict] = None
+    ):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent.span_id if parent else None
+        self.start_ns = start_ns or time.time_ns()
+        self.end_ns = None
+        self.attributes = {k: v for k, v in (attributes or {}).items() if v is not None}
+        self.status = "ok"
+        self.error = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        if value is not None:
+            self.attributes[key] = value
+
+    def set_attributes(self, **attributes) -> None:
+        for key, value in attributes.items():
+            self.set_attribute(key, value)
+
+    def record_error(self, error: Any) -> None:
+        self.status = "error"
+        self.error = str(error)[:500]
+
+    @property
+    def duration_ms(self) -> Optional[float]:
+        if self.end_ns is None:
+            return None
+        return (self.end_ns - self.start_ns) / 1e6
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": self.duration_ms,
+            "status": self.status,
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+
+class _NoopSpan:
+    """Span stand-in when tracing is off (no allocation per call)"""
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def set_attributes(self, **attributes) -> None:
+        pass
+
+    def record_error(self, error: Any) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar(
+    "testing_agent_span", default=None
+)
+
+
+def current_span() -> Optional[Span]:
+    """Return the innermost open span of this context"""
+    return _current_span.get()
+
+
+# ==================== EXPORTERS ====================
+
+class JsonlExporter:
+    """Append finished spans to a JSON Lines file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        line = json.dumps(span.to_dict(), default=str)
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+    def shutdown(self) -> None:
+        pass
+
+
+def _otlp_value(value: Any) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class OtlpHttpExporter:
+    """
+    Send spans to an OTLP/HTTP collector in JSON encoding.
+
+    Spans are batched and posted from a background thread, so exporting
+    never blocks the traced code.
+    """
+
+    def __init__(
+        self,
+        endpoint: str,
+        service_name: str = "testing-agent",
+        batch_size: int = 64,
+        flush_interval: float = 2.0
+    ):
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: queue.Queue = queue.Queue(maxsize=10000)
+        self._thread = threading.Thread(target=self._worker, name="otlp-exporter", daemon=True)
+        self._thread.start()
+
+    def export(self, span: Span) -> None:
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            pass  # Коллектор недоступен — теряем спаны, но не тормозим работу
+
+    def _worker(self) -> None:
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            timeout = max(0.0, deadline - time.monotonic())
+            try:
+                span = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                span = None
+            if span is _STOP:
+                self._send(batch)
+                return
+            if span is not None:
+                batch.append(span)
+            if len(batch) >= self.batch_size or time.monotonic() >= deadline:
+                self._send(batch)
+                batch = []
+                deadline = time.monotonic() + self.flush_interval
+
+    def encode(self, spans: list[Span]) -> dict:
+        """Build an OTLP ExportTraceServiceRequest (JSON mapping)"""
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": [
+                    {"key": "service.name", "value": {"stringValue": self.service_name}}
+                ]},
+                "scopeSpans": [{
+                    "scope": {"name": "testing-agent"},
+                    "spans": [
+                        {
+                            "traceId": span.trace_id,
+                            "spanId": span.span_id,
+                            **({"parentSpanId": span.parent_id} if span.parent_id else {}),
+                            "name": span.name,
+                            "kind": 1,
+                            "startTimeUnixNano": str(span.start_ns),
+                            "endTimeUnixNano": str(span.end_ns),
+                            "attributes": [
+                                {"key": key, "value": _otlp_value(value)}
+                                for key, value in span.attributes.items()
+                            ],
+                            "status": (
+                                {"code": 2, "message": span.error or ""}
+                                if span.status == "error" else {"code": 1}
+                            ),
+                        }
+                        for span in spans
+                    ],
+                }],
+            }]
+        }
+
+    def _send(self, spans: list[Span]) -> None:
+        if not spans:
+            return
+        request = urllib.request.Request(
+            self.endpoint,
+            data=json.dumps(self.encode(spans), default=str).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+            method="POST"
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=5):
+                pass
+        except Exception as e:
+            logger.warning(f"OTLP export failed ({len(spans)} spans): {e}")
+
+    def shutdown(self) -> None:
+        self._queue.put(_STOP)
+        self._thread.join(timeout=5)
+
+
+_STOP = object()
+
+
+# ==================== TRACER ====================
+
+class Tracer:
+    """
+    Creates spans and hands finished ones to the exporter.
+
+    A tracer without exporter is disabled: span() yields NOOP_SPAN.
+    """
+
+    def __init__(self, exporter=None):
+        self.exporter = exporter
+
+    @property
+    def enabled(self) -> bool:
+        return self.exporter is not None
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        """Open a child span of the current one for the duration of the block"""
+        if not self.enabled:
+            yield NOOP_SPAN
+            return
+
+        span = Span(name, parent=current_span(), attributes=attributes)
+        handle = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.record_error(f"{type(e).__name__}: {e}")
+            raise
+        finally:
+            _current_span.reset(handle)
+            self.end_span(span)
+
+    def start_span(
+        self,
+        name: str,
+        parent: Optional[Span] = None,
+        start_ns: Optional[int] = None,
+        **attributes
+    ) -> Optional[Span]:
+        """Start a span that is ended explicitly (event-driven instrumentation)"""
+        if not self.enabled:
+            return None
+        return Span(name, parent=parent or current_span(), start_ns=start_ns, attributes=attributes)
+
+    def end_span(self, span: Optional[Span], end_ns: Optional[int] = None) -> None:
+        if span is None or not self.enabled:
+            return
+        span.end_ns = end_ns or time.time_ns()
+        try:
+            self.exporter.export(span)
+        except Exception as e:
+            logger.warning(f"Span export failed: {e}")
+
+    def shutdown(self) -> None:
+        if self.exporter is not None:
+            self.exporter.shutdown()
+
+
+_tracer: Optional[Tracer] = None
+_tracer_lock = threading.Lock()
+
+
+def create_exporter(kind: Optional[str] = None):
+    """Build the exporter selected by TRACING_EXPORTER (None = tracing off)"""
+    kind = kind or os.getenv("TRACING_EXPORTER", "off")
+    if kind == "jsonl":
+        return JsonlExporter(os.getenv("TRACING_JSONL_PATH", "traces.jsonl"))
+    if kind == "otlp":
+        return OtlpHttpExporter(
+            os.getenv("TRACING_OTLP_ENDPOINT", "http://localhost:4318/v1/traces"),
+            service_name=os.getenv("TRACING_SERVICE_NAME", "testing-agent")
+        )
+    if kind not in ("off", ""):
+        raise ValueError(f"Unknown TRACING_EXPORTER: {kind}. Use off, jsonl or otlp")
+    return None
+
+
+def get_tracer() -> Tracer:
+    """Process-wide tracer, configured from the environment on first use"""
+    global _tracer
+
+    if _tracer is None:
+        with _tracer_lock:
+            if _tracer is None:
+                _tracer = Tracer(create_exporter())
+                if _tracer.enabled:
+                    instrument_crewai(_tracer)
+                    atexit.register(_tracer.shutdown)
+    return _tracer
+
+
+def set_tracer(tracer: Tracer) -> None:
+    """Replace the process-wide tracer (tests, custom exporters)"""
+    global _tracer
+    _tracer = tracer
+    if tracer.enabled:
+        instrument_crewai(tracer)
+
+
+# ==================== CREWAI INSTRUMENTATION ====================
+
+def _event_ns(event: Any) -> Optional[int]:
+    """Event timestamp in ns (handlers may run later than the event)"""
+    timestamp = getattr(event, "timestamp", None)
+    if isinstance(timestamp, datetime):
+        return int(timestamp.timestamp() * 1e9)
+    return None
+
+
+def _text_bytes(value: Any) -> int:
+    if value is None:
+        return 0
+    if isinstance(value, (list, dict)):
+        value = json.dumps(value, default=str)
+    return len(str(value).encode("utf-8"))
+
+
+def _cached_tokens(usage: dict) -> Optional[int]:
+    """Prompt tokens served from the provider's prefix cache, as reported"""
+    if "cached_prompt_tokens" in usage:
+        return usage["cached_prompt_tokens"]
+    details = usage.get("prompt_tokens_details") or {}
+    if isinstance(details, dict) and "cached_tokens" in details:
+        return details["cached_tokens"]  # OpenAI-совместимые
+    return usage.get("cache_read_input_tokens")  # Anthropic
+
+
+class _CrewAISpans:
+    """Pairs CrewAI start/finish events into spans"""
+
+    def __init__(self):
+        self.tracer: Optional[Tracer] = None
+        self._open: dict[tuple, Span] = {}
+        # Обработчики событий идут в пуле потоков: "finish" может прийти раньше "start"
+        self._early_finish: dict[tuple, tuple] = {}
+        self._lock = threading.Lock()
+
+    def begin(self, key: tuple, name: str, event: Any, parent_key: Optional[tuple] = None, **attributes):
+        tracer = self.tracer
+        if tracer is None or not tracer.enabled:
+            return
+        with self._lock:
+            parent = self._open.get(parent_key) if parent_key else None
+            span = tracer.start_span(name, parent=parent, start_ns=_event_ns(event), **attributes)
+            early = self._early_finish.pop(key, None)
+            if early is None:
+                self._open[key] = span
+        if early is not None:
+            self._close(span, *early)
+
+    def finish(self, key: tuple, event: Any, error: Optional[str] = None, **attributes):
+        if self.tracer is None:
+            return
+        with self._lock:
+            span = self._open.pop(key, None)
+            if span is None:
+                self._early_finish[key] = (event, error, attributes)
+                return
+        self._close(span, event, error, attributes)
+
+    def _close(self, span: Span, event: Any, error: Optional[str], attributes: dict):
+        span.set_attributes(**attributes)
+        if error:
+            span.record_error(error)
+        self.tracer.end_span(span, end_ns=_event_ns(event))
+
+
+_crewai_spans = _CrewAISpans()
+
+
+def instrument_crewai(tracer: Tracer) -> bool:
+    """
+    Emit spans for CrewAI tasks, LLM calls and tool calls.
+
+    Handlers are registered on CrewAI's event bus once per process.
+
+    Returns:
+        True if CrewAI's event bus is available
+    """
+    first_time = _crewai_spans.tracer is None
+    _crewai_spans.tracer = tracer
+    if not first_time:
+        return True
+
+    try:
+        from crewai.events import (
+            LLMCallCompletedEvent,
+            LLMCallFailedEvent,
+            LLMCallStartedEvent,
+            TaskCompletedEvent,
+            TaskFailedEvent,
+            TaskStartedEvent,
+            ToolUsageErrorEvent,
+            ToolUsageFinishedEvent,
+            ToolUsageStartedEvent,
+            crewai_event_bus,
+        )
+    except ImportError:
+        try:
+            from crewai.utilities.events import (
+                LLMCallCompletedEvent,
+                LLMCallFailedEvent,
+                LLMCallStartedEvent,
+                TaskCompletedEvent,
+                TaskFailedEvent,
+                TaskStartedEvent,
+                ToolUsageErrorEvent,
+                ToolUsageFinishedEvent,
+                ToolUsageStartedEvent,
+                crewai_event_bus,
+            )
+        except ImportError:
+            _crewai_spans.tracer = None
+            return False
+
+    spans = _crewai_spans
+
+    def task_key(event: Any) -> tuple:
+        task = getattr(event, "task", None)
+        return ("task", getattr(event, "task_id", None) or str(getattr(task, "id", "")))
+
+    def llm_key(event: Any) -> tuple:
+        return ("llm", getattr(event, "call_id", None) or getattr(event, "agent_role", None))
+
+    def tool_key(event: Any) -> tuple:
+        return (
+            "tool", getattr(event, "task_id", None),
+            getattr(event, "tool_name", None), getattr(event, "run_attempts", None)
+        )
+
+    @crewai_event_bus.on(TaskStartedEvent)
+    def on_task_started(source, event):
+        task = getattr(event, "task", None)
+        spans.begin(
+            task_key(event), "crewai.task", event,
+            task_name=getattr(task, "name", None) or getattr(event, "task_name", None),
+            agent_role=getattr(getattr(task, "agent", None), "role", None),
+            context_bytes=_text_bytes(getattr(event, "context", None))
+        )
+
+    @crewai_event_bus.on(TaskCompletedEvent)
+    def on_task_completed(source, event):
+        output = getattr(event, "output", None)
+        spans.finish(task_key(event), event, output_bytes=_text_bytes(getattr(output, "raw", None)))
+
+    @crewai_event_bus.on(TaskFailedEvent)
+    def on_task_failed(source, event):
+        spans.finish(task_key(event), event, error=getattr(event, "error", "task failed"))
+
+    @crewai_event_bus.on(LLMCallStartedEvent)
+    def on_llm_started(source, event):
+        messages = getattr(event, "messages", None)
+        spans.begin(
+            llm_key(event), "llm.call", event,
+            parent_key=("task", getattr(event, "task_id", None)),
+            model=getattr(event, "model", None),
+            agent_role=getattr(event, "agent_role", None),
+            messages=len(messages) if isinstance(messages, list) else None,
+            prompt_bytes=_text_bytes(messages)
+        )
+
+    @crewai_event_bus.on(LLMCallCompletedEvent)
+    def on_llm_completed(source, event):
+        usage = getattr(event, "usage", None) or {}
+        spans.finish(
+            llm_key(event), event,
+            response_bytes=_text_bytes(getattr(event, "response", None)),
+            prompt_tokens=usage.get("prompt_tokens"),
+            cached_prompt_tokens=_cached_tokens(usage),
+            completion_tokens=usage.get("completion_tokens"),
+            total_tokens=usage.get("total_tokens")
+        )
+
+    @crewai_event_bus.on(LLMCallFailedEvent)
+    def on_llm_failed(source, event):
+        spans.finish(llm_key(event), event, error=getattr(event, "error", "llm call failed"))
+
+    @crewai_event_bus.on(ToolUsageStartedEvent)
+    def on_tool_started(source, event):
+        spans.begin(
+            tool_key(event), f"tool.{getattr(event, 'tool_name', 'unknown')}", event,
+            parent_key=("task", getattr(event, "task_id", None)),
+            args_bytes=_text_bytes(getattr(event, "tool_args", None))
+        )
+
+    @crewai_event_bus.on(ToolUsageFinishedEvent)
+    def on_tool_finished(source, event):
+        spans.finish(
+            tool_key(event), event,
+            from_cache=getattr(event, "from_cache", None),
+            output_bytes=_text_bytes(getattr(event, "output", None))
+        )
+
+    @crewai_event_bus.on(ToolUsageErrorEvent)
+    def on_tool_error(source, event):
+        spans.finish(tool_key(event), event, error=str(getattr(event, "error", "tool failed")))
+
+    return True
+
+
+__all__ = [
+    "Span",
+    "Tracer",
+    "JsonlExporter",
+    "OtlpHttpExporter",
+    "NOOP_SPAN",
+    "current_span",
+    "create_exporter",
+    "get_tracer",
+    "set_tracer",
+    "instrument_crewai",
+]
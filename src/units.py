@@ -0,0 +1,356 @@
+"""
+Module splitting and test file assembly for per-unit caching
+
+A module is split into top-level units (functions and classes). Each unit
+knows its direct dependencies: other top-level definitions, assignments
+and imports it references. Generated test modules are split back into
+per-unit blocks and reassembled into a single file.
+"""
+
+import ast
+import hashlib
+import re
+from dataclasses import dataclass, field
+from typing import Optional
+
+try:
+    from .fingerprint import fingerprint
+except ImportError:
+    from fingerprint import fingerprint
+
+_DEFINITIONS = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+
+
+@dataclass
+class CodeUnit:
+    """Top-level function or class of a module"""
+
+    name: str
+    kind: str  # "function" | "class"
+    source: str
+    dependencies: list[str] = field(default_factory=list)
+
+
+def _segment(lines: list[str], node: ast.stmt) -> str:
+    """Source lines of a top-level statement, decorators included"""
+    start = min([node.lineno] + [d.lineno for d in getattr(node, "decorator_list", [])])
+    return "\n".join(lines[start - 1:node.end_lineno])
+
+
+def _bound_names(node: ast.stmt) -> list[str]:
+    """Names a top-level statement binds"""
+    if isinstance(node, _DEFINITIONS):
+        return [node.name]
+    if isinstance(node, (ast.Import, ast.ImportFrom)):
+        return [(alias.asname or alias.name).split(".")[0] for alias in node.names]
+    if isinstance(node, (ast.Assign, ast.AnnAssign, ast.AugAssign)):
+        targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+        return [n.id for t in targets for n in ast.walk(t) if isinstance(n, ast.Name)]
+    return []
+
+
+def _referenced_names(node: ast.AST) -> set[str]:
+    """All bare names referenced inside a node"""
+    return {n.id for n in ast.walk(node) if isinstance(n, ast.Name)}
+
+
+def split_units(source: str) -> list[CodeUnit]:
+    """
+    Split a Python module into top-level units.
+
+    Args:
+        source: Module source code
+
+    Returns:
+        Units in source order (empty if the code does not parse)
+    """
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError):
+        return []
+
+    lines = source.splitlines()
+    bindings = {name for node in tree.body for name in _bound_names(node)}
+
+    units = []
+    for node in tree.body:
+        if not isinstance(node, _DEFINITIONS):
+            continue
+        deps = sorted((_referenced_names(node) & bindings) - {node.name})
+        units.append(CodeUnit(
+            name=node.name,
+            kind="class" if isinstance(node, ast.ClassDef) else "function",
+            source=_segment(lines, node),
+            dependencies=deps
+        ))
+    return units
+
+
+def dependency_sources(source: str) -> dict[str, str]:
+    """Map each top-level bound name to the source of the statement binding it"""
+    tree = ast.parse(source)
+    lines = source.splitlines()
+    return {
+        name: _segment(lines, node)
+        for node in tree.body
+        for name in _bound_names(node)
+    }
+
+
+def unit_fingerprint(unit: CodeUnit, deps: dict[str, str]) -> str:
+    """
+    Hash of a unit's normalized source and its direct dependencies.
+
+    Args:
+        unit: Code unit
+        deps: Name → source of top-level statements (from dependency_sources)
+
+    Returns:
+        Hex SHA-256 digest
+    """
+    parts = [fingerprint(unit.source)]
+    parts += [f"{name}:{fingerprint(deps[name])}" for name in unit.dependencies if name in deps]
+    return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()
+
+
+def module_subset(source: str, names: set[str]) -> str:
+    """
+    Module source reduced to the given units plus their dependencies.
+
+    Imports, assignments and other module-level statements are kept;
+    top-level definitions not in names (or their direct dependencies)
+    are dropped.
+    """
+    tree = ast.parse(source)
+    lines = source.splitlines()
+    units = {u.name: u for u in split_units(source)}
+
+    keep = set(names)
+    for name in names:
+        if name in units:
+            keep.update(units[name].dependencies)
+
+    parts = [
+        _segment(lines, node)
+        for node in tree.body
+        if not isinstance(node, _DEFINITIONS) or node.name in keep
+    ]
+    return "\n\n".join(parts) + "\n"
+
+
+# ==================== GENERATED TESTS ====================
+
+def _normalize_name(name: str) -> str:
+    name = name.lower()
+    for prefix in ("test_", "test"):
+        if name.startswith(prefix):
+            name = name[len(prefix):]
+            break
+    return name.replace("_", "")
+
+
+def _owner_by_name(test_name: str, unit_names: list[str]) -> Optional[str]:
+    """Unit whose name prefixes the test name (longest match wins)"""
+    normalized = _normalize_name(test_name)
+    matches = [u for u in unit_names if normalized.startswith(u.lower().replace("_", ""))]
+    return max(matches, key=len) if matches else None
+
+
+def split_tests(test_source: str, unit_names: list[str]) -> tuple[list[str], dict[str, list[str]]]:
+    """
+    Split a generated test module into per-unit blocks.
+
+    Tests are attributed by name (test_factorial_*, TestCalculator) or,
+    failing that, by the units they reference. Fixtures and helpers follow
+    the tests that use them; anything left goes to every unit.
+
+    Args:
+        test_source: Generated test module
+        unit_names: Units the module was generated for
+
+    Returns:
+        (import lines, {unit name: [source blocks]})
+    """
+    tree = ast.parse(test_source)
+    lines = test_source.splitlines()
+
+    imports = []
+    blocks = []  # (bound names, referenced names, source, owners)
+    for node in tree.body:
+        source = _segment(lines, node)
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            imports.append(source)
+            continue
+
+        owners = set()
+        if isinstance(node, _DEFINITIONS) and node.name.lower().startswith("test"):
+            owner = _owner_by_name(node.name, unit_names)
+            owners = {owner} if owner else _referenced_names(node) & set(unit_names)
+        blocks.append((set(_bound_names(node)), _referenced_names(node), source, owners))
+
+    # Фикстуры и хелперы достаются юнитам, чьи тесты на них ссылаются
+    changed = True
+    while changed:
+        changed = False
+        for bound, _, _, owners in blocks:
+            for _, refs, _, other_owners in blocks:
+                new_owners = other_owners - owners
+                if bound & refs and new_owners:
+                    owners |= new_owners
+                    changed = True
+
+    artifacts: dict[str, list[str]] = {name: [] for name in unit_names}
+    for _, _, source, owners in blocks:
+        for name in (owners or unit_names):
+            artifacts[name].append(source)
+    return imports, artifacts
+
+
+def _merge_imports(import_lines: list[str]) -> list[str]:
+    """Deduplicate imports; `from x import ...` lines of one module are merged"""
+    plain = []
+    from_imports: dict[tuple[str, int], list[str]] = {}
+
+    for line in import_lines:
+        for node in ast.parse(line).body:
+            if isinstance(node, ast.ImportFrom):
+                names = from_imports.setdefault((node.module or "", node.level), [])
+                for alias in node.names:
+                    entry = f"{alias.name} as {alias.asname}" if alias.asname else alias.name
+                    if entry not in names:
+                        names.append(entry)
+            else:
+                text = ast.unparse(node)
+                if text not in plain:
+                    plain.append(text)
+
+    merged = list(plain)
+    for (module, level), names in from_imports.items():
+        merged.append(f"from {'.' * level}{module} import {', '.join(names)}")
+    return merged
+
+
+def assemble_tests(import_lines: list[str], blocks: list[str]) -> str:
+    """
+    Build one test module from imports and per-unit blocks.
+
+    Blocks that define an already defined name are skipped, so shared
+    fixtures and helpers appear once.
+    """
+    seen = set()
+    body = []
+    for block in blocks:
+        try:
+            node = ast.parse(block).body[0]
+            key = tuple(_bound_names(node)) or block
+        except (SyntaxError, IndexError):
+            key = block
+        if key in seen:
+            continue
+        seen.add(key)
+        body.append(block)
+
+    header = "\n".join(_merge_imports(import_lines))
+    return "\n\n\n".join(part for part in [header, *body] if part) + "\n"
+
+
+def _import_entry(node: ast.stmt, alias: ast.alias) -> tuple:
+    module = (node.level, node.module) if isinstance(node, ast.ImportFrom) else None
+    return module, alias.name, alias.asname
+
+
+def _unique_name(name: str, taken: set[str]) -> str:
+    index = 2
+    while f"{name}_{index}" in taken:
+        index += 1
+    return f"{name}_{index}"
+
+
+def append_tests(
+    test_source: str,
+    new_source: str,
+    exclude: Optional[set[str]] = None
+) -> tuple[str, list[str]]:
+    """
+    Append generated tests to an existing test module without rewriting it.
+
+    The existing text is kept as is: new imports go after its last import,
+    new blocks go to the end. A new test that reuses an existing name is
+    renamed (test_x → test_x_2); fixtures and helpers that are already
+    defined are skipped.
+
+    Args:
+        test_source: Existing test module
+        new_source: Generated tests to add
+        exclude: Tests (names after renaming) to leave out
+
+    Returns:
+        (merged module, names of the added tests)
+
+    Raises:
+        SyntaxError: If either module does not parse
+    """
+    existing = ast.parse(test_source)
+    new = ast.parse(new_source)
+    new_lines = new_source.splitlines()
+    exclude = exclude or set()
+
+    import_nodes = [n for n in existing.body if isinstance(n, (ast.Import, ast.ImportFrom))]
+    have_imports = {_import_entry(n, alias) for n in import_nodes for alias in n.names}
+    defined = {name for node in existing.body for name in _bound_names(node)}
+
+    imports, blocks, added = [], [], []
+    for node in new.body:
+        source = _segment(new_lines, node)
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            # Только имена, которых ещё нет среди импортов модуля
+            fresh = [a for a in node.names if _import_entry(node, a) not in have_imports]
+            have_imports.update(_import_entry(node, a) for a in fresh)
+            if len(fresh) == len(node.names):
+                imports.append(source)
+            elif fresh:
+                node.names = fresh
+                imports.append(ast.unparse(node))
+            continue
+
+        if isinstance(node, _DEFINITIONS) and node.name.lower().startswith("test"):
+            name = node.name
+            if name in defined:
+                name = _unique_name(node.name, defined)
+                source = re.sub(rf"\b(def|class)(\s+){node.name}\b", rf"\g<1>\g<2>{name}", source, count=1)
+            defined.add(name)
+            if name in exclude:
+                continue
+            added.append(name)
+            blocks.append(source)
+            continue
+
+        names = _bound_names(node)
+        if names and set(names) <= defined:
+            continue  # Фикстура/хелпер уже есть в модуле
+        defined.update(names)
+        blocks.append(source)
+
+    lines = test_source.rstrip("\n").splitlines()
+    if imports:
+        # После последнего импорта (или докстринга модуля)
+        anchor = max((n.end_lineno for n in import_nodes), default=0)
+        if not import_nodes and existing.body and isinstance(existing.body[0], ast.Expr) \
+                and isinstance(getattr(existing.body[0], "value", None), ast.Constant):
+            anchor = existing.body[0].end_lineno
+        lines[anchor:anchor] = imports
+    if not added:
+        return "\n".join(lines) + "\n", []
+    return "\n".join(lines) + "\n\n\n" + "\n\n\n".join(blocks) + "\n", added
+
+
+__all__ = [
+    "CodeUnit",
+    "split_units",
+    "dependency_sources",
+    "unit_fingerprint",
+    "module_subset",
+    "split_tests",
+    "assemble_tests",
+    "append_tests",
+]
@@ -0,0 +1,381 @@
+"""
+Watch mode: regenerate tests when a source file is saved
+
+A source tree is watched with Linux inotify (through ctypes, no polling
+and no extra dependency). Each save goes through these steps:
+
+1. debounce: events for a file restart its timer. The file is handled
+   once it has been quiet for WATCH_DEBOUNCE seconds (editors write
+   several times per save).
+2. parse: a Python file that does not parse (mid-edit) is skipped.
+3. fingerprint: a change that leaves the normalized AST alone (comments,
+   formatting) is skipped. Only modules whose fingerprint changed are
+   queued.
+4. regenerate: at most WATCH_CONCURRENCY files at a time, each with a
+   TestingCrew that stays warm across events. A file saved again while
+   it is being regenerated runs once more afterwards.
+
+Test files (test_*.py, *_test.py, the output directory), hidden
+directories, __pycache__ and virtualenvs are ignored.
+
+Configuration (environment):
+    WATCH_DEBOUNCE     Quiet period in seconds before a file is handled (default 0.5)
+    WATCH_CONCURRENCY  Files regenerated at the same time (default 1)
+"""
+
+import ctypes
+import ctypes.util
+import logging
+import os
+import queue
+import select
+import struct
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Optional
+
+try:
+    from .fingerprint import fingerprint
+except ImportError:
+    from fingerprint import fingerprint
+
+logger = logging.getLogger(__name__)
+
+# ==================== INOTIFY ====================
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_MOVED_FROM | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+
+_EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len
+
+LANGUAGE_EXTENSIONS = {"python": (".py",), "javascript": (".js", ".jsx"), "typescript": (".ts", ".tsx")}
+IGNORED_DIRS = {"__pycache__", "node_modules", "venv", "site-packages"}
+
+
+class Inotify:
+    """
+    Minimal inotify binding: recursive directory watches and blocking reads.
+
+    Raises:
+        RuntimeError: Not on Linux, or inotify is unavailable
+    """
+
+    def __init__(self):
+        if not sys.platform.startswith("linux"):
+            raise RuntimeError("Watch mode needs Linux inotify")
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise RuntimeError(f"inotify_init1 failed: {os.strerror(ctypes.get_errno())}")
+        self._dirs: dict[int, str] = {}  # wd → каталог
+
+    def add_watch(self, directory: str) -> int:
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK | IN_ONLYDIR)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch failed: {directory}")
+        self._dirs[wd] = directory
+        return wd
+
+    def add_tree(self, root: str, skip: Callable[[str], bool] = lambda path: False) -> int:
+        """Watch root and its subdirectories (except skipped ones); returns the count"""
+        count = 0
+        for directory, subdirs, _ in os.walk(root):
+            subdirs[:] = [d for d in subdirs if not skip(os.path.join(directory, d))]
+            try:
+                self.add_watch(directory)
+                count += 1
+            except OSError as e:  # Каталог удалён во время обхода, нет прав
+                logger.debug(f"Not watching {directory}: {e}")
+        return count
+
+    def read(self, timeout: Optional[float] = None) -> list[tuple[str, int]]:
+        """
+        Block until events arrive (or timeout).
+
+        Returns:
+            (path, mask) per event; IN_Q_OVERFLOW comes with path ""
+        """
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b"\0").decode("utf-8", "surrogateescape")
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                events.append(("", mask))
+                continue
+            directory = self._dirs.get(wd)
+            if mask & IN_IGNORED:
+                self._dirs.pop(wd, None)
+                continue
+            if directory is not None:
+                events.append((os.path.join(directory, name) if name else directory, mask))
+        return events
+
+    def close(self) -> None:
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+# ==================== WATCHER ====================
+
+class Watcher:
+    """
+    Regenerates tests for source files under root as they are saved.
+
+    Args:
+        root: Directory to watch
+        crew_factory: Creates a TestingCrew; called at most concurrency
+            times, and the crews are reused for every event
+        language: Source language (selects the file extensions)
+        output_dir: Directory of generated tests (its files are ignored)
+        concurrency: Files regenerated at the same time
+        debounce: Quiet period in seconds before a changed file is handled
+        **run_kwargs: Passed to run_and_save() (test_type, timeout, ...)
+    """
+
+    def __init__(
+        self,
+        root: str,
+        crew_factory: Callable[[], object],
+        language: str = "python",
+        output_dir: str = "tests",
+        concurrency: Optional[int] = None,
+        debounce: Optional[float] = None,
+        **run_kwargs
+    ):
+        self.root = os.path.abspath(root)
+        self.crew_factory = crew_factory
+        self.language = language
+        self.extensions = LANGUAGE_EXTENSIONS.get(language, (".py",))
+        self.output_dir = os.path.abspath(output_dir)
+        self.concurrency = concurrency or int(os.getenv("WATCH_CONCURRENCY", "1"))
+        self.debounce = debounce if debounce is not None else float(os.getenv("WATCH_DEBOUNCE", "0.5"))
+        self.run_kwargs = {"language": language, **run_kwargs}
+
+        self._inotify: Optional[Inotify] = None
+        self._fingerprints: dict[str, Optional[str]] = {}
+        self._deadlines: dict[str, float] = {}  # путь → когда обработать
+        self._lock = threading.Lock()
+        self._running: set[str] = set()
+        self._again: set[str] = set()  # Сохранены заново во время генерации
+        self._crews: queue.Queue = queue.Queue()
+        self._crews_created = 0
+        self._pool = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="watch")
+        self.stats = {"events": 0, "unchanged": 0, "unparsable": 0, "queued": 0, "runs": 0, "failed": 0}
+
+    # ---------- отбор файлов ----------
+
+    def _skip_dir(self, path: str) -> bool:
+        name = os.path.basename(path)
+        return (
+            name.startswith(".") or name in IGNORED_DIRS
+            or os.path.abspath(path) == self.output_dir
+        )
+
+    def is_source(self, path: str) -> bool:
+        """True for source files of the language outside test/ignored directories"""
+        if not path.endswith(self.extensions):
+            return False
+        name = os.path.basename(path)
+        stem = name.rsplit(".", 1)[0]
+        if name.startswith("test_") or stem.endswith(("_test", ".test", ".spec")):
+            return False
+        relative = os.path.relpath(os.path.dirname(os.path.abspath(path)), self.root)
+        parts = [] if relative == "." else relative.split(os.sep)
+        current = self.root
+        for part in parts:
+            current = os.path.join(current, part)
+            if self._skip_dir(current):
+                return False
+        return True
+
+    def _fingerprint(self, path: str) -> Optional[str]:
+        """Fingerprint of the file; None if it is gone or (Python) does not parse"""
+        try:
+            source = Path(path).read_text(encoding="utf-8")
+        except (OSError, UnicodeDecodeError):
+            return None
+        if self.language == "python":
+            try:
+                compile(source, path, "exec", flags=0x400, dont_inherit=True)  # PyCF_ONLY_AST
+            except (SyntaxError, ValueError):
+                return None
+        return fingerprint(source, self.language)
+
+    # ---------- цикл событий ----------
+
+    def start(self) -> int:
+        """
+        Watch the tree and record current fingerprints (no regeneration).
+
+        Returns:
+            Number of watched directories
+        """
+        self._inotify = Inotify()
+        count = self._inotify.add_tree(self.root, self._skip_dir)
+        self._scan()
+        return count
+
+    def _scan(self) -> None:
+        for directory, subdirs, files in os.walk(self.root):
+            subdirs[:] = [d for d in subdirs if not self._skip_dir(os.path.join(directory, d))]
+            for name in files:
+                path = os.path.join(directory, name)
+                if self.is_source(path) and path not in self._fingerprints:
+                    self._fingerprints[path] = self._fingerprint(path)
+
+    def step(self, timeout: Optional[float] = None) -> list[str]:
+        """
+        Wait for events up to timeout, then handle files that went quiet.
+
+        Returns:
+            Paths queued for regeneration by this step
+        """
+        now = time.monotonic()
+        if self._deadlines:
+            wait = max(0.0, min(self._deadlines.values()) - now)
+            timeout = wait if timeout is None else min(timeout, wait)
+
+        for path, mask in self._inotify.read(timeout):
+            self.stats["events"] += 1
+            if mask & IN_Q_OVERFLOW:
+                logger.warning("inotify queue overflowed, rescanning")
+                self._scan()
+                continue
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO) and not self._skip_dir(path):
+                    self._inotify.add_tree(path, self._skip_dir)
+                    self._queue_tree(path)
+                continue
+            if not self.is_source(path):
+                continue
+            if mask & (IN_DELETE | IN_MOVED_FROM):
+                self._deadlines.pop(path, None)
+                self._fingerprints.pop(path, None)
+                continue
+            if mask & (IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE):
+                # Серия записей одного сохранения сдвигает дедлайн
+                self._deadlines[path] = time.monotonic() + self.debounce
+
+        queued = []
+        now = time.monotonic()
+        for path in [p for p, deadline in self._deadlines.items() if deadline <= now]:
+            del self._deadlines[path]
+            if self._handle(path):
+                queued.append(path)
+        return queued
+
+    def _queue_tree(self, directory: str) -> None:
+        """A new or moved-in directory: its files are handled like saves"""
+        deadline = time.monotonic() + self.debounce
+        for sub, subdirs, files in os.walk(directory):
+            subdirs[:] = [d for d in subdirs if not self._skip_dir(os.path.join(sub, d))]
+            for name in files:
+                path = os.path.join(sub, name)
+                if self.is_source(path):
+                    self._deadlines[path] = deadline
+
+    def _handle(self, path: str) -> bool:
+        """Queue path if its AST changed; returns True if queued"""
+        new = self._fingerprint(path)
+        if new is None:
+            self.stats["unparsable"] += 1
+            logger.info(f"Skipping {path}: does not parse")
+            return False
+        if self._fingerprints.get(path) == new:
+            self.stats["unchanged"] += 1
+            logger.info(f"Skipping {path}: no code change")
+            return False
+        self._fingerprints[path] = new
+        self.stats["queued"] += 1
+        with self._lock:
+            if path in self._running:
+                self._again.add(path)
+                return True
+            self._running.add(path)
+        self._pool.submit(self._regenerate, path)
+        return True
+
+    # ---------- генерация ----------
+
+    def _acquire_crew(self):
+        with self._lock:
+            if self._crews.empty() and self._crews_created < self.concurrency:
+                self._crews_created += 1
+                return self.crew_factory()
+        return self._crews.get()
+
+    def _regenerate(self, path: str) -> None:
+        while True:
+            crew = self._acquire_crew()
+            started = time.perf_counter()
+            try:
+                output_path = crew.run_and_save(
+                    path,
+                    output_path=os.path.join(self.output_dir, f"test_{Path(path).stem}.py"),
+                    **self.run_kwargs
+                )
+                self.stats["runs"] += 1
+                print(f"🔁 {os.path.relpath(path, self.root)} → {output_path} "
+                      f"({time.perf_counter() - started:.1f}s)")
+            except Exception as e:
+                self.stats["failed"] += 1
+                # Следующее сохранение файла снова запустит генерацию
+                self._fingerprints[path] = None
+                print(f"❌ {os.path.relpath(path, self.root)}: {type(e).__name__}: {e}")
+            finally:
+                self._crews.put(crew)
+            with self._lock:
+                if path not in self._again:
+                    self._running.discard(path)
+                    return
+                self._again.discard(path)
+
+    def idle(self) -> bool:
+        """True when nothing is pending or being regenerated"""
+        with self._lock:
+            return not self._deadlines and not self._running
+
+    def serve_forever(self, stop: Optional[threading.Event] = None) -> None:
+        """Handle events until stop is set (or KeyboardInterrupt)"""
+        if self._inotify is None:
+            self.start()
+        while stop is None or not stop.is_set():
+            self.step(timeout=0.5 if stop is not None else None)
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=True, cancel_futures=True)
+        if self._inotify is not None:
+            self._inotify.close()
+
+
+__all__ = [
+    "Inotify",
+    "Watcher",
+]
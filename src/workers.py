@@ -0,0 +1,390 @@
+"""
+Recycled worker processes for crew runs
+
+Every crew run builds agents, LLM clients and crew memory, and verbose
+CrewAI logging and embedding stores keep growing, so a long-running bot
+process only gets bigger. Jobs therefore run in worker processes that
+watch themselves: after each job a worker counts it and measures its RSS,
+and once it has served WORKER_MAX_JOBS jobs or its RSS is above
+WORKER_MAX_RSS_MB it retires. The job in hand always finishes (drain):
+the result goes back with the retiring flag, the worker exits, and the
+pool starts a replacement in the background. A worker killed mid-job
+(e.g. by the OOM killer) fails only that job and is replaced too.
+
+Workers are forked from a forkserver with the preloaded modules (CrewAI)
+already imported, so a replacement costs a fork, not an interpreter
+start plus imports. The forkserver is shared with the sandbox pool; the
+preload lists of both are merged in forkserver.py.
+
+Each result comes with WorkerMetrics: RSS before and after the job, the
+delta, the job's duration, the worker's job count and the worker's test
+cache hits, misses and tokens saved during the job, which the bot adds to
+its own cache counters.
+
+A local model server's LOCAL_LLM_CONCURRENCY is split between the workers
+(at least one request each), so together they stay within it. Prompt
+batching (LOCAL_LLM_BATCH) groups prompts within one worker only.
+
+Configuration (environment):
+    WORKER_MAX_JOBS    Jobs per worker before it is replaced (default 50)
+    WORKER_MAX_RSS_MB  RSS after a job above which the worker is replaced (default 1024)
+"""
+
+import gc
+import os
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+try:
+    from .cancellation import CancelToken, DeadlineExceeded, JobCancelled
+    from .forkserver import get_context
+    from .local_llm import share_concurrency
+except ImportError:
+    from cancellation import CancelToken, DeadlineExceeded, JobCancelled
+    from forkserver import get_context
+    from local_llm import share_concurrency
+
+MB = 1024 * 1024
+
+# Сколько ждать воркер после отмены, прежде чем убить его
+CANCEL_GRACE_SECONDS = 30.0
+
+
+@dataclass
+class WorkerLimits:
+    """When a worker retires"""
+
+    max_jobs: int = 50
+    max_rss_mb: int = 1024
+
+    @classmethod
+    def from_env(cls) -> "WorkerLimits":
+        return cls(
+            max_jobs=int(os.getenv("WORKER_MAX_JOBS", "50")),
+            max_rss_mb=int(os.getenv("WORKER_MAX_RSS_MB", "1024"))
+        )
+
+
+@dataclass
+class WorkerMetrics:
+    """Memory and job count of the worker that ran a job"""
+
+    pid: int
+    jobs: int
+    rss_before: int
+    rss_after: int
+    seconds: float
+    retiring: bool = False
+    cache_hits: int = 0
+    cache_misses: int = 0
+    tokens_saved: int = 0
+
+    @property
+    def rss_delta(self) -> int:
+        return self.rss_after - self.rss_before
+
+    def to_dict(self) -> dict:
+        return {
+            "pid": self.pid,
+            "jobs": self.jobs,
+            "rss_mb": round(self.rss_after / MB, 1),
+            "rss_delta_mb": round(self.rss_delta / MB, 1),
+            "seconds": round(self.seconds, 2),
+            "retiring": self.retiring,
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses
+        }
+
+
+class WorkerCrashed(RuntimeError):
+    """The worker process died before returning the job's result"""
+
+
+def rss_bytes() -> int:
+    """Current resident set size of this process (peak RSS where /proc is missing)"""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    if resource is None:
+        return 0
+    # ru_maxrss: килобайты в Linux, байты в macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if os.uname().sysname == "Darwin" else peak * 1024
+
+
+# ==================== WORKER ====================
+
+_worker_state: dict = {}
+
+
+def run_crew(cancel_token: CancelToken, **kwargs) -> dict:
+    """
+    Default job: TestingCrew.run() with this worker's cache and memory.
+
+    The test cache (TEST_CACHE_*), stage checkpoints (CHECKPOINT_*) and
+    crew memory (CREW_MEMORY) are created once per worker from the
+    environment. The cache and checkpoints live on disk and are shared
+    with the bot; use the sqlite memory backend to share memory notes
+    across workers.
+    """
+    try:
+        from .cache import TestCache
+        from .checkpoints import CheckpointStore
+        from .crew import TestingCrew
+        from .memory import create_memory
+    except ImportError:
+        from cache import TestCache
+        from checkpoints import CheckpointStore
+        from crew import TestingCrew
+        from memory import create_memory
+
+    if not _worker_state:
+        _worker_state["test_cache"] = TestCache.from_env()
+        _worker_state["checkpoints"] = CheckpointStore.from_env()
+        _worker_state["memory"] = create_memory()
+    crew = TestingCrew(
+        test_cache=_worker_state["test_cache"],
+        memory=_worker_state["memory"],
+        checkpoints=_worker_state["checkpoints"]
+    )
+    return crew.run(cancel_token=cancel_token, **kwargs)
+
+
+def _cache_counters() -> tuple[int, int, int]:
+    """Hits, misses and tokens saved of this worker's test cache so far"""
+    cache = _worker_state.get("test_cache")
+    if cache is None:
+        return 0, 0, 0
+    stats = cache.stats()
+    return stats["hits"], stats["misses"], stats["tokens_saved"]
+
+
+def _worker_main(conn, cancel_event, target: Callable, limits: WorkerLimits, processes: int = 1) -> None:
+    """Worker: run jobs until the pool closes or the limits retire it"""
+    share_concurrency(processes)
+    jobs = 0
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            return  # Пул закрыт
+        if message is None:
+            return
+        timeout, kwargs = message
+
+        cancel_event.clear()
+        token = CancelToken(timeout=timeout, event=cancel_event)
+        before = rss_bytes()
+        counters = _cache_counters()
+        started = time.perf_counter()
+        try:
+            reply = ("ok", target(token, **kwargs))
+        except DeadlineExceeded as e:
+            reply = ("deadline", (e.reason, e.token_usage))
+        except JobCancelled as e:
+            reply = ("cancelled", (e.reason, e.token_usage))
+        except Exception as e:
+            reply = ("error", f"{type(e).__name__}: {e}")
+        seconds = time.perf_counter() - started
+
+        # Без мусора от задания: RSS после — то, что действительно осталось
+        gc.collect()
+        jobs += 1
+        after = rss_bytes()
+        retiring = jobs >= limits.max_jobs or after > limits.max_rss_mb * MB
+        cache = [now - then for now, then in zip(_cache_counters(), counters, strict=True)]
+        metrics = WorkerMetrics(os.getpid(), jobs, before, after, seconds, retiring, *cache)
+        try:
+            conn.send((*reply, metrics))
+        except (BrokenPipeError, OSError):
+            return
+        if retiring:
+            conn.close()
+            return
+
+
+# ==================== POOL ====================
+
+class WorkerPool:
+    """
+    Long-lived worker processes that retire by job count or RSS.
+
+    Args:
+        size: Worker processes (also the max concurrent jobs)
+        limits: When a worker retires (default: from WORKER_* env)
+        target: Job function target(cancel_token, **kwargs), importable
+            by name in the worker (default: run_crew)
+        preload: Modules imported once in the forkserver (added to the
+            sandbox's, see forkserver.py)
+    """
+
+    def __init__(
+        self,
+        size: int = 2,
+        limits: Optional[WorkerLimits] = None,
+        target: Callable = run_crew,
+        preload: tuple = ()
+    ):
+        self.size = size
+        self.limits = limits or WorkerLimits.from_env()
+        self.target = target
+
+        self._ctx = get_context(preload)
+
+        self._idle: queue.Queue = queue.Queue()
+        self._closed = False
+        self._lock = threading.Lock()
+        self.jobs = 0
+        self.recycled = 0
+        self.crashed = 0
+        self.last_metrics: dict[int, WorkerMetrics] = {}  # pid → метрики последнего задания
+        for _ in range(size):
+            self._idle.put(self._start_worker())
+
+    def _start_worker(self):
+        parent_conn, child_conn = self._ctx.Pipe()
+        cancel_event = self._ctx.Event()
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(child_conn, cancel_event, self.target, self.limits, self.size),
+            name="crew-worker",
+            daemon=True
+        )
+        process.start()
+        child_conn.close()
+        return process, parent_conn, cancel_event
+
+    def _replace(self, worker) -> None:
+        """Stop worker and start its replacement off the caller's path"""
+        process, conn, _ = worker
+        self.last_metrics.pop(process.pid, None)
+
+        def replace():
+            conn.close()
+            process.join(5)
+            if process.is_alive():
+                process.kill()
+                process.join(1)
+            if not self._closed:
+                self._idle.put(self._start_worker())
+        threading.Thread(target=replace, name="crew-worker-replace", daemon=True).start()
+
+    def run(self, cancel_token: Optional[CancelToken] = None, **kwargs) -> tuple[Any, WorkerMetrics]:
+        """
+        Run a job in a worker; blocks until it is done.
+
+        Args:
+            cancel_token: Cancels the job in the worker (its deadline too)
+            **kwargs: Passed to target
+
+        Returns:
+            (target's result, WorkerMetrics)
+
+        Raises:
+            JobCancelled: The job was cancelled (DeadlineExceeded — deadline);
+                token_usage is the partial usage reported by the worker
+            WorkerCrashed: The worker died during the job
+            RuntimeError: The job raised (message: "Type: text")
+        """
+        if self._closed:
+            raise RuntimeError("WorkerPool is shut down")
+
+        worker = self._idle.get()
+        process, conn, cancel_event = worker
+        healthy = False
+        try:
+            try:
+                conn.send((cancel_token.remaining() if cancel_token else None, kwargs))
+            except (BrokenPipeError, OSError) as e:
+                raise WorkerCrashed(f"worker {process.pid} unavailable: {e}") from e
+
+            kill_at = None
+            while not conn.poll(0.2):
+                if cancel_token is not None and cancel_token.cancelled and kill_at is None:
+                    cancel_event.set()
+                    kill_at = time.monotonic() + CANCEL_GRACE_SECONDS
+                if kill_at is not None and time.monotonic() > kill_at:
+                    # Не дошёл до точки отмены: воркер заменяется
+                    process.kill()
+                    cancel_token.check()
+            try:
+                kind, payload, metrics = conn.recv()
+            except EOFError:
+                process.join(1)
+                with self._lock:
+                    self.crashed += 1
+                raise WorkerCrashed(f"worker {process.pid} died (exit code {process.exitcode})") from None
+
+            healthy = not metrics.retiring
+            with self._lock:
+                self.jobs += 1
+                self.recycled += metrics.retiring
+                self.last_metrics[metrics.pid] = metrics
+
+            if kind == "ok":
+                return payload, metrics
+            if kind in ("cancelled", "deadline"):
+                reason, token_usage = payload
+                error = (DeadlineExceeded if kind == "deadline" else JobCancelled)(reason, token_usage)
+                if cancel_token is not None:
+                    # Причина отмены известна только здесь ("cancelled by user", ...)
+                    try:
+                        cancel_token.check()
+                    except JobCancelled as cancelled:
+                        cancelled.token_usage = token_usage
+                        error = cancelled
+                raise error
+            raise RuntimeError(payload)
+        finally:
+            if healthy and not self._closed:
+                self._idle.put(worker)
+            else:
+                self._replace(worker)
+
+    def stats(self) -> dict:
+        """Jobs run, workers recycled/crashed, RSS of each worker after its last job"""
+        with self._lock:
+            return {
+                "workers": self.size,
+                "jobs": self.jobs,
+                "recycled": self.recycled,
+                "crashed": self.crashed,
+                "rss_mb": {pid: round(m.rss_after / MB, 1) for pid, m in self.last_metrics.items()}
+            }
+
+    def shutdown(self) -> None:
+        """Stop idle workers (running jobs finish first)"""
+        self._closed = True
+        while True:
+            try:
+                process, conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+            conn.close()
+            process.join(5)
+            if process.is_alive():
+                process.kill()
+
+
+__all__ = [
+    "WorkerLimits",
+    "WorkerMetrics",
+    "WorkerCrashed",
+    "WorkerPool",
+    "rss_bytes",
+    "run_crew",
+]
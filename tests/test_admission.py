@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Tests for pre-flight admission of generation requests
+"""
+
+import shutil
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from admission import (
+    ACCEPT,
+    DOWNGRADE,
+    REJECT,
+    AdmissionLimits,
+    RunHistory,
+    admit,
+    count_tokens,
+)
+from cache import TestCache
+
+CODE = '''
+import math
+
+SCALE = 2
+
+
+def area(r):
+    return math.pi * r ** 2 * SCALE
+
+
+class Circle:
+    def __init__(self, r):
+        self.r = r
+
+    def area(self):
+        return area(self.r)
+'''
+
+LIMITS = AdmissionLimits(max_bytes=10_000, max_tokens=10_000, max_nodes=10_000)
+
+
+class TestAdmit(unittest.TestCase):
+    """Test the admission stages"""
+
+    def test_valid_code_accepted(self):
+        """Parsable code with units is accepted with a prediction"""
+        admission = admit(CODE, LIMITS, RunHistory())
+
+        self.assertEqual(admission.verdict, ACCEPT)
+        self.assertEqual(admission.units, ["area", "Circle"])
+        self.assertEqual(admission.code, CODE)
+        self.assertGreater(admission.predicted_tokens, 0)
+        self.assertGreater(admission.predicted_seconds, 0)
+
+    def test_garbage_rejected(self):
+        """Prose, broken syntax and code without units never reach a run"""
+        for text in ("", "please write tests = thanks", "def broken(:\n    return",
+                     "x = 1\nprint(x)\n"):
+            admission = admit(text, LIMITS)
+            self.assertEqual(admission.verdict, REJECT, text)
+            self.assertTrue(admission.reason)
+
+        self.assertIn("line 1", admit("def broken(:\n", LIMITS).reason)
+
+    def test_size_limit(self):
+        """Code over the byte limit is rejected before parsing"""
+        admission = admit("def f(): pass\n" + "#" * 20_000, LIMITS)
+
+        self.assertEqual(admission.verdict, REJECT)
+        self.assertIn("too large", admission.reason)
+
+    def test_downgrade_to_units_that_fit(self):
+        """Over the token budget only the units that fit are kept"""
+        code = "\n\n".join(f"def f{i}(x):\n    return x + {i}" for i in range(50))
+        per_unit = count_tokens("def f1(x):\n    return x + 1")
+        limits = AdmissionLimits(max_bytes=10_000, max_tokens=per_unit * 10, max_nodes=10_000)
+
+        admission = admit(code, limits)
+
+        self.assertEqual(admission.verdict, DOWNGRADE)
+        self.assertTrue(3 <= len(admission.units) <= 10)
+        self.assertEqual(len(admission.units) + len(admission.dropped), 50)
+        self.assertLessEqual(admission.tokens, limits.max_tokens)
+        self.assertIn("def f0(x)", admission.code)
+        self.assertNotIn("def f49(x)", admission.code)
+
+    def test_downgrade_keeps_dependencies(self):
+        """A kept unit brings the definitions it uses"""
+        small = "class Circle:\n    def area(self):\n        return scale(3)\n\n\ndef scale(x):\n    return x * 2\n"
+        big = "\n\ndef big():\n" + "".join(f"    v{i} = {i} * {i}\n" for i in range(200))
+        limits = AdmissionLimits(max_bytes=10_000, max_tokens=count_tokens(small) + 10, max_nodes=10_000)
+
+        admission = admit(small + big, limits)
+
+        self.assertEqual(admission.verdict, DOWNGRADE)
+        self.assertEqual(admission.units, ["Circle", "scale"])
+        self.assertEqual(admission.dropped, ["big"])
+        self.assertIn("def scale(x)", admission.code)
+
+    def test_reject_instead_of_downgrade(self):
+        """With downgrade off, oversized code is rejected"""
+        limits = AdmissionLimits(max_bytes=10_000, max_tokens=5, max_nodes=10_000, downgrade=False)
+
+        self.assertEqual(admit(CODE, limits).verdict, REJECT)
+
+    def test_cached_request(self):
+        """A cached result is marked and predicts no new tokens"""
+        admission = admit(CODE, LIMITS, is_cached=lambda code: code == CODE)
+
+        self.assertTrue(admission.cached)
+        self.assertEqual(admission.predicted_tokens, 0)
+
+
+class TestRunHistory(unittest.TestCase):
+    """Test predictions from past runs"""
+
+    def test_priors_without_history(self):
+        """Without runs the prior line is used"""
+        history = RunHistory(prior_tokens=(1000, 2), prior_seconds=(10, 0.01))
+
+        self.assertEqual(history.predict(500), (2000, 15.0))
+
+    def test_fit_on_runs(self):
+        """Enough runs replace the priors with a fitted line"""
+        history = RunHistory(prior_tokens=(1000, 2))
+        for tokens in (100, 200, 300, 400, 500):
+            history.record(tokens, 3000 + 10 * tokens, 20 + tokens / 10)
+
+        predicted_tokens, predicted_seconds = history.predict(1000)
+
+        self.assertEqual(predicted_tokens, 13000)
+        self.assertAlmostEqual(predicted_seconds, 120, places=0)
+
+    def test_few_runs_shift_prior(self):
+        """A couple of runs move the level but keep the prior slope"""
+        history = RunHistory(prior_tokens=(1000, 2))
+        history.record(100, 5200, 30)
+
+        self.assertEqual(history.predict(100)[0], 5200)
+
+
+class TestCacheContains(unittest.TestCase):
+    """Test the side-effect-free cache check used by admission"""
+
+    def test_contains_does_not_count(self):
+        """contains() sees stored entries without touching hit/miss counters"""
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir, True)
+        cache = TestCache(cache_dir)
+        key = cache.key_for(CODE)
+
+        self.assertFalse(cache.contains(key))
+        cache.put(key, {"raw": "tests", "token_usage": {"total_tokens": 10}})
+        self.assertTrue(cache.contains(key))
+        self.assertEqual(cache.stats()["hits"] + cache.stats()["misses"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
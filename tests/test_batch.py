@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Tests for the batch/async API and shared rate limiting
+"""
+
+import asyncio
+import sys
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from ratelimit import RateLimiter, current_limiter
+
+
+class TestRateLimiter(unittest.TestCase):
+    """Test the sliding-window limiter"""
+
+    def test_limits_per_window(self):
+        """Only max_rpm acquisitions succeed within one window"""
+        limiter = RateLimiter(max_rpm=2, period=60)
+
+        self.assertEqual(limiter.try_acquire(), 0.0)
+        self.assertEqual(limiter.try_acquire(), 0.0)
+        self.assertGreater(limiter.try_acquire(), 0.0)
+
+    def test_window_slides(self):
+        """Slots free up after the period"""
+        limiter = RateLimiter(max_rpm=1, period=0.05)
+        limiter.acquire()
+
+        started = time.monotonic()
+        limiter.acquire()
+        self.assertGreaterEqual(time.monotonic() - started, 0.04)
+
+
+class FakeCrew:
+    """Stands in for a spawned TestingCrew"""
+
+    def __init__(self, delays):
+        self.delays = delays
+
+    def run(self, file_path, rate_limiter=None, **kwargs):
+        assert current_limiter() is None  # лимитер привязывается внутри run()
+        time.sleep(self.delays.get(file_path, 0))
+        if file_path == "broken.py":
+            raise ValueError("boom")
+        return {"raw": file_path, "limiter": rate_limiter}
+
+    async def arun(self, file_path, **kwargs):
+        return await asyncio.to_thread(self.run, file_path, **kwargs)
+
+
+class TestBatchRun(unittest.TestCase):
+    """Test TestingCrew.run_many / arun_many with mocked crews"""
+
+    @classmethod
+    def setUpClass(cls):
+        """Check if CrewAI is available"""
+        try:
+            import crewai
+        except ImportError:
+            raise unittest.SkipTest("CrewAI not installed - skipping crew tests")
+
+    def setUp(self):
+        from crew import TestingCrew
+
+        self.testing_crew = TestingCrew.__new__(TestingCrew)
+        self.delays = {"slow.py": 0.2}
+        self.spawn = patch.object(
+            TestingCrew, "_spawn", lambda _self: FakeCrew(self.delays)
+        )
+        self.spawn.start()
+
+    def tearDown(self):
+        self.spawn.stop()
+
+    def test_run_many_streams_and_isolates_errors(self):
+        """Fast files come back first; a failing file does not stop others"""
+        results = list(self.testing_crew.run_many(
+            ["slow.py", "fast.py", "broken.py"], concurrency=3
+        ))
+
+        self.assertEqual(results[-1].file_path, "slow.py")
+        by_file = {r.file_path: r for r in results}
+        self.assertTrue(by_file["fast.py"].ok)
+        self.assertIsInstance(by_file["broken.py"].error, ValueError)
+
+    def test_run_many_shares_one_limiter(self):
+        """All items get the same RateLimiter"""
+        results = list(self.testing_crew.run_many(["a.py", "b.py"], max_rpm=5))
+
+        limiters = {id(r.result["limiter"]) for r in results}
+        self.assertEqual(len(limiters), 1)
+        self.assertEqual(results[0].result["limiter"].max_rpm, 5)
+
+    def test_arun_many_streams(self):
+        """arun_many yields results as they complete"""
+        async def collect():
+            return [r async for r in self.testing_crew.arun_many(
+                ["slow.py", "fast.py", "broken.py"], concurrency=3
+            )]
+
+        results = asyncio.run(collect())
+
+        self.assertEqual(len(results), 3)
+        self.assertEqual(results[-1].file_path, "slow.py")
+        self.assertEqual(sum(r.ok for r in results), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Tests for the compiled, hot-reloadable config cache
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from config_cache import ConfigCache, ConfigError, PromptTemplate, load_crew_config
+
+CONFIG_DIR = Path(__file__).parent.parent / "config"
+
+AGENTS = """
+writer:
+  role: Writer of {test_type} tests
+  goal: Cover {file_path}
+  backstory: 'Returns JSON like {"ok": true}'
+"""
+
+TASKS = """
+write:
+  description: Write tests for {code_content}
+  expected_output: A {test_framework} module
+  agent: writer
+"""
+
+RUN_INPUTS = {
+    "file_path": "x.py",
+    "code_content": "",
+    "test_type": "unit",
+    "test_framework": "pytest",
+    "language": "python",
+    "memory_context": "",
+    "dependency_context": "",
+    "revision_notes": "",
+    "coverage_gaps": "",
+}
+
+
+class TestPromptTemplate(unittest.TestCase):
+    """Test template compilation"""
+
+    def test_placeholders_and_render(self):
+        """Only {identifier} is a placeholder; values are not re-scanned"""
+        template = PromptTemplate.compile('Test {name} -> {"json": 1}')
+
+        self.assertEqual(template.placeholders, {"name"})
+        self.assertEqual(template.render({"name": "{other}"}), 'Test {other} -> {"json": 1}')
+
+    def test_render_missing(self):
+        """Rendering without a value fails"""
+        with self.assertRaises(ConfigError):
+            PromptTemplate.compile("{a} and {b}").render({"a": 1})
+
+
+class TestConfigCache(unittest.TestCase):
+    """Test parsing once and reloading on change"""
+
+    def setUp(self):
+        self.dir = Path(tempfile.mkdtemp())
+        self.agents = self.dir / "agents.yaml"
+        self.tasks = self.dir / "tasks.yaml"
+        self.agents.write_text(AGENTS)
+        self.tasks.write_text(TASKS)
+        self.cache = ConfigCache()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def _edit(self, path: Path, text: str):
+        """Write and move mtime forward (coarse filesystem clocks)"""
+        stat = path.stat()
+        path.write_text(text)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+    def test_parsed_once_and_frozen(self):
+        """Repeated lookups reuse the compiled objects"""
+        first = self.cache.crew_config(str(self.agents), str(self.tasks))
+        second = self.cache.crew_config(str(self.agents), str(self.tasks))
+
+        self.assertIs(first, second)
+        self.assertEqual(self.cache.loads, 2)
+        self.assertEqual(first.agents["writer"].role.text, "Writer of {test_type} tests")
+        self.assertEqual(first.tasks["write"].options["agent"], "writer")
+        with self.assertRaises(TypeError):
+            first.tasks["write"].options["agent"] = "other"
+
+    def test_reload_on_change(self):
+        """An edited file is reparsed and changes the version"""
+        before = self.cache.crew_config(str(self.agents), str(self.tasks))
+        self._edit(self.tasks, TASKS.replace("Write tests", "Write more tests"))
+        after = self.cache.crew_config(str(self.agents), str(self.tasks))
+
+        self.assertIn("more tests", after.tasks["write"].description.text)
+        self.assertNotEqual(before.version, after.version)
+        self.assertEqual(self.cache.loads, 3)
+
+    def test_broken_edit_keeps_previous(self):
+        """Invalid YAML or a missing field does not replace a good config"""
+        good = self.cache.crew_config(str(self.agents), str(self.tasks))
+
+        self._edit(self.agents, "writer: [unclosed")
+        with self.assertLogs("config_cache", level="WARNING"):
+            self.assertIs(self.cache.crew_config(str(self.agents), str(self.tasks)), good)
+
+        self._edit(self.agents, "writer:\n  role: only a role\n")
+        with self.assertLogs("config_cache", level="WARNING"):
+            self.assertIs(self.cache.crew_config(str(self.agents), str(self.tasks)), good)
+
+    def test_invalid_first_load(self):
+        """Without a previous version a bad config raises"""
+        self.agents.write_text("writer:\n  role: only a role\n")
+        with self.assertRaises(ConfigError):
+            self.cache.crew_config(str(self.agents), str(self.tasks))
+
+    def test_check_inputs(self):
+        """Unresolved placeholders are reported with their location"""
+        config = self.cache.crew_config(str(self.agents), str(self.tasks))
+
+        config.check_inputs(RUN_INPUTS)
+        with self.assertRaises(ConfigError) as ctx:
+            config.check_inputs({"test_type": "unit"})
+        self.assertIn("writer.goal: {file_path}", str(ctx.exception))
+        self.assertIn("write.description: {code_content}", str(ctx.exception))
+
+    def test_prefix_warnings(self):
+        """Placeholders in agent fields and expected_output are reported"""
+        config = self.cache.crew_config(str(self.agents), str(self.tasks))
+
+        warnings = config.prefix_warnings()
+
+        self.assertTrue(any(w.startswith("writer.role:") for w in warnings))
+        self.assertTrue(any(w.startswith("write.expected_output:") for w in warnings))
+        self.assertFalse(any(w.startswith("writer.backstory") for w in warnings))
+
+
+class TestProjectConfig(unittest.TestCase):
+    """Test the shipped agents.yaml / tasks.yaml"""
+
+    def test_placeholders_match_run_inputs(self):
+        """Every placeholder in the shipped prompts is provided by run()"""
+        config = load_crew_config(str(CONFIG_DIR / "agents.yaml"), str(CONFIG_DIR / "tasks.yaml"))
+
+        config.check_inputs(RUN_INPUTS)
+        self.assertTrue(config.placeholders <= set(RUN_INPUTS))
+
+    def test_static_prefix(self):
+        """Prompts start with text that does not depend on the request"""
+        config = load_crew_config(str(CONFIG_DIR / "agents.yaml"), str(CONFIG_DIR / "tasks.yaml"))
+        other = {**RUN_INPUTS, "file_path": "y.py", "code_content": "def f(): pass",
+                 "test_type": "integration", "language": "javascript"}
+
+        self.assertEqual(config.prefix_warnings(), [])
+        for task in config.tasks.values():
+            prefix = task.description.static_prefix
+            self.assertGreater(len(prefix), 400, task.name)
+            self.assertTrue(task.description.render(RUN_INPUTS).startswith(prefix))
+            self.assertTrue(task.description.render(other).startswith(prefix))
+            self.assertEqual(task.expected_output.render(other), task.expected_output.text)
+
+    def test_crews_share_parsed_config(self):
+        """New TestingCrew instances do not reparse the YAML files"""
+        try:
+            from config_cache import get_config_cache
+            from crew import TestingCrew
+        except ImportError:
+            self.skipTest("crewai not installed")
+
+        first = TestingCrew()
+        loads = get_config_cache().loads
+        second = TestingCrew()
+
+        self.assertEqual(get_config_cache().loads, loads)
+        self.assertIs(first._config, second._config)
+        self.assertEqual(second.agents_config["qa_test_agent"]["role"].strip(),
+                         second._config.agents["qa_test_agent"].role.text.strip())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -171,6 +171,44 @@ class TestMainModule(unittest.TestCase):
         self.assertEqual(args.type, 'unit')
         self.assertEqual(args.framework, 'pytest')
         self.assertEqual(args.language, 'python')
+        self.assertIsNone(args.timeout)
+
+    def test_parse_args_timeout(self):
+        """--timeout is parsed as seconds"""
+        from main import parse_args
+
+        with patch('sys.argv', ['main.py', 'test.py', '--timeout', '90']):
+            args = parse_args()
+
+        self.assertEqual(args.timeout, 90.0)
+
+    def test_parse_args_profile(self):
+        """--profile without a value writes profile.folded"""
+        from main import parse_args
+
+        with patch('sys.argv', ['main.py', 'test.py', '--profile']):
+            self.assertEqual(parse_args().profile, 'profile.folded')
+        with patch('sys.argv', ['main.py', 'test.py']):
+            self.assertIsNone(parse_args().profile)
+
+    def test_parse_args_rerun(self):
+        """--rerun takes a stage name, --feedback free text"""
+        from main import parse_args
+
+        with patch('sys.argv', ['main.py', 'test.py', '--rerun', 'validate']):
+            self.assertEqual(parse_args().rerun, 'validate')
+        with patch('sys.argv', ['main.py', 'test.py', '--feedback', 'more edge cases']):
+            args = parse_args()
+        self.assertEqual((args.rerun, args.feedback), (None, 'more edge cases'))
+
+    def test_parse_args_fill_gaps(self):
+        """--fill-gaps is off by default"""
+        from main import parse_args
+
+        with patch('sys.argv', ['main.py', 'test.py']):
+            self.assertFalse(parse_args().fill_gaps)
+        with patch('sys.argv', ['main.py', 'test.py', '--fill-gaps']):
+            self.assertTrue(parse_args().fill_gaps)
 
 
 class TestCrewModule(unittest.TestCase):
@@ -190,6 +228,35 @@ class TestCrewModule(unittest.TestCase):
         crew = TestingCrew()
         self.assertIsNotNone(crew)
 
+    def test_crew_memory_backend(self):
+        """CrewAI embedding memory is enabled only for the crewai backend"""
+        from crew import TestingCrew
+
+        self.assertFalse(TestingCrew(memory="off").crew().memory)
+        self.assertTrue(TestingCrew(memory="crewai").crew().memory)
+
+    def test_stage_usage(self):
+        """Per-task seconds and cached prompt tokens are deltas of the run"""
+        from crew import TestingCrew
+
+        testing_crew = TestingCrew()
+        crew = testing_crew.crew()
+        llms = [getattr(task.agent.llm, "chain", [task.agent.llm])[0] for task in crew.tasks]
+        llms[0]._track_token_usage_internal({"prompt_tokens": 50, "completion_tokens": 5})
+        before = testing_crew._llm_usage(crew)
+        llms[1]._track_token_usage_internal({
+            "prompt_tokens": 1000, "completion_tokens": 200, "prompt_tokens_details": {"cached_tokens": 800}
+        })
+
+        stages = testing_crew._stages(crew, before, [0.0, 1.0, 3.5])
+
+        self.assertEqual([s["task"] for s in stages],
+                         ["analyze_code_task", "write_tests_task", "validate_tests_task"])
+        self.assertEqual(stages[0]["prompt_tokens"], 0)
+        self.assertEqual(stages[1]["seconds"], 2.5)
+        self.assertEqual((stages[1]["cached_prompt_tokens"], stages[1]["cache_hit_rate"]), (800, 0.8))
+        self.assertIsNone(stages[2]["seconds"])
+
 
 class TestIntegration(unittest.TestCase):
     """Integration tests (skipped if CrewAI not installed)"""
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Tests for source fingerprinting and the generated-tests cache
+"""
+
+import shutil
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from cache import TestCache
+from fingerprint import fingerprint
+
+ORIGINAL = '''
+def add(a, b):
+    """Add two numbers"""
+    return a + b
+'''
+
+REFORMATTED = '''
+# helpers
+def add( a,b ):
+    """Add two numbers"""
+
+    return a+b   # sum
+
+
+'''
+
+NEW_DOCSTRING = '''
+def add(a, b):
+    """Return the sum of a and b"""
+    return a + b
+'''
+
+
+class TestFingerprint(unittest.TestCase):
+    """Test normalized-AST fingerprints"""
+
+    def test_formatting_and_comments_ignored(self):
+        """Whitespace, comments and blank lines do not change the fingerprint"""
+        self.assertEqual(fingerprint(ORIGINAL), fingerprint(REFORMATTED))
+
+    def test_docstrings_count_by_default(self):
+        """Docstring edits change the fingerprint unless stripped"""
+        self.assertNotEqual(fingerprint(ORIGINAL), fingerprint(NEW_DOCSTRING))
+        self.assertEqual(
+            fingerprint(ORIGINAL, strip_docstrings=True),
+            fingerprint(NEW_DOCSTRING, strip_docstrings=True)
+        )
+
+    def test_code_change_detected(self):
+        """A semantic change produces a different fingerprint"""
+        changed = ORIGINAL.replace("a + b", "a - b")
+        self.assertNotEqual(fingerprint(ORIGINAL), fingerprint(changed))
+
+    def test_invalid_python_falls_back_to_text(self):
+        """Unparseable code is fingerprinted by normalized text"""
+        broken = "def add(a, b:\n    return a + b\n"
+        self.assertEqual(fingerprint(broken), fingerprint(broken + "\n\n"))
+
+
+class TestTestCache(unittest.TestCase):
+    """Test the file-backed generated-tests cache"""
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def test_near_duplicate_hits(self):
+        """A reformatted submission is served from the cache"""
+        cache = TestCache(self.cache_dir)
+        result = {"raw": "ok", "tasks_output": [], "token_usage": {"total_tokens": 1500}}
+
+        key = cache.key_for(ORIGINAL, test_type="unit")
+        self.assertIsNone(cache.get(key))
+        cache.put(key, result)
+
+        self.assertEqual(cache.get(cache.key_for(REFORMATTED, test_type="unit")), result)
+        self.assertEqual(
+            cache.stats(),
+            {"hits": 1, "misses": 1, "hit_rate": 0.5, "tokens_saved": 1500}
+        )
+
+    def test_options_are_part_of_key(self):
+        """Different run options do not share entries"""
+        cache = TestCache(self.cache_dir)
+        self.assertNotEqual(
+            cache.key_for(ORIGINAL, test_type="unit"),
+            cache.key_for(ORIGINAL, test_type="integration")
+        )
+
+    def test_eviction_keeps_max_entries(self):
+        """Entries above max_entries are evicted"""
+        cache = TestCache(self.cache_dir, max_entries=2)
+        for i in range(4):
+            cache.put(cache.key_for(f"x = {i}"), {"raw": str(i)})
+
+        self.assertEqual(len(list(Path(self.cache_dir).glob("*/*.json"))), 2)
+
+    def test_from_env_disabled_without_dir(self):
+        """from_env() returns None when TEST_CACHE_DIR is unset"""
+        from unittest.mock import patch
+
+        with patch.dict("os.environ", {}, clear=True):
+            self.assertIsNone(TestCache.from_env())
+
+
+
+class TestCrewCacheKey(unittest.TestCase):
+    """Test the crew's test cache key"""
+
+    @classmethod
+    def setUpClass(cls):
+        try:
+            import crewai
+        except ImportError:
+            raise unittest.SkipTest("CrewAI not installed - skipping crew tests")
+
+    def test_module_name_is_part_of_key(self):
+        """Tests for calc.py import calc: the same code in other.py is a miss"""
+        from crew import TestingCrew
+
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir, ignore_errors=True)
+        testing_crew = TestingCrew.__new__(TestingCrew)
+        testing_crew.test_cache = TestCache(cache_dir)
+        testing_crew.config_version = "test"
+        testing_crew.symbol_index = None
+
+        key = testing_crew._cache_key(ORIGINAL, "/tmp/a/calc.py", "", "python", "unit", "pytest")
+        testing_crew.test_cache.put(key, {"raw": "from calc import add"})
+
+        self.assertTrue(testing_crew.is_cached(REFORMATTED, "/tmp/b/calc.py"))
+        self.assertFalse(testing_crew.is_cached(ORIGINAL, "/tmp/a/other.py"))
+
+    def test_key_without_a_crew(self):
+        """cache_key() (the bot's preflight) matches the key of a crew's run"""
+        from config_cache import load_crew_config
+        from crew import TestingCrew
+
+        cache = TestCache(tempfile.gettempdir())
+        testing_crew = TestingCrew.__new__(TestingCrew)
+        testing_crew.test_cache = cache
+        testing_crew.config_version = load_crew_config(
+            TestingCrew.agents_config, TestingCrew.tasks_config
+        ).version
+
+        self.assertEqual(
+            TestingCrew.cache_key(cache, ORIGINAL, "snippet.py"),
+            testing_crew._cache_key(ORIGINAL, "/tmp/x/snippet.py", "", "python", "unit", "pytest")
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
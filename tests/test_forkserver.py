@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Tests for the shared forkserver preload list
+"""
+
+import multiprocessing.forkserver
+import sys
+import unittest
+from pathlib import Path
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from forkserver import get_context, preloaded
+from sandbox import SandboxLimits, SandboxPool
+from workers import WorkerLimits, WorkerPool
+
+
+@unittest.skipUnless("forkserver" in multiprocessing.get_all_start_methods(), "no forkserver")
+class TestForkserverPreload(unittest.TestCase):
+    """Test that pools add to one list instead of replacing it"""
+
+    def test_lists_are_merged(self):
+        get_context(["json"])
+        ctx = get_context(["csv", "json"])
+
+        self.assertEqual(ctx.get_start_method(), "forkserver")
+        self.assertEqual(preloaded().count("json"), 1)
+        self.assertIn("csv", preloaded())
+        self.assertEqual(multiprocessing.forkserver._forkserver._preload_modules, preloaded())
+
+    def test_sandbox_and_workers_share_the_list(self):
+        """Whichever pool starts the server, it preloads the modules of both"""
+        workers = WorkerPool(size=0, limits=WorkerLimits(), preload=("wave",))
+        sandbox = SandboxPool(size=0, limits=SandboxLimits())
+        self.addCleanup(workers.shutdown)
+        self.addCleanup(sandbox.shutdown)
+
+        self.assertIn("wave", preloaded())
+        self.assertIn("pytest", preloaded())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Tests for per-agent model tiers and fallback chains
+"""
+
+import os
+import sys
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from config_cache import ModelSpec
+
+try:
+    from crewai.llms.base_llm import BaseLLM
+
+    from cancellation import JobCancelled
+    from llm_config import FallbackLLM, available_chain, create_llm, model_chain, reset_cooldowns
+except ImportError:
+    BaseLLM = None
+
+NO_KEYS = {"OPENROUTER_API_KEY": "", "GROQ_API_KEY": "", "OPENAI_API_KEY": ""}
+
+
+class TestModelSpec(unittest.TestCase):
+    """Test parsing of the agents.yaml model keys"""
+
+    def test_from_config(self):
+        """model, temperature, max_tokens and fallback are read from the entry"""
+        spec = ModelSpec.from_config({
+            "role": "r", "model": "gpt-4o-mini", "temperature": 0.1,
+            "max_tokens": 512, "fallback": ["groq/llama-3.1-8b-instant"]
+        })
+
+        self.assertEqual(spec.model, "gpt-4o-mini")
+        self.assertEqual(spec.fallback, ("groq/llama-3.1-8b-instant",))
+        self.assertEqual((spec.temperature, spec.max_tokens), (0.1, 512))
+
+    def test_invalid_values(self):
+        """Wrong types and a fallback without a model are rejected"""
+        for entry in ({"max_tokens": "many"}, {"temperature": True},
+                      {"fallback": ["gpt-4o-mini"]}, {"model": ["a", "b"]}):
+            with self.assertRaises(ValueError, msg=entry):
+                ModelSpec.from_config(entry)
+
+
+class _FakeLLM(BaseLLM if BaseLLM else object):
+    """Returns a fixed answer or raises"""
+
+    answer: str = ""
+    error: str = ""
+    calls: int = 0
+
+    def call(self, messages, *args, **kwargs):
+        self.calls += 1
+        if self.error == "cancel":
+            raise JobCancelled("cancelled")
+        if self.error:
+            raise RuntimeError(self.error)
+        self._track_token_usage_internal({"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15})
+        return self.answer
+
+
+@unittest.skipIf(BaseLLM is None, "crewai not installed")
+class TestModelResolution(unittest.TestCase):
+    """Test chain filtering by available API keys"""
+
+    def test_unavailable_providers_skipped(self):
+        """Only models whose provider has a key stay in the chain"""
+        spec = ModelSpec(model="openrouter/x/small", fallback=("groq/y", "gpt-4o-mini"))
+        with patch.dict(os.environ, {**NO_KEYS, "OPENAI_API_KEY": "sk-test"}):
+            self.assertEqual(available_chain(spec), ["gpt-4o-mini"])
+            llm = create_llm(spec)
+
+        self.assertNotIsInstance(llm, FallbackLLM)
+        self.assertEqual(llm.model, "gpt-4o-mini")
+
+    def test_default_chain(self):
+        """Without a model the default provider order applies"""
+        self.assertEqual(model_chain(ModelSpec())[-1], "gpt-4o-mini")
+        with patch.dict(os.environ, NO_KEYS):
+            with self.assertRaises(ValueError):
+                create_llm()
+
+    def test_settings_applied(self):
+        """temperature and max_tokens reach the LLM"""
+        with patch.dict(os.environ, {**NO_KEYS, "OPENAI_API_KEY": "sk-test"}):
+            llm = create_llm(ModelSpec(model="gpt-4o-mini", temperature=0.1, max_tokens=256))
+
+        self.assertEqual((llm.temperature, llm.max_tokens), (0.1, 256))
+
+
+@unittest.skipIf(BaseLLM is None, "crewai not installed")
+class TestFallbackLLM(unittest.TestCase):
+    """Test runtime fallback"""
+
+    def setUp(self):
+        reset_cooldowns()
+
+    def test_falls_back_and_cools_down(self):
+        """A failing model hands over to the next and is skipped afterwards"""
+        broken = _FakeLLM(model="primary", error="503 Service Unavailable")
+        backup = _FakeLLM(model="backup", answer="ok")
+        llm = FallbackLLM(model="primary", chain=[broken, backup], cooldown=60)
+
+        with self.assertLogs("llm_config", level="WARNING"):
+            self.assertEqual(llm.call("hi"), "ok")
+        self.assertEqual(llm.call("hi again"), "ok")
+        self.assertEqual(broken.calls, 1)
+        self.assertEqual(llm.get_token_usage_summary().total_tokens, 30)
+
+    def test_cooldown_outlives_the_job(self):
+        """The next job's crew (new LLM objects) also skips the failed model"""
+        first_job = FallbackLLM(model="primary", chain=[_FakeLLM(model="primary", error="quota"),
+                                                         _FakeLLM(model="backup", answer="ok")])
+        with self.assertLogs("llm_config", level="WARNING"):
+            first_job.call("hi")
+
+        primary = _FakeLLM(model="primary", answer="primary")
+        next_job = FallbackLLM(model="primary", chain=[primary, _FakeLLM(model="backup", answer="ok")])
+
+        self.assertEqual(next_job.call("hi"), "ok")
+        self.assertEqual(primary.calls, 0)
+
+    def test_all_failing_raises_last_error(self):
+        """If every model fails, the last error surfaces"""
+        llm = FallbackLLM(model="a", chain=[_FakeLLM(model="a", error="first"),
+                                             _FakeLLM(model="b", error="second")])
+        with self.assertLogs("llm_config", level="WARNING"):
+            with self.assertRaisesRegex(RuntimeError, "second"):
+                llm.call("hi")
+
+    def test_cancellation_does_not_fall_back(self):
+        """A cancelled run is not retried on the next model"""
+        backup = _FakeLLM(model="backup", answer="ok")
+        llm = FallbackLLM(model="a", chain=[_FakeLLM(model="a", error="cancel"), backup])
+
+        with self.assertRaises(JobCancelled):
+            llm.call("hi")
+        self.assertEqual(backup.calls, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Tests for the local OpenAI-compatible provider against a stub server
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from unittest.mock import patch
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from local_llm import LocalLLMError, LocalServer, LocalServerConfig, render_prompt
+
+
+class StubServer:
+    """OpenAI-compatible server answering 'echo: <last user message>'"""
+
+    def __init__(self, delay: float = 0.0, fail: bool = False):
+        self.delay = delay
+        self.fail = fail
+        self.requests = []
+        self.active = 0
+        self.max_active = 0
+        lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                with lock:
+                    stub.requests.append((self.path, body, self.headers.get("Authorization")))
+                    stub.active += 1
+                    stub.max_active = max(stub.max_active, stub.active)
+                time.sleep(stub.delay)
+                with lock:
+                    stub.active -= 1
+                if stub.fail:
+                    self.send_response(503)
+                    self.end_headers()
+                    self.wfile.write(b"overloaded")
+                    return
+                if self.path.endswith("/chat/completions"):
+                    text = "echo: " + body["messages"][-1]["content"]
+                    data = {"choices": [{"index": 0, "message": {"content": text}, "finish_reason": "stop"}],
+                            "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15}}
+                else:
+                    prompts = body["prompt"]
+                    # Ответы в обратном порядке: клиент сопоставляет по index
+                    data = {"choices": [
+                        {"index": i, "text": "echo: " + prompts[i].split("\n")[1].removesuffix("<|im_end|>"),
+                         "finish_reason": "stop"}
+                        for i in reversed(range(len(prompts)))
+                    ], "usage": {"prompt_tokens": 40, "completion_tokens": 20, "total_tokens": 60}}
+                payload = json.dumps(data).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/v1"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def user(content: str) -> list:
+    return [{"role": "user", "content": content}]
+
+
+class TestLocalServer(unittest.TestCase):
+    """Test requests, the concurrency limit and batching"""
+
+    def stub(self, **kwargs) -> StubServer:
+        stub = StubServer(**kwargs)
+        self.addCleanup(stub.close)
+        return stub
+
+    def test_chat(self):
+        """A chat request returns the text, usage and finish reason"""
+        stub = self.stub()
+        server = LocalServer(LocalServerConfig(stub.url, api_key="secret"))
+
+        text, usage, finish = server.chat("qwen", user("hi"), {"temperature": 0.1})
+
+        self.assertEqual((text, usage["total_tokens"], finish), ("echo: hi", 15, "stop"))
+        path, body, auth = stub.requests[0]
+        self.assertEqual(path, "/v1/chat/completions")
+        self.assertEqual((body["model"], body["temperature"]), ("qwen", 0.1))
+        self.assertEqual(auth, "Bearer secret")
+
+    def test_concurrency_limit(self):
+        """No more requests than the limit are in flight"""
+        stub = self.stub(delay=0.1)
+        server = LocalServer(LocalServerConfig(stub.url, concurrency=2))
+
+        with ThreadPoolExecutor(6) as pool:
+            list(pool.map(lambda i: server.complete("qwen", user(str(i)), {}), range(6)))
+
+        self.assertEqual(stub.max_active, 2)
+        self.assertEqual(len(stub.requests), 6)
+
+    def test_concurrent_prompts_are_batched(self):
+        """Concurrent small prompts share one /completions request"""
+        stub = self.stub()
+        server = LocalServer(LocalServerConfig(stub.url, batch=True, batch_size=4, batch_window=1.0))
+
+        with ThreadPoolExecutor(4) as pool:
+            results = list(pool.map(lambda i: server.complete("qwen", user(f"job {i}"), {}), range(4)))
+
+        self.assertEqual([text for text, _, _ in results], [f"echo: job {i}" for i in range(4)])
+        self.assertEqual(len(stub.requests), 1)
+        path, body, _ = stub.requests[0]
+        self.assertEqual(path, "/v1/completions")
+        self.assertEqual(len(body["prompt"]), 4)
+        self.assertIn("<|im_end|>", body["stop"])
+        self.assertEqual(sum(usage["total_tokens"] for _, usage, _ in results), 60)
+        self.assertEqual(server.stats(), {"requests": 1, "batches": 1, "batched_prompts": 4})
+
+    def test_window_flushes_partial_batch(self):
+        """A lone prompt is sent after the window; different params do not mix"""
+        stub = self.stub()
+        server = LocalServer(LocalServerConfig(stub.url, batch=True, batch_size=8, batch_window=0.05))
+
+        with ThreadPoolExecutor(2) as pool:
+            first = pool.submit(server.complete, "qwen", user("a"), {"temperature": 0})
+            second = pool.submit(server.complete, "qwen", user("b"), {"temperature": 1})
+            self.assertEqual((first.result()[0], second.result()[0]), ("echo: a", "echo: b"))
+
+        self.assertEqual(len(stub.requests), 2)
+
+    def test_large_prompt_goes_alone(self):
+        """Prompts over the size limit use chat completions"""
+        stub = self.stub()
+        server = LocalServer(LocalServerConfig(stub.url, batch=True, batch_max_chars=50))
+
+        text, _, _ = server.complete("qwen", user("x" * 100), {})
+
+        self.assertEqual(text, "echo: " + "x" * 100)
+        self.assertEqual(stub.requests[0][0], "/v1/chat/completions")
+
+    def test_errors(self):
+        """HTTP errors and a missing server raise LocalLLMError"""
+        stub = self.stub(fail=True)
+        with self.assertRaisesRegex(LocalLLMError, "HTTP 503"):
+            LocalServer(LocalServerConfig(stub.url)).chat("qwen", user("hi"), {})
+        with self.assertRaises(LocalLLMError):
+            LocalServer(LocalServerConfig("http://127.0.0.1:9/v1", timeout=2)).chat("qwen", user("hi"), {})
+
+    def test_render_prompt(self):
+        """Templates end where the assistant's answer starts"""
+        prompt = render_prompt([{"role": "system", "content": "s"}, {"role": "user", "content": "u"}])
+
+        self.assertEqual(prompt, "<|im_start|>system\ns<|im_end|>\n<|im_start|>user\nu<|im_end|>\n"
+                                 "<|im_start|>assistant\n")
+
+
+class TestLocalLLM(unittest.TestCase):
+    """Test the crewai LLM for local/<model>"""
+
+    @classmethod
+    def setUpClass(cls):
+        """Check if CrewAI is available"""
+        try:
+            import crewai
+        except ImportError:
+            raise unittest.SkipTest("CrewAI not installed - skipping crew tests")
+
+    def test_create_llm_uses_local_server(self):
+        """local/<model> is built when a server is configured and tracks usage"""
+        from config_cache import ModelSpec
+        from llm_config import LocalLLM, create_llm, is_available
+
+        stub = StubServer()
+        self.addCleanup(stub.close)
+        spec = ModelSpec(model="local/qwen2.5-coder", max_tokens=256)
+
+        with patch.dict(os.environ, {"LOCAL_LLM_BASE_URL": ""}):
+            self.assertFalse(is_available(spec.model))
+        with patch.dict(os.environ, {"LOCAL_LLM_BASE_URL": stub.url}):
+            llm = create_llm(spec)
+            text = llm.call("hello")
+
+        self.assertIsInstance(llm, LocalLLM)
+        self.assertEqual(text, "echo: hello")
+        self.assertEqual(stub.requests[0][1]["model"], "qwen2.5-coder")
+        self.assertEqual(stub.requests[0][1]["max_tokens"], 256)
+        self.assertEqual(llm.get_token_usage_summary().total_tokens, 15)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Tests for lightweight crew memory backends
+"""
+
+import shutil
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from memory import BufferMemory, NoMemory, SqliteMemory, create_memory
+
+
+class TestMemoryBackends(unittest.TestCase):
+    """Test remember/recall of each backend"""
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def _check_backend(self, memory):
+        for i in range(7):
+            memory.remember("calc.py", f"note {i}")
+        memory.remember("other.py", "unrelated")
+
+        self.assertEqual(memory.recall("calc.py"), [f"note {i}" for i in range(2, 7)])
+        self.assertEqual(memory.recall("missing.py"), [])
+
+    def test_buffer_keeps_last_items(self):
+        """BufferMemory keeps the last max_items notes per key"""
+        self._check_backend(BufferMemory(max_items=5))
+
+    def test_sqlite_keeps_last_items(self):
+        """SqliteMemory keeps the last max_items notes per key"""
+        self._check_backend(SqliteMemory(str(Path(self.work_dir) / "memory.db"), max_items=5))
+
+    def test_sqlite_persists(self):
+        """SqliteMemory notes survive a new instance"""
+        path = str(Path(self.work_dir) / "memory.db")
+        SqliteMemory(path).remember("calc.py", "analysis: 3 functions")
+
+        self.assertEqual(SqliteMemory(path).recall("calc.py"), ["analysis: 3 functions"])
+
+    def test_off_recalls_nothing(self):
+        """NoMemory stores nothing and renders no context"""
+        memory = NoMemory()
+        memory.remember("calc.py", "note")
+
+        self.assertEqual(memory.context_for("calc.py"), "")
+        self.assertFalse(memory.crewai_memory)
+
+    def test_remember_run_stores_analysis_and_validation(self):
+        """remember_run keeps short notes of analysis and validation outputs"""
+        memory = BufferMemory()
+        memory.remember_run("calc.py", ["found  3\nfunctions", "tests...", "x" * 1000])
+
+        notes = memory.recall("calc.py")
+        self.assertEqual(notes[0], "analysis: found 3 functions")
+        self.assertEqual(len(notes[1]), len("validation: ") + 400)
+        self.assertIn("Notes from previous runs", memory.context_for("calc.py"))
+
+    def test_create_memory(self):
+        """create_memory resolves backend names"""
+        self.assertIsInstance(create_memory("buffer"), BufferMemory)
+        self.assertTrue(create_memory("crewai").crewai_memory)
+        with self.assertRaises(ValueError):
+            create_memory("redis")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Tests for the sys.monitoring coverage collector
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from monitoring_coverage import MonitoringCoverage, analyze_source, available
+from sandbox import resolve_coverage_backend
+
+MODULE = '''"""Module docstring"""
+import os
+
+
+def sign(x):
+    """Docstring is not a statement."""
+    if x > 0:
+        return 1
+    return (-1 if x < 0
+            else 0)
+
+
+@staticmethod
+def never():
+    global os
+    return 5
+'''
+
+
+class TestAnalyzeSource(unittest.TestCase):
+    """Test statement detection (matches coverage.py)"""
+
+    def test_statements(self):
+        """Docstrings and global declarations are not statements; decorators are"""
+        statements, _ = analyze_source(MODULE)
+        self.assertEqual(sorted(statements), [2, 5, 7, 8, 9, 13, 14, 16])
+
+    def test_continuation_lines_map_to_statement(self):
+        """Every line of a multi-line statement belongs to its first line"""
+        _, line_map = analyze_source(MODULE)
+        self.assertEqual(line_map[10], 9)
+        self.assertNotIn(6, line_map)  # Докстринг
+
+
+@unittest.skipUnless(available(), "sys.monitoring requires Python 3.12+")
+class TestMonitoringCoverage(unittest.TestCase):
+    """Test line and branch collection"""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "signs.py")
+        Path(self.path).write_text(MODULE)
+        sys.path.insert(0, self.dir)
+
+    def tearDown(self):
+        sys.path.remove(self.dir)
+        sys.modules.pop("signs", None)
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_lines_and_partial_branches(self):
+        """Unexecuted statements are missing; one-sided conditions are partial"""
+        with MonitoringCoverage([self.path]) as collector:
+            import signs
+            signs.sign(5)
+
+        statements, missing = collector.analysis(self.path)
+        self.assertEqual(missing, [9, 16])
+        self.assertEqual(collector.partial_branches(self.path), [7])
+
+    def test_collectors_are_independent(self):
+        """Events disabled by one collection fire again for the next"""
+        with MonitoringCoverage([self.path]):
+            import signs
+            signs.sign(5)
+
+        with MonitoringCoverage([self.path]) as collector:
+            for x in (5, -5, 0):
+                signs.sign(x)
+
+        _, missing = collector.analysis(self.path)
+        self.assertIn(7, collector.executed_lines(self.path))
+        self.assertNotIn(9, missing)
+        self.assertEqual(collector.partial_branches(self.path), [])
+
+    def test_tool_slot_released(self):
+        """After stop the coverage tool id is free again"""
+        with MonitoringCoverage([self.path]):
+            self.assertFalse(available())
+        self.assertTrue(available())
+        self.assertEqual(resolve_coverage_backend(), "sysmon")
+
+
+class TestBackendSelection(unittest.TestCase):
+    """Test the coverage backend fallback"""
+
+    def test_coveragepy_forced(self):
+        """An explicit coveragepy choice is always honoured"""
+        self.assertEqual(resolve_coverage_backend("coveragepy"), "coveragepy")
+
+    @unittest.skipIf(available(), "sys.monitoring is available here")
+    def test_fallback_without_sys_monitoring(self):
+        """Before Python 3.12 auto falls back to coverage.py"""
+        self.assertEqual(resolve_coverage_backend("auto"), "coveragepy")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Tests for the mutation testing quality gate
+"""
+
+import sys
+import unittest
+from pathlib import Path
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from mutation import generate_mutants, run_mutation_gate
+from sandbox import SandboxLimits, SandboxPool
+
+MODULE = '''
+"""Math helpers"""
+
+
+def is_prime(n):
+    """Check primality."""
+    if n < 2:
+        return False
+    for i in range(2, n):
+        if n % i == 0:
+            return False
+    return True
+
+
+def untested(x):
+    return x * 2
+'''
+
+TESTS = '''
+from mathlib import is_prime
+
+
+def test_small_numbers():
+    assert not is_prime(1)
+    assert is_prime(2)
+
+
+def test_composite():
+    assert not is_prime(9)
+'''
+
+
+class TestGenerateMutants(unittest.TestCase):
+    """Test AST mutant generation"""
+
+    def test_mutants_cover_operator_kinds(self):
+        """Boundary flips, operator swaps, conditions and constants are produced"""
+        mutants = generate_mutants(MODULE)
+        kinds = {m.kind for m in mutants}
+
+        self.assertTrue({"boundary", "operator", "condition", "constant"} <= kinds)
+        descriptions = [m.description for m in mutants]
+        self.assertIn("line 7: < -> <=", descriptions)
+        self.assertIn("line 16: * -> /", descriptions)
+
+    def test_docstrings_and_module_level_untouched(self):
+        """Only function bodies are mutated, docstrings never"""
+        for mutant in generate_mutants('X = 1\n\n\ndef f():\n    """Doc."""\n    return X\n'):
+            self.fail(f"unexpected mutant {mutant.description}")
+
+    def test_max_mutants(self):
+        """The number of mutants is capped"""
+        self.assertEqual(len(generate_mutants(MODULE, max_mutants=3)), 3)
+
+    def test_invalid_source(self):
+        """Unparsable code yields no mutants"""
+        self.assertEqual(generate_mutants("def broken(:"), [])
+
+
+class TestMutationGate(unittest.TestCase):
+    """Test the gate end to end in the sandbox"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.pool = SandboxPool(size=2, limits=SandboxLimits(timeout=30))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.pool.shutdown()
+
+    def test_score_and_uncovered_skip(self):
+        """Mutants on uncovered lines are skipped, the rest killed or surviving"""
+        report = run_mutation_gate(MODULE, TESTS, "mathlib.py", pool=self.pool)
+
+        self.assertTrue(report.baseline_passed)
+        self.assertEqual(report.skipped_uncovered, 2)  # untested(): `*` and `2`
+        self.assertGreater(report.killed, 0)
+        self.assertIsNotNone(report.score)
+        self.assertIn("Mutation score:", report.summary())
+
+    def test_failing_baseline(self):
+        """Tests failing on the original code give no score"""
+        report = run_mutation_gate(
+            MODULE, "def test_bad():\n    assert False\n", "mathlib.py", pool=self.pool
+        )
+
+        self.assertFalse(report.baseline_passed)
+        self.assertIsNone(report.score)
+
+
+if __name__ == "__main__":
+    unittest.main()
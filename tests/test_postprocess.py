@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Tests for formatting and safe fixes of generated tests
+"""
+
+import shutil
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from postprocess import PostProcessor, fix_imports
+
+GENERATED = '''"""Tests for calculator"""
+import pytest
+import sys, os
+from calculator import subtract, add
+from unittest.mock import patch, MagicMock
+import json
+
+def test_add():
+    assert add(1, 2) == 3
+
+def test_env():
+    with patch("os.getcwd", return_value="/"):
+        assert os.getcwd() == "/"
+    assert sys.version
+'''
+
+
+class TestFixImports(unittest.TestCase):
+    """Test the built-in import fixer"""
+
+    def test_removes_unused_and_sorts(self):
+        """Unused names go; sections are stdlib, third-party, first-party"""
+        fixed = fix_imports(GENERATED, {"calculator"})
+
+        self.assertEqual(fixed.split("\n\ndef test_add")[0], (
+            '"""Tests for calculator"""\n'
+            "import os\n"
+            "import sys\n"
+            "from unittest.mock import patch\n"
+            "\n"
+            "from calculator import add"
+        ))
+        self.assertIn("def test_env():", fixed)
+
+    def test_names_in_strings_are_kept(self):
+        """String annotations and patch targets count as uses"""
+        source = "from typing import TYPE_CHECKING\nimport decimal\n\nx: 'decimal.Decimal' = TYPE_CHECKING\n"
+
+        self.assertEqual(fix_imports(source), "import decimal\nfrom typing import TYPE_CHECKING\n\n"
+                                               "x: 'decimal.Decimal' = TYPE_CHECKING\n")
+
+    def test_unsafe_blocks_left_alone(self):
+        """Comments, star imports and syntax errors leave the source unchanged"""
+        for source in (
+            "import os  # keep\nimport abc\n\nos.sep\n",
+            "from os import *\nimport abc\n",
+            "import os\ndef broken(:\n",
+        ):
+            self.assertEqual(fix_imports(source), source)
+
+
+class TestPostProcessor(unittest.TestCase):
+    """Test the post-processing stages"""
+
+    def test_builtin_fix_reports_stages(self):
+        """Without ruff the fix stage is in-process; every stage is timed"""
+        processor = PostProcessor(use_ruff=False, use_black=False)
+
+        processed, report = processor.process({"a.py": GENERATED, "b.py": "x = 1\n"})
+
+        self.assertNotIn("import json", processed["a.py"])
+        self.assertEqual(processed["b.py"], "x = 1\n")
+        self.assertEqual(report.files, 2)
+        self.assertEqual(report.changed, 1)
+        self.assertEqual(report.tools, {"fix": "builtin", "format": "skipped"})
+        self.assertEqual(set(report.stage_seconds), {"fix", "format"})
+        self.assertIn("fix", report.summary())
+
+    def test_black_formats(self):
+        """With black installed, the format stage uses its API"""
+        processor = PostProcessor(use_ruff=False)
+        if processor.black is None:
+            self.skipTest("black not installed")
+
+        processed = processor.process_one("def test_f( ):\n  assert  1==1\n")
+
+        self.assertEqual(processed, "def test_f():\n    assert 1 == 1\n")
+
+    def test_ruff_runs_once_per_batch(self):
+        """The ruff executable is started once for all files"""
+        processor = PostProcessor(use_ruff=False, use_black=False)
+        processor.ruff = "ruff"
+        sources = {f"test_{i}.py": "import os\n" for i in range(5)}
+
+        with patch("postprocess.subprocess.run") as run:
+            processed, report = processor.process(sources)
+
+        self.assertEqual(run.call_count, 1)
+        self.assertEqual(report.tools["fix"], "ruff")
+        self.assertEqual(processed, sources)  # ruff подменён — файлы не изменились
+
+    def test_single_file_skips_ruff(self):
+        """One file is fixed in process, without starting ruff"""
+        processor = PostProcessor(use_ruff=False, use_black=False)
+        processor.ruff = "ruff"
+
+        with patch("postprocess.subprocess.run") as run:
+            processed, report = processor.process({"test_one.py": "import os\n\ndef test_f():\n    pass\n"})
+
+        run.assert_not_called()
+        self.assertEqual(report.tools["fix"], "builtin")
+        self.assertNotIn("import os", processed["test_one.py"])
+
+    def test_from_env(self):
+        """POSTPROCESS_TESTS switches the stage on"""
+        with patch.dict("os.environ", {"POSTPROCESS_TESTS": "0"}):
+            self.assertIsNone(PostProcessor.from_env())
+        with patch.dict("os.environ", {"POSTPROCESS_TESTS": "1", "POSTPROCESS_LINE_LENGTH": "88"}):
+            self.assertEqual(PostProcessor.from_env().line_length, 88)
+
+
+class FakeCrew:
+    """Stands in for a spawned TestingCrew"""
+
+    def run(self, file_path, rate_limiter=None, **kwargs):
+        if file_path == "broken.py":
+            raise ValueError("boom")
+        return {"raw": f"```python\n{GENERATED}```"}
+
+
+class TestSaveMany(unittest.TestCase):
+    """Test batched post-processing in TestingCrew.save_many"""
+
+    @classmethod
+    def setUpClass(cls):
+        """Check if CrewAI is available"""
+        try:
+            import crewai
+        except ImportError:
+            raise unittest.SkipTest("CrewAI not installed - skipping crew tests")
+
+    def setUp(self):
+        from crew import TestingCrew
+
+        self.output_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.output_dir, True)
+        self.testing_crew = TestingCrew.__new__(TestingCrew)
+        self.testing_crew.postprocessor = PostProcessor(use_ruff=False, use_black=False)
+        self.testing_crew.last_postprocess = None
+        spawn = patch.object(TestingCrew, "_spawn", lambda _self: FakeCrew())
+        spawn.start()
+        self.addCleanup(spawn.stop)
+
+    def test_one_batch_for_all_files(self):
+        """Successful files are processed together and saved; errors are kept"""
+        with patch.object(PostProcessor, "process", wraps=self.testing_crew.postprocessor.process) as process:
+            results = self.testing_crew.save_many(
+                ["src/calculator.py", "src/other.py", "broken.py"], output_dir=self.output_dir
+            )
+
+        self.assertEqual(process.call_count, 1)
+        self.assertEqual(len(process.call_args.args[0]), 2)
+        by_file = {r.file_path: r for r in results}
+        self.assertIsInstance(by_file["broken.py"].error, ValueError)
+        saved = Path(by_file["src/calculator.py"].output_path)
+        self.assertEqual(saved.name, "test_calculator.py")
+        self.assertNotIn("import json", saved.read_text())
+        self.assertEqual(self.testing_crew.last_postprocess.files, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Tests for the sampling profiler
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from profiling import SamplingProfiler, mark_stage
+
+
+def busy(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        sum(range(100))
+
+
+def job():
+    mark_stage("parse")
+    busy(0.2)
+    mark_stage("llm")
+    time.sleep(0.2)
+
+
+class TestSamplingProfiler(unittest.TestCase):
+    """Test stage times, folded stacks and the top-N summary"""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def profile(self, fn=job):
+        profiler = SamplingProfiler(interval=0.005).start()
+        profiler.call(fn, stage="startup")
+        return profiler.stop()
+
+    def test_stages_split_cpu_and_wait(self):
+        """A busy stage is mostly CPU, a sleeping one mostly waiting"""
+        profile = self.profile()
+        stages = {s.stage: s for s in profile.stages}
+
+        self.assertEqual(list(stages), ["startup", "parse", "llm"])
+        self.assertGreater(stages["parse"].cpu, 0.1)
+        self.assertGreater(stages["llm"].wall, 0.15)
+        self.assertLess(stages["llm"].cpu, 0.05)
+        self.assertGreater(stages["llm"].wait, 0.15)
+        self.assertGreater(stages["parse"].samples, 5)
+
+    def test_folded_stacks(self):
+        """Each line is stage-rooted frames and a sample count"""
+        profile = self.profile()
+        path = os.path.join(self.dir, "profile.folded")
+        profile.write_folded(path)
+
+        lines = Path(path).read_text(encoding="utf-8").splitlines()
+        self.assertTrue(lines)
+        for line in lines:
+            stack, count = line.rsplit(" ", 1)
+            self.assertTrue(stack.startswith("stage:"))
+            self.assertGreater(int(count), 0)
+        self.assertTrue(any(line.startswith("stage:parse;") and ".busy" in line for line in lines))
+
+    def test_top_and_summary(self):
+        """The busy function leads the top list; the summary has all stages"""
+        profile = self.profile()
+
+        functions = [row["function"] for row in profile.top(5)]
+        self.assertTrue(any(f.endswith("busy") for f in functions))
+        summary = profile.summary(top_n=5)
+        for stage in ("startup", "parse", "llm"):
+            self.assertIn(stage, summary)
+        self.assertLess(profile.overhead, 0.2)
+
+    def test_mark_stage_outside_job_is_noop(self):
+        """Unprofiled code can call mark_stage freely"""
+        profiler = SamplingProfiler(interval=0.005).start()
+        mark_stage("ignored")
+        profile = profiler.stop()
+
+        self.assertEqual(profile.stages, [])
+        self.assertEqual(profile.samples, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Tests for structured report parsing and local JSON repair
+"""
+
+import json
+import sys
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from memory import BufferMemory
+from reports import (
+    AnalysisReport,
+    JsonRepair,
+    ValidationReport,
+    loads_lenient,
+    parse_report,
+    repair_json,
+    structured_output,
+)
+
+ANALYSIS = {
+    "file_path": "calc.py",
+    "language": "python",
+    "functions": [
+        {"name": "add", "line_number": 1, "params": ["a", "b"], "complexity": 1},
+        {"name": "div", "line_number": 4, "params": ["a", "b"], "complexity": 3},
+    ],
+    "total_complexity": 4,
+    "priority_targets": ["div"],
+    "warnings": ["div raises ZeroDivisionError"],
+}
+
+
+class TestJsonRepair(unittest.TestCase):
+    """Test that broken LLM JSON is repaired without another call"""
+
+    def test_valid_json_is_not_repaired(self):
+        value, repaired = loads_lenient(json.dumps(ANALYSIS))
+        self.assertEqual(value, ANALYSIS)
+        self.assertFalse(repaired)
+
+    def test_truncated_answer_keeps_complete_fields(self):
+        """Everything before the cut survives; the half-written field is dropped"""
+        text = json.dumps(ANALYSIS)
+        cut = text[:text.index('"priority_targets"') + 25]
+        value, repaired = loads_lenient(cut)
+
+        self.assertTrue(repaired)
+        self.assertEqual(value["functions"], ANALYSIS["functions"])
+        self.assertEqual(value["total_complexity"], 4)
+
+    def test_truncated_string_and_dangling_key(self):
+        self.assertEqual(json.loads(repair_json('{"a": "hel')), {"a": "hel"})
+        self.assertEqual(json.loads(repair_json('{"a": 1, "b":')), {"a": 1})
+        self.assertEqual(json.loads(repair_json('{"a": [1, 2,')), {"a": [1, 2]})
+
+    def test_prose_fences_and_python_literals(self):
+        text = (
+            "Here is the report:\n```json\n"
+            "{'syntax_valid': True, 'issues': [], 'notes': None,}\n```\nDone."
+        )
+        value, repaired = loads_lenient(text)
+        self.assertTrue(repaired)
+        self.assertEqual(value, {"syntax_valid": True, "issues": [], "notes": None})
+
+    def test_raw_newlines_in_strings(self):
+        value, _ = loads_lenient('{"fix": "line one\nline two"}')
+        self.assertEqual(value, {"fix": "line one\nline two"})
+
+    def test_incremental_feed(self):
+        """Fed in chunks, the snapshot is valid JSON after every chunk"""
+        text = json.dumps(ANALYSIS)
+        repair = JsonRepair()
+        for start in range(0, len(text), 7):
+            repair.feed(text[start:start + 7])
+            snapshot = repair.snapshot()
+            if snapshot is not None:
+                json.loads(snapshot)
+        self.assertTrue(repair.done)
+        self.assertEqual(json.loads(repair.snapshot()), ANALYSIS)
+
+    def test_no_json(self):
+        self.assertIsNone(repair_json("The code looks fine."))
+        self.assertEqual(loads_lenient("no json here"), (None, False))
+
+
+class TestReportModels(unittest.TestCase):
+    """Test coercion into the report models"""
+
+    def test_analysis_report(self):
+        report, repaired = parse_report(json.dumps(ANALYSIS), AnalysisReport)
+        self.assertFalse(repaired)
+        self.assertEqual([f.name for f in report.functions], ["add", "div"])
+        self.assertEqual(report.functions[1].complexity, 3.0)
+        self.assertIn("priority: div", report.note())
+
+    def test_bare_function_list_is_an_analysis(self):
+        report, _ = parse_report(json.dumps(ANALYSIS["functions"]), AnalysisReport)
+        self.assertEqual(len(report.functions), 2)
+
+    def test_validation_report_is_lenient(self):
+        text = json.dumps({
+            "syntax_valid": "yes",
+            "estimated_coverage": "85%",
+            "quality_score": "7/10",
+            "functions_missing": "div",
+            "issues": {"severity": "major", "issue": "no zero test"},
+            "extra_field": 1,
+        })
+        report, _ = parse_report(text, ValidationReport)
+
+        self.assertTrue(report.syntax_valid)
+        self.assertEqual(report.estimated_coverage, 85.0)
+        self.assertEqual(report.quality_score, 7.0)
+        self.assertEqual(report.functions_missing, ["div"])
+        self.assertEqual(report.issues[0].issue, "no zero test")
+        self.assertEqual(report.note(), "quality 7, untested: div, issues: no zero test")
+
+    def test_callback_attaches_report(self):
+        """structured_output fills pydantic/json_dict and keeps raw"""
+        raw = '{"syntax_valid": true, "quality_score": 9, "recommendations": ["more edge cases"'
+        output = SimpleNamespace(raw=raw, pydantic=None, json_dict=None)
+        structured_output(ValidationReport)(output)
+
+        self.assertIsInstance(output.pydantic, ValidationReport)
+        self.assertEqual(output.json_dict["recommendations"], ["more edge cases"])
+        self.assertEqual(output.raw, raw)
+
+        prose = SimpleNamespace(raw="Looks good.", pydantic=None, json_dict=None)
+        structured_output(ValidationReport)(prose)
+        self.assertIsNone(prose.pydantic)
+
+    def test_memory_uses_report_notes(self):
+        memory = BufferMemory()
+        memory.remember_run(
+            "calc.py", ["raw analysis", "tests", "raw validation"],
+            reports={"analysis": ANALYSIS, "validation": None}
+        )
+        notes = memory.recall("calc.py")
+
+        self.assertTrue(any(n.startswith("analysis: 2 functions") for n in notes))
+        self.assertIn("validation: raw validation", notes)
+
+
+if __name__ == "__main__":
+    unittest.main()
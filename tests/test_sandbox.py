@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Tests for the prewarmed sandbox pool
+"""
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from sandbox import ENV_ALLOWLIST, ENV_PREFIX_ALLOWLIST, SandboxJob, SandboxLimits, SandboxPool
+
+CALCULATOR = "def add(a, b):\n    return a + b\n\n\ndef sub(a, b):\n    return a - b\n"
+TESTS = "from calculator import add\n\n\ndef test_add():\n    assert add(1, 2) == 3\n"
+
+
+class TestSandboxPool(unittest.TestCase):
+    """Test sandboxed pytest runs"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.pool = SandboxPool(size=1, limits=SandboxLimits(timeout=30))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.pool.shutdown()
+
+    def test_run_with_coverage(self):
+        """Tests run in a temp dir and report line coverage of the source"""
+        result = self.pool.run_pytest(
+            {"calculator.py": CALCULATOR, "test_calculator.py": TESTS},
+            "test_calculator.py",
+            coverage_files=["calculator.py"]
+        )
+
+        self.assertTrue(result.passed, result.output)
+        self.assertIn("1 passed", result.output)
+        self.assertEqual(result.coverage["calculator.py"]["missing"], [6])
+
+    def test_failure_reported(self):
+        """A failing test gives a non-zero exit code and its output"""
+        result = self.pool.run_pytest(
+            {"test_fail.py": "def test_fail():\n    assert 1 == 2\n"}, "test_fail.py"
+        )
+
+        self.assertEqual(result.exit_code, 1)
+        self.assertIn("assert 1 == 2", result.output)
+
+    def test_timeout_kills_worker(self):
+        """A hanging test is killed after the wall-clock limit"""
+        job = SandboxJob({"test_hang.py": "def test_hang():\n    while True:\n        pass\n"},
+                         ["test_hang.py", "-q"])
+        result = self.pool.run(job, timeout=1)
+
+        self.assertTrue(result.timed_out)
+        self.assertFalse(result.passed)
+
+    def test_network_blocked_when_isolated(self):
+        """With an isolated namespace no connection can be opened"""
+        probe = (
+            "import socket\n\n\n"
+            "def test_connect():\n"
+            "    socket.create_connection(('1.1.1.1', 53), timeout=1).close()\n"
+        )
+        result = self.pool.run_pytest({"test_net.py": probe}, "test_net.py")
+        if not result.network_isolated:
+            self.skipTest("network namespaces not permitted here")
+        self.assertEqual(result.exit_code, 1)
+
+    def test_environment_allowlisted(self):
+        """Test code sees only allowlisted variables, HOME is the job directory"""
+        probe = (
+            "import os\n\n\n"
+            "def test_env():\n"
+            f"    allowed = {ENV_ALLOWLIST!r}\n"
+            "    extra = [k for k in os.environ if k not in allowed and k not in ('HOME', 'TMPDIR')\n"
+            f"             and not k.startswith({ENV_PREFIX_ALLOWLIST!r} + ('PYTEST_',))]\n"
+            "    assert extra == []\n"
+            "    assert os.environ['HOME'] == os.getcwd()\n"
+        )
+        result = self.pool.run_pytest({"test_env.py": probe}, "test_env.py")
+
+        self.assertTrue(result.passed, result.output or result.error)
+
+    def test_filesystem_confined(self):
+        """Only the job directory is writable; the project and /proc are not readable"""
+        outside = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, outside, ignore_errors=True)
+        probe = (
+            "import os\n\nimport pytest\n\n\n"
+            "def test_confined(tmp_path):\n"
+            "    (tmp_path / 'ok.txt').write_text('ok')\n"
+            "    with pytest.raises(PermissionError):\n"
+            f"        open({os.path.join(outside, 'poison')!r}, 'w')\n"
+            "    for path in ('/proc/self/environ', " + repr(__file__) + "):\n"
+            "        with pytest.raises(PermissionError):\n"
+            "            open(path, 'rb')\n"
+        )
+        result = self.pool.run_pytest({"test_fs.py": probe}, "test_fs.py")
+
+        self.assertTrue(result.passed, result.output or result.error)
+        self.assertTrue(result.filesystem_isolated)
+        self.assertEqual(os.listdir(outside), [])
+
+
+class TestIsolationRequired(unittest.TestCase):
+    """Test that jobs are refused without isolation unless opted out"""
+
+    def run_probe(self, **limits):
+        pool = SandboxPool(size=1, limits=SandboxLimits(timeout=30, isolate_network=False, **limits))
+        self.addCleanup(pool.shutdown)
+        return pool.run_pytest({"test_ok.py": "def test_ok():\n    pass\n"}, "test_ok.py")
+
+    def test_refused_without_network_isolation(self):
+        result = self.run_probe()
+
+        self.assertIsNone(result.exit_code)
+        self.assertIn("isolation unavailable (network)", result.error)
+
+    def test_opt_out(self):
+        """SANDBOX_REQUIRE_ISOLATION=0 runs the job anyway"""
+        with patch.dict(os.environ, {"SANDBOX_REQUIRE_ISOLATION": "0"}):
+            self.assertFalse(SandboxLimits.from_env().require_isolation)
+
+        self.assertTrue(self.run_probe(require_isolation=False).passed)
+
+
+class TestRunTestsTool(unittest.TestCase):
+    """Test the agent-facing tool on the run's snapshot"""
+
+    def test_runs_against_snapshot(self):
+        """run_tests uses the code under test from the snapshot store"""
+        try:
+            from tools.coverage_tool import RunTestsTool
+            from tools.snapshot_tool import SnapshotStore, use_snapshot_store
+        except ImportError:
+            self.skipTest("crewai not installed")
+
+        store = SnapshotStore()
+        store.add("/nonexistent/calculator.py", CALCULATOR)
+        with use_snapshot_store(store):
+            report = json.loads(RunTestsTool()._run(TESTS))
+
+        self.assertTrue(report["test_passed"], report)
+        self.assertEqual(report["missing_lines"], [6])
+
+
+if __name__ == "__main__":
+    unittest.main()
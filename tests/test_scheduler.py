@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Tests for the fair shortest-job-first job scheduler
+"""
+
+import asyncio
+import sys
+import unittest
+from pathlib import Path
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from cancellation import CancelToken, JobCancelled
+from scheduler import JobScheduler, estimate_cost
+
+SMALL = "def add(a, b):\n    return a + b\n"
+LARGE = "\n".join(f"def f{i}(x):\n    return x * {i} + 1\n" for i in range(500))
+
+
+class TestEstimateCost(unittest.TestCase):
+    """Test job cost estimation"""
+
+    def test_grows_with_code(self):
+        """Bigger sources cost more; every job pays the fixed overhead"""
+        self.assertGreater(estimate_cost(LARGE), 10 * estimate_cost(SMALL))
+        self.assertGreater(estimate_cost(""), 0)
+
+    def test_unparsable_code(self):
+        """Code that does not parse is estimated from its size"""
+        self.assertGreater(estimate_cost("def broken(:\n" * 50), estimate_cost("def broken(:\n"))
+
+
+class TestJobScheduler(unittest.IsolatedAsyncioTestCase):
+    """Test slot assignment order, cancellation and status"""
+
+    async def _start_order(self, scheduler, tickets):
+        """Start every ticket one slot at a time, returning the start order"""
+        order = []
+        for _ in tickets:
+            running = list(scheduler.running)
+            for ticket in running:
+                order.append(ticket)
+                scheduler.release(ticket)
+        return order + list(scheduler.running)
+
+    async def test_small_jobs_overtake_large(self):
+        """A large upload waits behind other users' small snippets"""
+        scheduler = JobScheduler(slots=1, aging=0)
+        first = scheduler.submit("a", cost=100)
+        large = scheduler.submit("a", LARGE)
+        small = [scheduler.submit(user, SMALL) for user in ("b", "c", "d")]
+
+        order = await self._start_order(scheduler, [first, large, *small])
+
+        self.assertEqual(order, [first, *small, large])
+
+    async def test_fair_share_between_users(self):
+        """One user's burst does not push another user to the back"""
+        scheduler = JobScheduler(slots=1, aging=0)
+        running = scheduler.submit("a", cost=10)
+        burst = [scheduler.submit("a", cost=10) for _ in range(4)]
+        other = scheduler.submit("b", cost=10)
+
+        order = await self._start_order(scheduler, [running, *burst, other])
+
+        self.assertLess(order.index(other), order.index(burst[1]))
+
+    async def test_aging_prevents_starvation(self):
+        """A long-waiting large job beats newly arrived small ones"""
+        scheduler = JobScheduler(slots=1, aging=1000)
+        running = scheduler.submit("a", cost=10)
+        large = scheduler.submit("b", cost=500)
+        large.submitted -= 10  # Ждёт уже 10 секунд
+        small = scheduler.submit("c", cost=10)
+
+        scheduler.release(running)
+
+        self.assertIn(large, scheduler.running)
+        self.assertNotIn(small, scheduler.running)
+
+    async def test_position_and_eta(self):
+        """Queued jobs report their place and when they should finish"""
+        scheduler = JobScheduler(slots=1, aging=0, seconds_per_unit=1.0)
+        running = scheduler.submit("a", cost=30)
+        second = scheduler.submit("b", cost=10)
+        third = scheduler.submit("c", cost=20)
+
+        self.assertEqual(scheduler.position(running)[0], 0)
+        position, eta = scheduler.position(third)
+        self.assertEqual(position, 2)
+        self.assertAlmostEqual(eta, 60, delta=1)
+        self.assertEqual(scheduler.position(second)[0], 1)
+        self.assertEqual(scheduler.stats()["queued"], 2)
+        self.assertEqual(scheduler.tickets("c"), [third])
+
+    async def test_acquire_and_release(self):
+        """acquire() resolves once a slot frees up"""
+        scheduler = JobScheduler(slots=1)
+        first = scheduler.submit("a", SMALL)
+        second = scheduler.submit("b", SMALL)
+        await scheduler.acquire(first)
+
+        waiter = asyncio.create_task(scheduler.acquire(second))
+        await asyncio.sleep(0)
+        self.assertFalse(waiter.done())
+
+        scheduler.release(first)
+        await asyncio.wait_for(waiter, timeout=1)
+        self.assertEqual(scheduler.stats()["completed"], 1)
+
+    async def test_cancelled_job_leaves_queue(self):
+        """A queued job whose token is cancelled is dropped, not started"""
+        scheduler = JobScheduler(slots=1)
+        running = scheduler.submit("a", SMALL)
+        token = CancelToken()
+        queued = scheduler.submit("b", SMALL, cancel_token=token)
+        later = scheduler.submit("c", LARGE)
+
+        token.cancel("cancelled by user")
+        scheduler.release(running)
+
+        with self.assertRaises(JobCancelled):
+            await scheduler.acquire(queued)
+        self.assertEqual(scheduler.running, [later])
+
+
+if __name__ == "__main__":
+    unittest.main()
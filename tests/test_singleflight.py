@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Tests for coalescing of concurrent identical jobs
+"""
+
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from cancellation import CancelToken, DeadlineExceeded, JobCancelled
+from singleflight import JobStore, SingleFlight, job_key
+
+
+class TestJobKey(unittest.TestCase):
+    """Test content keys"""
+
+    def test_formatting_does_not_matter(self):
+        """Comments and formatting give the same key; options do not"""
+        self.assertEqual(job_key("def f(x):\n    return x  # id\n"), job_key("def f( x ):\n  return x\n"))
+        self.assertNotEqual(job_key("def f(x): return x", test_type="unit"),
+                            job_key("def f(x): return x", test_type="e2e"))
+
+
+class TestSingleFlight(unittest.IsolatedAsyncioTestCase):
+    """Test in-process coalescing"""
+
+    async def test_concurrent_jobs_share_one_run(self):
+        """Identical jobs submitted together get one run's result"""
+        flights = SingleFlight()
+        calls = []
+        attached = []
+
+        async def pipeline(token):
+            calls.append(token)
+            await asyncio.sleep(0.05)
+            return "tests"
+
+        async def notify():
+            attached.append(True)
+
+        results = await asyncio.gather(*(
+            flights.run("k", pipeline, CancelToken(), on_attach=notify) for _ in range(4)
+        ))
+
+        self.assertEqual(results, ["tests"] * 4)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(attached), 3)
+        self.assertEqual(flights.stats(), {"runs": 1, "shared": 3, "in_flight": 0})
+
+    async def test_sequential_jobs_run_again(self):
+        """A finished flight is not reused (the test cache covers that)"""
+        flights = SingleFlight()
+
+        async def pipeline(token):
+            return "tests"
+
+        await flights.run("k", pipeline)
+        await flights.run("k", pipeline)
+
+        self.assertEqual(flights.runs, 2)
+
+    async def test_errors_reach_every_job(self):
+        """A failing run fails all attached jobs"""
+        flights = SingleFlight()
+
+        async def pipeline(token):
+            await asyncio.sleep(0.01)
+            raise RuntimeError("crew failed")
+
+        results = await asyncio.gather(
+            flights.run("k", pipeline), flights.run("k", pipeline), return_exceptions=True
+        )
+
+        self.assertTrue(all(isinstance(r, RuntimeError) for r in results))
+
+    async def test_one_cancel_keeps_shared_run(self):
+        """The leader's /cancel does not stop the run for a follower"""
+        flights = SingleFlight()
+        leader_token, follower_token = CancelToken(), CancelToken()
+        seen = {}
+
+        async def pipeline(token):
+            await asyncio.sleep(0.8)  # Дольше интервала опроса отмены
+            seen["cancelled"] = token.cancelled
+            return "tests"
+
+        leader = asyncio.create_task(flights.run("k", pipeline, leader_token))
+        follower = asyncio.create_task(flights.run("k", pipeline, follower_token))
+        await asyncio.sleep(0.01)
+        leader_token.cancel("cancelled by user")
+
+        with self.assertRaises(JobCancelled):
+            await leader
+        self.assertEqual(await follower, "tests")
+        self.assertFalse(seen["cancelled"])
+
+    async def test_all_cancelled_cancels_run(self):
+        """Once every attached job is cancelled the shared token fires"""
+        flights = SingleFlight()
+        tokens = [CancelToken(), CancelToken()]
+        shared = []
+
+        async def pipeline(token):
+            shared.append(token)
+            await asyncio.sleep(0.3)
+            token.check()
+            return "tests"
+
+        jobs = [asyncio.create_task(flights.run("k", pipeline, t)) for t in tokens]
+        await asyncio.sleep(0.01)
+        for token in tokens:
+            token.cancel("cancelled by user")
+
+        for job in jobs:
+            with self.assertRaises(JobCancelled):
+                await job
+        self.assertTrue(shared[0].cancelled)
+
+    async def test_shared_run_has_latest_deadline(self):
+        """The run lasts until the last deadline and then raises DeadlineExceeded"""
+        flights = SingleFlight()
+        short, long = CancelToken(timeout=0.2), CancelToken(timeout=0.6)
+        seen = {}
+
+        async def pipeline(token):
+            await asyncio.sleep(0.05)
+            seen["deadline"] = token.deadline
+            while True:
+                token.check()
+                await asyncio.sleep(0.02)
+
+        first = asyncio.create_task(flights.run("k", pipeline, short))
+        second = asyncio.create_task(flights.run("k", pipeline, long))
+
+        with self.assertRaises(DeadlineExceeded):
+            await first
+        self.assertFalse(second.done())  # Общий запуск идёт до позднего дедлайна
+        with self.assertRaises(DeadlineExceeded):
+            await second
+        self.assertEqual(seen["deadline"], long.deadline)
+
+    async def test_job_without_deadline_keeps_run_unbounded(self):
+        flights = SingleFlight()
+        seen = {}
+
+        async def pipeline(token):
+            await asyncio.sleep(0.05)
+            seen["deadline"] = token.deadline
+            return "tests"
+
+        results = await asyncio.gather(
+            flights.run("k", pipeline, CancelToken(timeout=30)), flights.run("k", pipeline, CancelToken())
+        )
+
+        self.assertEqual(results, ["tests", "tests"])
+        self.assertIsNone(seen["deadline"])
+
+
+class TestJobStore(unittest.IsolatedAsyncioTestCase):
+    """Test coalescing across processes through the job store"""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "jobs.db")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_claim_is_exclusive(self):
+        """Only one process owns a running key; stale owners are replaced"""
+        first, second = JobStore(self.path, stale_seconds=30), JobStore(self.path, stale_seconds=30)
+
+        self.assertTrue(first.claim("k"))
+        self.assertFalse(second.claim("k"))
+
+        second.stale_seconds = 0
+        time.sleep(0.01)
+        self.assertTrue(second.claim("k"))
+        self.assertEqual(second.get("k").owner, second.owner)
+
+    def test_release_lets_others_claim(self):
+        """A cancelled run gives the key back"""
+        first, second = JobStore(self.path), JobStore(self.path)
+        first.claim("k")
+        first.release("k")
+
+        self.assertTrue(second.claim("k"))
+
+    async def test_other_process_result_is_shared(self):
+        """A process that did not claim the key waits for the owner's result"""
+        owner_store, waiter_store = JobStore(self.path), JobStore(self.path)
+        owner, waiter = SingleFlight(owner_store), SingleFlight(waiter_store)
+        calls = []
+
+        async def pipeline(token):
+            calls.append(True)
+            await asyncio.sleep(0.3)
+            return {"tests": "def test_f(): pass"}
+
+        first = asyncio.create_task(owner.run("k", pipeline))
+        await asyncio.sleep(0.05)
+        second = asyncio.create_task(waiter.run("k", pipeline))
+
+        self.assertEqual(await first, await second)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(waiter.stats()["runs"], 0)
+        self.assertEqual(owner_store.get("k").state, "done")
+
+    async def test_failed_result_not_published(self):
+        """A None result releases the key: a waiting process runs the job itself"""
+        owner_store, waiter_store = JobStore(self.path), JobStore(self.path)
+        owner, waiter = SingleFlight(owner_store), SingleFlight(waiter_store)
+
+        async def failing(token):
+            await asyncio.sleep(0.3)
+            return None
+
+        async def pipeline(token):
+            return {"tests": "def test_f(): pass"}
+
+        first = asyncio.create_task(owner.run("k", failing))
+        await asyncio.sleep(0.05)
+        second = asyncio.create_task(waiter.run("k", pipeline))
+
+        self.assertIsNone(await first)
+        self.assertEqual(await second, {"tests": "def test_f(): pass"})
+        self.assertEqual(waiter.stats()["runs"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Tests for the snapshot-backed file read tool
+"""
+
+import shutil
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+try:
+    from tools.snapshot_tool import (
+        FileSnapshot,
+        SnapshotReadTool,
+        SnapshotStore,
+        use_snapshot_store,
+    )
+    CREWAI_AVAILABLE = True
+except ImportError:
+    CREWAI_AVAILABLE = False
+
+
+@unittest.skipUnless(CREWAI_AVAILABLE, "crewai not installed")
+class TestFileSnapshot(unittest.TestCase):
+    """Test line-range reads on bytes and mmap snapshots"""
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.path = Path(self.work_dir) / "module.py"
+        self.path.write_text("".join(f"line {i}\n" for i in range(1, 101)))
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def test_read_lines(self):
+        """Ranges are 1-based, inclusive and clipped to the file"""
+        snapshot = FileSnapshot.from_text("m.py", "a\nb\nc")
+        self.assertEqual(snapshot.line_count, 3)
+        self.assertEqual(snapshot.read_lines(2, 3), "b\nc")
+        self.assertEqual(snapshot.read_lines(3, 10), "c")
+        self.assertEqual(snapshot.read_lines(5), "")
+
+    def test_large_file_is_mapped_and_immutable(self):
+        """Files above the threshold are mmapped copies unaffected by edits"""
+        snapshot = FileSnapshot.from_path(str(self.path), mmap_threshold=10)
+        try:
+            self.assertTrue(snapshot.mapped)
+            self.path.write_text("rewritten\n")
+            self.assertEqual(snapshot.line_count, 100)
+            self.assertEqual(snapshot.read_lines(99, 100), "line 99\nline 100\n")
+        finally:
+            snapshot.close()
+
+
+@unittest.skipUnless(CREWAI_AVAILABLE, "crewai not installed")
+class TestSnapshotStore(unittest.TestCase):
+    """Test per-run snapshots, memoization and counters"""
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.path = str(Path(self.work_dir) / "calc.py")
+        Path(self.path).write_text("def add(a, b):\n    return a + b\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def test_serves_prompt_content_not_disk(self):
+        """The file under test is read from the run's snapshot"""
+        store = SnapshotStore()
+        store.add(self.path, "def sub(a, b):\n    return a - b\n")
+        Path(self.path).write_text("changed on disk\n")
+
+        self.assertIn("return a - b", store.read(self.path))
+
+    def test_repeat_read_within_task_is_cut_short(self):
+        """Second identical read in a task returns a pointer, memo serves later tasks"""
+        store = SnapshotStore()
+        first = store.read(self.path, 1, 2)
+        repeat = store.read(self.path, 1, 2)
+        self.assertIn("already returned", repeat)
+
+        store.next_task()
+        self.assertEqual(store.read(self.path, 1, 2), first)
+        self.assertEqual(
+            {k: store.stats()[k] for k in ("reads", "memo_hits", "repeat_reads")},
+            {"reads": 3, "memo_hits": 1, "repeat_reads": 1}
+        )
+
+    def test_tool_uses_bound_store(self):
+        """SnapshotReadTool reads from the store bound to the context"""
+        tool = SnapshotReadTool()
+        store = SnapshotStore()
+        store.add(self.path, "snapshot = True\n")
+        with use_snapshot_store(store):
+            self.assertIn("snapshot = True", tool._run(self.path))
+        self.assertIn("return a + b", tool._run(self.path))
+        self.assertIn("Error reading", tool._run(str(Path(self.work_dir) / "missing.py")))
+
+
+if __name__ == "__main__":
+    unittest.main()
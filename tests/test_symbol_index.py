@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Tests for the project-wide symbol index
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from symbol_index import SymbolIndex, extract_symbols, find_project_root, imported_names
+
+HELPERS = '''
+"""Helpers"""
+
+MAX_RETRIES = 3
+
+
+def parse_amount(text: str, default: float = 0.0) -> float:
+    """Parse a money amount."""
+    return float(text or default)
+
+
+class Ledger(Base):
+    """In-memory ledger."""
+
+    def __init__(self, owner):
+        self.owner = owner
+
+    def add(self, amount: float) -> None:
+        """Add an entry."""
+
+    def _private(self):
+        pass
+'''
+
+
+class TestExtraction(unittest.TestCase):
+    """Test symbol and import extraction"""
+
+    def test_extract_symbols(self):
+        """Functions, classes with public methods and constants are indexed"""
+        symbols = extract_symbols(HELPERS)
+
+        self.assertEqual(set(symbols), {"MAX_RETRIES", "parse_amount", "Ledger"})
+        self.assertEqual(
+            symbols["parse_amount"]["signature"],
+            "def parse_amount(text: str, default: float=0.0) -> float"
+        )
+        self.assertEqual(symbols["parse_amount"]["doc"], "Parse a money amount.")
+        methods = [m["signature"] for m in symbols["Ledger"]["methods"]]
+        self.assertEqual(methods, ["def __init__(self, owner)", "def add(self, amount: float) -> None"])
+
+    def test_imported_names_resolves_relative(self):
+        """Relative imports are resolved against the module's package"""
+        source = "import os\nfrom .helpers import parse_amount\nfrom ..core import Ledger\n"
+        imports = imported_names(source, "app.billing.invoice")
+
+        self.assertIsNone(imports["os"])
+        self.assertEqual(imports["app.billing.helpers"], {"parse_amount"})
+        self.assertEqual(imports["app.core"], {"Ledger"})
+
+
+class TestSymbolIndex(unittest.TestCase):
+    """Test incremental updates and dependency context"""
+
+    def setUp(self):
+        self.root = Path(tempfile.mkdtemp())
+        (self.root / "pyproject.toml").write_text("[project]\nname = 'demo'\n")
+        (self.root / "app").mkdir()
+        (self.root / "app" / "__init__.py").write_text("")
+        (self.root / "app" / "helpers.py").write_text(HELPERS)
+        self.target = self.root / "app" / "invoice.py"
+        self.target.write_text(
+            "from app.helpers import parse_amount\n\n"
+            "def total(items):\n    return sum(parse_amount(i) for i in items)\n"
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_find_project_root(self):
+        """The nearest directory with a root marker is the project root"""
+        self.assertEqual(find_project_root(str(self.target)), self.root.resolve())
+
+    def test_context_contains_only_imported_symbols(self):
+        """Only the names the target imports are rendered"""
+        index = SymbolIndex(str(self.root))
+        context = index.context_for(self.target.read_text(), str(self.target))
+
+        self.assertIn("# app.helpers", context)
+        self.assertIn("def parse_amount(text: str, default: float=0.0) -> float", context)
+        self.assertNotIn("Ledger", context)
+
+    def test_update_reparses_only_changed_files(self):
+        """Unchanged files are skipped; the index survives a reload"""
+        index = SymbolIndex(str(self.root))
+        self.assertEqual(index.update()["parsed"], 3)
+
+        reloaded = SymbolIndex(str(self.root))
+        self.assertEqual(reloaded.update(), {"parsed": 0, "unchanged": 3, "removed": 0})
+
+        helpers = self.root / "app" / "helpers.py"
+        stat = helpers.stat()
+        os.utime(helpers, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        self.assertEqual(reloaded.update()["parsed"], 0)  # touch: same hash
+
+        helpers.write_text(HELPERS + "\ndef new_helper():\n    pass\n")
+        self.assertEqual(reloaded.update()["parsed"], 1)
+        self.assertIn("new_helper", reloaded.lookup("app.helpers"))
+
+        helpers.unlink()
+        self.assertEqual(reloaded.update()["removed"], 1)
+        self.assertIsNone(reloaded.lookup("app.helpers"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Tests for end-to-end tracing spans and exporters
+"""
+
+import json
+import shutil
+import sys
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from pathlib import Path
+from types import SimpleNamespace
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from tracing import (
+    NOOP_SPAN,
+    JsonlExporter,
+    OtlpHttpExporter,
+    Tracer,
+    _CrewAISpans,
+    create_exporter,
+    current_span,
+)
+
+
+class ListExporter:
+    """Collects finished spans in memory"""
+
+    def __init__(self):
+        self.spans = []
+
+    def export(self, span):
+        self.spans.append(span)
+
+    def shutdown(self):
+        pass
+
+
+class TestTracer(unittest.TestCase):
+    """Test span nesting and status"""
+
+    def setUp(self):
+        self.exporter = ListExporter()
+        self.tracer = Tracer(self.exporter)
+
+    def test_spans_nest_through_context(self):
+        """Inner spans get the outer span as parent and share its trace"""
+        with self.tracer.span("bot.handle", user_id=1) as outer:
+            with self.tracer.span("testing_crew.run") as inner:
+                self.assertIs(current_span(), inner)
+            self.assertIs(current_span(), outer)
+        self.assertIsNone(current_span())
+
+        inner_span, outer_span = self.exporter.spans
+        self.assertEqual(inner_span.parent_id, outer_span.span_id)
+        self.assertEqual(inner_span.trace_id, outer_span.trace_id)
+        self.assertIsNone(outer_span.parent_id)
+        self.assertEqual(outer_span.attributes, {"user_id": 1})
+        self.assertGreaterEqual(outer_span.duration_ms, 0)
+
+    def test_error_marks_span(self):
+        """An exception inside a span is recorded and re-raised"""
+        with self.assertRaises(ValueError):
+            with self.tracer.span("failing"):
+                raise ValueError("boom")
+        self.assertEqual(self.exporter.spans[0].status, "error")
+        self.assertIn("boom", self.exporter.spans[0].error)
+
+    def test_disabled_tracer_yields_noop(self):
+        """Without exporter no spans are created"""
+        tracer = Tracer()
+        with tracer.span("anything", size=1) as span:
+            self.assertIs(span, NOOP_SPAN)
+            self.assertIsNone(current_span())
+        self.assertIsNone(tracer.start_span("manual"))
+
+    def test_create_exporter(self):
+        """TRACING_EXPORTER values map to exporters"""
+        self.assertIsNone(create_exporter("off"))
+        self.assertIsInstance(create_exporter("jsonl"), JsonlExporter)
+        with self.assertRaises(ValueError):
+            create_exporter("zipkin")
+
+
+class TestExporters(unittest.TestCase):
+    """Test JSONL output and OTLP encoding"""
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def test_jsonl_exporter_writes_lines(self):
+        """Each finished span is one JSON line"""
+        path = Path(self.work_dir) / "traces.jsonl"
+        tracer = Tracer(JsonlExporter(str(path)))
+        with tracer.span("outer"):
+            with tracer.span("inner", total_tokens=42):
+                pass
+
+        records = [json.loads(line) for line in path.read_text().splitlines()]
+        self.assertEqual([r["name"] for r in records], ["inner", "outer"])
+        self.assertEqual(records[0]["attributes"], {"total_tokens": 42})
+        self.assertEqual(records[0]["parent_id"], records[1]["span_id"])
+
+    def test_otlp_encoding(self):
+        """Spans are encoded as an OTLP JSON export request"""
+        exporter = OtlpHttpExporter("http://127.0.0.1:9/v1/traces", service_name="svc")
+        try:
+            tracer = Tracer(ListExporter())
+            with tracer.span("llm.call", model="gpt-4o-mini", total_tokens=10, from_cache=False):
+                pass
+            span = tracer.exporter.spans[0]
+
+            payload = exporter.encode([span])
+        finally:
+            exporter._queue.queue.clear()
+            exporter.shutdown()
+
+        resource = payload["resourceSpans"][0]
+        self.assertEqual(
+            resource["resource"]["attributes"][0]["value"]["stringValue"], "svc"
+        )
+        encoded = resource["scopeSpans"][0]["spans"][0]
+        self.assertEqual(encoded["traceId"], span.trace_id)
+        self.assertEqual(len(encoded["traceId"]), 32)
+        self.assertEqual(len(encoded["spanId"]), 16)
+        self.assertNotIn("parentSpanId", encoded)
+        attributes = {a["key"]: a["value"] for a in encoded["attributes"]}
+        self.assertEqual(attributes["model"], {"stringValue": "gpt-4o-mini"})
+        self.assertEqual(attributes["total_tokens"], {"intValue": "10"})
+        self.assertEqual(attributes["from_cache"], {"boolValue": False})
+
+
+class TestCrewAISpans(unittest.TestCase):
+    """Test pairing of CrewAI start/finish events into spans"""
+
+    def setUp(self):
+        self.exporter = ListExporter()
+        self.spans = _CrewAISpans()
+        self.spans.tracer = Tracer(self.exporter)
+
+    def test_llm_call_nested_under_task(self):
+        """LLM spans use event timestamps and the task span as parent"""
+        start = datetime.now()
+        self.spans.begin(("task", "t1"), "crewai.task", SimpleNamespace(timestamp=start))
+        self.spans.begin(
+            ("llm", "c1"), "llm.call", SimpleNamespace(timestamp=start),
+            parent_key=("task", "t1"), model="gpt-4o-mini"
+        )
+        self.spans.finish(
+            ("llm", "c1"), SimpleNamespace(timestamp=start + timedelta(seconds=2)),
+            total_tokens=100
+        )
+        self.spans.finish(("task", "t1"), SimpleNamespace(timestamp=start + timedelta(seconds=3)))
+
+        llm, task = self.exporter.spans
+        self.assertEqual(llm.parent_id, task.span_id)
+        self.assertAlmostEqual(llm.duration_ms, 2000, delta=1)
+        self.assertEqual(llm.attributes, {"model": "gpt-4o-mini", "total_tokens": 100})
+
+    def test_finish_before_start(self):
+        """Handlers may run out of order; the span is still closed"""
+        event = SimpleNamespace(timestamp=None)
+        self.spans.finish(("tool", "t1", "read_file", 1), event, error="not found")
+        self.assertEqual(self.exporter.spans, [])
+
+        self.spans.begin(("tool", "t1", "read_file", 1), "tool.read_file", event)
+        self.assertEqual(len(self.exporter.spans), 1)
+        self.assertEqual(self.exporter.spans[0].status, "error")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Tests for per-unit splitting, caching and test file assembly
+"""
+
+import shutil
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from cache import UnitTestCache
+from units import (
+    append_tests,
+    assemble_tests,
+    dependency_sources,
+    module_subset,
+    split_tests,
+    split_units,
+)
+
+MODULE = '''
+import math
+
+LIMIT = 10
+
+
+def helper(x):
+    return x * 2
+
+
+def area(r):
+    return math.pi * helper(r)
+
+
+class Shape:
+    def size(self):
+        return LIMIT
+'''
+
+GENERATED = '''
+import pytest
+from shapes import area, helper
+
+
+@pytest.fixture
+def radius():
+    return 2
+
+
+def test_area_positive(radius):
+    assert area(radius) > 0
+
+
+def test_helper_doubles():
+    assert helper(2) == 4
+
+
+class TestShape:
+    def test_size(self):
+        assert Shape().size() == 10
+'''
+
+
+class TestSplitUnits(unittest.TestCase):
+    """Test splitting a module into units"""
+
+    def test_units_and_dependencies(self):
+        """Top-level functions/classes with their direct dependencies"""
+        units = {u.name: u for u in split_units(MODULE)}
+
+        self.assertEqual(list(units), ["helper", "area", "Shape"])
+        self.assertEqual(units["area"].dependencies, ["helper", "math"])
+        self.assertEqual(units["Shape"].dependencies, ["LIMIT"])
+        self.assertEqual(units["Shape"].kind, "class")
+
+    def test_unit_key_includes_module(self):
+        """The same function in two files gets two keys"""
+        cache = UnitTestCache(tempfile.gettempdir())
+        unit = {u.name: u for u in split_units(MODULE)}["area"]
+        deps = dependency_sources(MODULE)
+
+        self.assertNotEqual(
+            cache.unit_key(unit, deps, module="shapes"),
+            cache.unit_key(unit, deps, module="geometry")
+        )
+
+    def test_module_subset_keeps_dependencies(self):
+        """The subset keeps requested units, their deps and module statements"""
+        subset = module_subset(MODULE, {"area"})
+
+        self.assertIn("def area", subset)
+        self.assertIn("def helper", subset)
+        self.assertIn("import math", subset)
+        self.assertNotIn("class Shape", subset)
+
+
+class TestSplitAndAssemble(unittest.TestCase):
+    """Test attributing generated tests to units and reassembling them"""
+
+    def test_tests_attributed_by_name(self):
+        """Tests and the fixtures they use go to the matching unit"""
+        imports, blocks = split_tests(GENERATED, ["helper", "area", "Shape"])
+
+        self.assertEqual(len(imports), 2)
+        self.assertTrue(any("def radius" in b for b in blocks["area"]))
+        self.assertTrue(any("test_area_positive" in b for b in blocks["area"]))
+        self.assertFalse(any("radius" in b for b in blocks["helper"]))
+        self.assertTrue(any("class TestShape" in b for b in blocks["Shape"]))
+
+    def test_assemble_merges_imports_and_dedups(self):
+        """Assembly merges from-imports and keeps one copy of shared blocks"""
+        fixture = "@pytest.fixture\ndef radius():\n    return 2"
+        tests = assemble_tests(
+            ["import pytest", "from shapes import area", "from shapes import helper", "import pytest"],
+            [fixture, "def test_a():\n    pass", fixture]
+        )
+
+        self.assertEqual(tests.count("def radius"), 1)
+        self.assertIn("from shapes import area, helper", tests)
+        compile(tests, "<assembled>", "exec")
+
+    def test_append_keeps_existing_text(self):
+        """New imports and tests are added; existing text and fixtures stay"""
+        new = (
+            "import pytest\nfrom shapes import area, Shape\n\n"
+            "@pytest.fixture\ndef radius():\n    return 3\n\n"
+            "def test_area_positive(radius):\n    assert area(-radius) > 0\n\n"
+            "def test_area_zero():\n    assert area(0) == 0\n"
+        )
+        merged, added = append_tests(GENERATED, new)
+
+        self.assertTrue(merged.startswith(GENERATED.split("\n\n\n")[0]))
+        self.assertIn(GENERATED.split("from shapes import area, helper\n")[1].strip(), merged)
+        self.assertEqual(added, ["test_area_positive_2", "test_area_zero"])
+        self.assertEqual(merged.count("def radius"), 1)
+        self.assertEqual(merged.count("import pytest"), 1)
+        self.assertIn("from shapes import Shape", merged)
+        compile(merged, "<appended>", "exec")
+
+    def test_append_exclude_and_syntax_error(self):
+        """Excluded tests are left out; unparsable code raises"""
+        new = "def test_a():\n    assert True\n\ndef test_b():\n    assert False\n"
+        merged, added = append_tests(GENERATED, new, exclude={"test_b"})
+
+        self.assertEqual(added, ["test_a"])
+        self.assertNotIn("test_b", merged)
+        with self.assertRaises(SyntaxError):
+            append_tests(GENERATED, "def test_(:")
+
+
+class TestIncrementalRun(unittest.TestCase):
+    """Test TestingCrew.run_incremental with a mocked crew run"""
+
+    @classmethod
+    def setUpClass(cls):
+        """Check if CrewAI is available"""
+        try:
+            import crewai
+        except ImportError:
+            raise unittest.SkipTest("CrewAI not installed - skipping crew tests")
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.module_path = Path(self.work_dir) / "shapes.py"
+        self.module_path.write_text(MODULE, encoding="utf-8")
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def _make_crew(self):
+        from crew import TestingCrew
+
+        testing_crew = TestingCrew.__new__(TestingCrew)
+        testing_crew.test_cache = None
+        testing_crew.unit_cache = UnitTestCache(str(Path(self.work_dir) / "cache"))
+        testing_crew.config_version = "test"
+        testing_crew.symbol_index = None
+        return testing_crew
+
+    def test_only_changed_units_regenerated(self):
+        """A second run after editing one unit sends only that unit to the crew"""
+        testing_crew = self._make_crew()
+        first = {"tasks_output": ["", f"```python\n{GENERATED}```", ""], "token_usage": None}
+
+        with patch.object(type(testing_crew), "run", return_value=first) as run:
+            result = testing_crew.run_incremental(str(self.module_path))
+        self.assertEqual(result["units_generated"], ["helper", "area", "Shape"])
+        self.assertEqual(run.call_count, 1)
+
+        # Меняем только Shape
+        self.module_path.write_text(MODULE.replace("return LIMIT", "return LIMIT + 1"))
+        second = {
+            "tasks_output": ["", "```python\nclass TestShape:\n    def test_size_new(self):\n        assert True\n```", ""],
+            "token_usage": None
+        }
+
+        with patch.object(type(testing_crew), "run", return_value=second) as run:
+            result = testing_crew.run_incremental(str(self.module_path))
+
+        prompt_code = run.call_args.kwargs["code_content"]
+        self.assertIn("class Shape", prompt_code)
+        self.assertNotIn("def area", prompt_code)
+        self.assertEqual(result["units_cached"], ["helper", "area"])
+        self.assertEqual(result["units_generated"], ["Shape"])
+        self.assertIn("test_area_positive", result["tests"])
+        self.assertIn("test_size_new", result["tests"])
+        compile(result["tests"], "<assembled>", "exec")
+
+    def test_same_unit_in_other_module_not_shared(self):
+        """Cached tests import their module, so another file gets its own key"""
+        testing_crew = self._make_crew()
+        first = {"tasks_output": ["", f"```python\n{GENERATED}```", ""], "token_usage": None}
+        copy_path = Path(self.work_dir) / "shapes_copy.py"
+        copy_path.write_text(MODULE, encoding="utf-8")
+
+        with patch.object(type(testing_crew), "run", return_value=first) as run:
+            testing_crew.run_incremental(str(self.module_path))
+            result = testing_crew.run_incremental(str(copy_path))
+
+        self.assertEqual(run.call_count, 2)
+        self.assertEqual(result["units_cached"], [])
+
+
+if __name__ == "__main__":
+    unittest.main()
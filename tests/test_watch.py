@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Tests for watch mode
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from watch import Watcher
+
+
+class FakeCrew:
+    """Records run_and_save calls instead of calling the LLM"""
+
+    def __init__(self, calls, delay=0.0, fail=False):
+        self.calls = calls
+        self.delay = delay
+        self.fail = fail
+
+    def run_and_save(self, file_path, output_path=None, **kwargs):
+        self.calls.append((os.path.basename(file_path), threading.get_ident(), id(self)))
+        time.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("crew failed")
+        return output_path
+
+
+@unittest.skipUnless(sys.platform.startswith("linux"), "inotify is Linux-only")
+class TestWatcher(unittest.TestCase):
+    """Test debouncing, AST filtering and warm crews"""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.calls = []
+        self.crews = 0
+        self.write("calc.py", "def add(a, b):\n    return a + b\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def write(self, name, source):
+        path = Path(self.dir) / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(source, encoding="utf-8")
+
+    def watcher(self, delay=0.0, fail=False, **kwargs):
+        def factory():
+            self.crews += 1
+            return FakeCrew(self.calls, delay, fail)
+
+        watcher = Watcher(self.dir, factory, output_dir=os.path.join(self.dir, "tests"),
+                          debounce=0.05, **kwargs)
+        watcher.start()
+        self.addCleanup(watcher.close)
+        return watcher
+
+    def settle(self, watcher, seconds=0.4):
+        """Run the event loop until files went quiet and runs finished"""
+        end = time.monotonic() + seconds
+        while time.monotonic() < end:
+            watcher.step(timeout=0.05)
+        while not watcher.idle():
+            watcher.step(timeout=0.05)
+
+    def test_code_change_is_regenerated(self):
+        """A save that changes the AST queues exactly that module"""
+        watcher = self.watcher()
+        self.write("calc.py", "def add(a, b):\n    return b + a\n")
+        self.settle(watcher)
+
+        self.assertEqual([c[0] for c in self.calls], ["calc.py"])
+        self.assertEqual(watcher.stats["runs"], 1)
+
+    def test_burst_of_saves_is_debounced(self):
+        """Several writes in a row trigger one run"""
+        watcher = self.watcher()
+        for i in range(5):
+            self.write("calc.py", f"def add(a, b):\n    return a + b + {i}\n")
+        self.settle(watcher)
+
+        self.assertEqual(len(self.calls), 1)
+
+    def test_formatting_only_change_is_skipped(self):
+        """Comments and whitespace leave the fingerprint unchanged"""
+        watcher = self.watcher()
+        self.write("calc.py", "# sum\ndef add(a, b):\n\n    return a + b  # plain\n")
+        self.settle(watcher)
+
+        self.assertEqual(self.calls, [])
+        self.assertEqual(watcher.stats["unchanged"], 1)
+
+    def test_unparsable_and_test_files_are_skipped(self):
+        """Half-written code and test files are not regenerated"""
+        watcher = self.watcher()
+        self.write("calc.py", "def add(a, b:\n")
+        self.write("test_calc.py", "def test_add(): pass\n")
+        self.write("tests/test_other.py", "def test_other(): pass\n")
+        self.settle(watcher)
+
+        self.assertEqual(self.calls, [])
+        self.assertEqual(watcher.stats["unparsable"], 1)
+
+    def test_crews_are_reused_and_bounded(self):
+        """At most concurrency crews exist; new subdirectories are watched"""
+        watcher = self.watcher(delay=0.1, concurrency=2)
+        for name in ("a.py", "b.py", "pkg/c.py", "pkg/d.py"):
+            self.write(name, f"def {name[-4]}(): return 1\n")
+        self.settle(watcher, seconds=0.6)
+
+        self.assertEqual(sorted(c[0] for c in self.calls), ["a.py", "b.py", "c.py", "d.py"])
+        self.assertLessEqual(self.crews, 2)
+        self.assertLessEqual(len({c[2] for c in self.calls}), 2)
+
+    def test_failed_run_retries_on_next_save(self):
+        """After a failure the same code is regenerated again"""
+        watcher = self.watcher(fail=True)
+        self.write("calc.py", "def add(a, b):\n    return b + a\n")
+        self.settle(watcher)
+        self.write("calc.py", "def add(a, b):\n    return b + a\n")
+        self.settle(watcher)
+
+        self.assertEqual(len(self.calls), 2)
+        self.assertEqual(watcher.stats["failed"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
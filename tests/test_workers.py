@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Tests for recycled worker processes
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+# Add src to path
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from cancellation import CancelToken, DeadlineExceeded, JobCancelled
+from workers import WorkerCrashed, WorkerLimits, WorkerPool, _worker_state, rss_bytes
+
+_ballast = []
+
+
+def echo_job(cancel_token, value=None, grow_mb=0):
+    """Worker target: returns its pid and keeps grow_mb of memory alive"""
+    _ballast.append(bytearray(grow_mb * 1024 * 1024))
+    return {"pid": os.getpid(), "value": value}
+
+
+def slow_job(cancel_token, seconds=5.0):
+    """Worker target: waits cooperatively, like a crew between steps"""
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        cancel_token.check()
+        time.sleep(0.05)
+    return "done"
+
+
+def cache_job(cancel_token, cache_dir, key):
+    """Worker target: one lookup in the worker's test cache, like run_crew"""
+    from cache import TestCache
+    from local_llm import LocalServerConfig, get_server
+
+    cache = _worker_state.setdefault("test_cache", TestCache(cache_dir))
+    if cache.get(key) is None:
+        cache.put(key, {"token_usage": {"total_tokens": 40}})
+    return get_server(LocalServerConfig("http://localhost:1/v1", concurrency=4)).config.concurrency
+
+
+def failing_job(cancel_token, crash=False):
+    if crash:
+        os._exit(1)
+    raise ValueError("bad input")
+
+
+class TestWorkerPool(unittest.TestCase):
+    """Test retirement, cancellation and failures"""
+
+    def pool(self, target=echo_job, **limits):
+        pool = WorkerPool(size=1, limits=WorkerLimits(**limits), target=target)
+        self.addCleanup(pool.shutdown)
+        return pool
+
+    def test_worker_is_reused_then_retires_after_max_jobs(self):
+        """The same process serves jobs until max_jobs, then is replaced"""
+        pool = self.pool(max_jobs=2)
+
+        first, m1 = pool.run(value=1)
+        second, m2 = pool.run(value=2)
+        third, m3 = pool.run(value=3)
+
+        self.assertEqual(first["pid"], second["pid"])
+        self.assertEqual((m1.jobs, m2.jobs, m2.retiring), (1, 2, True))
+        self.assertNotEqual(third["pid"], first["pid"])
+        self.assertEqual(m3.jobs, 1)
+        self.assertEqual(pool.stats()["recycled"], 1)
+
+    def test_rss_ceiling_retires_worker(self):
+        """A job that leaves memory behind shows in the delta and retires the worker"""
+        pool = self.pool(max_rss_mb=rss_bytes() // (1024 * 1024) + 2000)
+        _, small = pool.run()
+        _, big = pool.run(grow_mb=64)
+
+        self.assertFalse(small.retiring)
+        self.assertGreater(big.to_dict()["rss_delta_mb"], 50)
+
+        _, metrics = self.pool(max_rss_mb=1).run()
+        self.assertTrue(metrics.retiring)
+
+    def test_cancel_reaches_worker(self):
+        """Cancelling the caller's token stops the job with the caller's reason"""
+        pool = self.pool(target=slow_job)
+        token = CancelToken()
+        started = time.monotonic()
+        token.cancel("cancelled by user")
+
+        with self.assertRaises(JobCancelled) as ctx:
+            pool.run(cancel_token=token)
+        self.assertEqual(ctx.exception.reason, "cancelled by user")
+        self.assertLess(time.monotonic() - started, 3)
+        self.assertEqual(pool.run(seconds=0.1)[0], "done")
+
+    def test_deadline_in_worker(self):
+        """The remaining deadline is enforced inside the worker"""
+        pool = self.pool(target=slow_job)
+
+        with self.assertRaises(DeadlineExceeded):
+            pool.run(cancel_token=CancelToken(timeout=0.3))
+
+    def test_cache_counters_and_local_server_share(self):
+        """The job's cache lookups come back in the metrics; workers split the server limit"""
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir, ignore_errors=True)
+        pool = WorkerPool(size=2, limits=WorkerLimits(), target=cache_job)
+        self.addCleanup(pool.shutdown)
+
+        concurrency, miss = pool.run(cache_dir=cache_dir, key="a" * 64)
+        _, hit = pool.run(cache_dir=cache_dir, key="a" * 64)
+
+        self.assertEqual(concurrency, 2)
+        self.assertEqual((miss.cache_hits, miss.cache_misses), (0, 1))
+        self.assertEqual((hit.cache_hits, hit.cache_misses, hit.tokens_saved), (1, 0, 40))
+
+    def test_errors_and_crashes(self):
+        """A failing job keeps its worker; a crashed worker is replaced"""
+        pool = self.pool(target=failing_job)
+
+        with self.assertRaisesRegex(RuntimeError, "ValueError: bad input"):
+            pool.run()
+        with self.assertRaises(WorkerCrashed):
+            pool.run(crash=True)
+        with self.assertRaisesRegex(RuntimeError, "ValueError"):
+            pool.run()
+        self.assertEqual(pool.stats()["crashed"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()